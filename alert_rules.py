@@ -0,0 +1,523 @@
+# alert_rules.py
+"""
+告警规则
+
+触发条件写在 alert_rules.cfg 中，每节一条规则:
+    [wavetrend_high]
+    group = wavetrend                 ; 由哪个监控计算（wavetrend / rsi / liquidation）
+    expr = wt1 > 49                   ; 条件表达式
+    message = 🐶 哈基米，WT1是{wt1:.2f}（当前价格: {close:.2f}）
+    priority = normal                 ; high / normal / low
+    hours = 07:00-23:00               ; 可选，只在该时段内生效（本地时间）
+    enabled = true
+
+表达式语法（Python 表达式子集，用 ast 解析并只允许白名单节点）:
+    比较与逻辑   wt1 > 49 and rsi_14 <= 30 or not (-49 < wt1 < 49)
+    算术         + - * /，数字常量
+    函数         abs(x)  min(a, b)  max(a, b)  between(x, lo, hi)
+                 prev(x)              上一次计算时的值
+                 cross_above(x, y)    上一次 x <= y，本次 x > y
+                 cross_below(x, y)    上一次 x >= y，本次 x < y
+    变量         由监控提供，如 wt1、wt2、close、rsi、threshold；
+                 liq_sum_<秒>、liq_count_<秒> 为该时间窗口内的爆仓金额/笔数
+                 爆仓规则还可使用 funding_rate、basis、open_interest、oi_value、oi_change（见 futures_poller.py）
+
+每条规则在加载时编译为 numpy 闭包，evaluate 一次计算某组规则在所有交易对上的结果
+（变量为按交易对排列的数组）。文件修改后下次计算时自动重新加载，解析失败时继续使用旧规则。
+alert_rules.cfg 不存在时使用与原硬编码条件相同的默认规则；文件中的同名规则覆盖默认规则。
+"""
+import ast
+import configparser
+import logging
+import operator
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+from alert_throttle import QuietHours
+from bn_config import get_setting
+from lazy_import import lazy_import
+from notify_digest import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+RULES_FILE = 'alert_rules.cfg'
+RELOAD_CHECK_INTERVAL = 1.0  # 检查规则文件修改时间的最小间隔(秒)
+
+PRIORITIES = {'high': PRIORITY_HIGH, 'normal': PRIORITY_NORMAL, 'low': PRIORITY_LOW}
+
+# 默认规则，与各监控原来的硬编码条件一致
+DEFAULT_RULES = """
+[wavetrend_high]
+group = wavetrend
+expr = wt1 > 49
+message = 🐶 哈基米，WT1是{wt1:.2f}（当前价格: {close:.2f}）
+
+[wavetrend_low]
+group = wavetrend
+expr = wt1 < -49
+message = 🌊 曼波，WT1是{wt1:.2f}（当前价格: {close:.2f}）
+
+[rsi_high]
+group = rsi
+expr = rsi >= 70
+message = RSI过高: {rsi:.2f}
+
+[rsi_low]
+group = rsi
+expr = rsi <= 30
+message = RSI过低: {rsi:.2f}
+
+[liquidation]
+group = liquidation
+expr = abs(wt1) > 49 and liq_sum_300 > threshold
+message = 发生哈气事件，总金额${liq_sum_300:,.2f}
+priority = high
+"""
+
+FUNCTIONS = ('abs', 'min', 'max', 'between', 'prev', 'cross_above', 'cross_below')
+
+WINDOW_VARIABLE = re.compile(r'^liq_(sum|count)_(\d+)$')
+
+
+class RuleError(ValueError):
+    """规则语法错误或使用了不允许的表达式"""
+
+
+_COMPARE_OPS = {
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+_BIN_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+}
+
+
+def _compile(node, names):
+    """
+    把表达式节点编译为闭包 f(env, prev) -> ndarray
+
+    env / prev 为 变量名 -> 数组 的字典，prev 是上一次计算时的变量
+    """
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, names)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+            and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda env, prev: value
+    if isinstance(node, ast.Name):
+        name = node.id
+        names.add(name)
+        return lambda env, prev: env[name]
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(v, names) for v in node.values]
+        reducer = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        # 数组与标量混合（如 a > 1 and 1 < 2）时先广播到相同形状再合并
+        return lambda env, prev: reducer.reduce(np.broadcast_arrays(
+            *[np.asarray(p(env, prev), dtype=bool) for p in parts]))
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile(node.operand, names)
+        if isinstance(node.op, ast.Not):
+            return lambda env, prev: np.logical_not(operand(env, prev))
+        if isinstance(node.op, ast.USub):
+            return lambda env, prev: -operand(env, prev)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        op = _BIN_OPS[type(node.op)]
+        left, right = _compile(node.left, names), _compile(node.right, names)
+        return lambda env, prev: op(left(env, prev), right(env, prev))
+    if isinstance(node, ast.Compare):
+        terms = [_compile(node.left, names)] + [_compile(c, names) for c in node.comparators]
+        ops = []
+        for op in node.ops:
+            if type(op) not in _COMPARE_OPS:
+                raise RuleError(f"不支持的比较运算: {type(op).__name__}")
+            ops.append(_COMPARE_OPS[type(op)])
+
+        def compare(env, prev):
+            values = [t(env, prev) for t in terms]
+            result = ops[0](values[0], values[1])
+            for i in range(1, len(ops)):  # 链式比较 a < b < c
+                result = np.logical_and(result, ops[i](values[i], values[i + 1]))
+            return result
+        return compare
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        if node.func.id not in FUNCTIONS:
+            raise RuleError(f"不支持的函数: {node.func.id}，可选: {', '.join(FUNCTIONS)}")
+        return _compile_call(node.func.id, [_compile(a, names) for a in node.args])
+    raise RuleError(f"不允许的表达式: {ast.dump(node)[:60]}")
+
+
+def _compile_call(func, args):
+    def need(count):
+        if len(args) != count:
+            raise RuleError(f"{func} 需要 {count} 个参数")
+
+    if func == 'abs':
+        need(1)
+        return lambda env, prev: np.abs(args[0](env, prev))
+    if func in ('min', 'max'):
+        need(2)
+        reducer = np.minimum if func == 'min' else np.maximum
+        return lambda env, prev: reducer(args[0](env, prev), args[1](env, prev))
+    if func == 'between':
+        need(3)
+        x, lo, hi = args
+        return lambda env, prev: np.logical_and(lo(env, prev) <= x(env, prev),
+                                                x(env, prev) <= hi(env, prev))
+    if func == 'prev':
+        need(1)
+        return lambda env, prev: args[0](prev, prev)
+    if func in ('cross_above', 'cross_below'):
+        need(2)
+        x, y = args
+        before, after = (operator.le, operator.gt) if func == 'cross_above' \
+            else (operator.ge, operator.lt)
+        return lambda env, prev: np.logical_and(before(x(prev, prev), y(prev, prev)),
+                                                after(x(env, prev), y(env, prev)))
+
+
+def compile_expression(expr):
+    """
+    编译条件表达式
+
+    Returns:
+    --------
+    tuple
+        (f(env, prev) -> ndarray, 用到的变量名集合)
+
+    Raises:
+    -------
+    RuleError
+        语法错误或包含白名单以外的节点
+    """
+    try:
+        tree = ast.parse(expr.strip(), mode='eval')
+    except SyntaxError as e:
+        raise RuleError(f"表达式语法错误: {expr}: {e.msg}") from None
+    names = set()
+    return _compile(tree, names), names
+
+
+@dataclass
+class Rule:
+    """一条已编译的规则"""
+    name: str
+    group: str
+    expr: str
+    message: str
+    priority: int = PRIORITY_NORMAL
+    hours: Optional[QuietHours] = None
+    predicate: Callable = field(default=None, repr=False)
+    names: frozenset = frozenset()
+
+    def active(self, now=None):
+        """是否处于规则的生效时段"""
+        return self.hours is None or self.hours.active(now)
+
+
+@dataclass
+class Match:
+    """一次规则触发"""
+    rule: Rule
+    symbol: str
+    message: str
+    values: Dict[str, float]
+
+    @property
+    def priority(self):
+        return self.rule.priority
+
+
+class _PreviousValues:
+    """
+    一个规则组内各交易对上一次计算时的变量
+
+    按交易对分行保存，每次只读写本次参与计算的行，逐个交易对计算（如每条爆仓推送
+    只算一个交易对）时不会覆盖其他交易对的记录
+    """
+
+    def __init__(self):
+        self._rows: Dict[str, int] = {}
+        self._values: Dict[str, 'np.ndarray'] = {}
+
+    def _grow(self, size):
+        for key, column in self._values.items():
+            if len(column) < size:
+                self._values[key] = np.concatenate([column, np.full(size - len(column), np.nan)])
+
+    def exchange(self, symbols, env):
+        """
+        返回这些交易对上一次的变量（按 symbols 顺序，没有记录的为 NaN），并记录本次的变量
+        """
+        for symbol in symbols:
+            self._rows.setdefault(symbol, len(self._rows))
+        size = len(self._rows)
+        self._grow(size)
+        rows = np.array([self._rows[s] for s in symbols], dtype=np.intp)
+        prev = {}
+        for key, value in env.items():
+            column = self._values.get(key)
+            if column is None:
+                column = self._values[key] = np.full(size, np.nan)
+            prev[key] = column[rows]
+            column[rows] = value
+        return prev
+
+
+DRY_RUN_SYMBOLS = 2
+
+
+def _dry_run(name, predicate, names):
+    """用全 NaN 的变量试算一次，计算出错的规则在加载时就拒绝（热加载时保留旧规则）"""
+    env = {n: np.full(DRY_RUN_SYMBOLS, np.nan) for n in names}
+    try:
+        with np.errstate(all='ignore'):
+            np.broadcast_to(np.asarray(predicate(env, env), dtype=bool), (DRY_RUN_SYMBOLS,))
+    except Exception as e:
+        raise RuleError(f"规则 {name} 无法计算: {e}") from None
+
+
+def parse_rules(config) -> List[Rule]:
+    """
+    把 ConfigParser 中的规则编译为 Rule 列表
+
+    Raises:
+    -------
+    RuleError
+        任一规则无效
+    """
+    rules = []
+    for section in config.sections():
+        item = config[section]
+        if not item.getboolean('enabled', True):
+            continue
+        if 'expr' not in item or 'group' not in item:
+            raise RuleError(f"规则 {section} 缺少 expr 或 group")
+        predicate, names = compile_expression(item['expr'])
+        _dry_run(section, predicate, names)
+        priority = item.get('priority', 'normal').strip().lower()
+        if priority not in PRIORITIES:
+            raise RuleError(f"规则 {section} 的优先级无效: {priority}")
+        hours = item.get('hours', '').strip()
+        rules.append(Rule(section, item['group'].strip(), item['expr'],
+                          item.get('message', section), PRIORITIES[priority],
+                          QuietHours(hours) if hours else None, predicate, frozenset(names)))
+    return rules
+
+
+class RuleEngine:
+    """
+    按组计算告警规则，规则文件修改后自动重新加载（线程安全）
+
+    Parameters:
+    -----------
+    path : str, optional
+        规则文件，默认读取 [rules] path，未配置时为 alert_rules.cfg
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_setting('rules', 'path', RULES_FILE)
+        self.rules: List[Rule] = []
+        self._groups: Dict[str, List[Rule]] = {}
+        self._prev: Dict[str, _PreviousValues] = {}  # 组 -> 各交易对上次的变量
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'evaluations': 0, 'matches': 0, 'reloads': 0, 'errors': 0}
+        self.reload()
+
+    def reload(self):
+        """
+        重新加载规则；失败时保留当前规则
+
+        Returns:
+        --------
+        bool
+            是否加载成功
+        """
+        config = configparser.ConfigParser(interpolation=None, inline_comment_prefixes=(';',))
+        config.read_string(DEFAULT_RULES)
+        mtime = None
+        try:
+            if os.path.exists(self.path):
+                mtime = os.path.getmtime(self.path)
+                config.read(self.path, encoding='utf-8')
+            rules = parse_rules(config)
+        except (configparser.Error, RuleError) as e:
+            logger.error(f"加载告警规则失败，继续使用当前规则: {e}")
+            with self._lock:
+                self._mtime = mtime
+                self.stats['errors'] += 1
+            return False
+        groups = {}
+        for rule in rules:
+            groups.setdefault(rule.group, []).append(rule)
+        with self._lock:
+            self.rules, self._groups, self._mtime = rules, groups, mtime
+            self.stats['reloads'] += 1
+        logger.info(f"已加载 {len(rules)} 条告警规则"
+                    f"（{'默认规则' if mtime is None else self.path}）")
+        return True
+
+    def maybe_reload(self, now=None):
+        """规则文件的修改时间变化时重新加载（最多每秒检查一次）"""
+        now = time.time() if now is None else now
+        if now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        return self.reload()
+
+    def required(self, group) -> set:
+        """该组规则用到的全部变量名"""
+        with self._lock:
+            return set().union(*(r.names for r in self._groups.get(group, [])))
+
+    def windows(self, group, kind='sum') -> List[int]:
+        """该组规则用到的 liq_<kind>_<秒> 时间窗口"""
+        return sorted({int(m.group(2)) for m in map(WINDOW_VARIABLE.match, self.required(group))
+                       if m and m.group(1) == kind})
+
+    def evaluate(self, group, symbols: Sequence[str], variables) -> List[Match]:
+        """
+        计算一组规则
+
+        Parameters:
+        -----------
+        group : str
+            规则组，如 'wavetrend'
+        symbols : sequence of str
+            交易对
+        variables : dict
+            变量名 -> 与 symbols 等长的数组或标量（标量对所有交易对相同）
+
+        Returns:
+        --------
+        list of Match
+            触发的规则，每个交易对只取组内第一条触发的规则（按文件中的顺序）
+        """
+        self.maybe_reload()
+        symbols = tuple(symbols)
+        count = len(symbols)
+        env = {k: np.broadcast_to(np.asarray(v, dtype=np.float64), (count,))
+               for k, v in variables.items()}
+        with self._lock:
+            rules = list(self._groups.get(group, []))
+            prev = self._prev.setdefault(group, _PreviousValues()).exchange(symbols, env)
+
+        now = time.time()
+        matched = np.zeros(count, dtype=bool)
+        matches = []
+        for rule in rules:
+            if not rule.active(now):
+                continue
+            try:
+                hits = np.broadcast_to(np.asarray(rule.predicate(env, prev), dtype=bool), (count,))
+            except KeyError as e:
+                logger.error(f"规则 {rule.name} 缺少变量 {e}")
+                self.stats['errors'] += 1
+                continue
+            except Exception as e:
+                # 单条规则出错不影响同组其他规则，也不抛到监控主流程
+                logger.error(f"规则 {rule.name} 计算出错: {e}")
+                self.stats['errors'] += 1
+                continue
+            for i in np.nonzero(hits & ~matched)[0]:
+                values = {k: float(v[i]) for k, v in env.items()}
+                try:
+                    message = rule.message.format(symbol=symbols[i], **values)
+                except (KeyError, ValueError, IndexError) as e:
+                    message = f"{rule.name}: {rule.expr}"
+                    logger.error(f"规则 {rule.name} 的消息模板无效: {e}")
+                matches.append(Match(rule, symbols[i], message, values))
+            matched |= hits
+        self.stats['evaluations'] += 1
+        self.stats['matches'] += len(matches)
+        return matches
+
+    def get_stats(self):
+        return dict(self.stats, rules=len(self.rules))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> RuleEngine:
+    """进程内共享的规则引擎（延迟创建）"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RuleEngine()
+        return _engine
+
+
+def evaluate(group, symbols, variables) -> List[Match]:
+    """用共享规则引擎计算一组规则"""
+    return get_engine().evaluate(group, symbols, variables)
+
+
+def window_variables(records, group='liquidation', now=None, symbol=None):
+    """
+    计算规则用到的爆仓时间窗口变量
+
+    Parameters:
+    -----------
+    records : iterable of dict
+        爆仓记录，含 timestamp(毫秒)、symbol 与 total_value
+    group : str
+        规则组
+    now : float, optional
+        当前时间(秒)
+    symbol : str, optional
+        只统计该交易对的记录（与按交易对统计的自适应阈值口径一致）；None 时统计全部
+
+    Returns:
+    --------
+    dict
+        liq_sum_<秒> / liq_count_<秒> -> 数值
+    """
+    engine = get_engine()
+    now = time.time() if now is None else now
+    if symbol is not None:
+        records = [r for r in records if r['symbol'] == symbol]
+    variables = {}
+    for seconds in set(engine.windows(group, 'sum')) | set(engine.windows(group, 'count')):
+        since = (now - seconds) * 1000
+        recent = [r['total_value'] for r in records if r['timestamp'] >= since]
+        variables[f'liq_sum_{seconds}'] = sum(recent)
+        variables[f'liq_count_{seconds}'] = len(recent)
+    return variables
+
+
+def max_window(group='liquidation', default=0) -> int:
+    """规则用到的最长时间窗口(秒)，监控据此决定爆仓记录的保留时长"""
+    engine = get_engine()
+    return max(engine.windows(group, 'sum') + engine.windows(group, 'count') + [default])
+
+
+# 使用示例
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    engine = get_engine()
+    for rule in engine.rules:
+        print(f"{rule.group:<12} {rule.name:<16} {rule.expr}")
+    symbols = [f"SYM{i}USDT" for i in range(2000)]
+    rsi = np.random.default_rng(0).uniform(0, 100, len(symbols))
+    started = time.perf_counter()
+    matches = engine.evaluate('rsi', symbols, {'rsi': rsi})
+    print(f"{len(symbols)} 个交易对一次计算: {len(matches)} 条触发，"
+          f"耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+    print(engine.evaluate('wavetrend', ['ETHUSDT'], {'wt1': 55.0, 'wt2': 50.0, 'close': 3000.0}))
@@ -0,0 +1,441 @@
+# alert_throttle.py
+"""
+告警限频
+
+统一各机器人的告警冷却与静默时段:
+    cooldown:<秒>            两次告警之间至少间隔若干秒（原 WaveTrend / 爆仓冷却）
+    fixed:<次数>/<秒>        按本地时钟对齐的固定窗口内最多若干次（原 RSI 每15分钟窗口一次）
+    sliding:<次数>/<秒>      滑动窗口内最多若干次（双计数器近似，每个键O(1)内存）
+    bucket:<容量>/<秒>       令牌桶，每若干秒恢复一个令牌，可短时突发
+静默时段（默认 01:00-07:00，本地时间）对同一限频器的所有键生效。
+
+每个 (交易对, 告警类型[, 周期]) 键哈希为64位整数，状态保存在 numpy 结构化数组的一个槽位里
+(32字节)，通过 哈希->槽位 的字典 O(1) 定位，几千个键也只占几十KB；
+get_state / restore_state 可直接注册到 StateCheckpointer，只保存仍在生效的槽位。
+
+配置（bot_config.cfg，可用环境变量 BOT_THROTTLE_<OPTION> 覆盖）:
+    [throttle]
+    quiet_hours = 01:00-07:00
+    eth_robot_wt = cooldown:1800
+    rsi_notify = fixed:1/900
+    ; 单个机器人的静默时段，留空表示不静默
+    rsi_notify_quiet_hours =
+"""
+import base64
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, time as dt_time
+
+from bn_config import get_setting
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')  # 机器人启动时不需要，首次记录告警时才导入
+
+logger = logging.getLogger(__name__)
+
+QUIET_HOURS = '01:00-07:00'
+
+# 槽位: 键哈希 + 三个策略相关的数值（含义见各策略类）
+SLOT_FIELDS = [
+    ('key', '<u8'),
+    ('a', '<f8'),
+    ('b', '<f8'),
+    ('t', '<f8'),
+]
+_slot_dtype = None
+
+
+def slot_dtype():
+    global _slot_dtype
+    if _slot_dtype is None:
+        _slot_dtype = np.dtype(SLOT_FIELDS)
+    return _slot_dtype
+
+
+def hash_key(*parts) -> int:
+    """把 (交易对, 告警类型, ...) 哈希为64位整数"""
+    raw = '|'.join(str(p).upper() for p in parts).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), 'little')
+
+
+def _local_offset():
+    """本地时区相对UTC的偏移(秒)，用于把固定窗口对齐到本地时钟"""
+    return datetime.now().astimezone().utcoffset().total_seconds()
+
+
+class CooldownPolicy:
+    """两次告警之间至少间隔 period 秒；t: 上次告警时间"""
+    kind = 'cooldown'
+
+    def __init__(self, period):
+        self.period = float(period)
+
+    def wait_time(self, slot, now):
+        return max(0.0, slot['t'] + self.period - now) if slot['t'] else 0.0
+
+    def record(self, slot, now):
+        slot['t'] = now
+
+    def active(self, slots, now):
+        return slots['t'] + self.period > now
+
+    def __str__(self):
+        return f"cooldown:{self.period:g}"
+
+
+class FixedWindowPolicy:
+    """
+    按本地时钟对齐的固定窗口内最多 limit 次；a: 窗口内次数, t: 窗口起点
+    """
+    kind = 'fixed'
+
+    def __init__(self, limit, period):
+        self.limit = int(limit)
+        self.period = float(period)
+        self.offset = _local_offset()
+
+    def window_start(self, now):
+        return now - (now + self.offset) % self.period
+
+    def _roll(self, slot, now):
+        start = self.window_start(now)
+        if slot['t'] != start:
+            slot['a'] = 0
+            slot['t'] = start
+        return start
+
+    def wait_time(self, slot, now):
+        start = self.window_start(now)
+        if slot['t'] != start or slot['a'] < self.limit:
+            return 0.0
+        return start + self.period - now
+
+    def record(self, slot, now):
+        self._roll(slot, now)
+        slot['a'] += 1
+
+    def active(self, slots, now):
+        return slots['t'] + self.period > now
+
+    def __str__(self):
+        return f"fixed:{self.limit}/{self.period:g}"
+
+
+class SlidingWindowPolicy:
+    """
+    滑动窗口内最多 limit 次，用相邻两个固定窗口的计数加权近似:
+        估计值 = 上一窗口次数 * (1 - 当前窗口已过比例) + 当前窗口次数
+    a: 当前窗口次数, b: 上一窗口次数, t: 当前窗口起点
+    """
+    kind = 'sliding'
+
+    def __init__(self, limit, period):
+        self.limit = int(limit)
+        self.period = float(period)
+
+    def _counts(self, slot, now):
+        start = now - now % self.period
+        if slot['t'] == start:
+            return start, slot['a'], slot['b']
+        if slot['t'] == start - self.period:
+            return start, 0.0, slot['a']
+        return start, 0.0, 0.0
+
+    def wait_time(self, slot, now):
+        start, current, previous = self._counts(slot, now)
+        elapsed = (now - start) / self.period
+        if previous * (1 - elapsed) + current + 1 <= self.limit:
+            return 0.0
+        if current + 1 > self.limit or not previous:
+            return start + self.period - now
+        # 上一窗口的权重降到足以容纳一次告警的时刻
+        needed = 1 - (self.limit - 1 - current) / previous
+        return max(0.0, (needed - elapsed) * self.period)
+
+    def record(self, slot, now):
+        start, current, previous = self._counts(slot, now)
+        slot['t'], slot['a'], slot['b'] = start, current + 1, previous
+
+    def active(self, slots, now):
+        return slots['t'] + 2 * self.period > now
+
+    def __str__(self):
+        return f"sliding:{self.limit}/{self.period:g}"
+
+
+class TokenBucketPolicy:
+    """
+    令牌桶: 容量 capacity，每 period 秒恢复一个令牌；
+    a: 已用令牌数（新键为0即满桶）, t: 上次更新时间
+    """
+    kind = 'bucket'
+
+    def __init__(self, capacity, period):
+        self.capacity = float(capacity)
+        self.period = float(period)
+
+    def _used(self, slot, now):
+        return max(0.0, slot['a'] - (now - slot['t']) / self.period)
+
+    def wait_time(self, slot, now):
+        used = self._used(slot, now)
+        if used + 1 <= self.capacity:
+            return 0.0
+        return (used + 1 - self.capacity) * self.period
+
+    def record(self, slot, now):
+        slot['a'] = self._used(slot, now) + 1
+        slot['t'] = now
+
+    def active(self, slots, now):
+        return slots['a'] - (now - slots['t']) / self.period > 0
+
+    def __str__(self):
+        return f"bucket:{self.capacity:g}/{self.period:g}"
+
+
+POLICY_TYPES = {
+    'cooldown': CooldownPolicy,
+    'fixed': FixedWindowPolicy,
+    'sliding': SlidingWindowPolicy,
+    'bucket': TokenBucketPolicy,
+}
+
+
+def parse_policy(spec):
+    """
+    解析限频策略，如 'cooldown:1800'、'fixed:1/900'、'sliding:3/3600'、'bucket:5/600'
+    """
+    kind, _, args = spec.strip().partition(':')
+    if kind not in POLICY_TYPES:
+        raise ValueError(f"未知的限频策略: {spec}，可选: {list(POLICY_TYPES)}")
+    return POLICY_TYPES[kind](*(float(x) for x in args.split('/')))
+
+
+class QuietHours:
+    """
+    静默时段 [start, end)，本地时间，支持跨零点（如 23:00-07:00）
+
+    Parameters:
+    -----------
+    spec : str
+        'HH:MM-HH:MM'，空字符串表示不静默
+    """
+
+    def __init__(self, spec=QUIET_HOURS):
+        self.spec = spec.strip()
+        self.start = self.end = None
+        if self.spec:
+            start, end = self.spec.split('-')
+            self.start = dt_time.fromisoformat(start.strip())
+            self.end = dt_time.fromisoformat(end.strip())
+
+    def active(self, now=None) -> bool:
+        """当前是否处于静默时段"""
+        if self.start is None:
+            return False
+        current = datetime.fromtimestamp(time.time() if now is None else now).time()
+        if self.start <= self.end:
+            return self.start <= current < self.end
+        return current >= self.start or current < self.end
+
+    def __str__(self):
+        return self.spec or '无'
+
+
+class KeyStore:
+    """
+    哈希键 -> 槽位 的紧凑存储，槽位数组在首次写入时分配，之后按需倍增
+
+    Parameters:
+    -----------
+    capacity : int
+        初始槽位数
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.slots = None
+        self.index = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key_hash):
+        """键对应的槽位（numpy 记录，可原地修改），不存在时分配新槽位"""
+        i = self.index.get(key_hash)
+        if i is None:
+            i = len(self.index)
+            if self.slots is None:
+                self.slots = np.zeros(self.capacity, dtype=slot_dtype())
+            elif i == len(self.slots):
+                grown = np.zeros(len(self.slots) * 2, dtype=slot_dtype())
+                grown[:i] = self.slots
+                self.slots = grown
+            self.slots[i]['key'] = key_hash
+            self.index[key_hash] = i
+        return self.slots[i]
+
+    def peek(self, key_hash):
+        """只读查找，键不存在时返回空槽位"""
+        i = self.index.get(key_hash)
+        return self.slots[i] if i is not None else np.zeros((), dtype=slot_dtype())
+
+    def used(self):
+        if self.slots is None:
+            return np.zeros(0, dtype=slot_dtype())
+        return self.slots[:len(self.index)]
+
+    def load(self, records):
+        """用结构化数组替换全部槽位"""
+        self.slots = np.zeros(max(64, len(records)), dtype=slot_dtype())
+        self.slots[:len(records)] = records
+        self.index = {int(k): i for i, k in enumerate(records['key'])}
+
+    def nbytes(self):
+        return self.slots.nbytes if self.slots is not None else 0
+
+
+class Throttler:
+    """
+    按键限频，并在静默时段内屏蔽全部告警（线程安全）
+
+    Parameters:
+    -----------
+    policy : str or policy object
+        限频策略，见 parse_policy
+    quiet_hours : str or QuietHours, optional
+        静默时段，默认读取 [throttle] quiet_hours
+    name : str
+        名称（日志用）
+    """
+
+    def __init__(self, policy, quiet_hours=None, name='throttle'):
+        self.policy = parse_policy(policy) if isinstance(policy, str) else policy
+        if quiet_hours is None:
+            quiet_hours = get_setting('throttle', 'quiet_hours', QUIET_HOURS)
+        self.quiet_hours = QuietHours(quiet_hours) if isinstance(quiet_hours, str) else quiet_hours
+        self.name = name
+        self.store = KeyStore()
+        self.stats = {'allowed': 0, 'throttled': 0, 'quiet': 0}
+        self._lock = threading.Lock()
+
+    def quiet(self, now=None) -> bool:
+        """当前是否处于静默时段"""
+        return self.quiet_hours.active(now)
+
+    def wait_time(self, key, now=None) -> float:
+        """
+        该键距离下一次允许告警的秒数（不考虑静默时段），0表示可以发送
+
+        Parameters:
+        -----------
+        key : tuple or str
+            如 ('ETHUSDT', 'liquidation')
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            return self.policy.wait_time(self.store.peek(self._hash(key)), now)
+
+    def record(self, key, now=None):
+        """记录一次已发送的告警"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self.policy.record(self.store.get(self._hash(key)), now)
+
+    def allow(self, key, now=None) -> bool:
+        """
+        不在静默时段且未被限频时记录一次发送并返回True
+
+        Returns:
+        --------
+        bool
+            是否允许发送
+        """
+        now = time.time() if now is None else now
+        if self.quiet(now):
+            self.stats['quiet'] += 1
+            return False
+        with self._lock:
+            slot = self.store.get(self._hash(key))
+            if self.policy.wait_time(slot, now) > 0:
+                self.stats['throttled'] += 1
+                return False
+            self.policy.record(slot, now)
+            self.stats['allowed'] += 1
+        return True
+
+    @staticmethod
+    def _hash(key):
+        return hash_key(*key) if isinstance(key, tuple) else hash_key(key)
+
+    def get_state(self):
+        """导出仍在生效的槽位（供 StateCheckpointer 保存）"""
+        now = time.time()
+        with self._lock:
+            used = self.store.used()
+            active = used[self.policy.active(used, now)]
+            return {
+                'policy': str(self.policy),
+                'slots': base64.b64encode(active.tobytes()).decode('ascii'),
+            }
+
+    def restore_state(self, state, saved_at=None):
+        """从快照恢复；策略类型变化时丢弃旧状态"""
+        kind = state.get('policy', '').partition(':')[0]
+        if kind != self.policy.kind:
+            logger.warning(f"{self.name}: 限频策略已变化（{state.get('policy')} -> {self.policy}），忽略快照")
+            return
+        records = np.frombuffer(base64.b64decode(state.get('slots', '')), dtype=slot_dtype())
+        with self._lock:
+            self.store.load(records)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, keys=len(self.store), bytes=self.store.nbytes(),
+                        policy=str(self.policy), quiet_hours=str(self.quiet_hours))
+
+
+def build_throttler(name, default_policy, default_quiet_hours=None) -> Throttler:
+    """
+    按配置创建限频器
+
+    Parameters:
+    -----------
+    name : str
+        机器人名称，读取 [throttle] <name> 与 <name>_quiet_hours
+    default_policy : str
+        默认策略，如 'cooldown:1800'
+    default_quiet_hours : str, optional
+        未配置 <name>_quiet_hours 时的静默时段，默认使用 [throttle] quiet_hours
+
+    Returns:
+    --------
+    Throttler
+    """
+    if default_quiet_hours is None:
+        default_quiet_hours = get_setting('throttle', 'quiet_hours', QUIET_HOURS)
+    return Throttler(get_setting('throttle', name, default_policy),
+                     quiet_hours=get_setting('throttle', f'{name}_quiet_hours', default_quiet_hours),
+                     name=name)
+
+
+# 使用示例
+if __name__ == "__main__":
+    throttler = Throttler('bucket:3/60', quiet_hours='')
+    now = time.time()
+    for i in range(5):
+        print(f"第{i + 1}次: 允许={throttler.allow(('ETHUSDT', 'liquidation'), now + i)}")
+    print(f"需等待 {throttler.wait_time(('ETHUSDT', 'liquidation'), now + 5):.0f} 秒")
+
+    started = time.perf_counter()
+    for i in range(5000):
+        throttler.allow((f"SYM{i}USDT", 'rsi', '15m'), now)
+    print(f"5000个键: 耗时 {(time.perf_counter() - started) * 1000:.1f} ms，"
+          f"状态 {throttler.get_stats()}")
+    state = throttler.get_state()
+    restored = Throttler('bucket:3/60', quiet_hours='')
+    restored.restore_state(state)
+    print(f"快照 {len(state['slots'])} 字节（base64），恢复后 {len(restored.store)} 个键")
@@ -0,0 +1,88 @@
+# bn_config.py
+import configparser
+import os
+from typing import Optional
+
+# 配置文件路径，可通过环境变量 BOT_CONFIG_FILE 指定
+CONFIG_FILE = os.environ.get('BOT_CONFIG_FILE', 'bot_config.cfg')
+
+# 各外部服务的默认地址（生产环境）
+DEFAULT_ENDPOINTS = {
+    'binance_rest_url': 'https://api.binance.com',
+    'binance_fstream_url': 'wss://fstream.binance.com',
+    'binance_fapi_url': 'https://fapi.binance.com',
+    'bybit_ws_url': 'wss://stream.bybit.com/v5/public/linear',
+    'okx_ws_url': 'wss://ws.okx.com:8443/ws/v5/public',
+    'gocqhttp_url': 'http://127.0.0.1:5700',
+    # 为空表示沿用 wechat_config.cfg 中的 webhook 配置
+    'wechat_webhook_url': '',
+}
+
+_config = None
+
+
+def _load_config() -> configparser.ConfigParser:
+    """读取配置文件（只读，不存在时返回空配置）"""
+    global _config
+    if _config is None:
+        _config = configparser.ConfigParser()
+        if os.path.exists(CONFIG_FILE):
+            _config.read(CONFIG_FILE, encoding='utf-8')
+    return _config
+
+
+def reload_config() -> None:
+    """丢弃缓存的配置，下次读取时重新加载文件"""
+    global _config
+    _config = None
+
+
+def get_endpoint(name: str) -> Optional[str]:
+    """
+    获取外部服务地址
+
+    优先级: 环境变量 BOT_<NAME> > bot_config.cfg 的 [endpoints] 节 > 默认值
+    例如 BOT_BINANCE_REST_URL=http://127.0.0.1:8080 可将K线请求指向本地模拟器
+
+    Parameters:
+    -----------
+    name : str
+        地址名称，见 DEFAULT_ENDPOINTS
+
+    Returns:
+    --------
+    str or None
+        去掉末尾斜杠的地址，未配置时返回None
+    """
+    if name not in DEFAULT_ENDPOINTS:
+        raise KeyError(f"未知的地址名称: {name}")
+
+    value = os.environ.get(f"BOT_{name.upper()}")
+    if value is None:
+        value = _load_config().get('endpoints', name,
+                                   fallback=DEFAULT_ENDPOINTS[name])
+    value = value.strip().rstrip('/')
+    return value or None
+
+
+def get_setting(section: str, option: str, fallback=None, cast=str):
+    """
+    读取任意配置项，环境变量 BOT_<SECTION>_<OPTION> 优先
+
+    Parameters:
+    -----------
+    section : str
+        配置节名称
+    option : str
+        配置项名称
+    fallback : any
+        未配置时返回的默认值
+    cast : callable
+        类型转换函数，如 int / float
+    """
+    value = os.environ.get(f"BOT_{section.upper()}_{option.upper()}")
+    if value is None:
+        value = _load_config().get(section, option, fallback=None)
+    if value is None:
+        return fallback
+    return cast(value)
@@ -1,19 +1,120 @@
 # bn_eth.py
-import pandas as pd
-import requests
-import numpy as np
+from __future__ import annotations
+
+import time
 from typing import Optional
 
+from bn_config import get_endpoint, get_setting
+from lazy_import import lazy_import
+
+# 首次请求时才导入，缩短依赖本模块的机器人的启动时间
+pd = lazy_import('pandas')
+requests = lazy_import('requests')
+
+# K线周期对应的秒数
+INTERVAL_SECONDS = {
+    '1m': 60, '5m': 300, '15m': 900, '30m': 1800,
+    '1h': 3600, '4h': 14400, '1d': 86400, '1w': 604800,
+}
+
+KLINE_COLUMNS = [
+    'open_time', 'open', 'high', 'low', 'close', 'volume',
+    'close_time', 'quote_asset_volume', 'number_of_trades',
+    'taker_buy_base_volume', 'taker_buy_quote_volume', 'ignore'
+]
+
+def fetch_klines(symbol: str, interval: str, limit: int = 500,
+                 start_time: Optional[int] = None, end_time: Optional[int] = None,
+                 session: Optional[requests.Session] = None) -> list:
+    """
+    请求币安 /api/v3/klines 原始数据，网络错误直接抛出 requests 异常
+
+    Parameters:
+    -----------
+    symbol : str
+        交易对，如 ETHUSDT
+    interval : str
+        K线时间单位
+    limit : int
+        获取的数据条数，最大1000
+    start_time, end_time : int, optional
+        毫秒时间戳范围
+    session : requests.Session, optional
+        复用的HTTP会话
+
+    Returns:
+    --------
+    list
+        币安返回的K线数组
+    """
+    # 币安API端点（可通过 bot_config.cfg 或环境变量指向本地模拟器）
+    base_url = f"{get_endpoint('binance_rest_url')}/api/v3/klines"
+    params = {
+        'symbol': symbol,
+        'interval': interval,
+        'limit': limit
+    }
+    if start_time is not None:
+        params['startTime'] = start_time
+    if end_time is not None:
+        params['endTime'] = end_time
+
+    response = (session or requests).get(base_url, params=params, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def klines_to_dataframe(data: list) -> pd.DataFrame:
+    """把币安K线数组转换为以 open_time 为索引的OHLCV DataFrame"""
+    df = pd.DataFrame(data, columns=KLINE_COLUMNS)
+    
+    # 数据类型转换
+    numeric_columns = ['open', 'high', 'low', 'close', 'volume']
+    for col in numeric_columns:
+        df[col] = pd.to_numeric(df[col])
+    
+    # 时间戳转换
+    df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
+    df.set_index('open_time', inplace=True)
+    
+    # 按时间正序排列
+    df.sort_index(inplace=True)
+    
+    # 只返回需要的列
+    return df[numeric_columns].copy()
+
+def get_archived_data(symbol: str, interval: str, limit: int) -> pd.DataFrame:
+    """
+    超过单次请求上限时: 先把缺失的已收盘K线回补到本地归档（kline_archive.py），
+    再从归档读取，并拼接交易所返回的最新一根（未收盘）K线
+
+    网络错误直接抛出 requests 异常
+    """
+    from kline_archive import get_archive
+    from kline_backfill import backfill
+
+    archive = get_archive(symbol, interval)
+    current = archive.floor(int(time.time() * 1000))  # 正在形成的K线
+    backfill(symbol, interval, current - (limit - 1) * archive.step, current, archive=archive)
+    history = archive.get(end=current, limit=limit - 1)
+    latest = klines_to_dataframe(fetch_klines(symbol, interval, 2))
+    if history is None:
+        return latest
+    df = pd.concat([history, latest])
+    return df[~df.index.duplicated(keep='last')].iloc[-limit:]
+
 def get_eth_data(interval: str = '30m', limit: int = 500) -> Optional[pd.DataFrame]:
     """
     获取ETH/USDT的K线数据（简化版）
     
+    配置了行情守护进程（[market_data] socket_path）时优先从守护进程的共享内存读取，
+    守护进程不可用时回退到直接请求币安；limit 超过1000时经本地K线归档分页回补后读取
+    
     Parameters:
     -----------
     interval : str, default='30m'
         K线时间单位，可选: 1m, 5m, 15m, 30m, 1h, 4h, 1d, 1w
     limit : int, default=500
-        获取的数据条数，最大1000
+        获取的数据条数，超过1000时走本地归档
         
     Returns:
     --------
@@ -27,47 +128,28 @@ def get_eth_data(interval: str = '30m', limit: int = 500) -> Optional[pd.DataFra
         return None
     
     if limit > 1000:
-        print("警告: limit参数最大为1000，已自动调整")
-        limit = 1000
+        try:
+            result_df = get_archived_data('ETHUSDT', interval, limit)
+            print(f"成功获取 {len(result_df)} 条 {interval} K线数据（本地归档）")
+            return result_df
+        except requests.exceptions.RequestException as e:
+            print(f"网络请求错误: {e}")
+            return None
+        except Exception as e:
+            print(f"数据处理错误: {e}")
+            return None
     
-    # 币安API端点
-    base_url = "https://api.binance.com/api/v3/klines"
-    
-    params = {
-        'symbol': 'ETHUSDT',
-        'interval': interval,
-        'limit': limit
-    }
+    if get_setting('market_data', 'socket_path'):
+        import md_client
+        result_df = md_client.get_kline_data('ETHUSDT', interval, limit)
+        if result_df is not None:
+            return result_df
+        print("行情守护进程不可用，改为直接请求币安")
     
     try:
-        # 发送请求
-        response = requests.get(base_url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        # 转换为DataFrame
-        columns = [
-            'open_time', 'open', 'high', 'low', 'close', 'volume',
-            'close_time', 'quote_asset_volume', 'number_of_trades',
-            'taker_buy_base_volume', 'taker_buy_quote_volume', 'ignore'
-        ]
-        
-        df = pd.DataFrame(data, columns=columns)
-        
-        # 数据类型转换
-        numeric_columns = ['open', 'high', 'low', 'close', 'volume']
-        for col in numeric_columns:
-            df[col] = pd.to_numeric(df[col])
-        
-        # 时间戳转换
-        df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
-        df.set_index('open_time', inplace=True)
-        
-        # 按时间正序排列
-        df.sort_index(inplace=True)
-        
-        # 只返回需要的列
-        result_df = df[['open', 'high', 'low', 'close', 'volume']].copy()
+        # 发送请求并转换为DataFrame
+        data = fetch_klines('ETHUSDT', interval, limit)
+        result_df = klines_to_dataframe(data)
         
         print(f"成功获取 {len(result_df)} 条 {interval} K线数据")
         print(f"时间范围: {result_df.index[0]} 到 {result_df.index[-1]}")
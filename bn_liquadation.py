@@ -1,60 +1,201 @@
 import websockets
 import asyncio
-import json
+import logging
+import sys
 import time
-from datetime import datetime, time as dt_time
-from collections import deque
-from wechat_bot import send_text
+from datetime import datetime
+from liquidation_window import BURST_RULE, RULE, TIME_WINDOW, LiquidationWindow
+from chart_renderer import get_renderer
+from status_api import get_board, start_status_api
+from memory_monitor import get_monitor, start_memory_monitor
+from notifier import build_notifier
+from notify_digest import PRIORITY_HIGH
+from bn_config import get_endpoint, get_setting
+from bn_stream import RedundantFeed, ConnectionManager
+from liquidation_feeds import MultiExchangeFeed, build_adapters
 
 # 全局变量
-liquidation_records = deque()  # 存储5分钟内的爆仓记录
-
-last_sent_time = 0  # 最后发送时间
-WT1_value = 50  # WT1值
-TIME_WINDOW = 300  # 5分钟(秒)
 COOLDOWN = 1800  # 30分钟冷却(秒)
 THRESHOLD = 250000  # 50万美元阈值
 
+# 5分钟窗口、WT1、自适应阈值、突发检测、热力图与冷却状态（liquidation_window.py），
+# 可在 [throttle] bn_liquadation 改用其他限频策略
+window = LiquidationWindow('bn_liquadation', COOLDOWN, THRESHOLD, TIME_WINDOW)
+liquidation_records = window.records  # 存储5分钟内的爆仓记录
+futures = window.futures
+set_WT1 = window.set_WT1
+get_state = window.get_state
+restore_state = window.restore_state
+
+# 连接管理配置
+PING_INTERVAL = get_setting('liquidation', 'ping_interval', 20, float)  # ping间隔(秒)
+PING_TIMEOUT = get_setting('liquidation', 'ping_timeout', 20, float)  # pong超时(秒)
+IDLE_TIMEOUT = get_setting('liquidation', 'idle_timeout', 180, float)  # 无消息超时(秒)
+retry_delay = get_setting('liquidation', 'retry_delay', 1, float)  # 初始重连延迟(秒)
+max_retry_delay = get_setting('liquidation', 'max_retry_delay', 300, float)  # 最大重连延迟(秒)
+connection_manager = None  # 单连接模式下的 ConnectionManager 实例
+reconnect_hooks = []  # 重连后的补数回调
+
+# 连接管理日志直接输出到控制台（nohup.out），与本模块的 print 输出保持一致
+logger = logging.getLogger("bn_liquadation")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# 冗余连接配置: 连接数>1时启用热备模式，可用逗号分隔多个不同的 fstream 地址
+REDUNDANT_CONNECTIONS = get_setting('liquidation', 'redundant_connections', 1, int)
+REDUNDANT_ENDPOINTS = get_setting('liquidation', 'redundant_endpoints', '')
+redundant_feed = None  # 热备模式下的 RedundantFeed 实例
+
+# 爆仓数据来源，逗号分隔（binance / bybit / okx）；只有 binance 时沿用上面的单连接/热备模式，
+# 多个交易所时各交易所的 ETHUSDT 爆仓合并进入同一个窗口
+EXCHANGES = [e.strip().lower() for e in get_setting('liquidation', 'exchanges', 'binance').split(',')
+             if e.strip()]
+exchange_feed = None  # 多交易所模式下的 MultiExchangeFeed 实例
+
+# 通知通道（默认企业微信，可在 [notify] bn_liquadation_channels 配置多个通道）
+notifier = build_notifier('bn_liquadation', 'wechat')
+
+# 告警图表数据来源（eth_robot_wt 注册价格与WaveTrend序列），单独运行时只发送文字
+chart_source = None
+
+
+def handle_liquidation_message(data):
+    """处理一条爆仓推送"""
+    liquidation_data = extract_liquidation_data(data)
+    if liquidation_data:
+        check_and_send_alert(liquidation_data)
+
+
+def event_to_record(event):
+    """把归一化的 LiquidationEvent 转换为窗口记录（格式同 extract_liquidation_data）"""
+    return {
+        'symbol': event.symbol,
+        'quantity': event.quantity,
+        'price': event.price,
+        'side': event.side,
+        'total_value': event.notional,
+        'timestamp': event.ts_ms,
+        'time_str': datetime.fromtimestamp(event.ts_ms/1000).strftime('%H:%M:%S'),
+        'exchange': event.exchange,
+    }
+
+
+def handle_liquidation_event(event):
+    """处理多交易所模式下的一笔爆仓"""
+    if event.symbol.startswith('ETHUSDT'):
+        check_and_send_alert(event_to_record(event))
+
+
+async def get_eth_liquidations_multi(exchanges=None):
+    """多交易所模式: 各交易所的适配器在同一个事件循环中并发运行"""
+    global exchange_feed
+    adapters = build_adapters(exchanges or EXCHANGES)
+    print(f"爆仓数据来源: {', '.join(a.name for a in adapters)}")
+    exchange_feed = MultiExchangeFeed(
+        adapters, handle_liquidation_event,
+        ping_interval=PING_INTERVAL,
+        ping_timeout=PING_TIMEOUT,
+        idle_timeout=IDLE_TIMEOUT,
+        base_delay=retry_delay,
+        max_delay=max_retry_delay,
+        on_reconnect=run_reconnect_hooks,
+        on_gap=window.skip_unobserved,
+    )
+    await exchange_feed.run()
+
+
+def get_exchange_stats():
+    """获取各交易所的吞吐统计，未启用多交易所模式时返回None"""
+    if exchange_feed is None:
+        return None
+    return exchange_feed.get_stats()
+
+
+def get_redundant_urls(count=None):
+    """
+    生成冗余连接地址列表，地址数不足连接数时循环复用
+    """
+    count = count or REDUNDANT_CONNECTIONS
+    bases = [u.strip().rstrip('/') for u in REDUNDANT_ENDPOINTS.split(',') if u.strip()]
+    bases = bases or [get_endpoint('binance_fstream_url')]
+    return [f"{bases[i % len(bases)]}/ws/!forceOrder@arr" for i in range(count)]
+
+
+async def get_eth_liquidations_redundant(count=None):
+    """热备模式: 多条连接并行接收，事件按首达投递一次"""
+    global redundant_feed
+    urls = get_redundant_urls(count)
+    print(f"启用热备冗余连接，共 {len(urls)} 条: {urls}")
+    redundant_feed = RedundantFeed(
+        urls, handle_liquidation_message,
+        retry_delay=retry_delay,
+        max_retry_delay=max_retry_delay,
+        ping_interval=PING_INTERVAL,
+        ping_timeout=PING_TIMEOUT,
+        idle_timeout=IDLE_TIMEOUT,
+        on_gap=window.skip_unobserved,
+        on_reconnect=run_reconnect_hooks,
+        logger=logger,
+    )
+    await redundant_feed.run()
+
+
+def get_feed_stats():
+    """获取冗余连接的延迟与丢失统计，未启用热备模式时返回None"""
+    if redundant_feed is None:
+        return None
+    return redundant_feed.get_stats()
+
 async def get_eth_liquidations():
-    ws_url = "wss://fstream.binance.com/ws/!forceOrder@arr"
-    retry_delay = 10  # 初始重连延迟，单位：秒
-    max_retry_delay = 300  # 最大重连延迟，例如5分钟
+    """单连接模式: 由 ConnectionManager 负责半开检测与退避重连"""
+    global connection_manager
+    ws_url = f"{get_endpoint('binance_fstream_url')}/ws/!forceOrder@arr"
+    connection_manager = ConnectionManager(
+        ws_url,
+        handle_liquidation_message,
+        ping_interval=PING_INTERVAL,
+        ping_timeout=PING_TIMEOUT,
+        idle_timeout=IDLE_TIMEOUT,
+        base_delay=retry_delay,
+        max_delay=max_retry_delay,
+        on_reconnect=run_reconnect_hooks,
+        on_gap=window.skip_unobserved,
+        logger=logger,
+    )
+    try:
+        await connection_manager.run()
+    except (websockets.exceptions.InvalidURI,
+            websockets.exceptions.InvalidHandshake):
+        pass  # 这类错误通常无法通过重连解决，退出
+
+
+def register_reconnect_hook(func):
+    """
+    注册重连后的补数回调 func(gap_seconds)，
+    例如依赖本模块的指标计算可在断线恢复后立即补齐缺失的K线
+    """
+    reconnect_hooks.append(func)
 
-    while True:  # 使用循环而非递归
+
+def run_reconnect_hooks(gap):
+    """依次执行所有补数回调（在线程池中运行）"""
+    for hook in reconnect_hooks:
         try:
-            print(f"尝试连接至 {ws_url}...")
-            async with websockets.connect(ws_url) as websocket:
-                print("WebSocket 连接成功。")
-                retry_delay = 5  # 连接成功后重置重连延迟
-                
-                # 监听消息循环
-                while True:
-                    try:
-                        message = await websocket.recv()
-                        data = json.loads(message)
-                        liquidation_data = extract_liquidation_data(data)
-                        if liquidation_data:
-                            check_and_send_alert(liquidation_data)
-                    except websockets.exceptions.ConnectionClosed:
-                        print("WebSocket 连接在接收数据时被关闭，尝试重新建立连接...")
-                        break  # 跳出内部接收循环，外部循环会重连
-                    except Exception as e:
-                        print(f"处理消息时出错: {e}")
-                        # 可以选择继续监听下一条消息，而不是立即重连
-                        continue
-
-        except (websockets.exceptions.InvalidURI, 
-                websockets.exceptions.InvalidHandshake) as e:
-            print(f"连接参数问题，无法建立连接: {e}")
-            break  # 这类错误通常无法通过重连解决，退出循环
-        except (OSError, asyncio.TimeoutError, 
-                websockets.exceptions.WebSocketException) as e:
-            print(f"没有获取到爆仓事件（{e}），{retry_delay}秒后尝试重连...")
+            hook(gap)
         except Exception as e:
-            print(f"监控过程中发生未预期的错误: {e}")
-        
-        await asyncio.sleep(retry_delay)
-        
+            print(f"重连补数回调出错: {e}")
+
+
+def get_connection_metrics():
+    """获取单连接模式的重连次数、断线时长等指标，未启动时返回None"""
+    if connection_manager is None:
+        return None
+    return connection_manager.get_metrics()
+
 
 def extract_liquidation_data(raw_data):
     """提取ETH爆仓数据"""
@@ -73,67 +214,97 @@ def extract_liquidation_data(raw_data):
         'symbol': symbol,
         'quantity': quantity,
         'price': price,
+        'side': order_data.get('S', ''),
         'total_value': quantity * price,  # 计算总金额
         'timestamp': timestamp,
         'time_str': datetime.fromtimestamp(timestamp/1000).strftime('%H:%M:%S')
     }
 
-def set_WT1(value):
-    """设置WT1的值"""
-    global WT1_value
-    WT1_value = value
+def register_chart_source(func):
+    """
+    注册告警图表数据来源 func(symbol, title)，返回 chart_renderer 的渲染数据，
+    暂无数据时返回None
+    """
+    global chart_source
+    chart_source = func
 
-def is_suppress_time():
-    """检查是否在消息抑制时间段(1:00-7:00)"""
-    current_time = datetime.now().time()
-    return dt_time(1, 0) <= current_time < dt_time(7, 0)
+def send_alert_chart(symbol, title):
+    """在渲染进程中生成告警图表，完成后补发图片；文字告警已发出，这里不等待渲染"""
+    if chart_source is None:
+        return
+    try:
+        payload = chart_source(symbol, title)
+    except Exception as e:
+        print(f"生成告警图表数据出错: {e}")
+        return
+    if payload is not None:
+        get_renderer().attach(payload, lambda image: notifier.notify_image(image, symbol=symbol))
 
-def should_send_alert(current_value):
-    """判断是否满足发送条件"""
-    if is_suppress_time():
-        return False
-    
-    if not (WT1_value > 49 or WT1_value < -49):
-        return False
-    
-    if time.time() - last_sent_time < COOLDOWN:
-        return False
-    
-    # 计算5分钟内爆仓总量
-    five_min_ago = time.time() - TIME_WINDOW
-    total_5min = current_value + sum(
-        record['total_value'] for record in liquidation_records 
-        if record['timestamp']/1000 >= five_min_ago
-    )
-    return total_5min > THRESHOLD
+def send_burst_alert(burst):
+    """突发预警（不依赖WT1），静默时段与冷却规则同5分钟告警"""
+    if window.blocked(burst.symbol, BURST_RULE):
+        return
+    notifier.notify(window.with_heatmap(burst.format_message(), burst.symbol), priority=PRIORITY_HIGH,
+                    wait_ack=False, symbol=burst.symbol)
+    window.throttler.record((burst.symbol, BURST_RULE))
+    send_alert_chart(burst.symbol, f"{burst.symbol} liquidation burst ${burst.notional / 1e6:.2f}M")
 
 def check_and_send_alert(liquidation_data):
     """检查条件并发送警报"""
-    global last_sent_time, liquidation_records
-    
-    # 添加当前记录
-    liquidation_records.append(liquidation_data)
-    
-    # 清理5分钟前的记录
-    five_min_ago = time.time() - TIME_WINDOW
-    while (liquidation_records and 
-           liquidation_records[0]['timestamp']/1000 < five_min_ago):
-        liquidation_records.popleft()
+    # 添加当前记录（同时清理超出时间窗口的记录）
+    burst = window.observe(liquidation_data)
+    if burst:
+        send_burst_alert(burst)
     
     # 检查发送条件
-    if should_send_alert(liquidation_data['total_value']):
-        total_5min = sum(record['total_value'] for record in liquidation_records)
-        message = f"发生哈气事件，总金额${total_5min:,.2f}"
+    matches = window.should_send_alert(liquidation_data['symbol'])
+    if matches:
+        message = window.with_heatmap(matches[0].message, liquidation_data['symbol'])
         
-        # 发送微信消息
+        # 发送通知（在事件循环中调用，只提交不等待确认；微信通道进入合并队列，高优先级立即发送）
         
-        send_text(message)
+        notifier.notify(message, priority=matches[0].priority, wait_ack=False,
+                        symbol=liquidation_data['symbol'])
         
-        last_sent_time = time.time()
+        window.throttler.record((liquidation_data['symbol'], RULE))
+        send_alert_chart(liquidation_data['symbol'],
+                         f"{liquidation_data['symbol']} liquidation alert ({matches[0].rule.name})")
+    
+    # 状态接口的快照在后台线程中重新生成
+    status_board.mark('liquidation')
+
+def get_connection_status():
+    """状态接口的连接分区: 当前模式下的连接指标与各连接/交易所的吞吐统计"""
+    if EXCHANGES != ['binance']:
+        mode = 'multi_exchange'
+    else:
+        mode = 'redundant' if REDUNDANT_CONNECTIONS > 1 else 'single'
+    return {
+        'mode': mode,
+        'single': get_connection_metrics(),
+        'redundant': get_feed_stats(),
+        'exchanges': get_exchange_stats(),
+    }
+
+# 本地状态接口（status_api.py）的爆仓与连接分区，爆仓分区在每笔爆仓后标记更新
+# 内存监测（memory_monitor.py）: 随运行时间增长的数据结构
+status_board = get_board()
+memory_monitor = get_monitor()
+window.register_status(status_board, memory_monitor)
+status_board.register('connection', get_connection_status, interval=5)
+memory_monitor.register_gauge('dedup', lambda: len(redundant_feed.deduper) if redundant_feed else 0)
 
 async def start_eth_liquidations_monitor():
     """主函数"""
-    await get_eth_liquidations()
+    futures.start()  # 后台线程轮询资金费率/持仓量
+    if EXCHANGES != ['binance']:
+        await get_eth_liquidations_multi()
+    elif REDUNDANT_CONNECTIONS > 1:
+        await get_eth_liquidations_redundant()
+    else:
+        await get_eth_liquidations()
 
 if __name__ == "__main__":
+    start_status_api('bn_liquadation')
+    start_memory_monitor()
     asyncio.run(start_eth_liquidations_monitor())
\ No newline at end of file
@@ -1,26 +1,42 @@
 import websockets
 import asyncio
-import json
 import time
 import logging
 import os
-from datetime import datetime, time as dt_time
-from collections import deque
+from datetime import datetime
 from logging.handlers import RotatingFileHandler
 
+from liquidation_window import BURST_RULE, RULE, TIME_WINDOW, LiquidationWindow
+from status_api import get_board, start_status_api
+from memory_monitor import get_monitor, start_memory_monitor
+from bn_config import get_endpoint
+from bn_stream import RolloverStream, BINANCE_MAX_CONNECTION_AGE
+from state_store import StateCheckpointer
+
 # 全局变量
-liquidation_records = deque()  # 存储5分钟内的爆仓记录
-last_sent_time = 0  # 最后发送时间
-WT1_value = 50  # WT1值
-TIME_WINDOW = 300  # 5分钟(秒)
 COOLDOWN = 900  # 15分钟冷却(秒)
 THRESHOLD = 500000  # 50万美元阈值
 
+# 5分钟窗口、WT1、自适应阈值、突发检测、热力图与冷却状态（liquidation_window.py），
+# 可在 [throttle] bn_liquadation_log 改用其他限频策略
+window = LiquidationWindow('bn_liquadation_log', COOLDOWN, THRESHOLD, TIME_WINDOW)
+liquidation_records = window.records  # 存储5分钟内的爆仓记录
+thresholds = window.thresholds
+bursts = window.bursts
+futures = window.futures
+throttler = window.throttler
+set_WT1 = window.set_WT1
+
 
 # 在现有全局变量部分添加以下变量
 script_start_time = time.time()  # 脚本启动时间
-MAX_RUNNING_TIME = 24 * 60 * 60  # 24小时（以秒为单位）
+CONNECTION_MAX_AGE = BINANCE_MAX_CONNECTION_AGE  # 币安单连接最长24小时
+ROLLOVER_LEAD_TIME = 10 * 60  # 到期前10分钟建立新连接
+ROLLOVER_OVERLAP = 30  # 新旧连接重叠接收30秒
 shutdown_event = asyncio.Event()  # 关机事件标志
+liquidation_stream = None  # 当前的 RolloverStream 实例
+CHECKPOINT_INTERVAL = 30  # 状态快照间隔(秒)
+checkpointer = None  # 状态快照管理器
 
 
 # 配置日志系统
@@ -67,42 +83,6 @@ def setup_logging():
 # 初始化日志记录器
 haqi_logger = setup_logging()
 
-async def get_eth_liquidations():
-    ws_url = "wss://fstream.binance.com/ws/!forceOrder@arr"
-    retry_delay = 5  # 初始重连延迟，单位：秒
-    max_retry_delay = 300  # 最大重连延迟，例如5分钟
-
-    while True:  # 使用循环而非递归
-        try:
-            async with websockets.connect(ws_url) as websocket:
-                retry_delay = 5  # 连接成功后重置重连延迟
-                
-                # 监听消息循环
-                while True:
-                    try:
-                        message = await websocket.recv()
-                        data = json.loads(message)
-                        liquidation_data = extract_liquidation_data(data)
-                        if liquidation_data:
-                            check_and_send_alert(liquidation_data)
-                    except websockets.exceptions.ConnectionClosed:
-                        break  # 跳出内部接收循环，外部循环会重连
-                    except Exception as e:
-                        # 可以选择继续监听下一条消息，而不是立即重连
-                        continue
-
-        except (websockets.exceptions.InvalidURI, 
-                websockets.exceptions.InvalidHandshake) as e:
-            haqi_logger.error(f"连接参数问题，无法建立连接: {e}")
-            break  # 这类错误通常无法通过重连解决，退出循环
-        except (OSError, asyncio.TimeoutError, 
-                websockets.exceptions.WebSocketException) as e:
-            haqi_logger.warning(f"没有获取到爆仓事件（{e}），{retry_delay}秒后尝试重连...")
-        except Exception as e:
-            haqi_logger.error(f"监控过程中发生未预期的错误: {e}")
-        
-        await asyncio.sleep(retry_delay)
-
 def extract_liquidation_data(raw_data):
     """提取ETH爆仓数据"""
     order_data = raw_data.get('o', {})
@@ -126,109 +106,64 @@ def extract_liquidation_data(raw_data):
         'symbol': symbol,
         'quantity': quantity,
         'price': price,
+        'side': order_data.get('S', ''),
         'total_value': total_value,  # 计算总金额
         'timestamp': timestamp,
         'time_str': event_time
     }
 
-def set_WT1(value):
-    """设置WT1的值"""
-    global WT1_value
-    WT1_value = value
-
-def is_suppress_time():
-    """检查是否在消息抑制时间段(1:00-7:00)"""
-    current_time = datetime.now().time()
-    return dt_time(1, 0) <= current_time < dt_time(7, 0)
+def should_send_alert(symbol='ETHUSDT'):
+    """判断是否满足发送条件（见 LiquidationWindow.should_send_alert），并记录各窗口的爆仓总量"""
+    variables = window.variables(symbol)
+    for name, value in variables.items():
+        if name.startswith('liq_sum_'):
+            haqi_logger.info(f"{name[8:]}秒内爆仓总量计算: ${value:,.2f} (阈值: ${variables['threshold']:,.2f})")
+    return window.should_send_alert(symbol, variables)
 
-def should_send_alert(current_value):
-    """判断是否满足发送条件"""
-    if is_suppress_time():
-        return False
-    
-    if not (WT1_value > 49 or WT1_value < -49):
-        return False
-    
-    if time.time() - last_sent_time < COOLDOWN:
-        remaining_time = COOLDOWN - (time.time() - last_sent_time)
-        return False
-    
-    # 计算5分钟内爆仓总量
-    five_min_ago = time.time() - TIME_WINDOW
-    total_5min = current_value + sum(
-        record['total_value'] for record in liquidation_records 
-        if record['timestamp']/1000 >= five_min_ago
-    )
-    
-    haqi_logger.info(f"5分钟内爆仓总量计算: ${total_5min:,.2f} (阈值: ${THRESHOLD:,.2f})")
-    return total_5min > THRESHOLD
+def send_burst_alert(burst):
+    """突发预警（不依赖WT1），静默时段与冷却规则同5分钟告警"""
+    haqi_logger.info(f"检测到爆仓突发: {burst}")
+    if window.blocked(burst.symbol, BURST_RULE):
+        return
+    haqi_logger.critical(window.with_heatmap(burst.format_message(), burst.symbol))
+    throttler.record((burst.symbol, BURST_RULE))
 
 def check_and_send_alert(liquidation_data):
     """检查条件并发送警报"""
-    global last_sent_time, liquidation_records
-    
-    # 添加当前记录
-    liquidation_records.append(liquidation_data)
-    
-    # 清理5分钟前的记录
-    five_min_ago = time.time() - TIME_WINDOW
-    while (liquidation_records and 
-           liquidation_records[0]['timestamp']/1000 < five_min_ago):
-        liquidation_records.popleft()
+    # 添加当前记录（同时清理超出时间窗口的记录）
+    burst = window.observe(liquidation_data)
+    if burst:
+        send_burst_alert(burst)
     
     # 检查发送条件
-    if should_send_alert(liquidation_data['total_value']):
-        total_5min = sum(record['total_value'] for record in liquidation_records)
+    matches = should_send_alert(liquidation_data['symbol'])
+    if matches:
+        match = matches[0]
+        haqi_logger.info(f"触发规则: {', '.join(m.rule.name for m in matches)}")
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        # 构建详细的消息，包含发生时间
-        message = (f"发生哈气事件，总金额${total_5min:,.2f}，"
-                  f"事件时间: {current_time}，"
-                  f"交易对: {liquidation_data['symbol']}，"
-                  f"5分钟内爆仓总数: {len(liquidation_records)}笔")
+        # 构建详细的消息: 规则模板的文本（同 bn_liquadation），补充发生时间与该交易对的窗口笔数
+        message = f"{match.message}，事件时间: {current_time}，交易对: {match.symbol}"
+        count = match.values.get(f'liq_count_{TIME_WINDOW}')
+        if count is not None:
+            message += f"，5分钟内爆仓总数: {count:.0f}笔"
         
         # 记录到日志文件（替代原来的微信发送）
-        haqi_logger.critical(f"🚨 {message}")
+        haqi_logger.critical(f"🚨 {window.with_heatmap(message, liquidation_data['symbol'])}")
         
         # 同时记录详细统计信息
         haqi_logger.info(f"哈气事件详细统计 - "
                         f"最新爆仓: ${liquidation_data['total_value']:,.2f}, "
-                        f"WT1当前值: {WT1_value}, "
+                        f"WT1当前值: {window.wt1}, "
                         f"记录队列长度: {len(liquidation_records)}")
         
-        last_sent_time = time.time()
+        throttler.record((liquidation_data['symbol'], RULE))
         
         # 可选：发送后清空记录，避免重复报警
         # liquidation_records.clear()
-
-async def start_eth_liquidations_monitor():
-    """主函数"""
-    haqi_logger.info("=" * 60)
-    haqi_logger.info("ETH爆仓监控系统启动")
-    haqi_logger.info(f"监控参数: 5分钟窗口, 阈值${THRESHOLD:,}, 冷却{COOLDOWN}秒")
-    haqi_logger.info(f"当前WT1: {WT1_value}, 抑制时间: 1:00-7:00")
-    haqi_logger.info("=" * 60)
-    
-    await get_eth_liquidations()
-async def shutdown_monitor():
-    """
-    24小时关机监控器
-    在后台运行，24小时后触发关机事件
-    """
-    haqi_logger.info(f"24小时关机监控器已启动，脚本将在24小时后自动关闭")
     
-    try:
-        # 等待24小时
-        await asyncio.sleep(MAX_RUNNING_TIME)
-        
-        # 24小时到，触发关机事件
-        haqi_logger.info("24小时运行时间已到，触发自动关闭")
-        shutdown_event.set()
-        
-    except asyncio.CancelledError:
-        haqi_logger.info("关机监控器被取消")
-    except Exception as e:
-        haqi_logger.error(f"关机监控器出错: {e}")
+    # 状态接口的快照在后台线程中重新生成
+    status_board.mark('liquidation')
 
 async def safe_shutdown():
     """
@@ -241,87 +176,73 @@ async def safe_shutdown():
     hours = running_time / 3600
     haqi_logger.info(f"脚本运行时间: {hours:.2f}小时")
     haqi_logger.info(f"处理的爆仓记录总数: {len(liquidation_records)}")
+    haqi_logger.info(f"内存: {memory_monitor.format_summary()}")
+    futures.stop()
+    if checkpointer is not None:
+        checkpointer.stop()
+        haqi_logger.info(f"已保存状态快照: {checkpointer.path}")
+    if liquidation_stream is not None:
+        haqi_logger.info(f"连接轮换次数: {liquidation_stream.rollover_count}, "
+                         f"去重丢弃的重复事件: {liquidation_stream.deduper.duplicates}")
     
     # 这里可以添加其他清理逻辑，如关闭数据库连接等
     haqi_logger.info("安全关闭程序完成")
 
+def handle_liquidation_message(data):
+    """处理一条（已去重的）爆仓推送"""
+    liquidation_data = extract_liquidation_data(data)
+    if liquidation_data:
+        check_and_send_alert(liquidation_data)
+
 async def get_eth_liquidations_with_timeout():
     """
-    带超时控制的爆仓数据获取函数
+    带连接轮换的爆仓数据获取函数
+    在币安24小时强制断开前建立新连接，重叠期间的事件按(交易对, 成交时间, 数量)去重，
+    内存中的5分钟窗口不受影响，直到 shutdown_event 被设置才退出
     """
-    ws_url = "wss://fstream.binance.com/ws/!forceOrder@arr"
-    retry_delay = 5
+    global liquidation_stream
+    ws_url = f"{get_endpoint('binance_fstream_url')}/ws/!forceOrder@arr"
 
-    while not shutdown_event.is_set():  # 检查关机标志
-        try:
-            haqi_logger.info(f"尝试连接至 {ws_url}...")
-            async with websockets.connect(ws_url) as websocket:
-                haqi_logger.info("WebSocket 连接成功。")
-                retry_delay = 5
-                
-                # 监听消息循环（增加关机检查）
-                while not shutdown_event.is_set():
-                    try:
-                        # 设置接收超时，以便定期检查关机标志
-                        try:
-                            message = await asyncio.wait_for(websocket.recv(), timeout=1.0)
-                            data = json.loads(message)
-                            liquidation_data = extract_liquidation_data(data)
-                            if liquidation_data:
-                                check_and_send_alert(liquidation_data)
-                        except asyncio.TimeoutError:
-                            # 超时是正常的，用于检查关机标志
-                            continue
-                            
-                    except websockets.exceptions.ConnectionClosed:
-                        haqi_logger.warning("WebSocket连接关闭，尝试重连...")
-                        break
-                    except Exception as e:
-                        haqi_logger.error(f"处理消息时出错: {e}")
-                        continue
-
-        except (websockets.exceptions.InvalidURI, 
-                websockets.exceptions.InvalidHandshake) as e:
-            haqi_logger.error(f"连接参数问题: {e}")
-            break
-        except (OSError, asyncio.TimeoutError, 
-                websockets.exceptions.WebSocketException) as e:
-            if not shutdown_event.is_set():  # 只有非关机状态才重连
-                haqi_logger.warning(f"连接异常，{retry_delay}秒后重连: {e}")
-        except Exception as e:
-            if not shutdown_event.is_set():
-                haqi_logger.error(f"监控过程出错: {e}")
-        
-        if not shutdown_event.is_set():
-            await asyncio.sleep(retry_delay)
+    liquidation_stream = RolloverStream(
+        ws_url,
+        handle_liquidation_message,
+        max_age=CONNECTION_MAX_AGE,
+        lead_time=ROLLOVER_LEAD_TIME,
+        overlap=ROLLOVER_OVERLAP,
+        base_delay=5,
+        max_delay=300,
+        on_gap=window.skip_unobserved,
+        stop_event=shutdown_event,
+        logger=haqi_logger,
+    )
+    try:
+        await liquidation_stream.run()
+    except (websockets.exceptions.InvalidURI, 
+            websockets.exceptions.InvalidHandshake) as e:
+        haqi_logger.error(f"连接参数问题: {e}")
 
 async def start_eth_liquidations_monitor():
     """
-    修改后的主函数，集成24小时关机功能
+    修改后的主函数，连接到期前自动轮换，进程持续运行
     """
     haqi_logger.info("=" * 60)
     haqi_logger.info("ETH爆仓监控系统启动")
-    haqi_logger.info(f"监控参数: 5分钟窗口, 阈值${THRESHOLD:,}, 冷却{COOLDOWN}秒")
-    haqi_logger.info(f"当前WT1: {WT1_value}, 抑制时间: 1:00-7:00")
-    haqi_logger.info(f"最大运行时间: 24小时")
+    haqi_logger.info(f"监控参数: 5分钟窗口, 阈值${THRESHOLD:,}"
+                     f"{f'（自适应: 最近{thresholds.days}天P{thresholds.percentile:g}）' if thresholds.enabled else ''}"
+                     f", 冷却{COOLDOWN}秒")
+    haqi_logger.info(f"当前WT1: {window.wt1}, 抑制时间: {throttler.quiet_hours}")
+    if bursts.enabled:
+        haqi_logger.info(f"突发预警: 速率跳升{bursts.shift:g}倍, CUSUM阈值{bursts.threshold:g}")
+    haqi_logger.info(f"资金费率/持仓量轮询: 每{futures.interval:g}秒, 持仓量交易对 {','.join(futures.oi_symbols)}")
+    haqi_logger.info(f"连接轮换: 到期前{ROLLOVER_LEAD_TIME}秒建立新连接，重叠{ROLLOVER_OVERLAP}秒")
     haqi_logger.info("=" * 60)
     
-    # 创建关机监控任务
-    shutdown_task = asyncio.create_task(shutdown_monitor())
-    
     try:
         # 运行主监控逻辑，直到关机事件触发
         await get_eth_liquidations_with_timeout()
     except asyncio.CancelledError:
         haqi_logger.info("主监控任务被取消")
     finally:
-        # 取消关机监控任务
-        shutdown_task.cancel()
-        try:
-            await shutdown_task
-        except asyncio.CancelledError:
-            pass
-        
         # 执行安全关闭
         await safe_shutdown()
 
@@ -329,19 +250,49 @@ async def main_with_timeout():
     """
     新的主入口函数
     """
+    global checkpointer
     # 设置初始WT1值
     set_WT1(50)
     
+    # 恢复上次运行的窗口与冷却状态，并定期保存快照
+    checkpointer = StateCheckpointer('bn_liquadation_log', interval=CHECKPOINT_INTERVAL)
+    checkpointer.register_state('liquidation', window.get_state, window.restore_state)
+    if checkpointer.restore():
+        haqi_logger.info(f"已恢复快照: 窗口内记录 {len(liquidation_records)} 条, "
+                         f"冷却中的键 {len(throttler.store)} 个")
+    checkpointer.start()
+    futures.start()  # 后台线程轮询资金费率/持仓量
+    start_status_api('bn_liquadation_log')
+    start_memory_monitor()
+    
     # 运行监控系统
     await start_eth_liquidations_monitor()
 
 def get_remaining_time():
     """
-    获取剩余运行时间（用于外部查询）
+    获取距离下次连接轮换的剩余时间（用于外部查询）
     """
-    elapsed = time.time() - script_start_time
-    remaining = max(0, MAX_RUNNING_TIME - elapsed)
-    return remaining
+    if liquidation_stream is None:
+        return None
+    return liquidation_stream.seconds_until_rollover()
+
+def get_connection_status():
+    """状态接口的连接分区: 连接轮换倒计时、轮换次数与去重统计"""
+    return {
+        'uptime': time.time() - script_start_time,
+        'seconds_until_rollover': get_remaining_time(),
+        'rollovers': liquidation_stream.rollover_count if liquidation_stream else 0,
+        'duplicates': liquidation_stream.deduper.duplicates if liquidation_stream else 0,
+        'checkpoint_saved_at': checkpointer.last_saved_at if checkpointer else None,
+    }
+
+# 本地状态接口（status_api.py）的爆仓与连接分区，爆仓分区在每笔爆仓后标记更新
+# 内存监测（memory_monitor.py）: 随运行时间增长的数据结构
+status_board = get_board()
+memory_monitor = get_monitor()
+window.register_status(status_board, memory_monitor)
+status_board.register('connection', get_connection_status, interval=5)
+memory_monitor.register_gauge('dedup', lambda: len(liquidation_stream.deduper) if liquidation_stream else 0)
 
 def force_shutdown():
     """
@@ -0,0 +1,554 @@
+# bn_simulator.py
+"""
+本地币安 / Webhook 模拟服务器，用于离线压测整个机器人
+
+提供:
+  * REST  GET  /api/v3/klines、/fapi/v1/klines     合成K线（随机游走）
+  * REST  GET  /fapi/v1/premiumIndex               合成资金费率/标记价格（不带 symbol 时返回全部合约）
+  * REST  GET  /fapi/v1/openInterest               合成持仓量
+  * WS         /ws/!forceOrder@arr                 合成或回放的爆仓推送（广播给所有连接），支持速率与突发配置
+  * WS         /v5/public/linear、/ws/v5/public    同一份爆仓推送的 Bybit / OKX 格式（需先订阅）
+  * REST  POST /cgi-bin/webhook/send               企业微信 webhook（校验图片消息 md5），可注入延迟与错误
+  * REST  POST /send_group_msg                     go-cqhttp 群消息，可注入延迟与错误
+  * REST  GET  /stats                              模拟器统计信息
+
+使用示例:
+    python3 bn_simulator.py --rate 2 --speed 100 --profile storm
+    BOT_BINANCE_REST_URL=http://127.0.0.1:8080 \\
+    BOT_BINANCE_FSTREAM_URL=ws://127.0.0.1:8765 \\
+    BOT_BINANCE_FAPI_URL=http://127.0.0.1:8080 \\
+    BOT_BYBIT_WS_URL=ws://127.0.0.1:8765/v5/public/linear \\
+    BOT_OKX_WS_URL=ws://127.0.0.1:8765/ws/v5/public \\
+    BOT_GOCQHTTP_URL=http://127.0.0.1:8080 \\
+    BOT_WECHAT_WEBHOOK_URL=http://127.0.0.1:8080/cgi-bin/webhook/send?key=test \\
+    python3 -u eth_robot_wt.py
+"""
+import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import websockets
+
+from liquidation_feeds import OKX_CONTRACT_VALUES
+
+# K线周期对应的毫秒数
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000,
+    '30m': 1_800_000, '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000,
+    '1d': 86_400_000, '1w': 604_800_000,
+}
+
+# 突发配置: (开始秒数, 持续秒数, 速率倍数)，按周期循环
+BURST_PROFILES = {
+    'calm': [],
+    'cascade': [(60, 30, 20.0)],
+    'storm': [(30, 20, 10.0), (60, 60, 50.0), (150, 10, 200.0)],
+    'spike': [(60, 20, 20.0)],
+}
+PROFILE_PERIOD = 180  # 突发配置循环周期(秒)
+MAX_AGGREGATED_MS = INTERVAL_MS['4h']  # 超过该周期的K线不再逐分钟聚合，避免大量计算
+
+SYMBOLS = ['ETHUSDT', 'BTCUSDT', 'SOLUSDT', 'ETHUSDC']
+FUTURES_FILLER_SYMBOLS = 300  # premiumIndex 额外返回的合成合约数，使响应大小接近真实接口
+
+
+class SimulatorStats:
+    """模拟器运行统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self._weight_minute = None
+        self._weight = 0
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_weight(self, now_ms, weight):
+        """累计当前分钟的请求权重（模拟 X-MBX-USED-WEIGHT-1M），返回累计值"""
+        with self._lock:
+            minute = now_ms // 60_000
+            if minute != self._weight_minute:
+                self._weight_minute, self._weight = minute, 0
+            self._weight += weight
+            return self._weight
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+class SyntheticMarket:
+    """
+    确定性的合成行情: 同一时间点总是得到同一根K线，
+    因此重复请求、分页请求之间的数据保持一致
+    """
+
+    def __init__(self, base_price=3000.0, volatility=0.002, seed=42):
+        self.base_price = base_price
+        self.volatility = volatility
+        self.seed = seed
+
+    @functools.lru_cache(maxsize=65536)
+    def _minute_bar(self, open_time):
+        """生成单根1分钟K线 (open, high, low, close, volume)"""
+        rng = random.Random(self.seed * 1_000_003 + open_time // 60_000)
+        minute = open_time // 60_000
+        # 按日循环的漂移叠加随机扰动，每根K线独立生成，避免误差随时间累积
+        drift = 0.05 * ((minute % 1440) / 1440 - 0.5)
+        open_ = self.base_price * (1 + drift + self.volatility * rng.uniform(-1, 1))
+        close = open_ * (1 + self.volatility * rng.gauss(0, 1))
+        high = max(open_, close) * (1 + self.volatility * rng.random() / 2)
+        low = min(open_, close) * (1 - self.volatility * rng.random() / 2)
+        volume = rng.uniform(50, 500)
+        return (round(open_, 2), round(high, 2), round(low, 2),
+                round(close, 2), round(volume, 4))
+
+    def kline(self, open_time, interval):
+        """生成指定周期的K线，4h及以下由1分钟K线聚合得到，日线/周线直接生成"""
+        step = INTERVAL_MS[interval]
+        if step <= MAX_AGGREGATED_MS:
+            bars = [self._minute_bar(t) for t in range(open_time, open_time + step, 60_000)]
+        else:
+            bars = [self._minute_bar(t) for t in range(open_time, open_time + step, MAX_AGGREGATED_MS)]
+        open_ = bars[0][0]
+        high = max(b[1] for b in bars)
+        low = min(b[2] for b in bars)
+        close = bars[-1][3]
+        volume = round(sum(b[4] for b in bars), 4)
+        return [
+            open_time, f"{open_:.2f}", f"{high:.2f}", f"{low:.2f}", f"{close:.2f}",
+            f"{volume:.4f}", open_time + step - 1, f"{volume * close:.4f}",
+            len(bars) * 10, f"{volume / 2:.4f}", f"{volume * close / 2:.4f}", "0",
+        ]
+
+    def klines(self, interval, limit, start_time=None, end_time=None):
+        """按币安 /klines 接口语义返回K线列表"""
+        step = INTERVAL_MS[interval]
+        now = int(time.time() * 1000)
+        if start_time is not None:
+            first = -(-start_time // step) * step
+        else:
+            last_open = ((end_time if end_time is not None else now) // step) * step
+            first = last_open - (limit - 1) * step
+        stop = min(end_time if end_time is not None else now, now)
+        result = []
+        t = first
+        while t <= stop and len(result) < limit:
+            result.append(self.kline(t, interval))
+            t += step
+        return result
+
+    def symbol_price(self, symbol, now_ms):
+        """合约的合成价格（以ETH为基准按交易对缩放）"""
+        price = self._minute_bar((now_ms // 60_000) * 60_000)[3]
+        if symbol.startswith('BTC'):
+            return price * 20
+        if symbol.startswith('ETH'):
+            return price
+        return price * (0.05 if symbol.startswith('SOL') else 0.001 * (1 + zlib.crc32(symbol.encode()) % 997))
+
+    def premium_index(self, symbol, now_ms):
+        """单个合约的 /fapi/v1/premiumIndex 结果，资金费率按8小时周期缓慢变化"""
+        mark = self.symbol_price(symbol, now_ms)
+        phase = (now_ms / 28_800_000 + zlib.crc32(symbol.encode()) % 100 / 100) * 2 * math.pi
+        funding = 0.0001 + 0.0004 * math.sin(phase)
+        next_funding = (now_ms // 28_800_000 + 1) * 28_800_000
+        return {
+            'symbol': symbol, 'markPrice': f"{mark:.8f}", 'indexPrice': f"{mark * (1 - funding):.8f}",
+            'estimatedSettlePrice': f"{mark:.8f}", 'lastFundingRate': f"{funding:.8f}",
+            'interestRate': '0.00010000', 'nextFundingTime': next_funding, 'time': now_ms,
+        }
+
+    def open_interest(self, symbol, now_ms):
+        """/fapi/v1/openInterest 结果，每分钟一个确定的随机扰动"""
+        minute = now_ms // 60_000
+        rng = random.Random(self.seed * 7_919 + minute * 31 + zlib.crc32(symbol.encode()))
+        base = 1_000_000 / max(self.symbol_price(symbol, now_ms) / 3000, 0.01)
+        value = base * (1 + 0.1 * math.sin(minute / 240) + 0.01 * rng.gauss(0, 1))
+        return {'openInterest': f"{value:.3f}", 'symbol': symbol, 'time': now_ms}
+
+
+FUTURES_SYMBOLS = SYMBOLS + [f"SIM{i:03d}USDT" for i in range(FUTURES_FILLER_SYMBOLS)]
+
+
+class LiquidationGenerator:
+    """合成或回放 forceOrder 爆仓事件"""
+
+    def __init__(self, rate=1.0, speed=1.0, profile='calm', replay_file=None,
+                 market=None):
+        self.rate = rate
+        self.speed = speed
+        self.profile = BURST_PROFILES[profile]
+        self.market = market or SyntheticMarket()
+        self.replay = self._load_replay(replay_file) if replay_file else None
+        self._rng = random.Random()
+
+    @staticmethod
+    def _load_replay(path):
+        """读取回放文件（每行一条原始 forceOrder JSON）"""
+        frames = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    frames.append(json.loads(line))
+        frames.sort(key=lambda fr: fr.get('o', {}).get('T', 0))
+        return frames
+
+    def multiplier(self, elapsed):
+        """当前时刻的突发倍数"""
+        t = elapsed % PROFILE_PERIOD
+        mult = 1.0
+        for start, duration, factor in self.profile:
+            if start <= t < start + duration:
+                mult = max(mult, factor)
+        return mult
+
+    def make_frame(self, now_ms=None):
+        """生成一条合成的 forceOrder 推送"""
+        now_ms = now_ms or int(time.time() * 1000)
+        symbol = self._rng.choice(SYMBOLS)
+        price = self.market._minute_bar((now_ms // 60_000) * 60_000)[3]
+        if not symbol.startswith('ETH'):
+            price = price * (20 if symbol.startswith('BTC') else 0.05)
+        qty = round(self._rng.lognormvariate(0, 1.5), 3)
+        return {
+            'e': 'forceOrder', 'E': now_ms,
+            'o': {
+                's': symbol, 'S': self._rng.choice(['BUY', 'SELL']),
+                'o': 'LIMIT', 'f': 'IOC',
+                'q': f"{qty}", 'p': f"{price:.2f}", 'ap': f"{price:.2f}",
+                'X': 'FILLED', 'l': f"{qty}", 'z': f"{qty}", 'T': now_ms,
+            },
+        }
+
+    async def frames(self):
+        """按配置速率异步产出推送帧"""
+        if self.replay:
+            async for frame in self._replay_frames():
+                yield frame
+            return
+
+        start = last = time.monotonic()
+        tick = 0.01
+        budget = 0.0
+        while True:
+            now = time.monotonic()
+            elapsed = (now - start) * self.speed
+            # 按实际流逝时间累计，sleep 不准时也能保持目标速率
+            budget += self.rate * self.speed * self.multiplier(elapsed) * (now - last)
+            last = now
+            n = int(budget)
+            budget -= n
+            for _ in range(n):
+                yield self.make_frame()
+            await asyncio.sleep(tick)
+
+    async def _replay_frames(self):
+        """按原始时间间隔（除以 speed）回放，时间戳改写为当前时间"""
+        while True:
+            first_t = self.replay[0]['o'].get('T', 0)
+            start = time.monotonic()
+            for frame in self.replay:
+                offset = (frame['o'].get('T', first_t) - first_t) / 1000 / self.speed
+                delay = start + offset - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                now_ms = int(time.time() * 1000)
+                frame = json.loads(json.dumps(frame))
+                frame['E'] = now_ms
+                frame['o']['T'] = now_ms
+                yield frame
+
+
+def make_http_handler(market, stats, latency_ms, jitter_ms, error_rate, rest_latency_ms=0.0):
+    """构造HTTP请求处理类，模拟K线接口与两种 webhook；rest_latency_ms 为行情接口的固定延迟(毫秒)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # 响应头与响应体分两次写出，keep-alive 连接上需关闭 Nagle，避免每个请求多等 40ms 延迟确认
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass  # 压测时不打印每个请求
+
+        def _send_json(self, code, payload, headers=None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _inject_fault(self):
+            """注入延迟与错误，返回True表示已返回错误响应"""
+            delay = latency_ms + random.uniform(0, jitter_ms)
+            if delay > 0:
+                time.sleep(delay / 1000)
+            if random.random() < error_rate:
+                stats.incr('injected_errors')
+                if random.random() < 0.5:
+                    self._send_json(500, {'errcode': -1, 'errmsg': 'injected server error'})
+                else:
+                    # 企业微信限频错误码
+                    self._send_json(200, {'errcode': 45009, 'errmsg': 'api freq out of limit',
+                                          'status': 'failed', 'wording': 'injected error'})
+                return True
+            return False
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if rest_latency_ms > 0 and url.path != '/stats':
+                time.sleep(rest_latency_ms / 1000)  # 模拟到交易所的网络往返
+            if url.path in ('/api/v3/klines', '/fapi/v1/klines'):
+                stats.incr('klines_requests')
+                interval = query.get('interval', '1m')
+                if interval not in INTERVAL_MS:
+                    self._send_json(400, {'code': -1120, 'msg': 'Invalid interval.'})
+                    return
+                limit = min(int(query.get('limit', 500)), 1000)
+                start = int(query['startTime']) if 'startTime' in query else None
+                end = int(query['endTime']) if 'endTime' in query else None
+                self._send_json(200, market.klines(interval, limit, start, end))
+            elif url.path in ('/fapi/v1/premiumIndex', '/fapi/v1/openInterest'):
+                now_ms = int(time.time() * 1000)
+                symbol = query.get('symbol', '').upper()
+                if url.path == '/fapi/v1/openInterest':
+                    stats.incr('open_interest_requests')
+                    weight = stats.add_weight(now_ms, 1)
+                    if symbol not in FUTURES_SYMBOLS:
+                        self._send_json(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+                    else:
+                        self._send_json(200, market.open_interest(symbol, now_ms),
+                                        {'X-MBX-USED-WEIGHT-1M': str(weight)})
+                elif symbol:
+                    stats.incr('premium_index_requests')
+                    weight = stats.add_weight(now_ms, 1)
+                    if symbol not in FUTURES_SYMBOLS:
+                        self._send_json(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+                    else:
+                        self._send_json(200, market.premium_index(symbol, now_ms),
+                                        {'X-MBX-USED-WEIGHT-1M': str(weight)})
+                else:
+                    stats.incr('premium_index_requests')
+                    weight = stats.add_weight(now_ms, 10)
+                    self._send_json(200, [market.premium_index(s, now_ms) for s in FUTURES_SYMBOLS],
+                                    {'X-MBX-USED-WEIGHT-1M': str(weight)})
+            elif url.path == '/stats':
+                self._send_json(200, stats.snapshot())
+            else:
+                self._send_json(404, {'code': -1, 'msg': 'not found'})
+
+        def _check_wechat(self, body):
+            """校验图片消息的 md5（与企业微信一致），统计各类消息数"""
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return {'errcode': 40001, 'errmsg': 'invalid json'}
+            if data.get('msgtype') == 'image':
+                image = base64.b64decode(data['image']['base64'])
+                if hashlib.md5(image).hexdigest() != data['image']['md5']:
+                    return {'errcode': 301019, 'errmsg': 'media md5 not match'}
+                stats.incr('wechat_images')
+                stats.incr('wechat_image_bytes', len(image))
+            return {'errcode': 0, 'errmsg': 'ok'}
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length) if length else b''
+            if url.path == '/cgi-bin/webhook/send':
+                stats.incr('wechat_posts')
+                if not self._inject_fault():
+                    self._send_json(200, self._check_wechat(body))
+            elif url.path == '/send_group_msg':
+                stats.incr('qq_posts')
+                if not self._inject_fault():
+                    self._send_json(200, {'status': 'ok', 'retcode': 0,
+                                          'data': {'message_id': stats.snapshot()['qq_posts']}})
+            else:
+                self._send_json(404, {'errcode': -1, 'errmsg': 'not found'})
+            stats.incr('webhook_bytes', len(body))
+
+    return Handler
+
+
+def to_bybit_frame(frame):
+    """forceOrder 推送 -> Bybit allLiquidation 推送（S 为被强平的持仓方向）"""
+    order = frame['o']
+    return f"allLiquidation.{order['s']}", {
+        'topic': f"allLiquidation.{order['s']}", 'type': 'snapshot', 'ts': frame['E'],
+        'data': [{'T': order['T'], 's': order['s'], 'S': 'Buy' if order['S'] == 'SELL' else 'Sell',
+                  'v': order['q'], 'p': order['p']}],
+    }
+
+
+def to_okx_frame(frame):
+    """forceOrder 推送 -> OKX liquidation-orders 推送，数量按合约面值换算为张数；面值未知时返回 None"""
+    order = frame['o']
+    symbol = order['s']
+    inst_family = f"{symbol[:-4]}-{symbol[-4:]}"
+    contract_value = OKX_CONTRACT_VALUES.get(f"{inst_family}-SWAP")
+    if contract_value is None:
+        return None
+    return {
+        'arg': {'channel': 'liquidation-orders', 'instType': 'SWAP'},
+        'data': [{
+            'instId': f"{inst_family}-SWAP", 'instFamily': inst_family, 'instType': 'SWAP',
+            'uly': inst_family,
+            'details': [{
+                'bkLoss': '0', 'bkPx': order['p'], 'ccy': '',
+                'posSide': 'long' if order['S'] == 'SELL' else 'short',
+                'side': order['S'].lower(), 'sz': f"{float(order['q']) / contract_value:g}",
+                'ts': str(order['T']),
+            }],
+        }],
+    }
+
+
+async def serve_liquidations(generator, stats, host, port):
+    """
+    WebSocket 服务: 与真实交易所一样，所有连接收到同一份爆仓推送
+
+    按连接路径选择推送格式:
+        /v5/public/linear   Bybit，订阅 allLiquidation.<交易对> 后按交易对推送，支持 {"op": "ping"}
+        /ws/v5/public       OKX，订阅 liquidation-orders 后推送，支持字符串 ping
+        其他                币安 forceOrder
+    """
+    clients = set()
+    bybit_clients = {}  # websocket -> 订阅的 topic 集合
+    okx_clients = set()
+
+    async def handle_bybit(websocket):
+        topics = bybit_clients[websocket] = set()
+        async for message in websocket:
+            request = json.loads(message)
+            if request.get('op') == 'subscribe':
+                topics.update(request.get('args', []))
+                await websocket.send(json.dumps({'success': True, 'ret_msg': '', 'op': 'subscribe',
+                                                 'conn_id': 'simulator'}))
+            elif request.get('op') == 'ping':
+                await websocket.send(json.dumps({'success': True, 'ret_msg': 'pong', 'op': 'ping',
+                                                 'conn_id': 'simulator'}))
+
+    async def handle_okx(websocket):
+        async for message in websocket:
+            if message == 'ping':
+                await websocket.send('pong')
+                continue
+            request = json.loads(message)
+            if request.get('op') == 'subscribe':
+                for arg in request.get('args', []):
+                    await websocket.send(json.dumps({'event': 'subscribe', 'arg': arg,
+                                                     'connId': 'simulator'}))
+                    if arg.get('channel') == 'liquidation-orders':
+                        okx_clients.add(websocket)
+
+    async def handler(websocket):
+        stats.incr('ws_connections')
+        path = websocket.request.path
+        try:
+            if path.startswith('/v5/public/linear'):
+                await handle_bybit(websocket)
+            elif path.startswith('/ws/v5/public'):
+                await handle_okx(websocket)
+            else:
+                clients.add(websocket)
+                await websocket.wait_closed()
+        except (json.JSONDecodeError, websockets.exceptions.ConnectionClosed):
+            pass
+        finally:
+            clients.discard(websocket)
+            bybit_clients.pop(websocket, None)
+            okx_clients.discard(websocket)
+
+    async def produce():
+        async for frame in generator.frames():
+            frame = frame.get('data', frame)
+            if clients:
+                websockets.broadcast(clients, json.dumps(frame))
+                stats.incr('ws_frames_sent')
+            if bybit_clients:
+                topic, payload = to_bybit_frame(frame)
+                subscribers = [ws for ws, topics in bybit_clients.items() if topic in topics]
+                if subscribers:
+                    websockets.broadcast(subscribers, json.dumps(payload))
+                    stats.incr('ws_bybit_frames_sent')
+            if okx_clients:
+                payload = to_okx_frame(frame)
+                if payload is not None:
+                    websockets.broadcast(okx_clients, json.dumps(payload))
+                    stats.incr('ws_okx_frames_sent')
+
+    async with websockets.serve(handler, host, port):
+        await produce()
+
+
+async def report_stats(stats, interval=10):
+    """定期打印统计信息"""
+    last = {}
+    while True:
+        await asyncio.sleep(interval)
+        snap = stats.snapshot()
+        rate = (snap.get('ws_frames_sent', 0) - last.get('ws_frames_sent', 0)) / interval
+        print(f"[模拟器] 推送速率 {rate:.1f}/s, 统计: {snap}")
+        last = snap
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安 / Webhook 本地模拟服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--http-port', type=int, default=8080)
+    parser.add_argument('--ws-port', type=int, default=8765)
+    parser.add_argument('--rate', type=float, default=1.0, help='基础爆仓事件速率(条/秒)')
+    parser.add_argument('--speed', type=float, default=1.0, help='时间加速倍数，如10或100')
+    parser.add_argument('--profile', default='calm', choices=sorted(BURST_PROFILES))
+    parser.add_argument('--replay', default=None, help='回放文件，每行一条 forceOrder JSON')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='webhook 固定延迟(毫秒)')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='webhook 随机延迟上限(毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='webhook 错误注入概率(0-1)')
+    parser.add_argument('--rest-latency-ms', type=float, default=0.0, help='行情REST接口固定延迟(毫秒)')
+    args = parser.parse_args()
+
+    stats = SimulatorStats()
+    market = SyntheticMarket()
+    generator = LiquidationGenerator(args.rate, args.speed, args.profile, args.replay, market)
+
+    handler = make_http_handler(market, stats, args.latency_ms, args.jitter_ms, args.error_rate,
+                                args.rest_latency_ms)
+    http_server = ThreadingHTTPServer((args.host, args.http_port), handler)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+
+    print(f"HTTP 模拟服务: http://{args.host}:{args.http_port}")
+    print(f"WS   模拟服务: ws://{args.host}:{args.ws_port}/ws/!forceOrder@arr")
+    print(f"爆仓速率: {args.rate}/s × {args.speed}倍速, 突发配置: {args.profile}")
+
+    async def run():
+        asyncio.create_task(report_stats(stats))
+        await serve_liquidations(generator, stats, args.host, args.ws_port)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("模拟器已停止")
+    finally:
+        http_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,662 @@
+# bn_stream.py
+"""
+币安 WebSocket 行情流的连接管理
+
+Binance 会在连接满24小时时强制断开。RolloverStream 采用"先建后拆"的方式，
+在旧连接到期前建立新连接，两条连接并行接收一段时间（重叠事件去重），
+再关闭旧连接，整个过程不丢事件、不中断上层的窗口统计。
+
+RedundantFeed 同时保持多条到同一数据流的热备连接，按首达投递并去重，
+降低尾延迟，单条连接故障时零间隙切换；每条连接由 ConnectionManager 管理，
+全部连接都断开时才记为断线（OutageTracker）。
+
+ConnectionManager 管理单条连接: ping/pong 与空闲超时检测半开连接，
+带抖动的指数退避重连，并记录重连次数与断线时长，重连后触发补数回调。
+"""
+import asyncio
+import functools
+import json
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+
+import websockets
+
+BINANCE_MAX_CONNECTION_AGE = 24 * 60 * 60  # 币安单连接最长存活时间(秒)
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=300.0):
+    """
+    带抖动的指数退避时间: 在 [0.5, 1] 倍的 min(上限, 基数*2^次数) 之间随机取值，
+    避免多个客户端同时重连
+    """
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class IdleTimeout(Exception):
+    """连接在 idle_timeout 内没有收到任何消息，判定为半开连接"""
+
+
+def is_fatal_connect_error(exc):
+    """
+    连接错误是否无法通过重连解决: 地址无效，或握手被拒绝且状态码为 429 以外的 4xx；
+    5xx（交易所维护）、429（限频）、握手中途断开、代理错误等均按退避重试
+    """
+    if isinstance(exc, websockets.exceptions.InvalidURI):
+        return True
+    if isinstance(exc, websockets.exceptions.InvalidHandshake):
+        response = getattr(exc, 'response', None)
+        status = getattr(response, 'status_code', None) or getattr(exc, 'status_code', None)
+        return status is not None and 400 <= status < 500 and status != 429
+    return False
+
+
+def liquidation_event_key(raw_data):
+    """爆仓事件的去重键: (交易对, 成交时间, 数量)"""
+    order_data = raw_data.get('o', {})
+    return (order_data.get('s'), order_data.get('T'), order_data.get('q'))
+
+
+class EventDeduper:
+    """
+    有界去重集合，按插入顺序淘汰最旧的键
+
+    Parameters:
+    -----------
+    maxlen : int
+        最多记住的键数量，应大于重叠期内可能到达的事件数
+    """
+
+    def __init__(self, maxlen=10000):
+        self.maxlen = maxlen
+        self._keys = OrderedDict()
+        self.duplicates = 0
+
+    def seen(self, key):
+        """检查键是否已出现过；未出现则记录下来并返回False"""
+        if key in self._keys:
+            self.duplicates += 1
+            return True
+        self._keys[key] = None
+        if len(self._keys) > self.maxlen:
+            self._keys.popitem(last=False)
+        return False
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class _Connection:
+    """单条 WebSocket 连接及其接收任务"""
+
+    def __init__(self, conn_id, websocket, task):
+        self.conn_id = conn_id
+        self.websocket = websocket
+        self.task = task
+        self.opened_at = time.time()
+
+    async def close(self):
+        # 先停止接收任务，主动关闭不记为连接断开
+        self.task.cancel()
+        try:
+            await self.task
+        except (asyncio.CancelledError, Exception):
+            pass
+        await self.websocket.close()
+
+
+class RolloverStream:
+    """
+    先建后拆的 WebSocket 连接轮换
+
+    Parameters:
+    -----------
+    url : str
+        WebSocket 地址
+    on_message : callable
+        处理解析后JSON消息的回调（同步函数）
+    key_func : callable
+        从消息中提取去重键的函数，默认按爆仓事件去重
+    max_age : float
+        连接最长存活时间(秒)，默认为币安的24小时
+    lead_time : float
+        到期前多久开始建立新连接(秒)
+    overlap : float
+        新旧连接并行接收的时长(秒)
+    ping_interval : float
+        发送 ping 的间隔(秒)
+    ping_timeout : float
+        等待 pong 的超时(秒)，超时视为连接已死
+    idle_timeout : float
+        多久收不到任何消息视为连接已死(秒)，None表示不检测
+    base_delay : float
+        初始重连间隔(秒)，按带抖动的指数退避增长
+    max_delay : float
+        重连间隔上限(秒)
+    on_gap : callable, optional
+        连接断开后重新连上时调用 on_gap(start, end)（秒），start 为最后一条消息的时间；
+        在事件循环中同步调用，先于新连接的第一条消息
+    stop_event : asyncio.Event, optional
+        设置后停止运行
+    logger : logging.Logger, optional
+        日志记录器
+    """
+
+    def __init__(self, url, on_message, key_func=liquidation_event_key,
+                 max_age=BINANCE_MAX_CONNECTION_AGE, lead_time=600, overlap=30,
+                 ping_interval=20, ping_timeout=20, idle_timeout=180,
+                 base_delay=1, max_delay=300, dedup_size=10000, on_gap=None,
+                 stop_event=None, logger=None):
+        self.url = url
+        self.on_message = on_message
+        self.key_func = key_func
+        self.max_age = max_age
+        self.lead_time = lead_time
+        self.overlap = overlap
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.idle_timeout = idle_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_gap = on_gap
+        self.deduper = EventDeduper(dedup_size)
+        self.stop_event = stop_event or asyncio.Event()
+        self.logger = logger or logging.getLogger(__name__)
+        self.current = None
+        self.rollover_count = 0
+        self.idle_timeouts = 0
+        self.last_message_at = None
+        self._attempt = 0
+        self._next_conn_id = 0
+
+    def seconds_until_rollover(self):
+        """距离下次连接轮换的剩余秒数，未连接时返回None"""
+        if self.current is None:
+            return None
+        deadline = self.current.opened_at + self.max_age - self.lead_time
+        return max(0.0, deadline - time.time())
+
+    def _dispatch(self, message):
+        self.last_message_at = time.time()
+        data = json.loads(message)
+        if self.deduper.seen(self.key_func(data)):
+            return
+        self.on_message(data)
+
+    async def _reader(self, conn_id, websocket):
+        """单条连接的接收循环，连接关闭时结束"""
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.recv(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                self.idle_timeouts += 1
+                self.logger.warning(f"连接#{conn_id} {self.idle_timeout}秒未收到任何消息，判定连接已失效")
+                return
+            except websockets.exceptions.ConnectionClosed:
+                self.logger.warning(f"连接#{conn_id} 已关闭")
+                return
+            try:
+                self._dispatch(message)
+            except Exception as e:
+                self.logger.error(f"处理消息时出错: {e}")
+
+    async def _open(self):
+        """建立一条新连接并启动其接收任务"""
+        self._next_conn_id += 1
+        conn_id = self._next_conn_id
+        self.logger.info(f"尝试连接至 {self.url} (连接#{conn_id})...")
+        websocket = await websockets.connect(self.url, ping_interval=self.ping_interval,
+                                             ping_timeout=self.ping_timeout)
+        task = asyncio.create_task(self._reader(conn_id, websocket))
+        self.logger.info(f"WebSocket 连接#{conn_id} 成功。")
+        return _Connection(conn_id, websocket, task)
+
+    def _next_delay(self):
+        """下一次重连前的等待时间(秒)，带抖动的指数退避"""
+        delay = backoff_delay(self._attempt, self.base_delay, self.max_delay)
+        self._attempt += 1
+        return delay
+
+    async def _open_with_retry(self):
+        """持续重试直到连接成功或收到停止信号"""
+        while not self.stop_event.is_set():
+            try:
+                connection = await self._open()
+                self._attempt = 0
+                return connection
+            except (OSError, asyncio.TimeoutError,
+                    websockets.exceptions.WebSocketException) as e:
+                if is_fatal_connect_error(e):
+                    raise  # 参数问题，重连无法解决
+                delay = self._next_delay()
+                self.logger.warning(f"连接异常，{delay:.1f}秒后重连: {e}")
+            await self._sleep(delay)
+        return None
+
+    async def _sleep(self, seconds):
+        """可被停止信号打断的等待"""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=max(0.0, seconds))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _wait_current(self, timeout):
+        """等待当前连接断开、停止信号或超时，返回当前连接是否已断开"""
+        stop_waiter = asyncio.create_task(self.stop_event.wait())
+        try:
+            await asyncio.wait({self.current.task, stop_waiter}, timeout=max(0.0, timeout),
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop_waiter.cancel()
+        return self.current.task.done()
+
+    async def _rollover(self):
+        """建立新连接，与旧连接重叠接收后关闭旧连接"""
+        old = self.current
+        try:
+            new = await self._open()
+        except Exception as e:
+            delay = self._next_delay()
+            self.logger.warning(f"轮换时建立新连接失败，{delay:.1f}秒后重试: {e}")
+            await self._sleep(delay)
+            return
+        self._attempt = 0
+        self.logger.info(f"连接轮换: 连接#{old.conn_id} 与 #{new.conn_id} 重叠接收 {self.overlap} 秒")
+        await self._sleep(self.overlap)
+        self.current = new
+        await old.close()
+        self.rollover_count += 1
+        self.logger.info(f"连接轮换完成，当前连接#{new.conn_id}，"
+                         f"累计轮换 {self.rollover_count} 次，重复事件 {self.deduper.duplicates} 条")
+
+    async def run(self):
+        """运行直到 stop_event 被设置"""
+        try:
+            while not self.stop_event.is_set():
+                if self.current is None or self.current.task.done():
+                    lost_at = None
+                    if self.current is not None:
+                        # 以最后一条消息的时间作为断线起点，半开连接的静默期也计入
+                        lost_at = self.last_message_at or time.time()
+                        await self.current.close()
+                        self.current = None
+                        delay = self._next_delay()
+                        self.logger.warning(f"{delay:.1f}秒后尝试重连（第{self._attempt}次）...")
+                        await self._sleep(delay)
+                    self.current = await self._open_with_retry()
+                    if self.current is None:
+                        break
+                    if lost_at is not None and self.on_gap is not None:
+                        self.on_gap(lost_at, time.time())
+                    continue
+
+                lost = await self._wait_current(self.seconds_until_rollover())
+                if self.stop_event.is_set() or lost:
+                    continue
+                await self._rollover()
+        finally:
+            if self.current is not None:
+                await self.current.close()
+
+
+class FeedStats:
+    """单条冗余连接的统计: 接收量、首达次数、延迟与丢失率"""
+
+    def __init__(self, conn_id, url, latency_window=1000):
+        self.conn_id = conn_id
+        self.url = url
+        self.connected = False
+        self.received = 0          # 收到的事件总数（含重复）
+        self.first_arrivals = 0    # 该连接最先送达的事件数
+        self.expected = 0          # 连接在线期间全体连接送达的唯一事件数
+        self.reconnects = 0
+        self.latencies = deque(maxlen=latency_window)  # 事件时间到接收时间(毫秒)
+
+    def record_latency(self, latency_ms):
+        self.latencies.append(latency_ms)
+
+    def to_dict(self):
+        """导出统计信息"""
+        lat = sorted(self.latencies)
+
+        def pct(p):
+            return lat[min(len(lat) - 1, int(p * len(lat)))] if lat else None
+
+        loss = 1 - min(self.received, self.expected) / self.expected if self.expected else 0.0
+        return {
+            'conn_id': self.conn_id,
+            'url': self.url,
+            'connected': self.connected,
+            'received': self.received,
+            'first_arrivals': self.first_arrivals,
+            'reconnects': self.reconnects,
+            'loss_ratio': round(loss, 4),
+            'latency_p50_ms': pct(0.5),
+            'latency_p99_ms': pct(0.99),
+        }
+
+
+class OutageTracker:
+    """
+    多条连接（热备冗余、多个交易所）整体的断线时段: 最后一条在线连接断开时开始，
+    任一连接恢复时结束；单条连接断开而其他连接仍在接收时不算断线
+
+    Parameters:
+    -----------
+    on_gap : callable, optional
+        断线结束时调用 on_gap(start, end)（秒），start 为断开前最后一条消息的时间；
+        在事件循环中同步调用，先于恢复后的第一条消息
+    on_reconnect : callable, optional
+        断线结束后调用 on_reconnect(gap_seconds)，在线程池中执行
+    """
+
+    def __init__(self, on_gap=None, on_reconnect=None, logger=None):
+        self.on_gap = on_gap
+        self.on_reconnect = on_reconnect
+        self.logger = logger or logging.getLogger(__name__)
+        self.live = set()
+        self.last_seen = None
+        self.down_since = None
+        self.outages = 0
+        self._tasks = set()  # 后台补数任务，保留引用防止被回收
+
+    def update(self, link_id, connected, at):
+        """
+        记录一条连接的状态变化（可直接作为 ConnectionManager 的 on_status）
+
+        Parameters:
+        -----------
+        connected : bool
+            连接是否在线
+        at : float
+            上线时为当前时间；断开时为该连接最后一条消息的时间
+        """
+        if connected:
+            self.live.add(link_id)
+            if self.down_since is not None:
+                start, self.down_since = self.down_since, None
+                self._recovered(start, at)
+            return
+        self.live.discard(link_id)
+        self.last_seen = at if self.last_seen is None else max(self.last_seen, at)
+        if not self.live and self.down_since is None:
+            self.down_since = self.last_seen
+
+    def _recovered(self, start, end):
+        self.outages += 1
+        self.logger.info(f"全部连接断开 {end - start:.1f} 秒后恢复，累计 {self.outages} 次")
+        if self.on_gap is not None:
+            self.on_gap(start, end)
+        if self.on_reconnect is not None:
+            task = asyncio.create_task(self._after_reconnect(end - start))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _after_reconnect(self, gap):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.on_reconnect, gap)
+        except Exception as e:
+            self.logger.error(f"重连后补数失败: {e}")
+
+
+class RedundantFeed:
+    """
+    热备冗余连接: 同时保持N条到同一数据流的连接（可指向不同地址），
+    每个事件只由最先送达的连接投递一次，任一连接断开时其余连接无缝接替
+
+    Parameters:
+    -----------
+    urls : list of str
+        各连接的 WebSocket 地址，长度即连接数（可重复同一地址）
+    on_message : callable
+        处理解析后JSON消息的回调（同步函数）
+    key_func : callable
+        从消息中提取去重键的函数
+    dedup_size : int
+        去重集合容量
+    retry_delay : float
+        单条连接断开后的初始重连间隔(秒)，按指数退避增长
+    max_retry_delay : float
+        重连间隔上限(秒)
+    ping_interval, ping_timeout, idle_timeout : float
+        每条连接的半开检测参数，见 ConnectionManager
+    on_gap : callable, optional
+        全部连接都断开后有连接恢复时调用 on_gap(start, end)，见 OutageTracker
+    on_reconnect : callable, optional
+        全部连接都断开后有连接恢复时调用 on_reconnect(gap_seconds)，在线程池中执行
+    """
+
+    def __init__(self, urls, on_message, key_func=liquidation_event_key,
+                 dedup_size=10000, retry_delay=1, max_retry_delay=60,
+                 ping_interval=20, ping_timeout=20, idle_timeout=180,
+                 on_gap=None, on_reconnect=None, stop_event=None, logger=None):
+        self.urls = list(urls)
+        self.on_message = on_message
+        self.key_func = key_func
+        self.deduper = EventDeduper(dedup_size)
+        self.stop_event = stop_event or asyncio.Event()
+        self.logger = logger or logging.getLogger(__name__)
+        self.outages = OutageTracker(on_gap, on_reconnect, self.logger)
+        self.stats = [FeedStats(i + 1, url) for i, url in enumerate(self.urls)]
+        self.managers = [
+            ConnectionManager(stats.url, functools.partial(self._dispatch, stats),
+                              ping_interval=ping_interval, ping_timeout=ping_timeout,
+                              idle_timeout=idle_timeout, base_delay=retry_delay,
+                              max_delay=max_retry_delay, stop_event=self.stop_event,
+                              logger=self.logger,
+                              on_status=functools.partial(self._link_status, stats))
+            for stats in self.stats
+        ]
+
+    def _link_status(self, stats, connected, at):
+        stats.connected = connected
+        if connected:
+            self.logger.info(f"冗余连接#{stats.conn_id} 已连接 {stats.url}")
+        else:
+            stats.reconnects += 1
+        self.outages.update(stats.conn_id, connected, at)
+
+    def _dispatch(self, stats, data):
+        stats.received += 1
+        event_time = data.get('E')
+        if event_time:
+            stats.record_latency(time.time() * 1000 - event_time)
+        if self.deduper.seen(self.key_func(data)):
+            return
+        stats.first_arrivals += 1
+        for s in self.stats:
+            if s.connected:
+                s.expected += 1
+        self.on_message(data)
+
+    async def _run_connection(self, stats, manager):
+        """单条连接的接收与重连循环"""
+        try:
+            await manager.run()
+        except Exception as e:
+            self.logger.error(f"冗余连接#{stats.conn_id} 参数问题，停止该连接: {e}")
+
+    def get_stats(self):
+        """导出各连接的延迟与丢失统计"""
+        return {
+            'connections': [s.to_dict() for s in self.stats],
+            'duplicates': self.deduper.duplicates,
+            'outages': self.outages.outages,
+        }
+
+    async def run(self):
+        """并行运行所有连接，直到 stop_event 被设置"""
+        tasks = [asyncio.create_task(self._run_connection(s, m))
+                 for s, m in zip(self.stats, self.managers)]
+        try:
+            await self.stop_event.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ConnectionManager:
+    """
+    单条 WebSocket 连接管理: 检测半开连接并按带抖动的指数退避重连
+
+    Parameters:
+    -----------
+    url : str
+        WebSocket 地址
+    on_message : callable
+        处理解析后JSON消息的回调（同步函数）
+    ping_interval : float
+        发送 ping 的间隔(秒)
+    ping_timeout : float
+        等待 pong 的超时(秒)，超时视为连接已死
+    idle_timeout : float
+        多久收不到任何消息视为连接已死(秒)，None表示不检测
+    base_delay : float
+        初始重连间隔(秒)
+    max_delay : float
+        重连间隔上限(秒)
+    on_reconnect : callable, optional
+        重连成功后调用 on_reconnect(gap_seconds)，用于补齐断线期间缺失的数据；
+        在线程池中执行，不阻塞事件循环
+    on_connect : coroutine function, optional
+        每次连接建立后 await on_connect(websocket)，用于发送订阅请求、启动应用层心跳
+    on_gap : callable, optional
+        重连成功后调用 on_gap(start, end)（秒），标记断线期间没有观测的时间段；
+        在事件循环中同步调用，先于重连后的第一条消息
+    on_status : callable, optional
+        连接建立时调用 on_status(True, 当前时间)，断开时调用 on_status(False, 最后一条消息的时间)；
+        在事件循环中同步调用，供多条连接汇总整体的断线时段（OutageTracker）
+    decode : callable
+        把收到的原始消息转换为 on_message 的参数，返回 None 的消息（如心跳回复）直接忽略
+    """
+
+    def __init__(self, url, on_message, ping_interval=20, ping_timeout=20,
+                 idle_timeout=180, base_delay=1, max_delay=300, on_reconnect=None,
+                 stop_event=None, logger=None, on_connect=None, decode=json.loads,
+                 on_gap=None, on_status=None):
+        self.url = url
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.on_gap = on_gap
+        self.on_status = on_status
+        self.decode = decode
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.idle_timeout = idle_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_reconnect = on_reconnect
+        self.stop_event = stop_event or asyncio.Event()
+        self.logger = logger or logging.getLogger(__name__)
+
+        # 指标
+        self.connected = False
+        self.connect_count = 0
+        self.reconnect_count = 0
+        self.idle_timeouts = 0
+        self.messages = 0
+        self.last_message_at = None
+        self.disconnected_at = None
+        self.gaps = deque(maxlen=100)  # 最近的断线时长(秒)
+        self._tasks = set()  # 后台补数任务，保留引用防止被回收
+
+    def get_metrics(self):
+        """导出连接指标"""
+        gaps = list(self.gaps)
+        return {
+            'connected': self.connected,
+            'connects': self.connect_count,
+            'reconnects': self.reconnect_count,
+            'idle_timeouts': self.idle_timeouts,
+            'messages': self.messages,
+            'last_message_at': self.last_message_at,
+            'last_gap_seconds': gaps[-1] if gaps else None,
+            'max_gap_seconds': max(gaps) if gaps else None,
+            'total_gap_seconds': sum(gaps),
+        }
+
+    async def _receive(self, websocket):
+        """接收循环；空闲超时抛出 IdleTimeout"""
+        while not self.stop_event.is_set():
+            try:
+                message = await asyncio.wait_for(websocket.recv(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                self.idle_timeouts += 1
+                raise IdleTimeout() from None
+            self.messages += 1
+            self.last_message_at = time.time()
+            try:
+                data = self.decode(message)
+                if data is not None:
+                    self.on_message(data)
+            except Exception as e:
+                self.logger.error(f"处理消息时出错: {e}")
+
+    async def _after_reconnect(self, gap):
+        """记录断线时长并在后台执行补数回调"""
+        self.reconnect_count += 1
+        self.gaps.append(gap)
+        self.logger.info(f"重连成功，断线 {gap:.1f} 秒，累计重连 {self.reconnect_count} 次")
+        if self.on_reconnect is not None:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self.on_reconnect, gap)
+            except Exception as e:
+                self.logger.error(f"重连后补数失败: {e}")
+
+    async def run(self):
+        """运行直到 stop_event 被设置或遇到无法重连的错误"""
+        attempt = 0
+        while not self.stop_event.is_set():
+            try:
+                self.logger.info(f"尝试连接至 {self.url}...")
+                async with websockets.connect(self.url, ping_interval=self.ping_interval,
+                                              ping_timeout=self.ping_timeout) as websocket:
+                    self.connected = True
+                    self.connect_count += 1
+                    attempt = 0
+                    self.logger.info("WebSocket 连接成功。")
+                    if self.on_connect is not None:
+                        await self.on_connect(websocket)
+                    if self.on_status is not None:
+                        self.on_status(True, time.time())
+                    if self.disconnected_at is not None:
+                        if self.on_gap is not None:
+                            self.on_gap(self.disconnected_at, time.time())
+                        # 补数回调在后台执行，不阻塞接收
+                        task = asyncio.create_task(
+                            self._after_reconnect(time.time() - self.disconnected_at))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+                    await self._receive(websocket)
+            except IdleTimeout:
+                self.logger.warning(f"{self.idle_timeout}秒未收到任何消息，判定连接已失效")
+            except (OSError, asyncio.TimeoutError,
+                    websockets.exceptions.WebSocketException) as e:
+                if is_fatal_connect_error(e):
+                    self.logger.error(f"连接参数问题，无法建立连接: {e}")
+                    raise
+                self.logger.warning(f"连接异常: {e!r}")
+            except Exception as e:
+                self.logger.error(f"监控过程中发生未预期的错误: {e}")
+            finally:
+                if self.connected:
+                    # 以最后一条消息的时间作为断线起点，半开连接的静默期也计入
+                    self.disconnected_at = self.last_message_at or time.time()
+                    self.connected = False
+                    if self.on_status is not None:
+                        self.on_status(False, self.disconnected_at)
+
+            if self.stop_event.is_set():
+                break
+            delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+            attempt += 1
+            self.logger.warning(f"{delay:.1f}秒后尝试重连（第{attempt}次）...")
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
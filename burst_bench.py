@@ -0,0 +1,196 @@
+# burst_bench.py
+"""
+爆仓突发检测延迟基准
+
+用 bn_simulator 的 LiquidationGenerator 按模拟时间生成 ETHUSDT 爆仓流（泊松到达，金额与模拟器一致）:
+    预热 1 天（自适应阈值需要至少1天的5分钟桶） -> 平静 calm_hours 小时 -> 一个突发周期（storm / cascade / spike）
+对同一条事件流分别运行:
+    - window: 现有规则 liq_sum_300 > threshold（阈值为 AdaptiveThresholds 的 P99，不含 WT1 条件）
+    - burst:  BurstDetector（EWMA + CUSUM）
+统计每个突发周期第一段突发开始后的报警延迟、平静期每小时误报次数，以及突发检测每笔事件的耗时。
+
+也可以回放录制的 forceOrder 文件（格式同 bn_simulator --replay），此时没有真实起点，只列出两者的报警时刻。
+
+使用示例:
+    python3 burst_bench.py
+    python3 burst_bench.py --profiles storm,spike --runs 5 --rate 2
+    python3 burst_bench.py --replay data/force_orders.jsonl
+"""
+import argparse
+import statistics
+import time
+from collections import deque
+
+import numpy as np
+
+from bn_simulator import BURST_PROFILES, PROFILE_PERIOD, LiquidationGenerator
+from burst_detector import BurstDetector
+from quantile_sketch import AdaptiveThresholds
+
+SYMBOL = 'ETHUSDT'
+WINDOW = 300
+FALLBACK_THRESHOLD = 250000  # 与 bn_liquadation.THRESHOLD 一致
+WARMUP = 86400
+
+
+class WindowRule:
+    """现有规则: 最近 WINDOW 秒爆仓总额超过自适应阈值（按上升沿计报警）"""
+
+    def __init__(self):
+        self.thresholds = AdaptiveThresholds(FALLBACK_THRESHOLD, WINDOW)
+        self.records = deque()
+        self.total = 0.0
+        self.active = False
+
+    def update(self, ts_ms, value):
+        self.records.append((ts_ms, value))
+        self.total += value
+        self.thresholds.observe(SYMBOL, ts_ms, value)
+        while self.records[0][0] < ts_ms - WINDOW * 1000:
+            self.total -= self.records.popleft()[1]
+        fired = self.total > self.thresholds.threshold(SYMBOL, ts_ms)
+        rising, self.active = fired and not self.active, fired
+        return rising
+
+
+def generate_events(generator, start, seconds, rate, profile_offset=None, seed=0):
+    """
+    按模拟时间生成 ETHUSDT 爆仓事件
+
+    Parameters:
+    -----------
+    generator : LiquidationGenerator
+        提供金额分布与突发倍数
+    start : float
+        起始时间（秒级时间戳）
+    seconds : float
+        时长(秒)
+    rate : float
+        平静期全市场爆仓速率(笔/秒)，约四分之一为 ETHUSDT
+    profile_offset : float, optional
+        突发周期的起点，None 表示全程平静
+
+    Yields:
+    -------
+    tuple
+        (毫秒时间戳, 金额)
+    """
+    rng = np.random.default_rng(seed)
+    # 按突发配置的边界切分为速率恒定的区间，每个区间内到达数服从泊松分布、时刻均匀分布
+    edges = {start, start + seconds}
+    if profile_offset is not None:
+        for begin, duration, _ in generator.profile:
+            edges.update((profile_offset + begin, profile_offset + begin + duration))
+    edges = sorted(e for e in edges if start <= e <= start + seconds)
+    for t0, t1 in zip(edges, edges[1:]):
+        mult = 1.0
+        if profile_offset is not None and 0 <= t0 - profile_offset < PROFILE_PERIOD:
+            mult = generator.multiplier(t0 - profile_offset)
+        n = rng.poisson(rate * mult * (t1 - t0))
+        for t in np.sort(rng.uniform(t0, t1, n)):
+            ts_ms = int(t * 1000)
+            order = generator.make_frame(ts_ms)['o']
+            if order['s'] == SYMBOL:
+                yield ts_ms, float(order['q']) * float(order['p'])
+
+
+def run_scenario(profile, rate, calm_hours, seed):
+    """
+    单次运行
+
+    Returns:
+    --------
+    dict
+        window/burst 的延迟(秒，未检测到为 None)、平静期误报次数、事件数与检测耗时
+    """
+    generator = LiquidationGenerator(rate, profile=profile)
+    generator._rng.seed(seed)
+    window, detector = WindowRule(), BurstDetector()
+    start = time.time() - WARMUP - calm_hours * 3600 - 2 * PROFILE_PERIOD
+    calm_start = start + WARMUP
+    onset = calm_start + calm_hours * 3600
+    first_start, first_duration, _ = generator.profile[0]
+    burst_start = onset + first_start
+    result = {'window': None, 'burst': None, 'window_false': 0, 'burst_false': 0,
+              'events': 0, 'detect_us': 0.0, 'onset_error': None}
+    total = WARMUP + calm_hours * 3600 + 2 * PROFILE_PERIOD
+    for ts_ms, value in generate_events(generator, start, total, rate, onset, seed):
+        t = ts_ms / 1000
+        result['events'] += 1
+        started = time.perf_counter()
+        burst = detector.update(SYMBOL, ts_ms, value)
+        result['detect_us'] += (time.perf_counter() - started) * 1e6
+        window_fired = window.update(ts_ms, value)
+        for name, fired in (('window', window_fired), ('burst', burst)):
+            if not fired or t < calm_start:
+                continue
+            if t < burst_start:
+                result[f'{name}_false'] += 1
+            elif result[name] is None:
+                result[name] = t - burst_start
+                if name == 'burst':
+                    result['onset_error'] = burst.onset - burst_start
+    result['detect_us'] /= max(1, result['events'])
+    return result
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return f"{statistics.median(values):.1f}" if values else '-'
+
+
+def run_benchmark(profiles, rate, calm_hours, runs):
+    print(f"全市场爆仓速率 {rate}/s，预热1天 + 平静{calm_hours}小时，每种突发 {runs} 次")
+    print(f"{'突发配置':<10} {'首段(起点,时长,倍数)':<22} {'窗口规则延迟(s)':>15} {'检出':>5} "
+          f"{'CUSUM延迟(s)':>13} {'检出':>5} {'起点误差(s)':>11} "
+          f"{'误报/小时(窗口/CUSUM)':>22} {'每笔耗时(us)':>12}")
+    for profile in profiles:
+        results = [run_scenario(profile, rate, calm_hours, seed) for seed in range(runs)]
+        hours = calm_hours * runs
+        print(f"{profile:<10} {str(BURST_PROFILES[profile][0]):<22} "
+              f"{_median(r['window'] for r in results):>15} "
+              f"{sum(r['window'] is not None for r in results):>5} "
+              f"{_median(r['burst'] for r in results):>13} "
+              f"{sum(r['burst'] is not None for r in results):>5} "
+              f"{_median(r['onset_error'] for r in results):>11} "
+              f"{sum(r['window_false'] for r in results) / hours:>11.2f}/"
+              f"{sum(r['burst_false'] for r in results) / hours:<10.2f} "
+              f"{statistics.mean(r['detect_us'] for r in results):>12.1f}")
+
+
+def run_replay(path):
+    """回放录制文件，列出两种方法的报警时刻"""
+    generator = LiquidationGenerator(replay_file=path)
+    window, detector = WindowRule(), BurstDetector()
+    for frame in generator.replay:
+        order = frame['o']
+        if order.get('s') != SYMBOL:
+            continue
+        ts_ms = order.get('T', frame.get('E'))
+        value = float(order['q']) * float(order['p'])
+        burst = detector.update(SYMBOL, ts_ms, value)
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts_ms / 1000))
+        if burst:
+            print(f"{stamp} CUSUM  {burst}")
+        if window.update(ts_ms, value):
+            print(f"{stamp} 窗口规则 5分钟总额 ${window.total:,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爆仓突发检测延迟基准")
+    parser.add_argument('--profiles', default='storm,cascade,spike', help="突发配置，逗号分隔")
+    parser.add_argument('--rate', type=float, default=2, help="平静期全市场爆仓速率(笔/秒)")
+    parser.add_argument('--calm-hours', type=float, default=6, help="统计误报的平静时长(小时)")
+    parser.add_argument('--runs', type=int, default=3, help="每种突发的运行次数")
+    parser.add_argument('--replay', help="回放 forceOrder 录制文件（每行一条JSON）")
+    args = parser.parse_args()
+
+    if args.replay:
+        run_replay(args.replay)
+    else:
+        profiles = [p.strip() for p in args.profiles.split(',') if p.strip()]
+        run_benchmark(profiles, args.rate, args.calm_hours, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+# burst_detector.py
+"""
+多时间尺度爆仓突发检测（EWMA 速率 + CUSUM 变点检验）
+
+5分钟窗口求和要等窗口内累计够金额才触发，连锁爆仓开始后往往要数分钟才报警，
+20秒级的尖峰被5分钟窗口平均后可能根本达不到阈值。本模块对每笔 forceOrder 做 O(1) 增量更新:
+
+    EwmaRate       连续时间指数加权速率: rate = rate * exp(-dt/τ) + w/τ
+                   快速尺度 10秒 / 1分钟 / 5分钟，分别统计笔数速率与金额速率（用于描述突发规模）
+                   慢速基线（默认1小时），作为“正常”速率 λ0
+    PoissonCusum   检验事件速率是否从 λ0 跳升到 m·λ0（泊松过程的对数似然比 CUSUM）:
+                       无事件期间 S 按 (m-1)·λ0 线性下降，每来一个事件 S += log(m)·w
+                   S 最近一次从0开始上升的时刻即为估计的突发起点，S 超过 h 时报警
+                   笔数（w=1）与金额（w=金额/基线平均单笔金额，单笔上限 max_units）各一个检验
+
+BurstDetector 按交易对管理上述状态，报警后直到 S 回落到0才重新布防。配置在 [burst] 节:
+    enabled = true
+    shift = 4                 ; 检测的速率倍数 m
+    threshold = 12            ; CUSUM 报警阈值 h（对数似然比）
+    baseline_tau = 3600       ; 基线时间常数(秒)
+    warmup = 600              ; 启动后至少积累多少秒基线才报警
+    min_rate = 0.01           ; 基线笔数速率下限(笔/秒)
+    min_notional_rate = 100   ; 基线金额速率下限(美元/秒)
+    max_units = 2             ; 单笔爆仓在金额检验中最多折算为几笔平均爆仓
+    min_notional = 100000     ; 突发起点以来的爆仓金额不足该值时不报警(美元)
+"""
+import math
+import threading
+import time
+from datetime import datetime
+
+from bn_config import get_setting
+
+HORIZONS = (10, 60, 300)  # 快速 EWMA 时间尺度(秒)
+BASELINE_TAU = 3600
+
+
+class EwmaRate:
+    """
+    连续时间 EWMA 速率（每秒）
+
+    Parameters:
+    -----------
+    tau : float
+        时间常数(秒)，约等于滑动窗口长度
+    """
+
+    __slots__ = ('tau', 'rate', 't')
+
+    def __init__(self, tau, rate=0.0, t=None):
+        self.tau = tau
+        self.rate = rate
+        self.t = t
+
+    def value(self, t):
+        """t 时刻的速率（只衰减，不修改状态）"""
+        if self.t is None:
+            return 0.0
+        return self.rate * math.exp(-max(0.0, t - self.t) / self.tau)
+
+    def update(self, t, weight=1.0):
+        """t 时刻发生一个权重为 weight 的事件，返回更新后的速率"""
+        self.rate = self.value(t) + weight / self.tau
+        self.t = t if self.t is None else max(self.t, t)
+        return self.rate
+
+
+class PoissonCusum:
+    """
+    泊松速率跳升的单边 CUSUM
+
+    Parameters:
+    -----------
+    shift : float
+        备择假设的速率倍数 m（>1）
+    threshold : float
+        报警阈值 h
+    """
+
+    __slots__ = ('shift', 'threshold', 'log_shift', 'score', 't', 'onset', 'weight')
+
+    def __init__(self, shift=4.0, threshold=12.0):
+        self.shift = shift
+        self.threshold = threshold
+        self.log_shift = math.log(shift)
+        self.score = 0.0
+        self.t = None
+        self.onset = None  # S 最近一次离开0的时刻
+        self.weight = 0.0  # 起点以来累计的事件权重
+
+    def decay(self, t, base_rate):
+        """无事件期间按 (m-1)·λ0 下降，降到0时清除起点"""
+        if self.t is not None and t > self.t:
+            self.score -= (self.shift - 1) * base_rate * (t - self.t)
+            if self.score <= 0:
+                self.score, self.onset, self.weight = 0.0, None, 0.0
+        self.t = t if self.t is None else max(self.t, t)
+
+    def update(self, t, base_rate, weight=1.0):
+        """
+        加入一个事件
+
+        Returns:
+        --------
+        bool
+            当前得分是否超过阈值
+        """
+        self.decay(t, base_rate)
+        if self.onset is None:
+            self.onset = t
+        self.score += self.log_shift * weight
+        self.weight += weight
+        return self.score > self.threshold
+
+
+class Burst:
+    """一次检测到的突发"""
+
+    def __init__(self, symbol, onset, detected, events, notional, rates, baseline, trigger):
+        self.symbol = symbol
+        self.onset = onset        # 估计的起点（秒级时间戳）
+        self.detected = detected  # 报警时刻
+        self.events = events      # 起点以来的爆仓笔数
+        self.notional = notional  # 起点以来的爆仓金额
+        self.rates = rates        # {尺度: (笔/分钟, 美元/分钟)}
+        self.baseline = baseline  # (笔/分钟, 美元/分钟)
+        self.trigger = trigger    # 'count' 或 'notional'
+
+    @property
+    def delay(self):
+        """起点到报警的时长(秒)"""
+        return self.detected - self.onset
+
+    def format_message(self):
+        onset = datetime.fromtimestamp(self.onset).strftime('%H:%M:%S')
+        rates = ' / '.join(f"{_horizon_name(h)} {c:.1f}笔 ${n:,.0f}"
+                           for h, (c, n) in self.rates.items())
+        return (f"⚡ {self.symbol} 爆仓突发预警: 起点 {onset}（已持续{self.delay:.0f}秒），"
+                f"{self.events}笔 共${self.notional:,.0f}\n"
+                f"每分钟速率 {rates}\n"
+                f"基线 {self.baseline[0]:.1f}笔 ${self.baseline[1]:,.0f}/分钟")
+
+    def __repr__(self):
+        return (f"<Burst {self.symbol} onset={self.onset:.1f} delay={self.delay:.1f}s "
+                f"events={self.events} notional={self.notional:,.0f} by {self.trigger}>")
+
+
+def _horizon_name(seconds):
+    return f"{seconds // 60}分钟" if seconds >= 60 else f"{seconds}秒"
+
+
+class _SymbolState:
+    """单个交易对的检测状态"""
+
+    def __init__(self, shift, threshold):
+        self.count_rates = {h: EwmaRate(h) for h in HORIZONS}
+        self.notional_rates = {h: EwmaRate(h) for h in HORIZONS}
+        self.base_count = EwmaRate(BASELINE_TAU)
+        self.base_notional = EwmaRate(BASELINE_TAU)
+        self.count_cusum = PoissonCusum(shift, threshold)
+        self.notional_cusum = PoissonCusum(shift, threshold)
+        self.first_seen = None
+        self.onset_events = 0
+        self.onset_notional = 0.0
+        self.alarmed = False
+
+
+class BurstDetector:
+    """
+    按交易对的爆仓突发检测（线程安全）
+
+    Parameters:
+    -----------
+    shift, threshold, baseline_tau, warmup : optional
+        未指定时读取 [burst] 节，含义见模块说明
+    """
+
+    def __init__(self, shift=None, threshold=None, baseline_tau=None, warmup=None,
+                 min_notional=None):
+        def setting(value, option, fallback):
+            return value if value is not None else get_setting('burst', option, fallback, float)
+
+        self.enabled = get_setting('burst', 'enabled', 'true').lower() == 'true'
+        self.shift = setting(shift, 'shift', 4.0)
+        self.threshold = setting(threshold, 'threshold', 12.0)
+        self.baseline_tau = setting(baseline_tau, 'baseline_tau', BASELINE_TAU)
+        self.warmup = setting(warmup, 'warmup', 600.0)
+        self.min_notional = setting(min_notional, 'min_notional', 100000.0)
+        self.min_rate = get_setting('burst', 'min_rate', 0.01, float)
+        self.min_notional_rate = get_setting('burst', 'min_notional_rate', 100.0, float)
+        self.max_units = get_setting('burst', 'max_units', 2.0, float)
+        self.symbols = {}
+        self.stats = {'events': 0, 'bursts': 0}
+        self._lock = threading.Lock()
+
+    def _get(self, symbol):
+        state = self.symbols.get(symbol)
+        if state is None:
+            state = self.symbols[symbol] = _SymbolState(self.shift, self.threshold)
+            state.base_count.tau = state.base_notional.tau = self.baseline_tau
+        return state
+
+    def _baseline(self, state, t):
+        """基线速率 (笔/秒, 美元/秒)，不低于配置的下限"""
+        # EWMA 从0开始，运行时间不足 τ 时偏低，按 1-exp(-Δt/τ) 做偏差修正
+        elapsed = max(1.0, t - state.first_seen) if state.first_seen is not None else 1.0
+        correction = 1 - math.exp(-elapsed / self.baseline_tau)
+        return (max(self.min_rate, state.base_count.value(t) / correction),
+                max(self.min_notional_rate, state.base_notional.value(t) / correction))
+
+    def update(self, symbol, ts_ms, notional):
+        """
+        加入一笔爆仓
+
+        Parameters:
+        -----------
+        symbol : str
+            交易对
+        ts_ms : int
+            成交时间（毫秒）
+        notional : float
+            爆仓金额（美元）
+
+        Returns:
+        --------
+        Burst or None
+            本次事件使检验首次越过阈值时返回突发信息，否则 None
+        """
+        t = ts_ms / 1000
+        with self._lock:
+            self.stats['events'] += 1
+            state = self._get(symbol)
+            if state.first_seen is None:
+                state.first_seen = t
+            # 用事件之前的基线做检验，避免突发本身抬高 λ0
+            base_count, base_notional = self._baseline(state, t)
+            # 金额检验以基线平均单笔金额为1个单位，其基线速率与笔数相同
+            units = min(self.max_units, notional * base_count / base_notional)
+
+            if t - state.first_seen < self.warmup:
+                # 预热期基线还不可靠，只积累速率不做检验
+                state.count_cusum.score = state.notional_cusum.score = 0.0
+                state.count_cusum.onset = state.notional_cusum.onset = None
+            state.count_cusum.decay(t, base_count)
+            state.notional_cusum.decay(t, base_count)
+            was_idle = state.count_cusum.onset is None and state.notional_cusum.onset is None
+            count_hit = state.count_cusum.update(t, base_count)
+            notional_hit = state.notional_cusum.update(t, base_count, units)
+            if was_idle:
+                # 上一次突发已结束（两个检验都回落到0），重新布防
+                state.onset_events, state.onset_notional = 0, 0.0
+                state.alarmed = False
+            state.onset_events += 1
+            state.onset_notional += notional
+
+            for h in HORIZONS:
+                state.count_rates[h].update(t)
+                state.notional_rates[h].update(t, notional)
+            state.base_count.update(t)
+            state.base_notional.update(t, notional)
+
+            if not (count_hit or notional_hit) or state.alarmed or not self.enabled:
+                return None
+            if t - state.first_seen < self.warmup or state.onset_notional < self.min_notional:
+                return None
+            state.alarmed = True
+            self.stats['bursts'] += 1
+            onsets = [c.onset for c in (state.count_cusum, state.notional_cusum)
+                      if c.onset is not None]
+            return Burst(symbol, min(onsets), t, state.onset_events, state.onset_notional,
+                         {h: (state.count_rates[h].value(t) * 60,
+                              state.notional_rates[h].value(t) * 60) for h in HORIZONS},
+                         (base_count * 60, base_notional * 60),
+                         'count' if count_hit else 'notional')
+
+    def rates(self, symbol, now=None):
+        """
+        当前各尺度速率
+
+        Returns:
+        --------
+        dict
+            {'count': {尺度: 笔/分钟}, 'notional': {尺度: 美元/分钟}, 'baseline': (笔/分钟, 美元/分钟),
+             'score': (笔数 CUSUM, 金额 CUSUM)}
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self._get(symbol)
+            base_count, base_notional = self._baseline(state, now)
+            return {
+                'count': {h: r.value(now) * 60 for h, r in state.count_rates.items()},
+                'notional': {h: r.value(now) * 60 for h, r in state.notional_rates.items()},
+                'baseline': (base_count * 60, base_notional * 60),
+                'score': (state.count_cusum.score, state.notional_cusum.score),
+            }
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, symbols=len(self.symbols))
+
+    def get_state(self):
+        """导出基线与首次出现时间（CUSUM 与快速速率重启后从0开始）"""
+        with self._lock:
+            return {symbol: {'base_count': [s.base_count.rate, s.base_count.t],
+                             'base_notional': [s.base_notional.rate, s.base_notional.t],
+                             'first_seen': s.first_seen}
+                    for symbol, s in self.symbols.items()}
+
+    def restore_state(self, state, saved_at=None):
+        """从快照恢复基线，停机期间的衰减在下一笔事件时按时间差自动计入"""
+        with self._lock:
+            for symbol, data in state.items():
+                s = self._get(symbol)
+                s.base_count.rate, s.base_count.t = data['base_count']
+                s.base_notional.rate, s.base_notional.t = data['base_notional']
+                s.first_seen = data.get('first_seen')
+
+
+# 使用示例: 平静期每10秒一笔，随后20秒内每秒3笔
+if __name__ == "__main__":
+    detector = BurstDetector(warmup=600, min_notional=0)
+    t0 = time.time() - 3600
+    for i in range(340):
+        detector.update('ETHUSDT', int((t0 + i * 10) * 1000), 5000)
+    start = t0 + 3400
+    for i in range(60):
+        burst = detector.update('ETHUSDT', int((start + i / 3) * 1000), 8000)
+        if burst:
+            print(burst)
+            print(burst.format_message())
+            break
@@ -0,0 +1,365 @@
+# chart_renderer.py
+"""
+告警图表渲染（进程池）
+
+WaveTrend / 爆仓告警附带一张 价格 + WT1/WT2 走势图。matplotlib 新建一张图要几百毫秒，
+因此渲染放在独立的工作进程中（spawn 启动，Agg 后端，不与主进程的线程、事件循环争抢GIL）:
+    - 每个工作进程启动时只创建一次 Figure、坐标轴和所有线条，之后每次渲染只用 set_data
+      更新线条数据并重新计算坐标范围，再输出 PNG；
+    - 主进程只提交数据（几KB的数组），立即返回 Future，不等待渲染；
+    - 文字告警照常立即发送，图片渲染完成后由 Notifier.notify_image 补发到支持图片的通道
+      （企业微信）；渲染失败、进程池繁忙或超过 max_delay 仍未完成时就只有文字。
+
+渲染数据（payload）为 dict:
+    time      K线时间（秒级时间戳数组）
+    close     收盘价数组
+    wt1, wt2  WaveTrend 数组（与 close 等长）
+    title     标题（matplotlib 默认字体没有中文字形，使用英文）
+    marker    可选，标记告警时刻的秒级时间戳
+
+配置在 bot_config.cfg 的 [chart] 节:
+    enabled = true
+    workers = 1          ; 渲染进程数
+    width = 8            ; 图片尺寸(英寸)
+    height = 5
+    dpi = 80
+    max_pending = 4      ; 同时等待渲染的图表上限，超出时直接跳过（只发文字）
+    max_delay = 30       ; 渲染完成距提交超过该秒数则不再补发
+"""
+import io
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from bn_config import get_setting
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# WaveTrend 超买/超卖参考线
+WT_LEVELS = (-60, -53, 0, 53, 60)
+
+
+class _Chart:
+    """工作进程内复用的图表: 线条只创建一次，每次渲染只更新数据"""
+
+    def __init__(self, width, height, dpi):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.dates as mdates
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=(width, height), dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.price_ax, self.wt_ax = self.figure.subplots(
+            2, 1, sharex=True, gridspec_kw={'height_ratios': [2, 1]})
+        # 固定边距，避免每次渲染都做 tight_layout
+        self.figure.subplots_adjust(left=0.09, right=0.98, top=0.93, bottom=0.1, hspace=0.08)
+
+        self.price_line, = self.price_ax.plot([], [], color='#333333', linewidth=1.2)
+        self.last_point, = self.price_ax.plot([], [], 'o', color='#d62728', markersize=4)
+        self.wt1_line, = self.wt_ax.plot([], [], color='#2ca02c', linewidth=1, label='WT1')
+        self.wt2_line, = self.wt_ax.plot([], [], color='#d62728', linewidth=1, label='WT2')
+        for level in WT_LEVELS:
+            self.wt_ax.axhline(level, color='#999999', linewidth=0.5, linestyle='-' if level == 0 else ':')
+        self.markers = [ax.axvline(0, color='#ff7f0e', linewidth=0.8, visible=False)
+                        for ax in (self.price_ax, self.wt_ax)]
+        self.wt_ax.legend(loc='upper left', fontsize=7)
+        tz = datetime.now().astimezone().tzinfo
+        self.wt_ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d %H:%M', tz=tz))
+        for ax in (self.price_ax, self.wt_ax):
+            ax.grid(alpha=0.3)
+            ax.tick_params(labelsize=7)
+
+    def render(self, payload):
+        """
+        按 payload 更新线条并输出 PNG
+
+        Returns:
+        --------
+        bytes
+        """
+        x = np.asarray(payload['time'], dtype=float) / 86400  # matplotlib 日期为1970年起的天数
+        close = np.asarray(payload['close'], dtype=float)
+        self.price_line.set_data(x, close)
+        self.last_point.set_data(x[-1:], close[-1:])
+        self.wt1_line.set_data(x, payload['wt1'])
+        self.wt2_line.set_data(x, payload['wt2'])
+        marker = payload.get('marker')
+        for line in self.markers:
+            line.set_visible(marker is not None)
+            if marker is not None:
+                line.set_xdata([marker / 86400] * 2)
+        for ax in (self.price_ax, self.wt_ax):
+            ax.relim(visible_only=True)
+            ax.autoscale_view()
+        self.price_ax.set_title(payload.get('title', ''), fontsize=9, loc='left')
+        buffer = io.BytesIO()
+        self.figure.savefig(buffer, format='png')
+        return buffer.getvalue()
+
+
+_chart = None  # 工作进程内的图表实例
+
+
+def _init_worker(width, height, dpi):
+    global _chart
+    _chart = _Chart(width, height, dpi)
+
+
+def _render_in_worker(payload):
+    """在工作进程中渲染，返回 (PNG字节, 渲染耗时秒)"""
+    started = time.perf_counter()
+    image = _chart.render(payload)
+    return image, time.perf_counter() - started
+
+
+def _warm_up():
+    return True
+
+
+class ChartRenderer:
+    """
+    图表渲染进程池（线程安全），参数未指定时读取 [chart] 节，含义见模块说明
+    """
+
+    def __init__(self, workers=None, width=None, height=None, dpi=None):
+        def setting(value, option, fallback, cast=float):
+            return value if value is not None else get_setting('chart', option, fallback, cast)
+
+        self.enabled = get_setting('chart', 'enabled', 'true').lower() == 'true'
+        self.workers = setting(workers, 'workers', 1, int)
+        self.size = (setting(width, 'width', 8.0), setting(height, 'height', 5.0), setting(dpi, 'dpi', 80, int))
+        self.max_pending = get_setting('chart', 'max_pending', 4, int)
+        self.max_delay = get_setting('chart', 'max_delay', 30.0, float)
+        self.pending = 0
+        self.stats = {'submitted': 0, 'rendered': 0, 'failed': 0, 'skipped': 0, 'late': 0,
+                      'attached': 0, 'render_ms_total': 0.0, 'render_ms_max': 0.0,
+                      'latency_ms_total': 0.0, 'bytes_total': 0}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: 主进程已有调度线程与事件循环线程，fork 可能继承被占用的锁
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker, initargs=self.size)
+        return self._executor
+
+    def start(self):
+        """预先启动工作进程并创建图表，避免第一张图等待进程启动（不阻塞）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            executor = self._get_executor()
+            for _ in range(self.workers):
+                executor.submit(_warm_up).add_done_callback(self._on_warm_up)
+
+    def _on_warm_up(self, future):
+        if future.exception() is not None:
+            self._disable(future.exception())
+
+    def _disable(self, error):
+        if self.enabled:
+            self.enabled = False
+            logger.error(f"图表渲染进程不可用，之后的告警只发送文字: {error}")
+
+    def render(self, payload):
+        """
+        提交渲染，立即返回
+
+        Returns:
+        --------
+        concurrent.futures.Future or None
+            结果为 PNG 字节；未启用或等待中的渲染已达上限时返回 None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.stats['skipped'] += 1
+                return None
+            self.pending += 1
+            self.stats['submitted'] += 1
+            try:
+                inner = self._get_executor().submit(_render_in_worker, payload)
+            except (BrokenProcessPool, RuntimeError) as e:
+                self.pending -= 1
+                self._disable(e)
+                return None
+        result = Future()
+        submitted = time.perf_counter()
+
+        def done(future):
+            with self._lock:
+                self.pending -= 1
+                error = future.exception()
+                if error is None:
+                    image, seconds = future.result()
+                    self.stats['rendered'] += 1
+                    self.stats['render_ms_total'] += seconds * 1000
+                    self.stats['render_ms_max'] = max(self.stats['render_ms_max'], seconds * 1000)
+                    self.stats['latency_ms_total'] += (time.perf_counter() - submitted) * 1000
+                    self.stats['bytes_total'] += len(image)
+                else:
+                    self.stats['failed'] += 1
+            if error is None:
+                result.set_result(image)
+                return
+            if isinstance(error, BrokenProcessPool):
+                self._disable(error)
+            else:
+                logger.error(f"图表渲染失败: {error}")
+            result.set_exception(error)
+
+        inner.add_done_callback(done)
+        return result
+
+    def attach(self, payload, send):
+        """
+        提交渲染，完成后调用 send(PNG字节) 补发图片；调用方不等待
+
+        send 在进程池的结果线程中调用，应只提交不等待（如 notifier.notify_image）。
+
+        Returns:
+        --------
+        bool
+            是否已提交渲染
+        """
+        future = self.render(payload)
+        if future is None:
+            return False
+        submitted = time.time()
+
+        def done(future):
+            if future.exception() is not None:
+                return
+            if time.time() - submitted > self.max_delay:
+                with self._lock:
+                    self.stats['late'] += 1
+                return
+            try:
+                send(future.result())
+                with self._lock:
+                    self.stats['attached'] += 1
+            except Exception as e:
+                logger.error(f"补发告警图表失败: {e}")
+
+        future.add_done_callback(done)
+        return True
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, enabled=self.enabled, pending=self.pending)
+        rendered = max(1, stats['rendered'])
+        stats['render_ms_avg'] = stats['render_ms_total'] / rendered
+        stats['latency_ms_avg'] = stats['latency_ms_total'] / rendered
+        return stats
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer() -> ChartRenderer:
+    """全局渲染进程池（延迟初始化）"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = ChartRenderer()
+        return _renderer
+
+
+def wavetrend_payload(df, wt1, wt2, title, marker=None, bars=None):
+    """
+    由K线与 WaveTrend 序列生成渲染数据
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        K线，索引为时间，包含 close 列
+    wt1, wt2 : array-like
+        与 df 等长的 WaveTrend 序列
+    title : str
+        图表标题
+    marker : float, optional
+        告警时刻（秒级时间戳）
+    bars : int, optional
+        只保留最近的 bars 根K线
+
+    Returns:
+    --------
+    dict
+    """
+    start = -bars if bars else 0
+    times = df.index[start:]
+    if getattr(times, 'tz', None) is None:
+        times = times.tz_localize(datetime.now().astimezone().tzinfo)
+    # 索引精度可能是 ns/us/ms，统一换算为秒
+    seconds = times.tz_convert('UTC').tz_localize(None).values.astype('datetime64[ms]').astype(np.int64) / 1000
+    return {
+        'time': seconds,
+        'close': df['close'].to_numpy(dtype=float)[start:],
+        'wt1': np.asarray(wt1, dtype=float)[start:],
+        'wt2': np.asarray(wt2, dtype=float)[start:],
+        'title': title,
+        'marker': marker,
+    }
+
+
+# 使用示例: 对比每次新建图表与复用图表的渲染耗时，以及主线程提交到进程池的耗时
+if __name__ == "__main__":
+    import pandas as pd
+    from indicators import get_pipeline
+
+    rng = np.random.default_rng(0)
+    close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.003, 300)))
+    df = pd.DataFrame({'open': close, 'high': close * 1.002, 'low': close * 0.998, 'close': close,
+                       'volume': rng.uniform(10, 100, 300)},
+                      index=pd.date_range(end=datetime.now(), periods=300, freq='30min'))
+    values = get_pipeline().evaluate('ETHUSDT', '30m', df, ['wt1', 'wt2'])
+    payload = wavetrend_payload(df, values['wt1'], values['wt2'], 'ETHUSDT 30m WaveTrend',
+                                marker=time.time(), bars=100)
+    runs = 10
+
+    started = time.perf_counter()
+    for _ in range(runs):
+        _Chart(*ChartRenderer(workers=1).size).render(payload)
+    fresh = (time.perf_counter() - started) / runs * 1000
+    chart = _Chart(8, 5, 80)
+    started = time.perf_counter()
+    for _ in range(runs):
+        image = chart.render(payload)
+    reused = (time.perf_counter() - started) / runs * 1000
+    print(f"每次新建图表 {fresh:.1f} ms/张，复用图表 {reused:.1f} ms/张，PNG {len(image) / 1024:.1f} KB")
+
+    renderer = ChartRenderer(workers=1)
+    renderer.start()
+    renderer.render(payload).result(timeout=60)  # 等待工作进程就绪
+    submit_us = []
+    futures = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        futures.append(renderer.render(payload))
+        submit_us.append((time.perf_counter() - started) * 1e6)
+    images = [f.result(timeout=60) for f in futures if f is not None]
+    with open('chart_example.png', 'wb') as f:
+        f.write(images[-1])
+    print(f"进程池提交 {np.median(submit_us):.0f} us/次（主线程耗时），"
+          f"渲染 {len(images)} 张，跳过 {runs - len(images)} 张（max_pending={renderer.max_pending}）")
+    print(renderer.get_stats())
+    renderer.shutdown(wait=True)
@@ -1,43 +1,124 @@
 # main.py
-from datetime import datetime, time, timedelta
+from datetime import datetime, timedelta
 import time as time_module
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 
-from wechat_bot import send_text
+from wechat_bot import flush_alerts, get_digest_stats
+from notifier import build_notifier, PRIORITY_NORMAL
+from alert_throttle import build_throttler
+import alert_rules
 from bn_eth import get_eth_data
-from WT_method import calculate_wavetrend
-import bn_liquadation
+from kline_resampler import KlineResampler
+from indicators import calculate_wavetrend, get_pipeline
 import asyncio
 import threading
+from state_store import StateCheckpointer
+from status_api import get_board, start_status_api
+from memory_monitor import approx_size, get_monitor, start_memory_monitor
+from lazy_import import lazy_import
+
+# 爆仓监控（websockets 等）与K线归档（numpy）在首次使用时才导入
+bn_liquadation = lazy_import('bn_liquadation')
+futures_poller = lazy_import('futures_poller')
+kline_archive = lazy_import('kline_archive')
+chart_renderer = lazy_import('chart_renderer')
+
+# 通知通道（默认企业微信，可在 [notify] eth_robot_wt_channels 配置多个通道）
+notifier = build_notifier('eth_robot_wt', 'wechat')
 
 # 全局变量
-last_alert_sent_time = None
 ALERT_COOLDOWN_MINUTES = 30  # 警报冷却时间30分钟
+WT_ALERT_KEY = ('ETHUSDT', 'wavetrend')
+
+# 警报冷却与静默时段（[throttle] eth_robot_wt / quiet_hours 可覆盖）
+throttler = build_throttler('eth_robot_wt', f'cooldown:{ALERT_COOLDOWN_MINUTES * 60}')
+# 警报在合并队列中等待发送时置位，送达后才开始冷却，期间不重复入队
+wt_alert_pending = threading.Event()
 
 # BN链接状态相关全局变量
 bn_connection_ok = True  # BN链接状态，初始为True
 bn_failure_count = 0     # BN链接失败次数统计
 bn_last_check_time = None  # 最后一次检查时间
 
+# 多周期重采样引擎: 只增量拉取1分钟K线，WaveTrend用的30m K线和连通性检测用的1m K线都从这里读取
+WT_INTERVAL = '30m'
+WT_BARS = 100
+resampler = KlineResampler('ETHUSDT', [WT_INTERVAL])
+
+market_data_lock = threading.RLock()  # 定时检查、重连补数可能并发刷新（K线与指标一起更新）
+
+# 最近一次计算WaveTrend用的K线与WT1/WT2序列，告警图表从这里取数据（整体替换，读取无需加锁）
+CHART_BARS = 96  # 图表显示的K线根数（30m × 96 = 2天）
+latest_chart_data = None
+
+def refresh_market_data(interval=WT_INTERVAL, limit=WT_BARS):
+    """
+    增量拉取1分钟K线并更新重采样引擎；30m历史不足或有缺口时从交易所补导入
+    Returns:
+        pd.DataFrame or None: 指定周期的最新K线，获取失败返回None
+    """
+    with market_data_lock:
+        missing = resampler.missing_minutes(int(time_module.time() * 1000))
+        df_1m = get_eth_data('1m', min(1000, max(2, missing or 1000)))
+        if df_1m is None or df_1m.empty:
+            return None
+        resampler.update_1m(df_1m)
+        if not resampler.is_contiguous(WT_INTERVAL, WT_BARS):
+            # 指标预热优先使用本地K线归档，归档与1分钟数据之间仍有缺口时再请求交易所
+            history = kline_archive.load_klines('ETHUSDT', WT_INTERVAL, limit=WT_BARS)
+            if history is not None:
+                resampler.seed(WT_INTERVAL, history)
+        if not resampler.is_contiguous(WT_INTERVAL, WT_BARS):
+            history = get_eth_data(WT_INTERVAL, WT_BARS)
+            if history is None or history.empty:
+                return None
+            resampler.seed(WT_INTERVAL, history)
+        return resampler.get(interval, limit)
+
+# 运行状态快照，重启后恢复冷却时间、失败统计、K线历史和爆仓窗口
+CHECKPOINT_INTERVAL = 30  # 快照间隔(秒)
+checkpointer = StateCheckpointer('eth_robot_wt', interval=CHECKPOINT_INTERVAL)
+
+def get_state():
+    """导出本模块需要跨重启保留的状态"""
+    return {
+        'throttle': throttler.get_state(),
+        'bn_connection_ok': bn_connection_ok,
+        'bn_failure_count': bn_failure_count,
+        'bn_last_check_time': bn_last_check_time,
+    }
+
+def restore_state(state, saved_at=None):
+    """从快照恢复本模块的状态"""
+    global bn_connection_ok, bn_failure_count, bn_last_check_time
+    if 'throttle' in state:
+        throttler.restore_state(state['throttle'], saved_at)
+    elif state.get('last_alert_sent_time'):
+        # 旧版快照只有最后发送时间
+        throttler.record(WT_ALERT_KEY, state['last_alert_sent_time'].timestamp())
+    bn_connection_ok = state.get('bn_connection_ok', True)
+    bn_failure_count = state.get('bn_failure_count', 0)
+    bn_last_check_time = state.get('bn_last_check_time')
+
+def get_market_state():
+    """在锁内导出K线状态，避免与刷新线程并发修改"""
+    with market_data_lock:
+        return resampler.get_state()
+
+checkpointer.register_state('robot', get_state, restore_state)
+checkpointer.register_state('klines', get_market_state, resampler.restore_state)
+checkpointer.register_state('liquidation', lambda: bn_liquadation.get_state(),
+                            lambda state, saved_at=None: bn_liquadation.restore_state(state, saved_at))
+
 def should_suppress_message():
     """
-    检查当前时间是否在消息抑制时间段内（北京时间1:00-7:00）
+    检查当前时间是否在消息抑制时间段内（默认北京时间1:00-7:00，[throttle] quiet_hours 可配置）
     Returns:
         bool: True表示需要抑制消息发送，False表示允许发送
     """
     try:
-        # 获取当前时间（使用服务器本地时间，假设服务器已设置为北京时间）
-        now = datetime.now()
-        current_time = now.time()
-        
-        # 定义抑制时间段：1:00-7:00（包括1:00，不包括7:00）
-        suppress_start = time(1, 0, 0)  # 01:00:00
-        suppress_end = time(7, 0, 0)     # 07:00:00
-        
-        # 检查当前时间是否在抑制时间段内
-        if suppress_start <= current_time < suppress_end:
-            print(f"当前时间 {current_time.strftime('%H:%M:%S')} 在抑制时间段内（1:00-7:00），跳过消息发送")
+        # 使用服务器本地时间，假设服务器已设置为北京时间
+        if throttler.quiet():
+            print(f"当前时间 {datetime.now().strftime('%H:%M:%S')} 在抑制时间段内（{throttler.quiet_hours}），跳过消息发送")
             return True
         return False
     except Exception as e:
@@ -53,8 +134,8 @@ def send_startup_message():
             return
             
         message = "🚀 曼波机器人启动成功！开始监控ETH/USDT WaveTrend指标（15秒间隔）"
-        result = send_text(message)
-        if result and result.get('errcode') == 0:
+        # 启动、每日状态、关闭消息不进入合并队列，返回值为实际发送结果
+        if notifier.notify(message, digest=False):
             print("启动消息发送成功")
         else:
             print("启动消息发送可能失败")
@@ -80,83 +161,131 @@ def update_bn_connection_status(success):
     else:
         bn_connection_ok = False
         bn_failure_count += 1
+    status_board.mark('robot')
+
+def update_wavetrend():
+    """
+    刷新K线并计算WaveTrend，更新图表数据、状态接口与爆仓监控使用的WT1（不判断告警）
+
+    Returns:
+        tuple or None: (df, wt1, wt2)，获取数据失败返回None
+    """
+    global latest_chart_data
+    with market_data_lock:
+        # 获取ETH数据（增量补齐1分钟K线并重采样为30m）
+        df = refresh_market_data(WT_INTERVAL, WT_BARS)
+        if df is None or df.empty:
+            return None
+        
+        # 计算WaveTrend指标
+        wt1, wt2 = calculate_wavetrend(df, 'ETHUSDT', WT_INTERVAL)
+        current_price = df['close'].iloc[-1]
+        # 整条序列来自指标流水线的缓存，不重复计算
+        series = get_pipeline().evaluate('ETHUSDT', WT_INTERVAL, df, ['wt1', 'wt2'])
+        latest_chart_data = (df, series['wt1'], series['wt2'])
+        status_board.publish('indicators', {'ETHUSDT': {
+            'interval': WT_INTERVAL, 'bar_time': df.index[-1].to_pydatetime(), 'close': float(current_price),
+            'wt1': wt1, 'wt2': wt2, 'computed_at': datetime.now()}})
+        
+        #设置爆仓检查的WT1
+        bn_liquadation.set_WT1(wt1)
+        return df, wt1, wt2
 
 def check_wavetrend_alert():
     """
     每15秒检查WaveTrend指标，满足条件时发送警报
     同时更新BN链接状态标志位
     """
-    global last_alert_sent_time
-    
     try:
         print(f"[{datetime.now().strftime('%H:%M:%S')}] 正在获取ETH数据并计算WaveTrend...")
         
-        # 获取ETH数据（这里直接更新标志位）
-        df = get_eth_data('30m', 100)
+        result = update_wavetrend()
         
         # 在数据获取后立即更新BN链接状态（无额外线程）
-        if df is None or df.empty:
+        if result is None:
             print("获取ETH数据失败")
             update_bn_connection_status(False)
             return
         else:
             update_bn_connection_status(True)
         
-        # 计算WaveTrend指标
-        wt1, wt2 = calculate_wavetrend(df)
+        df, wt1, wt2 = result
         current_price = df['close'].iloc[-1]
-        
         print(f"最新数据 - 价格: {current_price:.2f}, WT1: {wt1:.2f}, WT2: {wt2:.2f}")
         
-        # 检查是否需要发送警报
+        # 检查是否需要发送警报（触发条件见 alert_rules.cfg 的 wavetrend 组）
         current_time = datetime.now()
-        should_send_alert = False
-        alert_message = ""
-        
-        if wt1 > 49:
-            alert_message = f"🐶 哈基米，WT1是{wt1:.2f}（当前价格: {current_price:.2f}）"
-            should_send_alert = True
-        elif wt1 < -49:
-            alert_message = f"🌊 曼波，WT1是{wt1:.2f}（当前价格: {current_price:.2f}）"
-            should_send_alert = True
-
-        #设置爆仓检查的WT1
-        bn_liquadation.set_WT1(wt1)
+        matches = alert_rules.evaluate('wavetrend', ['ETHUSDT'],
+                                       {'wt1': wt1, 'wt2': wt2, 'close': current_price})
+        should_send_alert = bool(matches)
+        alert_message = matches[0].message if matches else ""
         
         # 检查冷却时间
         if should_send_alert:
-            if last_alert_sent_time is None:
-                # 第一次发送警报
+            remaining_time = throttler.wait_time(WT_ALERT_KEY, current_time.timestamp())
+            if wt_alert_pending.is_set():
+                print("上一条警报仍在发送队列中")
+            elif remaining_time <= 0:
                 send_alert_with_cooldown(alert_message, current_time)
             else:
-                time_diff = current_time - last_alert_sent_time
-                if time_diff.total_seconds() >= ALERT_COOLDOWN_MINUTES * 60:
-                    send_alert_with_cooldown(alert_message, current_time)
-                else:
-                    remaining_time = ALERT_COOLDOWN_MINUTES * 60 - time_diff.total_seconds()
-                    print(f"警报冷却中，{int(remaining_time/60)}分{int(remaining_time%60)}秒后可再次发送")
+                print(f"警报冷却中，{int(remaining_time/60)}分{int(remaining_time%60)}秒后可再次发送")
         
     except Exception as e:
         print(f"检查WaveTrend时出错: {e}")
         update_bn_connection_status(False)
 
+def build_chart(symbol, title):
+    """
+    用最近一次的K线与WaveTrend生成告警图表的渲染数据（格式见 chart_renderer）
+
+    Returns:
+    --------
+    dict or None
+        暂无数据或不是ETHUSDT时返回None
+    """
+    data = latest_chart_data
+    if data is None or symbol != 'ETHUSDT':
+        return None
+    df, wt1, wt2 = data
+    return chart_renderer.wavetrend_payload(df, wt1, wt2, title, marker=time_module.time(),
+                                            bars=CHART_BARS)
+
+def send_alert_chart(title, symbol='ETHUSDT'):
+    """提交告警图表渲染，完成后补发图片；文字告警已发出，这里不等待渲染"""
+    try:
+        payload = build_chart(symbol, title)
+        if payload is not None:
+            chart_renderer.get_renderer().attach(
+                payload, lambda image: notifier.notify_image(image, symbol=symbol))
+    except Exception as e:
+        print(f"提交告警图表时出错: {e}")
+
+def on_alert_delivered(ok):
+    """警报的最终投递结果（在发送线程中回调）: 送达后才记录冷却，失败时下次检查可重新发送"""
+    if ok:
+        throttler.record(WT_ALERT_KEY)
+        print("警报已送达，开始冷却")
+    else:
+        print("警报发送失败，下次检查时重新发送")
+    wt_alert_pending.clear()
+
 def send_alert_with_cooldown(message, current_time):
-    """发送警报并更新最后发送时间"""
-    global last_alert_sent_time
-    
+    """发送警报，送达后记录到限频器"""
     # 检查是否在抑制时间段
     if should_suppress_message():
         print(f"警报抑制：当前处于抑制时间段，跳过警报发送: {message}")
         return
         
     try:
-        result = send_text(message)
-        if result and result.get('errcode') == 0:
-            last_alert_sent_time = current_time
-            print(f"警报发送成功: {message}")
+        # 进入合并队列，与同一时刻的其他告警合并为一条消息
+        wt_alert_pending.set()
+        if notifier.notify(message, priority=PRIORITY_NORMAL, on_result=on_alert_delivered):
+            print(f"警报已加入发送队列: {message}")
+            send_alert_chart(f"ETHUSDT {WT_INTERVAL} WaveTrend alert")
         else:
             print(f"警报发送可能失败")
     except Exception as e:
+        wt_alert_pending.clear()
         print(f"发送警报时出错: {e}")
 
 def test_bn_connection():
@@ -166,8 +295,8 @@ def test_bn_connection():
         tuple: (连接状态, 附加信息, 最新价格)
     """
     try:
-        # 尝试获取少量数据测试连接
-        df = get_eth_data('1m', 2)
+        # 刷新共享的1分钟K线测试连接
+        df = refresh_market_data('1m', 2)
         if df is not None and not df.empty:
             latest_price = df['close'].iloc[-1]
             return True, f"最新价格: {latest_price:.2f} USDT，数据更新时间: {df.index[-1].strftime('%H:%M:%S')}", latest_price
@@ -198,11 +327,19 @@ def send_daily_status():
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         last_check_time = bn_last_check_time.strftime("%H:%M:%S") if bn_last_check_time else "从未检查"
         
+        futures_status = futures_poller.get_poller().format_status('ETHUSDT') or '暂无数据'
+        # 多交易所模式下列出各交易所最近1分钟的爆仓速率
+        exchange_feed = bn_liquadation.exchange_feed
+        exchange_status = f"\n🌐 爆仓数据源: {exchange_feed.format_status()}" if exchange_feed else ''
+        memory_status = memory_monitor.format_summary()
+        
         message = f"""📅 每日状态报告 - {current_time}
 
 🤖 曼波机器人运行状态
 🔗 与币安链接: {status}
 📊 连接信息: {connection_info}
+💹 合约数据: {futures_status}{exchange_status}
+🧠 内存: {memory_status}
 ❌ 昨日失败次数: {bn_failure_count}次
 🕒 最后检查: {last_check_time}
 ⏰ 检查频率: 每15秒一次
@@ -212,9 +349,8 @@ def send_daily_status():
 📈 重置统计: 失败次数已清零
 🕒 下次报告: 明日09:00"""
         
-        # 发送消息
-        result = send_text(message)
-        if result and result.get('errcode') == 0:
+        # 发送消息（确认送达后才重置失败次数）
+        if notifier.notify(message, digest=False):
             print("每日状态消息发送成功")
             # 重置失败次数
             bn_failure_count = 0
@@ -236,10 +372,75 @@ def get_bn_connection_stats():
         'last_check_time': bn_last_check_time
     }
 
+def get_robot_status():
+    """状态接口的机器人分区: BN连接状态、告警冷却与K线缓存"""
+    stats = get_bn_connection_stats()
+    return {
+        'bn_connection_ok': stats['connection_ok'],
+        'bn_failure_count': stats['failure_count'],
+        'bn_last_check_time': stats['last_check_time'],
+        'wavetrend_cooldown': throttler.wait_time(WT_ALERT_KEY),
+        'suppressed': throttler.quiet(),
+        'klines_cached': resampler.count(WT_INTERVAL),
+        'checkpoint_saved_at': checkpointer.last_saved_at,
+    }
+
+def get_services_status():
+    """状态接口的服务分区: 各通知通道、合并队列、合约数据轮询与图表渲染的统计"""
+    return {
+        'notify': {'eth_robot_wt': notifier.get_stats(),
+                   'bn_liquadation': bn_liquadation.notifier.get_stats(),
+                   'wechat_digest': get_digest_stats()},
+        'futures': futures_poller.get_poller().get_stats(),
+        'chart': chart_renderer.get_renderer().get_stats(),
+    }
+
+# 本地状态接口（status_api.py）: 指标在每次计算后发布，其余分区由后台线程刷新
+status_board = get_board()
+status_board.register('robot', get_robot_status, interval=5)
+status_board.register('services', get_services_status, interval=10)
+
+def get_kline_cache_size():
+    """K线缓存的条数与字节数（1分钟与各高周期）"""
+    series = [resampler.base, *resampler.derived.values()]
+    return (sum(len(s) for s in series),
+            sum(approx_size(s.bars) + approx_size(s.times) for s in series))
+
+def get_chart_data_size():
+    """图表用K线与WT序列的条数与字节数"""
+    data = latest_chart_data
+    if data is None:
+        return 0, 0
+    return len(data[0]), sum(approx_size(x) for x in data)
+
+# 内存监测（memory_monitor.py）: 随运行时间增长的数据结构，每日状态报告中附带摘要
+memory_monitor = get_monitor()
+memory_monitor.register_gauge('klines', get_kline_cache_size)
+memory_monitor.register_gauge('chart_data', get_chart_data_size)
+memory_monitor.register_gauge('indicator_cache',
+                              lambda: (get_pipeline().get_stats()['keys'], get_pipeline().nbytes()))
+
+def backfill_after_reconnect(gap_seconds):
+    """
+    爆仓流重连后立即补齐断线期间缺失的K线和WT1（在重连线程中运行）
+    只刷新数据与指标，WaveTrend告警仍由定时任务判断，避免并发重复发送
+    """
+    print(f"爆仓监控断线 {gap_seconds:.1f} 秒后恢复，立即刷新K线与WaveTrend")
+    try:
+        if update_wavetrend() is None:
+            print("重连补数: 获取ETH数据失败")
+    except Exception as e:
+        print(f"重连补数时出错: {e}")
+
 def run_script1_monitor():
     """
     在新线程中运行爆仓监控函数
     """
+    # 重连后补齐依赖的指标状态
+    bn_liquadation.register_reconnect_hook(backfill_after_reconnect)
+    # 爆仓告警附带的图表使用本模块的K线与WaveTrend
+    bn_liquadation.register_chart_source(build_chart)
+
     def run_async_loop():
         """在新线程中运行异步事件循环"""
         try:
@@ -271,7 +472,10 @@ def main():
     send_startup_message()
     
     # 设置调度器（使用北京时间）
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
     scheduler = BackgroundScheduler(timezone='Asia/Shanghai')
+    memory_monitor.register_gauge('scheduler_jobs', lambda: len(scheduler.get_jobs()))
     
     # 每15秒执行WaveTrend检查（修改为15秒间隔）
     scheduler.add_job(
@@ -313,6 +517,15 @@ def main():
         if 'scheduler' in locals() and scheduler.running:
             scheduler.shutdown()
         
+        # 保存最终状态快照，供下次启动恢复
+        checkpointer.stop()
+        
+        # 关闭图表渲染进程，未完成的图表不再补发
+        chart_renderer.get_renderer().shutdown()
+        
+        # 发出合并队列中尚未发送的告警
+        flush_alerts()
+        
         # 发送最终统计报告（关闭报告不受抑制时间限制）
         stats = get_bn_connection_stats()
         final_report = f"""🔴 曼波机器人已关闭
@@ -325,14 +538,25 @@ def main():
         
         try:
             # 关闭报告不受时间抑制限制，始终发送
-            send_text(final_report)
-            print("关闭报告已发送")
+            if notifier.notify(final_report, digest=False):
+                print("关闭报告已发送")
+            else:
+                print("关闭报告发送失败")
         except:
             print("关闭报告发送失败")
         
         print("曼波机器人已关闭")
 
 if __name__ == "__main__":
+    # 先恢复上次运行的状态，再启动各监控任务
+    if checkpointer.restore():
+        print(f"已恢复状态快照: 缓存{WT_INTERVAL} K线 {resampler.count(WT_INTERVAL)} 条, "
+              f"窗口内爆仓记录 {len(bn_liquadation.liquidation_records)} 条")
+    checkpointer.start()
+    # 预先启动图表渲染进程，第一条告警的图表不必等待进程启动
+    chart_renderer.get_renderer().start()
+    start_status_api('eth_robot_wt')
+    start_memory_monitor()
     script1_monitor_thread = run_script1_monitor()
-    send_text("脚本1爆仓监控已启动")
+    notifier.notify("脚本1爆仓监控已启动", digest=False)
     main()
@@ -0,0 +1,130 @@
+# fanout_bench.py
+"""
+订阅投递基准
+
+在本进程内启动模拟 webhook（bn_simulator 的HTTP处理类），为 1~500 个群订阅同一告警，
+分别测量:
+    - resolve: 按 (交易对, 告警类型) 查找接收者的耗时（微秒）
+    - publish: SubscriptionDispatcher 用连接池并发投递到全部接收者的耗时
+    - baseline: 不复用连接，每个接收者单独 requests.post 的耗时
+
+使用示例:
+    python3 fanout_bench.py
+    python3 fanout_bench.py --sizes 1,10,100 --latency-ms 50 --workers 32
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import requests
+
+from bn_simulator import SimulatorStats, SyntheticMarket, make_http_handler
+from subscriptions import (RULE_LIQUIDATION, Recipient, SubscriptionDispatcher,
+                           SubscriptionRegistry)
+
+DEFAULT_SIZES = [1, 10, 50, 100, 500]
+
+
+def start_webhook_server(latency_ms):
+    """启动本地模拟 webhook，返回 (server, 基础地址)"""
+    handler = make_http_handler(SyntheticMarket(), SimulatorStats(), latency_ms, 0, 0)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def build_registry(base_url, size):
+    """size 个群订阅 ETHUSDT 爆仓告警，另有同样数量的无关订阅作为干扰"""
+    registry = SubscriptionRegistry()
+    for i in range(size):
+        url = f"{base_url}/cgi-bin/webhook/send?key=bench{i}"
+        registry.subscribe(Recipient('wechat', url, f"群{i}"), ['ETHUSDT'], [RULE_LIQUIDATION])
+        registry.subscribe(Recipient('wechat', url + 'x', f"无关群{i}"), ['BTCUSDT'], ['rsi'])
+    return registry
+
+
+def post_without_pool(recipients, content, workers):
+    """对照组: 每次投递新建连接"""
+    data = json.dumps({"msgtype": "text", "text": {"content": content}})
+
+    def send(recipient):
+        response = requests.post(recipient.target, data=data,
+                                 headers={'Content-Type': 'application/json'}, timeout=10)
+        return response.json().get('errcode') == 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(send, recipients))
+
+
+def measure(base_url, size, workers, rounds=3):
+    """
+    测量单个订阅规模
+
+    Returns:
+    --------
+    dict
+        resolve_us / publish_ms / baseline_ms 及投递成功数
+    """
+    registry = build_registry(base_url, size)
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        registry.resolve('ETHUSDT', RULE_LIQUIDATION)
+    resolve_us = (time.perf_counter() - started) * 1000  # 1000 次，折算为单次微秒
+
+    dispatcher = SubscriptionDispatcher(registry, max_workers=workers)
+    content = "ETHUSDT 爆仓告警（基准测试）"
+    dispatcher.publish('ETHUSDT', RULE_LIQUIDATION, content)  # 预热连接池
+    publish_ms, delivered = [], 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        delivered = dispatcher.publish('ETHUSDT', RULE_LIQUIDATION, content)
+        publish_ms.append((time.perf_counter() - started) * 1000)
+    dispatcher.close()
+
+    recipients = registry.resolve('ETHUSDT', RULE_LIQUIDATION)
+    started = time.perf_counter()
+    baseline_ok = post_without_pool(recipients, content, workers)
+    baseline_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        'size': size,
+        'resolve_us': resolve_us,
+        'publish_ms': min(publish_ms),
+        'delivered': delivered,
+        'baseline_ms': baseline_ms,
+        'baseline_ok': baseline_ok,
+    }
+
+
+def print_results(results):
+    print(f"{'订阅数':>6} {'查找(us)':>10} {'连接池投递(ms)':>14} {'成功':>6} "
+          f"{'无连接池(ms)':>12} {'成功':>6}")
+    for r in results:
+        print(f"{r['size']:>6} {r['resolve_us']:>10.2f} {r['publish_ms']:>14.1f} "
+              f"{r['delivered']:>6} {r['baseline_ms']:>12.1f} {r['baseline_ok']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="订阅投递基准")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="订阅数列表，逗号分隔")
+    parser.add_argument('--workers', type=int, default=16, help="并发投递线程数")
+    parser.add_argument('--latency-ms', type=float, default=20, help="模拟 webhook 延迟(毫秒)")
+    parser.add_argument('--rounds', type=int, default=3, help="每个规模的投递轮数")
+    args = parser.parse_args()
+
+    server, base_url = start_webhook_server(args.latency_ms)
+    try:
+        sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+        print_results([measure(base_url, size, args.workers, args.rounds) for size in sizes])
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
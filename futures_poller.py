@@ -0,0 +1,336 @@
+# futures_poller.py
+"""
+资金费率与持仓量批量轮询
+
+每个周期:
+    GET /fapi/v1/premiumIndex            不带 symbol，一次请求返回全部合约的标记价格、指数价格与资金费率（权重10）
+    GET /fapi/v1/openInterest?symbol=X   持仓量没有批量接口，只请求 oi_symbols 中的交易对，
+                                         有界并发（oi_concurrency 个线程，共用连接池）
+按默认配置每分钟约 10 + 2 的请求权重，远低于币安合约 2400/分钟的限制；
+响应头 X-MBX-USED-WEIGHT-1M 超过 weight_budget 时跳过本轮持仓量请求。
+
+结果保存在列式快照 FuturesSnapshot 中: 每列是一个只读 numpy 数组，按 symbols 的顺序排列，
+轮询线程每次生成新快照后整体替换引用，读取方拿到的快照不会再变化，直接使用列数组，无需加锁也无需复制。
+
+告警规则可以使用的变量（见 variables()，没有数据时为 NaN，相关条件不成立）:
+    funding_rate    最近一期资金费率（0.0001 即 0.01%）
+    mark_price      标记价格
+    basis           标记价格相对指数价格的溢价（mark / index - 1）
+    open_interest   持仓量（币）
+    oi_value        持仓价值（美元）
+    oi_change       持仓量相对 oi_change_window 秒前的变化比例
+
+配置在 bot_config.cfg 的 [futures] 节:
+    enabled = true
+    interval = 60                  ; 轮询间隔(秒)
+    oi_symbols = ETHUSDT,BTCUSDT
+    oi_concurrency = 4
+    oi_change_window = 300
+    weight_budget = 1200
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bn_config import get_endpoint, get_setting
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+PREMIUM_COLUMNS = ('mark_price', 'index_price', 'funding_rate', 'next_funding_time')
+OI_COLUMNS = ('open_interest', 'oi_time')
+PREMIUM_WEIGHT = 10  # 不带 symbol 的 premiumIndex 请求权重
+OI_WEIGHT = 1
+
+
+class FuturesSnapshot:
+    """
+    某一时刻全部合约的列式数据（只读）
+
+    Attributes:
+    -----------
+    symbols : tuple of str
+        行顺序
+    columns : dict
+        列名 -> 只读 np.ndarray（float64，缺失为 NaN）
+    updated : float
+        生成时间(秒)
+    """
+
+    def __init__(self, symbols, columns, updated):
+        self.symbols = tuple(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        for values in columns.values():
+            values.setflags(write=False)
+        self.columns = columns
+        self.updated = updated
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def column(self, name):
+        """整列（只读视图，不复制）"""
+        return self.columns[name]
+
+    def row(self, symbol):
+        """单个交易对的全部字段，不存在时返回 None"""
+        i = self.index.get(symbol)
+        if i is None:
+            return None
+        return {name: float(values[i]) for name, values in self.columns.items()}
+
+    def variables(self, symbols=None):
+        """
+        告警规则变量
+
+        Parameters:
+        -----------
+        symbols : sequence of str, optional
+            交易对列表；None 时按 self.symbols 的顺序返回整列（不复制）
+
+        Returns:
+        --------
+        dict
+            变量名 -> 与 symbols 等长的数组
+        """
+        columns = self.columns
+        if symbols is not None:
+            rows = np.array([self.index.get(s, -1) for s in symbols], dtype=np.int64)
+            # 首次轮询完成前快照为空，所有变量为 NaN
+            columns = {name: np.where(rows >= 0, values[rows], np.nan) if len(values)
+                       else np.full(len(rows), np.nan) for name, values in columns.items()}
+        return {name: columns[name] for name in
+                ('funding_rate', 'mark_price', 'basis', 'open_interest', 'oi_value', 'oi_change')}
+
+
+EMPTY_COLUMNS = PREMIUM_COLUMNS + OI_COLUMNS + ('basis', 'oi_value', 'oi_change')
+
+
+def _empty_snapshot():
+    return FuturesSnapshot((), {name: np.zeros(0) for name in EMPTY_COLUMNS}, 0.0)
+
+
+class FuturesPoller:
+    """
+    资金费率 / 持仓量轮询器
+
+    Parameters:
+    -----------
+    interval : float, optional
+        轮询间隔(秒)
+    oi_symbols : sequence of str, optional
+        需要请求持仓量的交易对
+    参数未指定时读取 [futures] 节
+    """
+
+    def __init__(self, interval=None, oi_symbols=None, oi_concurrency=None):
+        self.interval = interval or get_setting('futures', 'interval', 60.0, float)
+        if oi_symbols is None:
+            oi_symbols = get_setting('futures', 'oi_symbols', 'ETHUSDT,BTCUSDT').split(',')
+        self.oi_symbols = [s.strip().upper() for s in oi_symbols if s.strip()]
+        self.oi_concurrency = oi_concurrency or get_setting('futures', 'oi_concurrency', 4, int)
+        self.oi_change_window = get_setting('futures', 'oi_change_window', 300.0, float)
+        self.weight_budget = get_setting('futures', 'weight_budget', 1200, int)
+        self.snapshot = None
+        self.stats = {'polls': 0, 'requests': 0, 'weight': 0, 'errors': 0,
+                      'used_weight_1m': 0, 'last_ms': 0.0, 'skipped_oi': 0}
+        self._session = None
+        self._executor = None
+        self._oi_history = {}  # 交易对 -> [(时间, 持仓量), ...]，只保留 oi_change_window 内
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _get(self, path, params=None, weight=1):
+        if self._session is None:
+            from subscriptions import create_session
+            self._session = create_session(self.oi_concurrency)
+        response = self._session.get(f"{get_endpoint('binance_fapi_url')}{path}",
+                                     params=params, timeout=10)
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['weight'] += weight
+            used = response.headers.get('X-MBX-USED-WEIGHT-1M')
+            if used is not None:
+                self.stats['used_weight_1m'] = int(used)
+        response.raise_for_status()
+        return response.json()
+
+    def fetch_premium_index(self):
+        """一次请求获取全部合约的 premiumIndex"""
+        return self._get('/fapi/v1/premiumIndex', weight=PREMIUM_WEIGHT)
+
+    def fetch_open_interest(self, symbols):
+        """
+        有界并发请求持仓量
+
+        Returns:
+        --------
+        dict
+            交易对 -> (持仓量, 毫秒时间戳)，失败的交易对不包含在内
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.oi_concurrency,
+                                                thread_name_prefix='futures_oi')
+
+        def fetch(symbol):
+            try:
+                data = self._get('/fapi/v1/openInterest', {'symbol': symbol}, OI_WEIGHT)
+                return symbol, (float(data['openInterest']), int(data.get('time', 0)))
+            except Exception as e:
+                logger.warning(f"获取 {symbol} 持仓量失败: {e}")
+                with self._lock:
+                    self.stats['errors'] += 1
+                return symbol, None
+
+        return {symbol: value for symbol, value in self._executor.map(fetch, symbols)
+                if value is not None}
+
+    def build_snapshot(self, premium, open_interest, now=None) -> FuturesSnapshot:
+        """把原始响应转换为列式快照（持仓量只填 oi_symbols 中的行，其余为 NaN）"""
+        now = time.time() if now is None else now
+        premium = [item for item in premium if item.get('symbol')]
+        symbols = [item['symbol'] for item in premium]
+        index = {symbol: i for i, symbol in enumerate(symbols)}
+        for symbol in open_interest:
+            if symbol not in index:
+                index[symbol] = len(symbols)
+                symbols.append(symbol)
+        count = len(symbols)
+        columns = {name: np.full(count, np.nan) for name in EMPTY_COLUMNS}
+        fields = {'mark_price': 'markPrice', 'index_price': 'indexPrice',
+                  'funding_rate': 'lastFundingRate', 'next_funding_time': 'nextFundingTime'}
+        for name, key in fields.items():
+            columns[name][:len(premium)] = [float(item.get(key) or 'nan') for item in premium]
+
+        cutoff = now - self.oi_change_window
+        for symbol, (value, ts_ms) in open_interest.items():
+            i = index[symbol]
+            columns['open_interest'][i] = value
+            columns['oi_time'][i] = ts_ms
+            history = self._oi_history.setdefault(symbol, [])
+            history.append((now, value))
+            while len(history) > 1 and history[1][0] <= cutoff:
+                history.pop(0)
+            # 最早的样本距今不足 oi_change_window 时仍用它计算，刚启动时也有数据
+            if len(history) > 1 and history[0][1]:
+                columns['oi_change'][i] = value / history[0][1] - 1
+
+        previous = self.snapshot
+        if previous is not None:
+            # 本轮没取到持仓量（失败或超出权重预算）的交易对沿用上一份快照的值
+            for symbol in self.oi_symbols:
+                i, j = index.get(symbol), previous.index.get(symbol)
+                if symbol in open_interest or i is None or j is None:
+                    continue
+                for name in ('open_interest', 'oi_time', 'oi_change'):
+                    columns[name][i] = previous.columns[name][j]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns['basis'] = columns['mark_price'] / columns['index_price'] - 1
+        columns['oi_value'] = columns['open_interest'] * columns['mark_price']
+        return FuturesSnapshot(symbols, columns, now)
+
+    def poll(self):
+        """
+        轮询一次并替换快照
+
+        Returns:
+        --------
+        FuturesSnapshot or None
+            失败时返回 None，保留上一份快照
+        """
+        started = time.perf_counter()
+        try:
+            premium = self.fetch_premium_index()
+        except Exception as e:
+            logger.warning(f"获取资金费率失败: {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+            return None
+        if self.stats['used_weight_1m'] > self.weight_budget:
+            # 本进程或同一IP的其他程序用掉了太多权重，本轮只更新资金费率
+            open_interest = {}
+            with self._lock:
+                self.stats['skipped_oi'] += 1
+        else:
+            open_interest = self.fetch_open_interest(self.oi_symbols)
+        snapshot = self.build_snapshot(premium, open_interest)
+        self.snapshot = snapshot  # 引用替换是原子的，读取方看到的要么是旧快照要么是新快照
+        with self._lock:
+            self.stats['polls'] += 1
+            self.stats['last_ms'] = (time.perf_counter() - started) * 1000
+        return snapshot
+
+    def current(self) -> FuturesSnapshot:
+        """最新快照，尚未轮询成功时为空快照"""
+        return self.snapshot or _empty_snapshot()
+
+    def variables(self, symbols):
+        """告警规则变量，见 FuturesSnapshot.variables"""
+        return self.current().variables(symbols)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """启动后台轮询线程（[futures] enabled = false 时不启动）"""
+        if get_setting('futures', 'enabled', 'true').lower() != 'true':
+            return
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name='futures_poller')
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self):
+        with self._lock:
+            snapshot = self.snapshot
+            return dict(self.stats, symbols=len(snapshot) if snapshot else 0,
+                        age=time.time() - snapshot.updated if snapshot else None)
+
+    def format_status(self, symbol='ETHUSDT'):
+        """状态报告中的一行摘要，没有数据时返回空字符串"""
+        row = self.current().row(symbol)
+        if row is None:
+            return ''
+        text = f"资金费率 {row['funding_rate'] * 100:.4f}%，标记价格 {row['mark_price']:.2f}"
+        if not np.isnan(row['open_interest']):
+            text += f"，持仓量 {row['open_interest']:,.0f}（${row['oi_value'] / 1e6:,.1f}M）"
+        if not np.isnan(row['oi_change']):
+            text += f"，{self.oi_change_window / 60:.0f}分钟变化 {row['oi_change'] * 100:+.2f}%"
+        return text
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def get_poller() -> FuturesPoller:
+    """进程内共享的轮询器（延迟创建，需调用 start() 才开始轮询）"""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = FuturesPoller()
+        return _poller
+
+
+# 使用示例（可配合 bn_simulator: BOT_BINANCE_FAPI_URL=http://127.0.0.1:8080）
+if __name__ == "__main__":
+    poller = get_poller()
+    snapshot = poller.poll()
+    if snapshot is not None:
+        print(f"{len(snapshot)} 个合约，耗时 {poller.stats['last_ms']:.0f} ms")
+        print(poller.format_status('ETHUSDT'))
+        print(poller.variables(['ETHUSDT', 'BTCUSDT']))
+    print(poller.get_stats())
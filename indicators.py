@@ -0,0 +1,363 @@
+# indicators.py
+"""
+指标流水线
+
+每个指标在注册表中声明自己的输入（K线列或其他指标），流水线据此建立依赖图:
+    hlc3 ─> wt_esa ─> wt_dev ─> wt_ci ─> wt1 ─> wt2      (WaveTrend)
+    close ─> diff ─> rsi_14                              (RSI)
+WaveTrend 与 RSI 共用 close、diff 等中间结果，新增指标时也只需声明输入即可复用。
+
+中间结果按 (交易对, 周期) 缓存，并记录所属的最新K线；同一根K线内再次计算时，
+只有输入列发生变化的指标（及其下游）才会重算，例如只有成交量变化时价格类指标直接复用缓存。
+每个输入列与指标都有版本号，缓存的指标记录计算时各输入的版本，即使上次计算请求的是
+另一组指标（没有顺带更新它），输入变化后再次请求时也会重算。
+
+计算方式与 TradingView 一致:
+    EMA 以首个有效值为初始值递推（pandas ewm(adjust=False)）
+    RSI 使用 Wilder 平滑，首个平均值为前 period 根的简单平均（与 talib.RSI 相同）
+    WaveTrend 为 LazyBear 版本，通道长度/平均长度可在 [indicators] 节配置
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from bn_config import get_setting
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+logger = logging.getLogger(__name__)
+
+SOURCE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+WT_CHANNEL_LENGTH = 10  # n1
+WT_AVERAGE_LENGTH = 21  # n2
+WT_SIGNAL_LENGTH = 4
+RSI_PERIOD = 14
+
+
+def ema(values, span):
+    """指数移动平均，从首个有效值开始递推，之前为 NaN"""
+    return pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def sma(values, length):
+    """简单移动平均"""
+    return pd.Series(values).rolling(length).mean().to_numpy()
+
+
+def wilder_rsi(diff, period=RSI_PERIOD):
+    """
+    Wilder RSI
+
+    Parameters:
+    -----------
+    diff : np.ndarray
+        收盘价一阶差分（首个元素为 NaN）
+    period : int
+        周期
+
+    Returns:
+    --------
+    np.ndarray
+        RSI 序列，前 period 根为 NaN
+    """
+    result = np.full(len(diff), np.nan)
+    if len(diff) <= period:
+        return result
+    gains = np.where(diff > 0, diff, 0.0)
+    losses = np.where(diff < 0, -diff, 0.0)
+    # 首个平均值取前 period 个差分的简单平均，之后按 1/period 递推
+    gains[:period] = np.nan
+    losses[:period] = np.nan
+    gains[period] = np.mean(np.where(diff[1:period + 1] > 0, diff[1:period + 1], 0.0))
+    losses[period] = np.mean(np.where(diff[1:period + 1] < 0, -diff[1:period + 1], 0.0))
+    avg_gain = pd.Series(gains).ewm(alpha=1 / period, adjust=False).mean().to_numpy()
+    avg_loss = pd.Series(losses).ewm(alpha=1 / period, adjust=False).mean().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    result[:period] = np.nan
+    return result
+
+
+class Indicator:
+    """
+    注册表中的一个指标
+
+    Parameters:
+    -----------
+    name : str
+        指标名
+    inputs : tuple of str
+        输入列或其他指标名，按顺序作为 func 的位置参数
+    func : callable
+        func(*inputs, **params) -> np.ndarray，结果长度与K线相同
+    params : dict
+        固定参数
+    """
+
+    def __init__(self, name, inputs, func, **params):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.func = func
+        self.params = params
+
+    def compute(self, *inputs):
+        return np.asarray(self.func(*inputs, **self.params), dtype=np.float64)
+
+    def __repr__(self):
+        return f"<Indicator {self.name} <- {', '.join(self.inputs)}>"
+
+
+REGISTRY: Dict[str, Indicator] = {}
+
+
+def register(name, inputs, func, **params) -> Indicator:
+    """
+    注册指标（同名覆盖）
+
+    使用示例:
+        register('ema_50', ('close',), ema, span=50)
+    """
+    indicator = REGISTRY[name] = Indicator(name, inputs, func, **params)
+    return indicator
+
+
+def rsi_indicator(period=RSI_PERIOD) -> str:
+    """返回指定周期的RSI指标名，未注册时自动注册"""
+    name = f"rsi_{period}"
+    if name not in REGISTRY:
+        register(name, ('diff',), wilder_rsi, period=period)
+    return name
+
+
+def _register_builtins():
+    n1 = get_setting('indicators', 'wt_channel_length', WT_CHANNEL_LENGTH, int)
+    n2 = get_setting('indicators', 'wt_average_length', WT_AVERAGE_LENGTH, int)
+    register('hlc3', ('high', 'low', 'close'), lambda h, l, c: (h + l + c) / 3)
+    register('diff', ('close',), lambda c: np.concatenate([[np.nan], np.diff(c)]))
+    # WaveTrend (LazyBear)
+    register('wt_esa', ('hlc3',), ema, span=n1)
+    register('wt_dev', ('hlc3', 'wt_esa'), lambda ap, esa, span: ema(np.abs(ap - esa), span), span=n1)
+    register('wt_ci', ('hlc3', 'wt_esa', 'wt_dev'),
+             lambda ap, esa, d: np.divide(ap - esa, 0.015 * d,
+                                          out=np.full(len(ap), np.nan), where=d != 0))
+    register('wt1', ('wt_ci',), ema, span=n2)
+    register('wt2', ('wt1',), sma, length=WT_SIGNAL_LENGTH)
+    rsi_indicator(RSI_PERIOD)
+
+
+_register_builtins()
+
+
+def _bar_time(df):
+    """最新一根K线的开盘时间（DatetimeIndex 或 timestamp 列）"""
+    if 'timestamp' in df.columns:
+        return df['timestamp'].iloc[-1]
+    return df.index[-1]
+
+
+class _Entry:
+    """单个 (交易对, 周期) 的缓存"""
+
+    def __init__(self):
+        self.bar = None
+        self.length = 0
+        self.sources: Dict[str, np.ndarray] = {}
+        self.values: Dict[str, np.ndarray] = {}
+        self.versions: Dict[str, int] = {}  # 输入列/指标名 -> 版本号，每次变化加1
+        self.built_from: Dict[str, Tuple[int, ...]] = {}  # 指标名 -> 计算时各输入的版本
+        self.lock = threading.Lock()
+
+    def bump(self, name):
+        self.versions[name] = self.versions.get(name, 0) + 1
+
+
+class IndicatorPipeline:
+    """
+    按依赖图计算指标并缓存中间结果（线程安全）
+
+    Parameters:
+    -----------
+    registry : dict, optional
+        指标注册表，默认为模块级 REGISTRY
+    """
+
+    def __init__(self, registry=None):
+        self.registry = REGISTRY if registry is None else registry
+        self._plans: Dict[Tuple[str, ...], List[Indicator]] = {}
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._lock = threading.Lock()
+        self.stats = {'evaluations': 0, 'computed': 0, 'reused': 0, 'total_ms': 0.0}
+
+    def plan(self, names: Iterable[str]) -> List[Indicator]:
+        """
+        计算 names 及其全部上游指标的拓扑顺序（按请求的指标集合缓存）
+
+        Raises:
+        -------
+        KeyError
+            指标未注册
+        ValueError
+            依赖图中有环
+        """
+        key = tuple(sorted(names))
+        order = self._plans.get(key)
+        if order is not None:
+            return order
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done or name in SOURCE_COLUMNS:
+                return
+            if name in visiting:
+                raise ValueError(f"指标依赖存在环: {name}")
+            if name not in self.registry:
+                raise KeyError(f"未注册的指标: {name}")
+            visiting.add(name)
+            indicator = self.registry[name]
+            for dep in indicator.inputs:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(indicator)
+
+        for name in key:
+            visit(name)
+        with self._lock:
+            self._plans[key] = order
+        return order
+
+    def _entry(self, symbol, interval):
+        key = (symbol.replace('/', '').upper(), interval)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            return entry
+
+    def evaluate(self, symbol, interval, df, names) -> Dict[str, np.ndarray]:
+        """
+        计算指标
+
+        Parameters:
+        -----------
+        symbol : str
+            交易对
+        interval : str
+            K线周期
+        df : pd.DataFrame
+            OHLCV数据（DatetimeIndex，或含 timestamp 列）
+        names : iterable of str
+            需要的指标名
+
+        Returns:
+        --------
+        dict
+            指标名 -> 与 df 等长的 np.ndarray（只读共享，调用方不要修改）
+        """
+        started = time.perf_counter()
+        names = list(names)
+        order = self.plan(names)
+        entry = self._entry(symbol, interval)
+        bar = _bar_time(df)
+        with entry.lock:
+            if entry.bar != bar or entry.length != len(df):
+                # 新K线或长度变化: 全部重算
+                entry.values.clear()
+                entry.sources.clear()
+                entry.built_from.clear()
+                entry.bar, entry.length = bar, len(df)
+            for column in SOURCE_COLUMNS:
+                if column not in df.columns:
+                    continue
+                values = df[column].to_numpy(dtype=np.float64)
+                cached = entry.sources.get(column)
+                if cached is None or not np.array_equal(cached, values, equal_nan=True):
+                    # to_numpy 可能返回 df 的视图，保存副本，调用方原地修改 df 后才能检测到变化
+                    entry.sources[column] = values.copy()
+                    entry.bump(column)
+            computed = 0
+            for indicator in order:
+                # 与计算时的输入版本一致才复用（上游已按拓扑顺序先更新）
+                inputs = tuple(entry.versions.get(i, 0) for i in indicator.inputs)
+                if indicator.name in entry.values and entry.built_from.get(indicator.name) == inputs:
+                    continue
+                args = [entry.sources[i] if i in SOURCE_COLUMNS else entry.values[i]
+                        for i in indicator.inputs]
+                entry.values[indicator.name] = indicator.compute(*args)
+                entry.built_from[indicator.name] = inputs
+                entry.bump(indicator.name)
+                computed += 1
+            result = {name: entry.values[name] for name in names}
+        with self._lock:
+            self.stats['evaluations'] += 1
+            self.stats['computed'] += computed
+            self.stats['reused'] += len(order) - computed
+            self.stats['total_ms'] += (time.perf_counter() - started) * 1000
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, keys=len(self._entries))
+
+    def nbytes(self):
+        """缓存的输入序列与指标结果占用的字节数"""
+        with self._lock:
+            entries = list(self._entries.values())
+        total = 0
+        for entry in entries:
+            # 与 evaluate 使用同一把锁，避免在计算线程写入缓存时遍历字典
+            with entry.lock:
+                total += sum(a.nbytes for a in (*entry.sources.values(), *entry.values.values()))
+        return total
+
+
+_pipeline = None
+
+
+def get_pipeline() -> IndicatorPipeline:
+    """进程内共享的指标流水线"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = IndicatorPipeline()
+    return _pipeline
+
+
+def calculate_wavetrend(df, symbol='ETHUSDT', interval='30m') -> Tuple[float, float]:
+    """
+    最新一根K线的 WaveTrend 值
+
+    Returns:
+    --------
+    tuple
+        (wt1, wt2)
+    """
+    values = get_pipeline().evaluate(symbol, interval, df, ['wt1', 'wt2'])
+    return float(values['wt1'][-1]), float(values['wt2'][-1])
+
+
+def calculate_rsi(df, symbol='ETHUSDT', interval='15m', period=RSI_PERIOD) -> np.ndarray:
+    """RSI 序列（与 df 等长）"""
+    name = rsi_indicator(period)
+    return get_pipeline().evaluate(symbol, interval, df, [name])[name]
+
+
+# 使用示例
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.003, 500)))
+    df = pd.DataFrame({'open': close, 'high': close * 1.002, 'low': close * 0.998,
+                       'close': close, 'volume': rng.uniform(10, 100, 500)},
+                      index=pd.date_range('2024-01-01', periods=500, freq='30min'))
+    pipeline = get_pipeline()
+    print(f"计算顺序: {[i.name for i in pipeline.plan(['wt2', 'rsi_14'])]}")
+    wt1, wt2 = calculate_wavetrend(df)
+    print(f"WT1: {wt1:.2f}, WT2: {wt2:.2f}, RSI: {calculate_rsi(df, interval='30m')[-1]:.2f}")
+    df.iloc[-1, df.columns.get_loc('volume')] += 1  # 只有成交量变化，价格类指标全部复用
+    calculate_wavetrend(df)
+    print(pipeline.get_stats())
@@ -0,0 +1,389 @@
+# kline_archive.py
+"""
+本地K线归档
+
+每个 (交易对, 周期) 一个只追加的定长二进制文件 data/klines/<SYMBOL>_<interval>.bin，
+记录按开盘时间升序排列，每条48字节:
+    open_time int64(毫秒), open, high, low, close, volume float64
+只归档已收盘的K线。
+
+读取通过 numpy.memmap 只读映射整个文件，按 open_time 二分查找 (O(log n)) 切片，
+不把文件读入内存；多个进程映射同一文件时共享操作系统页缓存，不产生拷贝。
+文件追加后自动重新映射；早于现有数据的回补会整体重写并原子替换文件，
+已持有旧映射的读者继续读旧文件，下次读取时切换到新文件。
+写入（追加或重写）期间持有同名 .lock 文件的 fcntl 排他锁，机器人与 kline_backfill.py
+等多个写者不会互相覆盖。
+
+交易所确认没有数据的区间（上市之前、停机期间）记录在同名的 .empty 文件中（JSON），
+missing_ranges 不再把这些区间当作缺口，回补时不会重复请求。
+
+使用示例:
+    python3 kline_archive.py ETHUSDT 30m
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from bn_config import get_setting
+from lazy_import import lazy_import
+
+pd = lazy_import('pandas')  # 只在转换 DataFrame 时才需要
+
+ARCHIVE_ROOT = os.path.join('data', 'klines')
+
+KLINE_DTYPE = np.dtype([
+    ('open_time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+INTERVAL_MS = {
+    '1m': 60_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '4h': 14_400_000, '1d': 86_400_000, '1w': 604_800_000,
+}
+# 币安周线从周一 00:00 UTC 开始，1970-01-01 是周四
+INTERVAL_OFFSET_MS = {'1w': 4 * 86_400_000}
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def rows_to_records(rows):
+    """(open_time_ms, o, h, l, c, v) 行转为结构化数组"""
+    records = np.empty(len(rows), dtype=KLINE_DTYPE)
+    if len(rows):
+        arr = np.asarray(rows, dtype=np.float64)
+        records['open_time'] = arr[:, 0].astype(np.int64)
+        for i, name in enumerate(PRICE_FIELDS, start=1):
+            records[name] = arr[:, i]
+    return records
+
+
+def find_gaps(times, first, end, step) -> List[Tuple[int, int]]:
+    """
+    升序开盘时间 times 在 [first, end) 内未覆盖的区间
+
+    Returns:
+    --------
+    list of (int, int)
+        缺口列表，每个区间为 [开始开盘时间, 结束开盘时间)
+    """
+    if not len(times):
+        return [(first, end)] if first < end else []
+    ranges = []
+    if times[0] > first:
+        ranges.append((first, int(times[0])))
+    for i in np.nonzero(np.diff(times) > step)[0]:
+        ranges.append((int(times[i]) + step, int(times[i + 1])))
+    if times[-1] + step < end:
+        ranges.append((int(times[-1]) + step, end))
+    return ranges
+
+
+def subtract_ranges(ranges, holes) -> List[Tuple[int, int]]:
+    """从区间列表 ranges 中扣除 holes 覆盖的部分（两者均为 [start, end) 列表）"""
+    result = []
+    for start, end in ranges:
+        for hole_start, hole_end in sorted(holes):
+            if hole_end <= start or hole_start >= end:
+                continue
+            if hole_start > start:
+                result.append((start, hole_start))
+            start = max(start, hole_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def records_to_dataframe(records):
+    """结构化数组转为与 bn_eth.get_eth_data 相同格式的 DataFrame（会拷贝数据）"""
+    df = pd.DataFrame({name: np.array(records[name]) for name in PRICE_FIELDS},
+                      index=pd.to_datetime(np.array(records['open_time']), unit='ms'))
+    df.index.name = 'open_time'
+    return df
+
+
+class KlineArchive:
+    """
+    单个 (交易对, 周期) 的K线归档文件
+
+    Parameters:
+    -----------
+    symbol : str
+        交易对
+    interval : str
+        K线时间单位
+    root : str, optional
+        归档根目录，默认读取 [archive] root，未配置时为 data/klines
+    """
+
+    def __init__(self, symbol, interval, root=None):
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"不支持的时间单位: {interval}")
+        self.symbol = symbol.upper()
+        self.interval = interval
+        self.step = INTERVAL_MS[interval]
+        self.offset = INTERVAL_OFFSET_MS.get(interval, 0)
+        root = root or get_setting('archive', 'root', ARCHIVE_ROOT)
+        self.path = os.path.join(root, f"{self.symbol}_{interval}.bin")
+        self.empty_path = os.path.join(root, f"{self.symbol}_{interval}.empty")
+        self.lock_path = os.path.join(root, f"{self.symbol}_{interval}.lock")
+        self._map = None
+        self._map_key = None  # (inode, 记录数)，变化时重新映射
+        self._lock = threading.Lock()  # 只保护映射缓存；写者之间由 _write_lock 互斥，需在它之后获取
+
+    @contextmanager
+    def _write_lock(self):
+        """跨进程的写锁（锁文件独立于数据文件，重写替换数据文件不影响加锁）"""
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def floor(self, ms):
+        """ms 所在K线的开盘时间"""
+        return ms - (ms - self.offset) % self.step
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.path) // KLINE_DTYPE.itemsize
+        except OSError:
+            return 0
+
+    def records(self) -> np.ndarray:
+        """
+        全部记录的只读映射（不拷贝）
+
+        Returns:
+        --------
+        np.ndarray
+            KLINE_DTYPE 结构化数组（np.memmap），归档为空时返回空数组
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                self._map = self._map_key = None
+                return np.empty(0, dtype=KLINE_DTYPE)
+            count = st.st_size // KLINE_DTYPE.itemsize
+            key = (st.st_ino, count)
+            if key != self._map_key:
+                self._map = (np.memmap(self.path, dtype=KLINE_DTYPE, mode='r', shape=(count,))
+                             if count else np.empty(0, dtype=KLINE_DTYPE))
+                self._map_key = key
+            return self._map
+
+    def read_all(self) -> np.ndarray:
+        """读取全部记录（拷贝到内存）"""
+        return np.array(self.records())
+
+    @property
+    def first_open_time(self) -> Optional[int]:
+        records = self.records()
+        return int(records['open_time'][0]) if len(records) else None
+
+    @property
+    def last_open_time(self) -> Optional[int]:
+        records = self.records()
+        return int(records['open_time'][-1]) if len(records) else None
+
+    def slice(self, start=None, end=None) -> np.ndarray:
+        """
+        开盘时间在 [start, end) 内的记录，二分查找定位，返回映射上的视图（不拷贝）
+
+        Parameters:
+        -----------
+        start, end : int, optional
+            毫秒时间戳，缺省表示不限
+        """
+        records = self.records()
+        times = records['open_time']
+        lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        hi = len(records) if end is None else int(np.searchsorted(times, end, side='left'))
+        return records[lo:hi]
+
+    def tail(self, limit, end=None) -> np.ndarray:
+        """开盘时间早于 end 的最后 limit 条记录（视图）"""
+        records = self.slice(None, end)
+        return records[max(0, len(records) - limit):]
+
+    def get(self, start=None, end=None, limit=None) -> Optional[pd.DataFrame]:
+        """
+        读取为 DataFrame（格式同 bn_eth.get_eth_data），无数据时返回None
+
+        Parameters:
+        -----------
+        start, end : int, optional
+            毫秒时间戳范围 [start, end)
+        limit : int, optional
+            只取范围内最后 limit 根
+        """
+        records = self.slice(start, end)
+        if limit is not None:
+            records = records[max(0, len(records) - limit):]
+        if not len(records):
+            return None
+        return records_to_dataframe(records)
+
+    def merge(self, records) -> int:
+        """
+        写入记录: 全部晚于现有数据时直接追加；否则与现有数据合并去重后原子重写
+
+        Parameters:
+        -----------
+        records : np.ndarray or list
+            KLINE_DTYPE 结构化数组，或 (open_time_ms, o, h, l, c, v) 行
+
+        Returns:
+        --------
+        int
+            新增的记录数
+        """
+        if not isinstance(records, np.ndarray) or records.dtype != KLINE_DTYPE:
+            records = rows_to_records(records)
+        if not len(records):
+            return 0
+        records = np.sort(records, order='open_time')
+        # 同一批次内去重（分页边界可能重复）
+        keep = np.ones(len(records), dtype=bool)
+        keep[1:] = records['open_time'][1:] != records['open_time'][:-1]
+        records = records[keep]
+
+        with self._write_lock():
+            # 加锁后重新读取现有数据，其他写者可能刚追加或重写过文件
+            last = self.last_open_time
+            if last is None or records['open_time'][0] > last:
+                with open(self.path, 'ab') as f:
+                    records.tofile(f)
+                return len(records)
+
+            existing = self.records()
+            new_mask = ~np.isin(records['open_time'], existing['open_time'])
+            added = int(new_mask.sum())
+            if not added:
+                return 0
+            merged = np.concatenate([existing, records[new_mask]])
+            merged.sort(order='open_time')
+            fd, tmp_path = tempfile.mkstemp(prefix=f".{self.symbol}_{self.interval}-",
+                                            suffix='.tmp', dir=os.path.dirname(self.path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    merged.tofile(f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            return added
+
+    def empty_ranges(self) -> List[Tuple[int, int]]:
+        """已确认交易所没有数据的区间（按开始时间升序）"""
+        try:
+            with open(self.empty_path, 'r', encoding='utf-8') as f:
+                return [(int(a), int(b)) for a, b in json.load(f)]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, TypeError) as e:
+            print(f"读取 {self.empty_path} 失败，忽略已记录的空区间: {e}")
+            return []
+
+    def mark_empty(self, ranges) -> None:
+        """记录交易所没有数据的区间，与已有记录合并后原子写回"""
+        if not ranges:
+            return
+        with self._write_lock():
+            merged = []
+            for start, end in sorted(self.empty_ranges() + [(int(a), int(b)) for a, b in ranges]):
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            tmp_path = self.empty_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(merged, f)
+            os.replace(tmp_path, self.empty_path)
+
+    def missing_ranges(self, start, end) -> List[Tuple[int, int]]:
+        """
+        计算 [start, end) 内尚未归档的K线区间，已确认交易所没有数据的区间（mark_empty）不计入
+
+        Returns:
+        --------
+        list of (int, int)
+            缺失区间列表，每个区间为 [开始开盘时间, 结束开盘时间)
+        """
+        first = self.floor(start)
+        if first < start:
+            first += self.step  # 向上取整到周期边界
+        if first >= end:
+            return []
+        times = np.array(self.slice(first, end)['open_time'])
+        return subtract_ranges(find_gaps(times, first, end, self.step), self.empty_ranges())
+
+
+_archives = {}
+
+
+def get_archive(symbol, interval) -> KlineArchive:
+    """同一进程内复用归档对象（及其映射）"""
+    key = (symbol.upper(), interval)
+    archive = _archives.get(key)
+    if archive is None:
+        archive = _archives[key] = KlineArchive(symbol, interval)
+    return archive
+
+
+def load_klines(symbol='ETHUSDT', interval='30m', start=None, end=None,
+                limit=None) -> Optional[pd.DataFrame]:
+    """
+    从本地归档读取K线，用于回测与指标预热
+
+    Parameters:
+    -----------
+    symbol : str
+        交易对
+    interval : str
+        K线时间单位
+    start, end : int, optional
+        毫秒时间戳范围 [start, end)
+    limit : int, optional
+        只取范围内最后 limit 根
+
+    Returns:
+    --------
+    pd.DataFrame or None
+        OHLCV数据，归档中没有数据时返回None
+    """
+    return get_archive(symbol, interval).get(start, end, limit)
+
+
+# 使用示例
+if __name__ == "__main__":
+    symbol = sys.argv[1] if len(sys.argv) > 1 else 'ETHUSDT'
+    interval = sys.argv[2] if len(sys.argv) > 2 else '30m'
+    archive = get_archive(symbol, interval)
+    if not len(archive):
+        print(f"归档 {archive.path} 为空，请先运行 kline_backfill.py")
+        sys.exit(0)
+    print(f"归档 {archive.path}: 共 {len(archive)} 根K线")
+    print(f"时间范围: {pd.to_datetime(archive.first_open_time, unit='ms')} 到 "
+          f"{pd.to_datetime(archive.last_open_time, unit='ms')}")
+    missing = archive.missing_ranges(archive.first_open_time, archive.last_open_time)
+    print(f"缺口: {len(missing)} 处")
+    print(load_klines(symbol, interval, limit=5))
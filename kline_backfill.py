@@ -0,0 +1,192 @@
+# kline_backfill.py
+"""
+历史K线并发分页回补
+
+币安单次最多返回1000根K线。backfill 把 [start, end) 拆成1000根一页，
+在请求权重预算内用线程池并发拉取，合并去重后写入本地K线归档（kline_archive.py）；
+归档中已有的区间不会重复请求，重复执行只补缺失部分。
+重试后仍失败的页会被跳过（其余页照常写入），下次执行时重新请求；
+请求成功但交易所没有返回K线的区间记入归档的空区间，之后不再请求。
+
+使用示例:
+    python3 kline_backfill.py ETHUSDT 30m 2024-01-01 2024-06-01
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+from bn_config import get_setting
+from bn_eth import fetch_klines
+from kline_archive import KlineArchive, find_gaps, rows_to_records
+
+PAGE_LIMIT = 1000
+KLINES_WEIGHT = 2           # /api/v3/klines 每次请求的权重
+WEIGHT_PER_MINUTE = 1200    # 留给回补使用的每分钟权重预算
+MAX_WORKERS = 4
+MAX_RETRIES = 5
+
+
+class WeightBudget:
+    """
+    按分钟权重限流的令牌桶（线程安全）
+
+    Parameters:
+    -----------
+    weight_per_minute : int
+        每分钟可用的请求权重
+    """
+
+    def __init__(self, weight_per_minute=WEIGHT_PER_MINUTE):
+        self.capacity = weight_per_minute
+        self.rate = weight_per_minute / 60.0
+        self.tokens = float(weight_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, weight=KLINES_WEIGHT):
+        """阻塞直到预算足够"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                wait = (weight - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def to_ms(value) -> int:
+    """毫秒时间戳 / datetime / 日期字符串统一转为毫秒时间戳（无时区视为UTC）"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return int(ts.value // 1_000_000)
+
+
+def split_pages(ranges, step, page_limit=PAGE_LIMIT):
+    """把缺失区间拆成每页最多 page_limit 根K线的 (start, end) 列表"""
+    pages = []
+    for start, end in ranges:
+        for page_start in range(start, end, step * page_limit):
+            pages.append((page_start, min(end, page_start + step * page_limit)))
+    return pages
+
+
+def _fetch_page(symbol, interval, page, budget, session):
+    """拉取单页，429/418 时按 Retry-After 等待，网络错误指数退避重试"""
+    start, end = page
+    for attempt in range(MAX_RETRIES):
+        budget.acquire(KLINES_WEIGHT)
+        try:
+            return fetch_klines(symbol, interval, PAGE_LIMIT, start_time=start,
+                                end_time=end - 1, session=session)
+        except requests.exceptions.RequestException as e:
+            response = getattr(e, 'response', None)
+            if response is not None and response.status_code in (429, 418):
+                delay = float(response.headers.get('Retry-After', 60))
+            else:
+                delay = min(2 ** attempt, 30)
+            if attempt == MAX_RETRIES - 1:
+                raise
+            print(f"回补 {symbol} {interval} 第 {attempt + 1} 次请求失败: {e}，{delay:.0f} 秒后重试")
+            time.sleep(delay)
+
+
+def backfill(symbol, interval, start, end=None, archive=None, max_workers=None,
+             weight_per_minute=None):
+    """
+    回补 [start, end) 内的历史K线到本地归档
+
+    Parameters:
+    -----------
+    symbol : str
+        交易对，如 ETHUSDT
+    interval : str
+        K线时间单位
+    start, end : int or str or datetime
+        时间范围（毫秒时间戳或可被 pandas 解析的时间），end 默认为当前时间
+    archive : KlineArchive, optional
+        目标归档，默认 data/klines/<SYMBOL>_<interval>.bin
+    max_workers : int, optional
+        并发请求数
+    weight_per_minute : int, optional
+        每分钟权重预算
+
+    Returns:
+    --------
+    dict
+        本次回补统计: pages, failed（跳过的页数）, fetched, added, empty（新记录的空区间数）, seconds
+    """
+    symbol = symbol.upper()
+    if archive is None:
+        archive = KlineArchive(symbol, interval)
+    start_ms = to_ms(start)
+    now_ms = int(time.time() * 1000)
+    # 只归档已收盘的K线: 正在形成的那根的开盘时间作为上限
+    end_ms = min(to_ms(end) if end is not None else now_ms, archive.floor(now_ms))
+
+    started = time.time()
+    pages = split_pages(archive.missing_ranges(start_ms, end_ms), archive.step)
+    stats = {'pages': len(pages), 'failed': 0, 'fetched': 0, 'added': 0, 'empty': 0,
+             'seconds': 0.0}
+    if not pages:
+        return stats
+
+    max_workers = max_workers or get_setting('backfill', 'max_workers', MAX_WORKERS, int)
+    budget = WeightBudget(weight_per_minute or
+                          get_setting('backfill', 'weight_per_minute', WEIGHT_PER_MINUTE, int))
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    rows, empty = [], []
+    # 最近一根已收盘K线可能尚未出现在接口中，只把更早的空区间记为交易所无数据
+    settled_ms = end_ms - archive.step
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_fetch_page, symbol, interval, page, budget, session)
+                   for page in pages]
+        for (page_start, page_end), future in zip(pages, futures):
+            try:
+                klines = future.result()
+            except Exception as e:
+                # 单页失败不影响其他页，缺口留待下次回补
+                stats['failed'] += 1
+                print(f"回补 {symbol} {interval} 跳过 {page_start}-{page_end}: {e}")
+                continue
+            page_rows = [(k[0], float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+                         for k in klines if page_start <= k[0] < page_end]
+            rows.extend(page_rows)
+            times = sorted(row[0] for row in page_rows)
+            empty.extend((a, b) for a, b in find_gaps(times, page_start, page_end, archive.step)
+                         if b <= settled_ms)
+    session.close()
+
+    # 页与页之间的边界K线可能重复，merge 内部按开盘时间去重
+    stats['fetched'] = len(rows)
+    stats['added'] = archive.merge(rows_to_records(rows))
+    archive.mark_empty(empty)
+    stats['empty'] = len(empty)
+    stats['seconds'] = time.time() - started
+    print(f"回补 {symbol} {interval}: {stats['pages']} 页（失败 {stats['failed']} 页）, "
+          f"获取 {stats['fetched']} 根, 新增 {stats['added']} 根, "
+          f"无数据区间 {stats['empty']} 处, 耗时 {stats['seconds']:.1f} 秒")
+    return stats
+
+
+# 使用示例
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("用法: python3 kline_backfill.py SYMBOL INTERVAL START [END]")
+        sys.exit(1)
+    backfill(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
+    archive = KlineArchive(sys.argv[1], sys.argv[2])
+    print(f"归档 {archive.path}: 共 {len(archive)} 根K线")
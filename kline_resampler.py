@@ -0,0 +1,229 @@
+# kline_resampler.py
+"""
+多周期K线重采样引擎
+
+每个交易对只维护一份1分钟K线，5m/15m/30m/1h/4h 等高周期K线由它增量推导:
+每次1分钟K线更新时，只重算该分钟所属的那一根高周期K线。
+
+推导规则与币安一致: 开盘取首根1分钟K线的开盘价，最高/最低取极值，收盘取末根收盘价，
+成交量为各分钟成交量之和（用 math.fsum 求和后按交易所精度取整，保证已收盘K线与交易所
+返回值逐位一致）。1分钟数据覆盖之前的历史K线通过 seed 从交易所直接导入。
+"""
+from __future__ import annotations
+
+import bisect
+import math
+import sys
+from typing import Dict, Iterable, List, Optional
+
+from lazy_import import lazy_import
+
+pd = lazy_import('pandas')  # 只在转换 DataFrame 时才需要
+
+# 周期对应的分钟数
+INTERVAL_MINUTES = {
+    '1m': 1, '5m': 5, '15m': 15, '30m': 30, '1h': 60, '4h': 240,
+}
+MINUTE_MS = 60_000
+VOLUME_DECIMALS = 8  # 币安成交量最多8位小数
+
+
+def _is_dataframe(obj):
+    """pandas 尚未导入时不可能是 DataFrame，避免为类型判断触发导入"""
+    return 'pandas' in sys.modules and isinstance(obj, sys.modules['pandas'].DataFrame)
+
+
+class _BarSeries:
+    """按开盘时间排序的K线序列，超出容量时丢弃最旧的K线"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times: List[int] = []
+        self.bars: Dict[int, tuple] = {}
+
+    def upsert(self, open_time, bar):
+        if open_time not in self.bars:
+            if not self.times or open_time > self.times[-1]:
+                self.times.append(open_time)
+            else:
+                bisect.insort(self.times, open_time)
+        self.bars[open_time] = bar
+        while len(self.times) > self.capacity:
+            del self.bars[self.times.pop(0)]
+
+    def range(self, start, stop):
+        """开盘时间在 [start, stop) 内的K线"""
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_left(self.times, stop)
+        return [(t, self.bars[t]) for t in self.times[lo:hi]]
+
+    def tail(self, limit):
+        return [(t, self.bars[t]) for t in self.times[-limit:]]
+
+    def __len__(self):
+        return len(self.times)
+
+
+class KlineResampler:
+    """
+    单个交易对的重采样引擎
+
+    Parameters:
+    -----------
+    symbol : str
+        交易对
+    intervals : iterable of str
+        需要推导的高周期，如 ['15m', '30m']
+    capacity : int
+        每个高周期保留的K线条数
+    base_capacity : int
+        1分钟K线保留条数，至少覆盖最大周期的一根K线
+    """
+
+    def __init__(self, symbol='ETHUSDT', intervals: Iterable[str] = ('5m', '15m', '30m', '1h', '4h'),
+                 capacity=1000, base_capacity=1440):
+        for interval in intervals:
+            if interval not in INTERVAL_MINUTES:
+                raise ValueError(f"不支持的时间单位: {interval}")
+        self.symbol = symbol
+        self.intervals = [i for i in intervals if i != '1m']
+        self.base = _BarSeries(max(base_capacity, max(
+            [INTERVAL_MINUTES[i] for i in self.intervals] or [1]) * 2))
+        self.derived = {interval: _BarSeries(capacity) for interval in self.intervals}
+        self.base_start: Optional[int] = None  # 连续1分钟数据的起点
+        self.updates = 0
+
+    @staticmethod
+    def _aggregate(bars):
+        """把若干根1分钟K线聚合成一根"""
+        volume = round(math.fsum(b[4] for b in bars), VOLUME_DECIMALS)
+        return (bars[0][0], max(b[1] for b in bars), min(b[2] for b in bars),
+                bars[-1][3], volume)
+
+    def _rebuild(self, interval, open_time):
+        """重算 open_time 所属的那根高周期K线，数据不完整时不推导"""
+        step = INTERVAL_MINUTES[interval] * MINUTE_MS
+        bucket = open_time - open_time % step
+        if self.base_start is None or bucket < self.base_start:
+            return False  # 该K线的开头不在1分钟数据内，保留交易所导入的值
+        minutes = self.base.range(bucket, bucket + step)
+        self.derived[interval].upsert(bucket, self._aggregate([b for _, b in minutes]))
+        return True
+
+    def update_1m(self, rows) -> List[str]:
+        """
+        写入1分钟K线（新K线或正在形成的最后一根），并更新受影响的高周期K线
+
+        Parameters:
+        -----------
+        rows : iterable or pd.DataFrame
+            (open_time_ms, open, high, low, close, volume) 序列，
+            或 bn_eth.get_eth_data 格式的 DataFrame
+
+        Returns:
+        --------
+        list of str
+            本次有更新的周期
+        """
+        if _is_dataframe(rows):
+            rows = dataframe_to_rows(rows)
+        touched = set()
+        for row in rows:
+            open_time = int(row[0])
+            bar = tuple(float(x) for x in row[1:6])
+            last = self.base.times[-1] if len(self.base) else None
+            if last is not None and open_time < last and open_time not in self.base.bars:
+                continue  # 早于当前数据且不在缓冲内，忽略
+            if self.base.bars.get(open_time) == bar:
+                continue  # 未变化
+            if last is None or open_time > last + MINUTE_MS:
+                # 首次写入或数据出现缺口: 从这里重新开始连续区间
+                self.base_start = open_time
+            self.base.upsert(open_time, bar)
+            self.updates += 1
+            for interval in self.intervals:
+                if self._rebuild(interval, open_time):
+                    touched.add(interval)
+        # 1分钟缓冲滚动后，连续区间的起点随之后移
+        if len(self.base) and self.base_start is not None and self.base.times[0] > self.base_start:
+            self.base_start = self.base.times[0]
+        return sorted(touched)
+
+    def seed(self, interval, rows):
+        """
+        导入交易所返回的历史K线，作为1分钟数据覆盖范围之前的历史；
+        已由1分钟数据完整推导的K线不会被覆盖
+        """
+        if _is_dataframe(rows):
+            rows = dataframe_to_rows(rows)
+        series = self.base if interval == '1m' else self.derived[interval]
+        for row in rows:
+            open_time = int(row[0])
+            if interval != '1m' and self.base_start is not None and open_time >= self.base_start:
+                continue
+            series.upsert(open_time, tuple(float(x) for x in row[1:6]))
+
+    def missing_minutes(self, now_ms):
+        """距离最新1分钟K线需要补齐的条数（含正在形成的最后一根），无数据时返回None"""
+        if not len(self.base):
+            return None
+        return int((now_ms - self.base.times[-1]) // MINUTE_MS) + 1
+
+    def count(self, interval):
+        return len(self.base if interval == '1m' else self.derived[interval])
+
+    def is_contiguous(self, interval, limit):
+        """最新 limit 根K线是否连续无缺口（缺口通常意味着需要重新 seed）"""
+        series = self.base if interval == '1m' else self.derived[interval]
+        times = series.times[-limit:]
+        if len(times) < limit:
+            return False
+        step = INTERVAL_MINUTES[interval] * MINUTE_MS
+        return times[-1] - times[0] == (len(times) - 1) * step
+
+    def get_rows(self, interval, limit=500):
+        """最新 limit 根K线，[(open_time_ms, open, high, low, close, volume), ...]"""
+        series = self.base if interval == '1m' else self.derived[interval]
+        return [(t,) + bar for t, bar in series.tail(limit)]
+
+    def get(self, interval, limit=500) -> Optional[pd.DataFrame]:
+        """与 bn_eth.get_eth_data 相同格式的 DataFrame，无数据时返回None"""
+        rows = self.get_rows(interval, limit)
+        if not rows:
+            return None
+        return rows_to_dataframe(rows)
+
+    def get_state(self):
+        """导出全部K线，用于状态快照"""
+        return {
+            'symbol': self.symbol,
+            'base_start': self.base_start,
+            'series': {interval: self.get_rows(interval, self.count(interval))
+                       for interval in ['1m'] + self.intervals},
+        }
+
+    def restore_state(self, state, saved_at=None):
+        """从状态快照恢复"""
+        if state.get('symbol') != self.symbol:
+            return
+        series = state.get('series', {})
+        for interval in self.intervals:
+            self.seed(interval, series.get(interval, []))
+        for row in series.get('1m', []):
+            self.base.upsert(int(row[0]), tuple(row[1:6]))
+        self.base_start = state.get('base_start')
+
+
+def dataframe_to_rows(df):
+    """bn_eth.get_eth_data 格式的 DataFrame 转为 (open_time_ms, o, h, l, c, v) 行"""
+    times = df.index.as_unit('ms').asi8.tolist()
+    values = df[['open', 'high', 'low', 'close', 'volume']].values.tolist()
+    return [(t,) + tuple(v) for t, v in zip(times, values)]
+
+
+def rows_to_dataframe(rows):
+    """(open_time_ms, o, h, l, c, v) 行转为 bn_eth.get_eth_data 格式的 DataFrame"""
+    df = pd.DataFrame([r[1:6] for r in rows], columns=['open', 'high', 'low', 'close', 'volume'],
+                      index=pd.to_datetime([r[0] for r in rows], unit='ms'))
+    df.index.name = 'open_time'
+    return df
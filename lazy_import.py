@@ -0,0 +1,137 @@
+# lazy_import.py
+"""
+延迟导入与导入耗时统计
+
+lazy_import 返回一个模块代理，首次访问属性时才真正导入，用于 pandas、ccxt、
+talib、APScheduler 等加载较慢、但启动阶段用不到的依赖:
+
+    pd = lazy_import('pandas')      # 此时不导入
+    df = pd.DataFrame(...)          # 首次使用时导入
+
+ImportTimer 统计本进程内每个模块的导入耗时（类似 python -X importtime，无需额外参数），
+startup_bench.py 用它输出导入耗时报告。
+"""
+import builtins
+import importlib
+import sys
+import threading
+import time
+
+
+class LazyModule:
+    """
+    模块代理，首次访问属性时导入真实模块
+
+    Parameters:
+    -----------
+    name : str
+        模块全名，如 'pandas'、'ccxt.async_support'
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = '已导入' if self.__dict__['_module'] is not None else '未导入'
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+def lazy_import(name):
+    """已导入的模块直接返回，否则返回 LazyModule 代理"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def is_loaded(name):
+    """模块是否已被真正导入"""
+    return name in sys.modules
+
+
+class ImportTimer:
+    """
+    替换 builtins.__import__，记录每个模块首次导入的累计耗时与自身耗时(微秒)
+
+    使用示例:
+        with ImportTimer() as timer:
+            import eth_robot_wt
+        print(timer.report())
+    """
+
+    def __init__(self):
+        self.records = {}  # 模块名 -> [累计耗时, 自身耗时, 嵌套深度]
+        self._stack = []
+        self._original = None
+        self._lock = threading.RLock()
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        with self._lock:
+            self._stack.append(0)
+            started = time.perf_counter()
+            try:
+                return self._original(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = (time.perf_counter() - started) * 1e6
+                children = self._stack.pop()
+                if self._stack:
+                    self._stack[-1] += elapsed
+                if name not in self.records:
+                    self.records[name] = [elapsed, elapsed - children, len(self._stack)]
+
+    def start(self):
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def stop(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def report(self, top=20):
+        """
+        按累计耗时排序的导入报告
+
+        Parameters:
+        -----------
+        top : int
+            只列出耗时最多的 top 个模块
+
+        Returns:
+        --------
+        str
+            文本报告
+        """
+        total = sum(r[0] for r in self.records.values() if r[2] == 0)
+        lines = [f"导入耗时报告（顶层导入合计 {total / 1000:.1f} ms）",
+                 f"{'累计(ms)':>10} {'自身(ms)':>10}  模块"]
+        ranked = sorted(self.records.items(), key=lambda item: item[1][0], reverse=True)
+        for name, (cumulative, own, _) in ranked[:top]:
+            lines.append(f"{cumulative / 1000:>10.1f} {own / 1000:>10.1f}  {name}")
+        return '\n'.join(lines)
@@ -0,0 +1,411 @@
+# liquidation_feeds.py
+"""
+多交易所爆仓流适配器
+
+每个交易所一个 LiquidationAdapter，负责地址、订阅请求、应用层心跳，并把交易所自己的推送格式
+归一化为统一的紧凑记录 LiquidationEvent；连接管理（ping/pong、半开检测、退避重连）复用
+bn_stream.ConnectionManager。MultiExchangeFeed 在同一个事件循环中并发运行多个适配器，
+所有事件通过同一个回调进入现有的窗口统计与告警逻辑。
+
+LiquidationEvent 字段:
+    exchange    'binance' / 'bybit' / 'okx'
+    symbol      统一为币安风格，如 ETHUSDT
+    side        被强平订单的方向，与币安 forceOrder 的 S 一致: SELL = 多头被强平，BUY = 空头被强平
+    price       成交/破产价格
+    quantity    数量（币），OKX 的张数已按合约面值换算
+    notional    金额（美元） = price * quantity
+    ts_ms       成交时间（毫秒）
+
+各交易所的格式:
+    binance  wss://fstream.binance.com/ws/!forceOrder@arr    全市场，o.S 即被强平订单方向
+    bybit    wss://stream.bybit.com/v5/public/linear          订阅 allLiquidation.<交易对>，S 为持仓方向（Buy = 多头被强平）
+    okx      wss://ws.okx.com:8443/ws/v5/public               订阅 liquidation-orders/SWAP，sz 为张数
+
+地址可在 [endpoints] 的 bybit_ws_url / okx_ws_url 配置，指向 bn_simulator 即可离线测试，
+每个适配器分别统计消息数、事件数、金额、解析耗时与最近1分钟的事件速率（get_stats）。
+
+配置在 bot_config.cfg 的 [liquidation] 节:
+    exchanges = binance,bybit,okx      ; 默认只有 binance（保持原有的单连接/热备/轮换逻辑）
+    symbols = ETHUSDT                  ; bybit 按交易对订阅
+    okx_contract_values = ETH-USDT-SWAP:0.1,BTC-USDT-SWAP:0.01    ; 追加/覆盖内置的合约面值
+"""
+import asyncio
+import functools
+import json
+import logging
+import time
+from typing import NamedTuple
+
+from bn_config import get_endpoint, get_setting
+from bn_stream import ConnectionManager, OutageTracker
+from burst_detector import EwmaRate
+
+logger = logging.getLogger(__name__)
+
+# OKX 永续合约面值（每张对应的币数量）
+OKX_CONTRACT_VALUES = {
+    'BTC-USDT-SWAP': 0.01, 'ETH-USDT-SWAP': 0.1, 'SOL-USDT-SWAP': 1.0,
+    'BTC-USDC-SWAP': 0.0001, 'ETH-USDC-SWAP': 0.001,
+}
+
+
+class LiquidationEvent(NamedTuple):
+    """归一化后的一笔爆仓"""
+    exchange: str
+    symbol: str
+    side: str
+    price: float
+    quantity: float
+    notional: float
+    ts_ms: int
+
+
+class AdapterStats:
+    """单个适配器的吞吐统计"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.messages = 0
+        self.events = 0
+        self.notional = 0.0
+        self.errors = 0
+        self.skipped = 0
+        self.parse_ns = 0
+        self.last_event_at = None
+        self.lag_ms = None  # 最近一笔的 本地接收时间 - 交易所成交时间
+        self.rate = EwmaRate(60)
+
+    def to_dict(self, connection=None):
+        now = time.time()
+        elapsed = max(now - self.started_at, 1e-9)
+        result = {
+            'messages': self.messages,
+            'events': self.events,
+            'notional': self.notional,
+            'errors': self.errors,
+            'skipped': self.skipped,
+            'events_per_second': self.events / elapsed,
+            'events_per_minute_1m': self.rate.value(now) * 60,
+            'parse_us': self.parse_ns / max(1, self.messages) / 1000,
+            'last_event_at': self.last_event_at,
+            'lag_ms': self.lag_ms,
+        }
+        if connection is not None:
+            result.update(connected=connection.connected, reconnects=connection.reconnect_count)
+        return result
+
+
+class LiquidationAdapter:
+    """
+    交易所爆仓流适配器基类
+
+    子类需要设置 name / endpoint 并实现 parse；需要订阅或应用层心跳时覆盖
+    subscribe_messages / heartbeat_message。
+
+    Parameters:
+    -----------
+    symbols : sequence of str, optional
+        关注的交易对（币安风格），按交易对订阅的交易所使用
+    url : str, optional
+        覆盖 [endpoints] 中的地址
+    """
+
+    name = ''
+    endpoint = ''  # bn_config 中的地址名称
+    path = ''
+    heartbeat_interval = None  # 应用层心跳间隔(秒)，None 表示只用协议层 ping
+
+    def __init__(self, symbols=None, url=None):
+        if symbols is None:
+            symbols = get_setting('liquidation', 'symbols', 'ETHUSDT').split(',')
+        self.symbols = [s.strip().upper() for s in symbols if s.strip()]
+        self.url = url or f"{get_endpoint(self.endpoint)}{self.path}"
+        self.stats = AdapterStats()
+        self.connection = None
+        self._heartbeat_task = None
+
+    def subscribe_messages(self):
+        """连接建立后依次发送的订阅请求"""
+        return []
+
+    def heartbeat_message(self):
+        return None
+
+    def decode(self, message):
+        """原始消息 -> JSON 对象，心跳回复等返回 None"""
+        return json.loads(message)
+
+    def parse(self, data):
+        """
+        把一条推送归一化
+
+        Returns:
+        --------
+        list of LiquidationEvent
+        """
+        raise NotImplementedError
+
+    def handle(self, data, on_event):
+        """解析一条推送并逐笔回调，同时更新统计"""
+        stats = self.stats
+        stats.messages += 1
+        started = time.perf_counter_ns()
+        try:
+            events = self.parse(data)
+        except (KeyError, TypeError, ValueError) as e:
+            stats.errors += 1
+            logger.warning(f"{self.name} 推送格式无法解析: {e}")
+            return
+        finally:
+            stats.parse_ns += time.perf_counter_ns() - started
+        now = time.time()
+        for event in events:
+            stats.events += 1
+            stats.notional += event.notional
+            stats.rate.update(now)
+            stats.last_event_at = now
+            stats.lag_ms = now * 1000 - event.ts_ms
+            on_event(event)
+
+    async def _on_connect(self, websocket):
+        for message in self.subscribe_messages():
+            await websocket.send(json.dumps(message))
+        if self.heartbeat_interval:
+            # 保留引用，避免任务被回收
+            self._heartbeat_task = asyncio.create_task(self._heartbeat(websocket))
+
+    async def _heartbeat(self, websocket):
+        """应用层心跳，连接关闭后自动结束"""
+        message = self.heartbeat_message()
+        try:
+            while True:
+                await asyncio.sleep(self.heartbeat_interval)
+                await websocket.send(message if isinstance(message, str) else json.dumps(message))
+        except Exception:
+            pass
+
+    async def run(self, on_event, stop_event=None, **connection_options):
+        """
+        连接并持续接收，直到 stop_event 被设置
+
+        Parameters:
+        -----------
+        on_event : callable
+            on_event(LiquidationEvent)，在事件循环中同步调用
+        connection_options : dict
+            传给 ConnectionManager 的其他参数（ping_interval、idle_timeout 等）
+        """
+        self.stats = AdapterStats()
+        self.connection = ConnectionManager(
+            self.url, lambda data: self.handle(data, on_event),
+            stop_event=stop_event, on_connect=self._on_connect, decode=self.decode,
+            logger=logging.getLogger(f"{__name__}.{self.name}"), **connection_options)
+        await self.connection.run()
+
+    def get_stats(self):
+        return self.stats.to_dict(self.connection)
+
+
+class BinanceAdapter(LiquidationAdapter):
+    """币安 U 本位合约全市场强平流"""
+
+    name = 'binance'
+    endpoint = 'binance_fstream_url'
+    path = '/ws/!forceOrder@arr'
+
+    def parse(self, data):
+        # 组合流会包一层 {"stream": ..., "data": ...}
+        data = data.get('data', data)
+        order = data['o']
+        price = float(order['p'])
+        quantity = float(order['q'])
+        return [LiquidationEvent('binance', order['s'].upper(), order['S'], price, quantity,
+                                 price * quantity, int(order.get('T') or data.get('E')))]
+
+
+class BybitAdapter(LiquidationAdapter):
+    """Bybit V5 USDT 永续全部强平（allLiquidation.<交易对>）"""
+
+    name = 'bybit'
+    endpoint = 'bybit_ws_url'
+    heartbeat_interval = 20  # Bybit 要求每20秒发送一次 {"op": "ping"}
+
+    def subscribe_messages(self):
+        return [{'op': 'subscribe', 'args': [f"allLiquidation.{s}" for s in self.symbols]}]
+
+    def heartbeat_message(self):
+        return {'op': 'ping'}
+
+    def parse(self, data):
+        if not data.get('topic', '').startswith('allLiquidation.'):
+            return []  # 订阅/心跳回复
+        events = []
+        for item in data.get('data', []):
+            price = float(item['p'])
+            quantity = float(item['v'])
+            # S 是被强平的持仓方向: Buy(多头) 对应强平卖单
+            side = 'SELL' if item['S'] == 'Buy' else 'BUY'
+            events.append(LiquidationEvent('bybit', item['s'].upper(), side, price, quantity,
+                                           price * quantity, int(item['T'])))
+        return events
+
+
+class OkxAdapter(LiquidationAdapter):
+    """OKX 永续合约强平（liquidation-orders，instType=SWAP）"""
+
+    name = 'okx'
+    endpoint = 'okx_ws_url'
+    heartbeat_interval = 25  # 30秒内没有数据 OKX 会断开连接，发送字符串 ping
+
+    def __init__(self, symbols=None, url=None, contract_values=None):
+        super().__init__(symbols, url)
+        self.contract_values = dict(OKX_CONTRACT_VALUES)
+        for item in get_setting('liquidation', 'okx_contract_values', '').split(','):
+            inst_id, _, value = item.partition(':')
+            if value:
+                self.contract_values[inst_id.strip().upper()] = float(value)
+        self.contract_values.update(contract_values or {})
+
+    def subscribe_messages(self):
+        return [{'op': 'subscribe', 'args': [{'channel': 'liquidation-orders', 'instType': 'SWAP'}]}]
+
+    def heartbeat_message(self):
+        return 'ping'
+
+    def decode(self, message):
+        if message == 'pong':
+            return None
+        return json.loads(message)
+
+    def parse(self, data):
+        if data.get('arg', {}).get('channel') != 'liquidation-orders' or 'data' not in data:
+            return []  # 订阅回复
+        events = []
+        for item in data['data']:
+            inst_id = item['instId']
+            contract_value = self.contract_values.get(inst_id)
+            if contract_value is None:
+                self.stats.skipped += 1  # 面值未知，无法换算金额
+                continue
+            symbol = inst_id.replace('-SWAP', '').replace('-', '')
+            for detail in item.get('details', []):
+                price = float(detail['bkPx'])
+                quantity = float(detail['sz']) * contract_value
+                events.append(LiquidationEvent('okx', symbol, detail['side'].upper(), price,
+                                               quantity, price * quantity, int(detail['ts'])))
+        return events
+
+
+ADAPTERS = {adapter.name: adapter for adapter in (BinanceAdapter, BybitAdapter, OkxAdapter)}
+
+
+def build_adapters(names=None):
+    """
+    按名称创建适配器
+
+    Parameters:
+    -----------
+    names : sequence of str or str, optional
+        交易所名称，默认读取 [liquidation] exchanges
+
+    Raises:
+    -------
+    KeyError
+        未知的交易所
+    """
+    if names is None:
+        names = get_setting('liquidation', 'exchanges', 'binance')
+    if isinstance(names, str):
+        names = names.split(',')
+    adapters = []
+    for name in names:
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in ADAPTERS:
+            raise KeyError(f"未知的交易所: {name}，可选: {', '.join(ADAPTERS)}")
+        adapters.append(ADAPTERS[name]())
+    return adapters
+
+
+class MultiExchangeFeed:
+    """
+    在同一个事件循环中并发运行多个适配器
+
+    Parameters:
+    -----------
+    adapters : list of LiquidationAdapter
+    on_event : callable
+        on_event(LiquidationEvent)，所有交易所的事件都经过这里
+    on_gap : callable, optional
+        所有交易所的连接都断开后有连接恢复时调用 on_gap(start, end)（秒）；
+        单个交易所断线时其他交易所仍在接收，不调用
+    connection_options : dict
+        传给每个 ConnectionManager 的参数
+    """
+
+    def __init__(self, adapters, on_event, stop_event=None, on_gap=None, **connection_options):
+        self.adapters = adapters
+        self.on_event = on_event
+        self.stop_event = stop_event or asyncio.Event()
+        self.outages = OutageTracker(on_gap, logger=logger)
+        self.connection_options = connection_options
+
+    async def _run_adapter(self, adapter):
+        try:
+            await adapter.run(self.on_event, self.stop_event,
+                              on_status=functools.partial(self.outages.update, adapter.name),
+                              **self.connection_options)
+        except Exception as e:
+            # 单个交易所的地址或握手错误不影响其他交易所
+            logger.error(f"{adapter.name} 爆仓流已停止: {e}")
+
+    async def run(self):
+        await asyncio.gather(*(self._run_adapter(adapter) for adapter in self.adapters))
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_stats(self):
+        """每个交易所的吞吐统计"""
+        return {adapter.name: adapter.get_stats() for adapter in self.adapters}
+
+    def format_status(self):
+        """状态报告中的一行摘要，如 'binance 12.0笔/分 | okx 3.1笔/分(断开)'"""
+        parts = []
+        for name, stats in self.get_stats().items():
+            state = '' if stats.get('connected') else '(断开)'
+            parts.append(f"{name} {stats['events_per_minute_1m']:.1f}笔/分{state}")
+        return ' | '.join(parts)
+
+
+# 使用示例: 先启动模拟器 python3 bn_simulator.py --rate 20，再运行
+#   BOT_BINANCE_FSTREAM_URL=ws://127.0.0.1:8765 BOT_BYBIT_WS_URL=ws://127.0.0.1:8765/v5/public/linear \
+#   BOT_OKX_WS_URL=ws://127.0.0.1:8765/ws/v5/public python3 liquidation_feeds.py binance,bybit,okx 10
+if __name__ == "__main__":
+    import sys
+
+    names = sys.argv[1] if len(sys.argv) > 1 else 'binance,bybit,okx'
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    logging.basicConfig(level=logging.WARNING, format='%(name)s %(message)s')
+    totals = {}
+
+    def on_event(event):
+        key = (event.exchange, event.symbol)
+        totals[key] = totals.get(key, 0.0) + event.notional
+
+    async def main():
+        feed = MultiExchangeFeed(build_adapters(names), on_event)
+        task = asyncio.create_task(feed.run())
+        await asyncio.sleep(seconds)
+        feed.stop()
+        task.cancel()  # 接收循环要等到下一条消息或空闲超时才会检查停止标志
+        await asyncio.gather(task, return_exceptions=True)
+        for name, stats in feed.get_stats().items():
+            print(f"{name:<8} 消息 {stats['messages']:>6}  事件 {stats['events']:>6}  "
+                  f"{stats['events_per_second']:>8.1f} 笔/秒  金额 ${stats['notional']:>14,.0f}  "
+                  f"解析 {stats['parse_us']:.1f} us/条  错误 {stats['errors']}  跳过 {stats['skipped']}")
+        for (exchange, symbol), notional in sorted(totals.items())[:12]:
+            print(f"  {exchange:<8} {symbol:<10} ${notional:,.0f}")
+
+    asyncio.run(main())
@@ -0,0 +1,324 @@
+# liquidation_heatmap.py
+"""
+按价格分桶的爆仓热力图
+
+每个交易对一个 PriceHistogram，数据为 numpy 数组 [时间片, 方向, 价格桶]:
+    价格桶    以当前价格为中心、宽度为 bucket_bps 个基点的等宽桶（默认 200 个 × 10bp，覆盖 ±10%）
+    方向      0 = SELL（多头被强平），1 = BUY（空头被强平），即 forceOrder 的 S 字段
+    时间片    window 秒分成 slices 片的环形缓冲（默认1小时 × 12片），过期的片整体清零
+
+每笔爆仓 O(1): 定位时间片与价格桶后累加金额，同时累加到滚动总和 totals[方向, 价格桶]，
+时间片过期时从 totals 中减去（每片只发生一次）。查询只读 totals，不需要逐片求和。
+
+价格离开中间一半区域时以新价格为中心重新分桶: 按累计分布线性插值把旧桶的金额重新分配到新桶
+（同时修正桶宽为新价格的 bucket_bps），移出范围的金额计入 stats['dropped']。
+
+top_clusters 把相邻 cluster_buckets 个桶合并为一个密集区，取金额的局部峰值中最大的K个（互不重叠）。
+配置在 bot_config.cfg 的 [heatmap] 节:
+    enabled = true          ; 在爆仓告警中附带热力图摘要
+    bucket_bps = 10
+    buckets = 200
+    window = 3600
+    slices = 12
+    cluster_buckets = 3
+    top_k = 3
+"""
+import base64
+import threading
+import time
+
+from bn_config import get_setting
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+SIDES = ('SELL', 'BUY')
+SIDE_NAMES = {'SELL': '多头爆仓', 'BUY': '空头爆仓'}
+
+
+class PriceHistogram:
+    """
+    单个交易对的滚动价格分桶直方图
+
+    Parameters:
+    -----------
+    bucket_bps : float
+        桶宽（基点，相对中心价格）
+    buckets : int
+        桶数
+    window : float
+        统计窗口(秒)
+    slices : int
+        窗口内的时间片数，决定过期的粒度（window/slices 秒）
+    """
+
+    def __init__(self, bucket_bps=10, buckets=200, window=3600, slices=12):
+        self.bucket_bps = bucket_bps
+        self.buckets = buckets
+        self.slice_seconds = window / slices
+        self.data = np.zeros((slices, len(SIDES), buckets))
+        self.totals = np.zeros((len(SIDES), buckets))
+        self.epochs = np.full(slices, -1, dtype=np.int64)  # 每个时间片当前对应的片序号
+        self.low = None    # 第一个桶的下沿
+        self.width = None  # 桶宽(价格)
+        self.stats = {'events': 0, 'rebuckets': 0, 'dropped': 0.0}
+
+    def _slice(self, ts):
+        """返回 ts 所在的时间片下标，必要时清除过期片"""
+        epoch = int(ts // self.slice_seconds)
+        index = epoch % len(self.epochs)
+        current = self.epochs[index]
+        if current != epoch:
+            if epoch < current:
+                return None  # 早于窗口的迟到事件
+            self.totals -= self.data[index]
+            self.data[index] = 0
+            self.epochs[index] = epoch
+        return index
+
+    def expire(self, now):
+        """清除 now 时已超出窗口的时间片（查询前调用）"""
+        oldest = int(now // self.slice_seconds) - len(self.epochs) + 1
+        stale = (self.epochs >= 0) & (self.epochs < oldest)
+        if stale.any():
+            self.totals -= self.data[stale].sum(axis=0)
+            self.data[stale] = 0
+            self.epochs[stale] = -1
+            # 减法累积的舍入误差，保证空桶为0
+            np.maximum(self.totals, 0, out=self.totals)
+
+    def edges(self):
+        return self.low + self.width * np.arange(self.buckets + 1)
+
+    def rebucket(self, center):
+        """以 center 为中心重新分桶，金额按累计分布线性插值分配到新桶"""
+        width = center * self.bucket_bps / 10000
+        low = center - width * self.buckets / 2
+        if self.low is None:
+            self.low, self.width = low, width
+            return
+        old_edges = self.edges()
+        self.low, self.width = low, width
+        new_edges = self.edges()
+        rows = self.data.reshape(-1, self.buckets)
+        before = rows.sum()
+        cumulative = np.concatenate([np.zeros((len(rows), 1)), np.cumsum(rows, axis=1)], axis=1)
+        for i, row in enumerate(cumulative):
+            if row[-1]:
+                rows[i] = np.diff(np.interp(new_edges, old_edges, row))
+        self.totals = self.data.sum(axis=0)
+        self.stats['rebuckets'] += 1
+        self.stats['dropped'] += float(before - rows.sum())
+
+    def add(self, ts, price, value, side):
+        """
+        加入一笔爆仓
+
+        Parameters:
+        -----------
+        ts : float
+            成交时间（秒级时间戳）
+        price : float
+            成交价
+        value : float
+            金额（美元）
+        side : str
+            'SELL' 或 'BUY'
+        """
+        if price <= 0 or side not in SIDES:
+            return
+        if self.low is None:
+            self.rebucket(price)
+        quarter = self.buckets // 4
+        position = (price - self.low) / self.width
+        if not quarter <= position < self.buckets - quarter:
+            # 价格离开中间一半区域，以新价格为中心重新分桶
+            self.rebucket(price)
+            position = (price - self.low) / self.width
+        index = self._slice(ts)
+        if index is None:
+            return
+        bucket = int(position)
+        side_index = SIDES.index(side)
+        self.data[index, side_index, bucket] += value
+        self.totals[side_index, bucket] += value
+        self.stats['events'] += 1
+
+    def top_clusters(self, k=3, side=None, cluster_buckets=3):
+        """
+        金额最大的 k 个价格密集区
+
+        Parameters:
+        -----------
+        k : int
+            返回个数
+        side : str, optional
+            'SELL' / 'BUY'，None 表示两个方向合计
+        cluster_buckets : int
+            每个密集区包含的相邻桶数
+
+        Returns:
+        --------
+        list of tuple
+            [(区间下沿, 区间上沿, 金额), ...]，按金额降序，互不重叠
+        """
+        if self.low is None:
+            return []
+        values = self.totals.sum(axis=0) if side is None else self.totals[SIDES.index(side)]
+        span = max(1, min(cluster_buckets, self.buckets))
+        sums = np.convolve(values, np.ones(span), mode='valid')  # sums[i] = 桶 i..i+span-1
+        # 只取平滑后的局部峰值，同一个密集区不会被拆成多个相邻区间
+        padded = np.concatenate([[-np.inf], sums, [-np.inf]])
+        peaks = np.flatnonzero((sums > padded[:-2]) & (sums >= padded[2:]) & (sums > 0))
+        clusters = []
+        for start in peaks[np.argsort(-sums[peaks])]:
+            if len(clusters) == k:
+                break
+            if any(abs(start - other) < span for other, _ in clusters):
+                continue
+            clusters.append((int(start), float(sums[start])))
+        return [(self.low + self.width * start, self.low + self.width * (start + span), total)
+                for start, total in clusters]
+
+    def to_dict(self):
+        return {
+            'low': self.low, 'width': self.width,
+            'epochs': self.epochs.tolist(),
+            'data': base64.b64encode(self.data.astype(np.float32).tobytes()).decode('ascii'),
+        }
+
+    def load(self, state):
+        """恢复快照（桶数与时间片数须与当前配置一致，否则忽略）"""
+        data = np.frombuffer(base64.b64decode(state['data']), dtype=np.float32)
+        if state.get('low') is None or data.size != self.data.size:
+            return
+        self.low, self.width = state['low'], state['width']
+        self.epochs[:] = state['epochs']
+        self.data[:] = data.reshape(self.data.shape)
+        self.totals = self.data.sum(axis=0)
+        center = self.low + self.width * self.buckets / 2
+        if abs(self.width / center * 10000 - self.bucket_bps) > 1e-6:
+            # 桶宽配置已修改
+            self.rebucket(center)
+
+
+def _format_usd(value):
+    if value >= 1e6:
+        return f"${value / 1e6:.2f}M"
+    if value >= 1e3:
+        return f"${value / 1e3:.0f}K"
+    return f"${value:.0f}"
+
+
+def _format_price(price, width):
+    return f"{price:,.{0 if width >= 5 else 1 if width >= 0.5 else 3}f}"
+
+
+class LiquidationHeatmap:
+    """
+    按交易对管理 PriceHistogram（线程安全）
+
+    参数未指定时读取 [heatmap] 节，含义见模块说明
+    """
+
+    def __init__(self, bucket_bps=None, buckets=None, window=None, slices=None):
+        def setting(value, option, fallback, cast=float):
+            return value if value is not None else get_setting('heatmap', option, fallback, cast)
+
+        self.enabled = get_setting('heatmap', 'enabled', 'true').lower() == 'true'
+        self.bucket_bps = setting(bucket_bps, 'bucket_bps', 10.0)
+        self.buckets = setting(buckets, 'buckets', 200, int)
+        self.window = setting(window, 'window', 3600.0)
+        self.slices = setting(slices, 'slices', 12, int)
+        self.cluster_buckets = get_setting('heatmap', 'cluster_buckets', 3, int)
+        self.top_k = get_setting('heatmap', 'top_k', 3, int)
+        self.symbols = {}
+        self._lock = threading.Lock()
+
+    def _get(self, symbol):
+        histogram = self.symbols.get(symbol)
+        if histogram is None:
+            histogram = self.symbols[symbol] = PriceHistogram(
+                self.bucket_bps, self.buckets, self.window, self.slices)
+        return histogram
+
+    def observe(self, symbol, ts_ms, price, value, side):
+        """记录一笔爆仓（side 为 forceOrder 的 S 字段）"""
+        with self._lock:
+            self._get(symbol).add(ts_ms / 1000, price, value, side)
+
+    def top_clusters(self, symbol, k=None, side=None, now=None):
+        """当前窗口内金额最大的 k 个价格密集区，格式见 PriceHistogram.top_clusters"""
+        now = time.time() if now is None else now
+        with self._lock:
+            histogram = self._get(symbol)
+            histogram.expire(now)
+            return histogram.top_clusters(k or self.top_k, side, self.cluster_buckets)
+
+    def summary(self, symbol, k=None, now=None):
+        """
+        告警消息中附带的热力图摘要
+
+        Returns:
+        --------
+        str
+            按方向列出金额最大的价格区间，窗口内没有爆仓时为空字符串
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            histogram = self._get(symbol)
+            histogram.expire(now)
+            if histogram.low is None:
+                return ''
+            width = histogram.width
+            lines = []
+            for side in SIDES:
+                clusters = histogram.top_clusters(k or self.top_k, side, self.cluster_buckets)
+                if clusters:
+                    parts = [f"{_format_price(lo, width)}-{_format_price(hi, width)} {_format_usd(v)}"
+                             for lo, hi, v in clusters]
+                    lines.append(f"{SIDE_NAMES[side]}: {' | '.join(parts)}")
+        if not lines:
+            return ''
+        return f"近{self.window / 60:.0f}分钟爆仓密集区\n" + '\n'.join(lines)
+
+    def get_stats(self):
+        with self._lock:
+            return {symbol: dict(h.stats, total=float(h.totals.sum()))
+                    for symbol, h in self.symbols.items()}
+
+    def nbytes(self):
+        """各交易对直方图数组占用的字节数"""
+        with self._lock:
+            return sum(h.data.nbytes + h.totals.nbytes + h.epochs.nbytes for h in self.symbols.values())
+
+    def get_state(self):
+        with self._lock:
+            return {symbol: h.to_dict() for symbol, h in self.symbols.items()
+                    if h.low is not None}
+
+    def restore_state(self, state, saved_at=None):
+        """从快照恢复，超出窗口的时间片在下次查询时自动清除"""
+        with self._lock:
+            for symbol, data in state.items():
+                self._get(symbol).load(data)
+
+
+# 使用示例: 1小时合成爆仓，多头集中在 2950 附近，空头集中在 3080 附近
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    heatmap = LiquidationHeatmap()
+    now = time.time()
+    n = 20000
+    prices = np.where(rng.random(n) < 0.5, rng.normal(2950, 5, n), rng.normal(3080, 5, n))
+    sides = np.where(prices < 3000, 'SELL', 'BUY')
+    values = rng.lognormal(8, 1.5, n)
+    started = time.perf_counter()
+    for ts, price, value, side in zip(np.sort(rng.uniform(now - 3600, now, n)), prices, values, sides):
+        heatmap.observe('ETHUSDT', ts * 1000, price, value, str(side))
+    per_event = (time.perf_counter() - started) / n * 1e6
+    started = time.perf_counter()
+    text = heatmap.summary('ETHUSDT', now=now)
+    print(text)
+    print(f"每笔 {per_event:.1f} us，摘要查询 {(time.perf_counter() - started) * 1000:.2f} ms")
+    print(heatmap.get_stats())
@@ -0,0 +1,211 @@
+# liquidation_window.py
+"""
+爆仓告警的共享窗口状态
+
+bn_liquadation（通知）与 bn_liquadation_log（写日志）共用同一套窗口逻辑，各自创建一个
+LiquidationWindow，只在解析推送与发送告警的方式上不同:
+    records       最近的爆仓记录（规则用到的最长窗口，默认5分钟）
+    wt1           由 eth_robot_wt 定时写入的 WT1
+    thresholds    按交易对的自适应阈值（quantile_sketch，样本不足时使用固定阈值）
+    bursts        爆仓速率突发检测（burst_detector，[burst] 节）
+    heatmap       按价格分桶的爆仓密集区（liquidation_heatmap，[heatmap] 节）
+    futures       资金费率/持仓量（futures_poller，进程内共享）
+    throttler     按 (交易对, 规则) 冷却，静默时段见 [throttle] quiet_hours
+"""
+import time
+from collections import deque
+
+import alert_rules
+from alert_throttle import build_throttler
+from burst_detector import BurstDetector
+from futures_poller import get_poller
+from liquidation_heatmap import LiquidationHeatmap
+from memory_monitor import approx_size
+from quantile_sketch import AdaptiveThresholds
+
+RULE = 'liquidation'
+BURST_RULE = 'liquidation_burst'
+TIME_WINDOW = 300  # 5分钟(秒)
+
+
+class LiquidationWindow:
+    """
+    爆仓窗口、阈值、突发检测、热力图与冷却状态
+
+    Parameters:
+    -----------
+    name : str
+        限频配置名（[throttle] 节中可用该名字改用其他策略）
+    cooldown : float
+        默认冷却时间(秒)
+    threshold : float
+        自适应阈值样本不足时使用的固定阈值(美元)
+    time_window : float
+        状态接口统计与快照保留的窗口(秒)
+    """
+
+    def __init__(self, name, cooldown, threshold, time_window=TIME_WINDOW):
+        self.name = name
+        self.cooldown = cooldown
+        self.threshold = threshold
+        self.time_window = time_window
+        self.records = deque()
+        self.wt1 = 50
+        self.thresholds = AdaptiveThresholds(threshold, time_window)
+        self.bursts = BurstDetector()
+        self.heatmap = LiquidationHeatmap()
+        self.futures = get_poller()
+        self.throttler = build_throttler(name, f'cooldown:{cooldown}')
+
+    def set_WT1(self, value):
+        """设置WT1的值"""
+        self.wt1 = value
+
+    def is_suppress_time(self):
+        """检查是否在消息抑制时间段(默认1:00-7:00)"""
+        return self.throttler.quiet()
+
+    def blocked(self, symbol, rule):
+        """静默时段内或该交易对的规则仍在冷却中"""
+        return self.is_suppress_time() or self.throttler.wait_time((symbol, rule)) > 0
+
+    def skip_unobserved(self, start, end):
+        """断线期间（秒）没有观测，这段时间不计入自适应阈值的分布"""
+        self.thresholds.skip(int(start * 1000), int(end * 1000))
+
+    def observe(self, record):
+        """
+        记录一笔爆仓并清理超出窗口的记录
+
+        Returns:
+        --------
+        burst_detector.Burst or None
+            本笔爆仓触发的突发预警
+        """
+        self.records.append(record)
+        self.thresholds.observe(record['symbol'], record['timestamp'], record['total_value'])
+        self.heatmap.observe(record['symbol'], record['timestamp'], record['price'],
+                             record['total_value'], record.get('side', ''))
+        burst = self.bursts.update(record['symbol'], record['timestamp'], record['total_value'])
+
+        # 清理超出时间窗口的记录（规则用到更长的窗口时保留更久）
+        since = time.time() - alert_rules.max_window(RULE, self.time_window)
+        while self.records and self.records[0]['timestamp']/1000 < since:
+            self.records.popleft()
+        return burst
+
+    def variables(self, symbol):
+        """
+        规则变量: WT1、阈值、该交易对各时间窗口内的爆仓总量/笔数，以及资金费率/持仓量
+        （阈值按交易对统计，窗口变量也只统计该交易对，两边口径一致）
+        """
+        variables = {'wt1': self.wt1, 'threshold': self.thresholds.threshold(symbol)}
+        variables.update(alert_rules.window_variables(self.records, symbol=symbol))
+        variables.update(self.futures.variables([symbol]))
+        return variables
+
+    def should_send_alert(self, symbol='ETHUSDT', variables=None):
+        """
+        判断是否满足发送条件（触发条件见 alert_rules.cfg 的 liquidation 组）
+
+        静默时段与冷却期间也计算规则，只丢弃结果: cross_above / prev 等依赖上一次值的规则
+        需要看到每一笔爆仓后的变量，否则冷却结束后会拿很久以前的值比较而误触发
+
+        Parameters:
+        -----------
+        symbol : str
+            交易对
+        variables : dict
+            已计算好的规则变量，默认调用 variables(symbol)
+
+        Returns:
+        --------
+        list of alert_rules.Match
+            触发的规则，空列表表示不发送
+        """
+        if variables is None:
+            variables = self.variables(symbol)
+        matches = alert_rules.evaluate(RULE, [symbol], variables)
+        if matches and self.blocked(symbol, RULE):
+            return []
+        return matches
+
+    def with_heatmap(self, message, symbol):
+        """在告警消息后附带爆仓密集区摘要（[heatmap] enabled = false 时不附带）"""
+        summary = self.heatmap.summary(symbol) if self.heatmap.enabled else ''
+        return f"{message}\n{summary}" if summary else message
+
+    def get_state(self):
+        """导出需要跨重启保留的运行状态（5分钟窗口、冷却时间、WT1）"""
+        return {
+            'liquidation_records': list(self.records),
+            'throttle': self.throttler.get_state(),
+            'thresholds': self.thresholds.get_state(),
+            'bursts': self.bursts.get_state(),
+            'heatmap': self.heatmap.get_state(),
+            'WT1_value': self.wt1,
+        }
+
+    def restore_state(self, state, saved_at=None):
+        """从快照恢复运行状态，已过期的窗口记录直接丢弃"""
+        since = time.time() - self.time_window
+        self.records.clear()
+        self.records.extend(
+            record for record in state.get('liquidation_records', [])
+            if record['timestamp']/1000 >= since
+        )
+        if 'thresholds' in state:
+            self.thresholds.restore_state(state['thresholds'], saved_at)
+        if 'heatmap' in state:
+            self.heatmap.restore_state(state['heatmap'], saved_at)
+        if 'bursts' in state:
+            self.bursts.restore_state(state['bursts'], saved_at)
+        if 'throttle' in state:
+            self.throttler.restore_state(state['throttle'], saved_at)
+        elif state.get('last_sent_time'):
+            # 旧版快照只有全局的最后发送时间
+            self.throttler.record(('ETHUSDT', RULE), state['last_sent_time'])
+        self.wt1 = state.get('WT1_value', self.wt1)
+
+    def get_status(self):
+        """状态接口的爆仓分区: 各交易对的窗口统计、阈值、冷却剩余时间与突发检测速率"""
+        now = time.time()
+        records = list(self.records)
+        since = (now - self.time_window) * 1000
+        symbols = {}
+        for symbol in sorted({r['symbol'] for r in records} | {'ETHUSDT'}):
+            recent = [r for r in records if r['symbol'] == symbol and r['timestamp'] >= since]
+            by_side = {}
+            by_exchange = {}
+            for r in recent:
+                by_side[r.get('side', '')] = by_side.get(r.get('side', ''), 0.0) + r['total_value']
+                exchange = r.get('exchange', 'binance')
+                by_exchange[exchange] = by_exchange.get(exchange, 0.0) + r['total_value']
+            symbols[symbol] = {
+                'window_total': sum(r['total_value'] for r in recent),
+                'window_count': len(recent),
+                'by_side': by_side,
+                'by_exchange': by_exchange,
+                'threshold': self.thresholds.threshold(symbol),
+                'cooldown': {RULE: self.throttler.wait_time((symbol, RULE), now),
+                             BURST_RULE: self.throttler.wait_time((symbol, BURST_RULE), now)},
+                'burst': self.bursts.rates(symbol, now) if self.bursts.enabled else None,
+                'last': recent[-1] if recent else None,
+            }
+        return {
+            'window_seconds': self.time_window,
+            'records': len(records),
+            'WT1': self.wt1,
+            'suppressed': self.is_suppress_time(),
+            'symbols': symbols,
+        }
+
+    def register_status(self, status_board, memory_monitor):
+        """注册状态接口的爆仓分区（每笔爆仓后 mark 更新）与随运行时间增长的数据结构的内存指标"""
+        status_board.register(RULE, self.get_status, interval=5)
+        memory_monitor.register_gauge('liquidation_records',
+                                      lambda: (len(self.records), approx_size(self.records)))
+        memory_monitor.register_gauge('heatmap', lambda: (len(self.heatmap.symbols), self.heatmap.nbytes()))
+        memory_monitor.register_gauge('burst_symbols', lambda: len(self.bursts.symbols))
+        memory_monitor.register_gauge('throttle_keys',
+                                      lambda: (len(self.throttler.store), self.throttler.store.nbytes()))
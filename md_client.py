@@ -0,0 +1,221 @@
+# md_client.py
+"""
+行情守护进程（md_daemon.py）的本地客户端
+
+通过 Unix socket 订阅 (交易对, 周期)，守护进程返回共享内存名称；之后的每次读取
+都直接从共享内存拷贝最新K线，不产生任何网络请求或交易所请求权重。
+
+共享内存布局（小端, 全部8字节）:
+    header: int64[4]  = [seq, count, capacity, last_update_ms]
+    rows:   float64[capacity, 6] = open_time_ms, open, high, low, close, volume
+seq 为顺序锁: 写入期间为奇数，读者发现 seq 为奇数或读前读后不一致时重读。
+"""
+import json
+import socket
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from bn_config import get_setting
+
+HEADER_FIELDS = 4
+ROW_FIELDS = 6
+DEFAULT_SOCKET_PATH = '/tmp/eth_md.sock'
+
+
+def buffer_size(capacity):
+    """共享内存所需字节数"""
+    return 8 * (HEADER_FIELDS + capacity * ROW_FIELDS)
+
+
+def map_buffer(shm, capacity):
+    """把共享内存映射为 (header, rows) 两个 numpy 视图"""
+    header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+    rows = np.ndarray((capacity, ROW_FIELDS), dtype=np.float64, buffer=shm.buf,
+                      offset=8 * HEADER_FIELDS)
+    return header, rows
+
+
+def attach_shared_memory(name):
+    """
+    只读方式挂载已有的共享内存，不注册到 resource_tracker，
+    避免客户端退出时误删守护进程的共享内存
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 不支持 track 参数
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedKlineView:
+    """守护进程某个 (交易对, 周期) K线缓冲区的只读视图"""
+
+    def __init__(self, shm_name, capacity):
+        self.shm = attach_shared_memory(shm_name)
+        self.capacity = capacity
+        self.header, self.rows = map_buffer(self.shm, capacity)
+
+    @property
+    def last_update_ms(self):
+        return int(self.header[3])
+
+    def read(self, limit, retries=1000):
+        """
+        在顺序锁保护下拷贝最新 limit 行
+
+        Returns:
+        --------
+        np.ndarray
+            形状为 (n, 6) 的数组拷贝
+        """
+        for _ in range(retries):
+            seq = int(self.header[0])
+            if seq % 2:
+                time.sleep(0)
+                continue
+            count = int(self.header[1])
+            rows = self.rows[max(0, count - limit):count].copy()
+            if int(self.header[0]) == seq:
+                return rows
+        raise RuntimeError("共享内存读取冲突次数过多")
+
+    def close(self):
+        self.header = self.rows = None
+        self.shm.close()
+
+
+def rows_to_dataframe(rows):
+    """把共享内存中的行转换为与 bn_eth.get_eth_data 相同格式的 DataFrame"""
+    df = pd.DataFrame(rows[:, 1:], columns=['open', 'high', 'low', 'close', 'volume'],
+                      index=pd.to_datetime(rows[:, 0].astype(np.int64), unit='ms'))
+    df.index.name = 'open_time'
+    return df
+
+
+class MarketDataClient:
+    """
+    行情守护进程客户端
+
+    Parameters:
+    -----------
+    socket_path : str
+        守护进程的 Unix socket 路径
+    max_staleness : float
+        共享内存超过多少秒未更新视为守护进程失效(秒)
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, max_staleness=60.0):
+        self.socket_path = socket_path
+        self.max_staleness = max_staleness
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def _request(self, payload):
+        """发送一条JSON请求并读取一行JSON响应"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(30)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(payload).encode('utf-8') + b'\n')
+            data = b''
+            while not data.endswith(b'\n'):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        response = json.loads(data.decode('utf-8'))
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error', '守护进程返回错误'))
+        return response
+
+    def subscribe(self, symbol, interval):
+        """订阅并挂载共享内存，已订阅时直接返回视图"""
+        key = (symbol, interval)
+        with self._lock:
+            view = self._views.get(key)
+            if view is None:
+                response = self._request({'op': 'subscribe', 'symbol': symbol,
+                                          'interval': interval})
+                view = SharedKlineView(response['shm'], response['capacity'])
+                self._views[key] = view
+            return view
+
+    def _drop(self, key):
+        with self._lock:
+            view = self._views.pop(key, None)
+        if view is not None:
+            view.close()
+
+    def get_kline_data(self, symbol, interval, limit=500):
+        """
+        读取最新K线
+
+        Returns:
+        --------
+        pd.DataFrame or None
+            与 bn_eth.get_eth_data 相同格式，守护进程不可用时返回None
+        """
+        key = (symbol, interval)
+        for _ in range(2):
+            try:
+                view = self.subscribe(symbol, interval)
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"行情守护进程订阅失败: {e}")
+                return None
+            age = time.time() - view.last_update_ms / 1000
+            if age <= self.max_staleness:
+                try:
+                    rows = view.read(limit)
+                except RuntimeError as e:
+                    # 守护进程持续写入时顺序锁重读失败，本次交由调用方改走REST
+                    print(f"行情守护进程读取失败: {e}")
+                    return None
+                return rows_to_dataframe(rows) if len(rows) else None
+            # 数据过旧: 守护进程可能已重启，重新订阅一次
+            self._drop(key)
+        print("行情守护进程数据过旧")
+        return None
+
+    def stats(self):
+        """查询守护进程统计信息"""
+        return self._request({'op': 'stats'})
+
+
+_client = None
+
+
+def get_client() -> MarketDataClient:
+    """按配置创建全局客户端（延迟初始化）"""
+    global _client
+    if _client is None:
+        socket_path = get_setting('market_data', 'socket_path', DEFAULT_SOCKET_PATH)
+        _client = MarketDataClient(socket_path)
+    return _client
+
+
+def get_kline_data(symbol: str = 'ETHUSDT', interval: str = '30m',
+                   limit: int = 500) -> Optional[pd.DataFrame]:
+    """
+    与 bn_eth.get_eth_data 等价的便捷函数，数据来自本地行情守护进程
+
+    Parameters:
+    -----------
+    symbol : str
+        交易对
+    interval : str
+        K线时间单位
+    limit : int
+        获取的数据条数
+
+    Returns:
+    --------
+    pd.DataFrame or None
+        OHLCV数据，守护进程不可用时返回None
+    """
+    return get_client().get_kline_data(symbol, interval, limit)
@@ -0,0 +1,316 @@
+# md_daemon.py
+"""
+本地行情守护进程
+
+唯一持有交易所连接的进程: 每个交易对每轮只增量拉取一次1分钟K线，5m~4h 由
+kline_resampler 推导（1d/1w 单独拉取），K线写入共享内存；eth_robot_wt、rsi_notify 等本地客户端通过 Unix socket 订阅后
+直接读共享内存（见 md_client.py），新增消费者不增加任何交易所请求。
+
+协议: 每行一个JSON请求，返回一行JSON
+    {"op": "subscribe", "symbol": "ETHUSDT", "interval": "30m"}
+        -> {"ok": true, "shm": "<共享内存名>", "capacity": 1000}
+    {"op": "stats"} -> {"ok": true, "buffers": [...], "exchange_requests": N}
+
+使用示例:
+    python3 md_daemon.py
+    # bot_config.cfg 中配置 [market_data] socket_path = /tmp/eth_md.sock 后，
+    # bn_eth.get_eth_data 与 rsi_notify 自动改为从守护进程读取
+"""
+import asyncio
+import json
+import os
+import signal
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import requests
+
+from bn_config import get_setting
+from bn_eth import fetch_klines, INTERVAL_SECONDS
+from kline_resampler import KlineResampler, INTERVAL_MINUTES
+from md_client import DEFAULT_SOCKET_PATH, ROW_FIELDS, buffer_size, map_buffer
+
+# 由1分钟K线推导的周期
+RESAMPLED_INTERVALS = [i for i in INTERVAL_MINUTES if i != '1m']
+
+
+class KlineBuffer:
+    """
+    单个 (交易对, 周期) 的共享内存K线缓冲区（守护进程内唯一写者）
+
+    Parameters:
+    -----------
+    symbol : str
+        交易对
+    interval : str
+        K线时间单位
+    capacity : int
+        缓冲区保留的K线条数
+    """
+
+    def __init__(self, symbol, interval, capacity=1000):
+        self.symbol = symbol
+        self.interval = interval
+        self.capacity = capacity
+        name = f"md_{symbol}_{interval}_{os.getpid()}"
+        self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                              size=buffer_size(capacity))
+        self.header, self.rows = map_buffer(self.shm, capacity)
+        self.header[:] = 0
+        self.header[2] = capacity
+
+    @property
+    def count(self):
+        return int(self.header[1])
+
+    @property
+    def last_open_time(self):
+        """最后一根K线的开盘时间(毫秒)，无数据时返回None"""
+        return int(self.rows[self.count - 1, 0]) if self.count else None
+
+    def write(self, rows):
+        """在顺序锁保护下用 rows 的最新 capacity 行替换缓冲区内容"""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, ROW_FIELDS)[-self.capacity:]
+        self.header[0] += 1  # 奇数: 写入中
+        self.rows[:len(rows)] = rows
+        self.header[1] = len(rows)
+        self.header[3] = int(time.time() * 1000)
+        self.header[0] += 1  # 偶数: 写入完成
+
+    def merge(self, new_rows):
+        """合并增量K线（同开盘时间的以新数据为准）后写入"""
+        new_rows = np.asarray(new_rows, dtype=np.float64).reshape(-1, ROW_FIELDS)
+        if self.count and len(new_rows):
+            old = self.rows[:self.count]
+            new_rows = np.vstack([old[old[:, 0] < new_rows[0, 0]], new_rows])
+        self.write(new_rows)
+
+    def info(self):
+        return {
+            'symbol': self.symbol,
+            'interval': self.interval,
+            'shm': self.shm.name,
+            'count': self.count,
+            'last_update_ms': int(self.header[3]),
+        }
+
+    def close(self):
+        self.header = self.rows = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+def klines_to_rows(data):
+    """币安K线数组转为 (open_time_ms, o, h, l, c, v) 行"""
+    return [(k[0], float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+            for k in data]
+
+
+class SymbolFeed:
+    """
+    单个交易对的行情源: 每轮只增量拉取一次1分钟K线，
+    5m~4h 由重采样引擎推导，其余周期（1d/1w）单独增量拉取
+
+    Parameters:
+    -----------
+    symbol : str
+        交易对
+    capacity : int
+        每个缓冲区保留的K线条数
+    """
+
+    def __init__(self, symbol, capacity=1000):
+        self.symbol = symbol
+        self.capacity = capacity
+        self.resampler = KlineResampler(symbol, RESAMPLED_INTERVALS, capacity=capacity,
+                                        base_capacity=max(capacity, 1440))
+        self.buffers = {}
+        self.requests = 0
+        self.last_error = None
+
+    def _fetch(self, interval, limit, session):
+        self.requests += 1
+        return klines_to_rows(fetch_klines(self.symbol, interval, limit, session=session))
+
+    def _publish(self, interval):
+        self.buffers[interval].write(self.resampler.get_rows(interval, self.capacity))
+
+    def _missing(self, last_open_time, interval):
+        if last_open_time is None:
+            return self.capacity
+        elapsed = time.time() - last_open_time / 1000
+        return int(elapsed // INTERVAL_SECONDS[interval]) + 1
+
+    def add_interval(self, interval, session):
+        """新增一个周期的缓冲区，推导周期先从交易所导入一次历史"""
+        buffer = KlineBuffer(self.symbol, interval, self.capacity)
+        self.buffers[interval] = buffer
+        if interval in RESAMPLED_INTERVALS:
+            self.resampler.seed(interval, self._fetch(interval, self.capacity, session))
+            self._refresh_base(session)
+            self._publish(interval)
+        elif interval == '1m':
+            self._refresh_base(session)
+        else:
+            buffer.merge(self._fetch(interval, self.capacity, session))
+        return buffer
+
+    def _refresh_base(self, session):
+        """增量拉取1分钟K线，只发布本次有变化的周期"""
+        now_ms = int(time.time() * 1000)
+        missing = self.resampler.missing_minutes(now_ms)
+        limit = min(1000, max(2, missing or 1000))
+        touched = self.resampler.update_1m(self._fetch('1m', limit, session))
+        if '1m' in self.buffers:
+            self._publish('1m')
+        for interval in touched:
+            if interval not in self.buffers:
+                continue
+            if not self.resampler.is_contiguous(interval, min(self.capacity,
+                                                              self.resampler.count(interval))):
+                # 长时间停机后出现缺口，重新导入历史
+                self.resampler.seed(interval, self._fetch(interval, self.capacity, session))
+            self._publish(interval)
+
+    def refresh(self, session=None):
+        """刷新所有已订阅周期（同步，在线程池中执行）"""
+        if any(i == '1m' or i in RESAMPLED_INTERVALS for i in self.buffers):
+            self._refresh_base(session)
+        for interval, buffer in self.buffers.items():
+            if interval == '1m' or interval in RESAMPLED_INTERVALS:
+                continue
+            limit = min(self.capacity, max(2, self._missing(buffer.last_open_time, interval)))
+            buffer.merge(self._fetch(interval, limit, session))
+        self.last_error = None
+
+    def info(self):
+        return [dict(b.info(), requests=self.requests, last_error=self.last_error)
+                for b in self.buffers.values()]
+
+    def close(self):
+        for buffer in self.buffers.values():
+            buffer.close()
+        self.buffers.clear()
+
+
+class MarketDataDaemon:
+    """
+    行情守护进程
+
+    Parameters:
+    -----------
+    socket_path : str
+        Unix socket 路径
+    poll_interval : float
+        每个交易对的刷新间隔(秒)
+    capacity : int
+        每个缓冲区保留的K线条数
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, poll_interval=5.0, capacity=1000):
+        self.socket_path = socket_path
+        self.poll_interval = poll_interval
+        self.capacity = capacity
+        self.feeds = {}
+        self.clients_served = 0
+        self._session = requests.Session()
+        self._subscribe_lock = asyncio.Lock()
+
+    async def _refresh(self, feed):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, feed.refresh, self._session)
+        except Exception as e:
+            feed.last_error = str(e)
+            print(f"刷新 {feed.symbol} 失败: {e}")
+
+    async def subscribe(self, symbol, interval):
+        """获取或创建缓冲区；首次订阅时同步完成首次拉取，保证客户端立即可读"""
+        if interval not in INTERVAL_SECONDS:
+            raise ValueError(f"不支持的时间单位: {interval}")
+        symbol = symbol.upper()
+        async with self._subscribe_lock:
+            feed = self.feeds.get(symbol)
+            if feed is None:
+                feed = self.feeds[symbol] = SymbolFeed(symbol, self.capacity)
+            buffer = feed.buffers.get(interval)
+            if buffer is None:
+                print(f"新增订阅: {symbol} {interval}")
+                loop = asyncio.get_running_loop()
+                buffer = await loop.run_in_executor(None, feed.add_interval, interval,
+                                                    self._session)
+        return buffer
+
+    async def handle_request(self, request):
+        op = request.get('op')
+        if op == 'subscribe':
+            buffer = await self.subscribe(request['symbol'], request['interval'])
+            return {'ok': True, 'shm': buffer.shm.name, 'capacity': buffer.capacity}
+        if op == 'stats':
+            return {
+                'ok': True,
+                'buffers': [info for f in self.feeds.values() for info in f.info()],
+                'exchange_requests': sum(f.requests for f in self.feeds.values()),
+                'clients_served': self.clients_served,
+            }
+        return {'ok': False, 'error': f"未知操作: {op}"}
+
+    async def handle_client(self, reader, writer):
+        self.clients_served += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except Exception as e:
+                    response = {'ok': False, 'error': str(e)}
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def poll_loop(self):
+        """定期刷新所有交易对，每个交易对每轮只请求一次1分钟K线"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            async with self._subscribe_lock:
+                await asyncio.gather(*(self._refresh(f) for f in list(self.feeds.values())))
+
+    async def run(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        # SIGTERM（如 kill / systemd 停止）时同样走清理流程，释放共享内存
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        print(f"行情守护进程已启动: {self.socket_path}，刷新间隔 {self.poll_interval} 秒")
+        try:
+            async with server:
+                await self.poll_loop()
+        finally:
+            self.close()
+
+    def close(self):
+        for feed in self.feeds.values():
+            feed.close()
+        self.feeds.clear()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def main():
+    daemon = MarketDataDaemon(
+        socket_path=get_setting('market_data', 'socket_path', DEFAULT_SOCKET_PATH),
+        poll_interval=get_setting('market_data', 'poll_interval', 5.0, float),
+        capacity=get_setting('market_data', 'capacity', 1000, int),
+    )
+    try:
+        asyncio.run(daemon.run())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("行情守护进程已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+# memory_monitor.py
+"""
+内存监测与泄漏排查
+
+长期运行的监控进程（eth_robot_wt 在 nohup 下连续运行数周）定期记录:
+    - RSS 与峰值 RSS（/proc/self/statm，非 Linux 只有峰值）、gc 各代计数；
+    - 各模块注册的数据结构大小（爆仓窗口、K线缓存、热力图、调度任务等），
+      register_gauge(name, func)，func 返回条数或 (条数, 字节数)；
+    - 开启 tracemalloc 时，与上一次快照对比分配增长最多的代码行。
+RSS 按最近的采样做线性回归得到每小时增长量，持续增长时在每日状态报告中提示。
+
+tracemalloc 会让每次分配变慢，默认不开启；需要排查时:
+    - 配置 [memory] tracemalloc = true 从启动开始跟踪，或
+    - kill -USR1 <pid> 按需触发: 第一次开启跟踪并记录基准快照，之后每次输出与上一次的对比
+      （信号处理只设置标志，由采样线程完成快照，不打断主流程）。
+
+配置在 bot_config.cfg 的 [memory] 节:
+    enabled = true
+    interval = 900        ; 采样间隔(秒)
+    history = 96          ; 保留的采样数（默认24小时）
+    tracemalloc = false   ; 启动时开启 tracemalloc
+    frames = 1            ; tracemalloc 记录的调用栈深度
+    top = 10              ; 报告中列出的分配增长行数
+"""
+import gc
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+from bn_config import get_setting
+from status_api import get_board
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+COPY_RETRIES = 5  # approx_size 复制容器时被并发修改的重试次数
+
+# 对比结果中忽略的分配来源（跟踪本身与导入系统）；按行汇总后再过滤，
+# 比 Snapshot.filter_traces 逐条过滤快得多
+_IGNORED_SOURCES = (tracemalloc.__file__, '<frozen importlib._bootstrap>',
+                    '<frozen importlib._bootstrap_external>', '<unknown>')
+
+
+def rss_bytes():
+    """当前进程的常驻内存(字节)，无法读取时返回None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes():
+    """进程启动以来的峰值常驻内存(字节)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux 单位为KB
+
+
+def _deep_size(obj, seen, depth=3):
+    if id(obj) in seen:  # 共享的对象（相同的键、驻留字符串）只计一次
+        return 0
+    seen.add(id(obj))
+    if hasattr(obj, 'memory_usage') and hasattr(obj, 'columns'):  # DataFrame
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if hasattr(obj, 'nbytes'):  # numpy 数组
+        return int(obj.nbytes)
+    size = sys.getsizeof(obj)
+    if depth <= 0:
+        return size
+    if isinstance(obj, dict):
+        return size + sum(_deep_size(k, seen, depth - 1) + _deep_size(v, seen, depth - 1) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        return size + sum(_deep_size(v, seen, depth - 1) for v in obj)
+    return size
+
+
+def approx_size(container, sample=50):
+    """
+    估算容器及其元素占用的字节数
+
+    只计算前 sample 个元素，按平均值外推，避免在大容器上逐个计算。
+
+    Parameters:
+    -----------
+    container : list / deque / dict / DataFrame / numpy 数组
+    sample : int
+        抽样的元素个数
+
+    Returns:
+    --------
+    int
+    """
+    if hasattr(container, 'nbytes') or hasattr(container, 'memory_usage'):
+        return _deep_size(container, set())
+    n = len(container)
+    if n == 0:
+        return sys.getsizeof(container)
+    for attempt in range(COPY_RETRIES):
+        try:
+            items = list(container.items() if isinstance(container, dict) else container)[:sample]
+            break
+        except RuntimeError:
+            # 复制期间其他线程（如爆仓事件循环）修改了容器: changed size / mutated during iteration
+            if attempt == COPY_RETRIES - 1:
+                raise
+    if not items:
+        return sys.getsizeof(container)
+    seen = set()
+    per_item = sum(_deep_size(x, seen) for x in items) / len(items)
+    return int(sys.getsizeof(container) + per_item * n)
+
+
+def _format_mb(value):
+    return f"{value / MB:.1f}MB" if value is not None else '-'
+
+
+class MemoryMonitor:
+    """
+    定期采样内存并对比 tracemalloc 快照（线程安全），参数未指定时读取 [memory] 节
+    """
+
+    def __init__(self, interval=None, history=None, top=None):
+        def setting(value, option, fallback, cast=float):
+            return value if value is not None else get_setting('memory', option, fallback, cast)
+
+        self.enabled = get_setting('memory', 'enabled', 'true').lower() == 'true'
+        self.interval = setting(interval, 'interval', 900.0)
+        self.top = setting(top, 'top', 10, int)
+        self.frames = get_setting('memory', 'frames', 1, int)
+        self.trace_on_start = get_setting('memory', 'tracemalloc', 'false').lower() == 'true'
+        self.samples = deque(maxlen=setting(history, 'history', 96, int))
+        self.gauges = {}
+        self.started_at = time.time()
+        self.last_growth = []  # 最近一次快照对比的结果
+        self._snapshot = None  # 上一次 tracemalloc 快照（只保留一份）
+        self._lock = threading.Lock()
+        self._requested = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register_gauge(self, name, func):
+        """
+        注册数据结构大小
+
+        Parameters:
+        -----------
+        name : str
+            名称
+        func : callable
+            func() -> 条数，或 (条数, 字节数)；在采样线程中调用
+        """
+        self.gauges[name] = func
+
+    def _read_gauges(self):
+        result = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                value = func()
+            except Exception as e:
+                result[name] = {'error': str(e)}
+                continue
+            items, size = value if isinstance(value, tuple) else (value, None)
+            result[name] = {'items': items, 'bytes': size}
+        return result
+
+    def start_tracing(self):
+        """开启 tracemalloc（已开启时不做任何事）"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info(f"已开启 tracemalloc（调用栈深度 {self.frames}）")
+
+    def _compare_snapshot(self):
+        """与上一次快照对比，返回分配增长最多的代码行"""
+        snapshot = tracemalloc.take_snapshot()
+        previous, self._snapshot = self._snapshot, snapshot
+        if previous is None:
+            return []
+        growth = []
+        for stat in snapshot.compare_to(previous, 'lineno'):
+            frame = stat.traceback[0]
+            if frame.filename in _IGNORED_SOURCES:
+                continue
+            if len(growth) >= self.top:
+                break
+            growth.append({'site': f"{frame.filename}:{frame.lineno}", 'size': stat.size,
+                           'size_diff': stat.size_diff, 'count_diff': stat.count_diff})
+        return growth
+
+    def sample(self, reason='periodic', snapshot=False):
+        """
+        采样一次
+
+        Parameters:
+        -----------
+        reason : str
+            采样原因（periodic / on_demand / daily）
+        snapshot : bool
+            开启 tracemalloc 时是否拍快照并与上一次快照对比（耗时随跟踪的分配数增长，
+            定时采样不拍快照，只在按需触发与每日报告时对比）
+
+        Returns:
+        --------
+        dict
+            time / reason / rss / peak_rss / gc / gauges，开启 tracemalloc 时还有 traced，
+            拍快照时还有 growth
+        """
+        with self._lock:
+            record = {
+                'time': time.time(),
+                'reason': reason,
+                'rss': rss_bytes(),
+                'peak_rss': peak_rss_bytes(),
+                'gc': gc.get_count(),
+                'gauges': self._read_gauges(),
+            }
+            if tracemalloc.is_tracing():
+                record['traced'] = tracemalloc.get_traced_memory()
+                if snapshot:
+                    self.last_growth = self._compare_snapshot()
+                    record['growth'] = self.last_growth
+            self.samples.append(record)
+            return record
+
+    def trigger(self):
+        """按需采样: 首次调用开启 tracemalloc 并记录基准快照，之后输出与上一次快照的对比"""
+        self.start_tracing()
+        record = self.sample('on_demand', snapshot=True)
+        print(self.format_report(record))
+        return record
+
+    def request(self, *_):
+        """信号处理函数: 只设置标志，由采样线程执行 trigger"""
+        self._requested.set()
+
+    def install_signal(self, signum=getattr(signal, 'SIGUSR1', None)):
+        """注册按需采样信号（只能在主线程调用，不支持的平台忽略）"""
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signum, self.request)
+        return True
+
+    def growth_rate(self, hours=None):
+        """
+        RSS 每小时增长量(字节)，按最近的采样线性回归；采样不足3个或跨度不足1小时
+        （启动阶段的增长会被误判为泄漏）时返回None
+
+        Parameters:
+        -----------
+        hours : float, optional
+            只使用最近 hours 小时的采样
+        """
+        with self._lock:
+            points = [(s['time'], s['rss']) for s in self.samples if s['rss'] is not None]
+        if hours is not None and points:
+            points = [p for p in points if p[0] >= points[-1][0] - hours * 3600]
+        if len(points) < 3 or points[-1][0] - points[0][0] < 3600:
+            return None
+        n = len(points)
+        mean_t = sum(t for t, _ in points) / n
+        mean_r = sum(r for _, r in points) / n
+        var = sum((t - mean_t) ** 2 for t, _ in points)
+        if var == 0:
+            return None
+        slope = sum((t - mean_t) * (r - mean_r) for t, r in points) / var
+        return slope * 3600
+
+    def format_report(self, record=None):
+        """多行报告（按需触发时输出）"""
+        record = record or (self.samples[-1] if self.samples else self.sample('report'))
+        lines = [f"内存报告 {datetime.fromtimestamp(record['time']).strftime('%Y-%m-%d %H:%M:%S')}: "
+                 f"RSS {_format_mb(record['rss'])}，峰值 {_format_mb(record['peak_rss'])}，gc {record['gc']}"]
+        rate = self.growth_rate()
+        if rate is not None:
+            lines.append(f"RSS 趋势: {rate / MB:+.2f}MB/小时（{len(self.samples)} 个采样）")
+        for name, gauge in record['gauges'].items():
+            if 'error' in gauge:
+                lines.append(f"  {name}: 读取失败 {gauge['error']}")
+            else:
+                size = f"，约{_format_mb(gauge['bytes'])}" if gauge['bytes'] is not None else ''
+                lines.append(f"  {name}: {gauge['items']:,}{size}")
+        if 'traced' in record:
+            current, peak = record['traced']
+            lines.append(f"tracemalloc: 当前 {_format_mb(current)}，峰值 {_format_mb(peak)}")
+            if record.get('growth'):
+                lines.append("与上一次快照相比增长最多的分配:")
+                lines.extend(f"  {g['size_diff'] / 1024:+,.1f}KB ({g['count_diff']:+,}个) "
+                             f"共{g['size'] / 1024:,.1f}KB  {g['site']}" for g in record['growth'])
+            elif 'growth' in record:
+                lines.append("已记录基准快照，下次触发时输出对比")
+        return '\n'.join(lines)
+
+    def format_summary(self):
+        """每日状态报告中的一行摘要"""
+        record = self.sample('daily', snapshot=True)
+        parts = [f"RSS {_format_mb(record['rss'])}"]
+        rate = self.growth_rate(hours=24)
+        if rate is not None:
+            parts.append(f"趋势 {rate / MB:+.2f}MB/小时")
+        for name, gauge in record['gauges'].items():
+            if gauge.get('items') is not None:
+                parts.append(f"{name} {gauge['items']:,}")
+        if record.get('growth'):
+            top = record['growth'][0]
+            parts.append(f"增长最多 {top['site'].rsplit(os.sep, 1)[-1]} {top['size_diff'] / 1024:+,.0f}KB")
+        return '，'.join(parts)
+
+    def get_stats(self):
+        """状态接口用: 最近一次采样与趋势"""
+        with self._lock:
+            last = dict(self.samples[-1]) if self.samples else None
+        return {
+            'last': last,
+            'samples': len(self.samples),
+            'rss_growth_per_hour': self.growth_rate(),
+            'tracing': tracemalloc.is_tracing(),
+        }
+
+    def _run(self):
+        next_sample = time.time()
+        while not self._stop.is_set():
+            if self._requested.wait(max(0.0, next_sample - time.time())):
+                self._requested.clear()
+                try:
+                    self.trigger()
+                except Exception as e:
+                    logger.error(f"按需内存采样出错: {e}")
+                continue
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"内存采样出错: {e}")
+            next_sample = time.time() + self.interval
+
+    def start(self):
+        """启动采样线程（[memory] enabled = false 时不启动）"""
+        if not self.enabled or self._thread is not None:
+            return
+        if self.trace_on_start:
+            self.start_tracing()
+        self._thread = threading.Thread(target=self._run, name='memory-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._requested.set()
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_monitor() -> MemoryMonitor:
+    """进程内共享的内存监测（延迟初始化），各模块在导入时注册数据结构大小"""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = MemoryMonitor()
+        return _monitor
+
+
+def start_memory_monitor():
+    """
+    启动采样线程、注册 SIGUSR1 按需采样，并在状态接口中增加 memory 分区
+    （[memory] enabled = false 时不启动；须在主线程调用）
+
+    Returns:
+    --------
+    MemoryMonitor or None
+    """
+    monitor = get_monitor()
+    if not monitor.enabled:
+        return None
+    monitor.start()
+    if monitor.install_signal():
+        print(f"内存监测: kill -USR1 {os.getpid()} 输出内存报告与分配增长对比")
+    get_board().register('memory', monitor.get_stats, interval=30)
+    return monitor
+
+
+# 使用示例: 模拟一个缓存不断增长的泄漏，两次快照对比定位到泄漏的代码行
+if __name__ == "__main__":
+    monitor = MemoryMonitor(interval=3600)
+    leak = []
+    window = deque(maxlen=1000)
+    monitor.register_gauge('leak', lambda: (len(leak), approx_size(leak)))
+    monitor.register_gauge('window', lambda: (len(window), approx_size(window)))
+    monitor.trigger()  # 开启跟踪，记录基准快照
+    for step in range(5):
+        for i in range(20000):
+            leak.append({'ts': time.time(), 'value': float(i), 'symbol': 'ETHUSDT'})
+            window.append({'ts': time.time(), 'value': float(i)})
+        monitor.sample()
+        time.sleep(0.2)
+    started = time.perf_counter()
+    monitor.trigger()
+    print(f"快照对比耗时 {(time.perf_counter() - started) * 1000:.0f} ms")
+    print(monitor.format_summary())
@@ -0,0 +1,431 @@
+# notifier.py
+"""
+多通道通知
+
+一条告警同时投递到所有订阅的通道（企业微信、QQ go-cqhttp、本地日志、
+按交易对与告警类型路由的多群订阅，见 subscriptions.py），
+每个通道有独立的发送线程，慢通道只会让自己的消息排队，不会拖慢其他通道。
+每个通道单独统计成功/失败次数、耗时与重试次数；Notifier.notify 支持两种确认语义:
+    any: 任一通道成功即返回成功（默认）
+    all: 所有通道都成功才返回成功
+企业微信告警默认进入合并队列，入队即视为成功；启动、每日状态、关闭等需要确认送达的消息
+用 notify(..., digest=False) 直接发送，返回值为实际的发送结果。
+告警图表（见 chart_renderer.py）通过 notify_image 补发，只投递到支持图片的通道（企业微信）。
+
+通道在 bot_config.cfg 的 [notify] 节按机器人配置，例如:
+    [notify]
+    eth_robot_wt_channels = wechat,qq,log
+    eth_robot_wt_ack = any
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from bn_config import get_endpoint, get_setting
+from lazy_import import lazy_import
+from notify_digest import PRIORITY_NORMAL
+from subscriptions import RULE_LIQUIDATION, RULE_RSI, RULE_WAVETREND
+
+requests = lazy_import('requests')
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelStats:
+    """单个通道的投递统计（线程安全）"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def record(self, ok, latency, retries, error=None):
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+                self.last_error = error
+            self.retries += retries
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self):
+        with self._lock:
+            count = self.sent + self.failed
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'retries': self.retries,
+                'avg_latency_ms': self.total_latency / count * 1000 if count else 0.0,
+                'max_latency_ms': self.max_latency * 1000,
+                'last_error': self.last_error,
+            }
+
+
+class Channel:
+    """
+    通知通道基类，子类实现 send
+
+    Parameters:
+    -----------
+    retries : int
+        失败后的重试次数
+    retry_delay : float
+        重试间隔(秒)，每次重试翻倍
+    """
+    name = 'base'
+
+    def __init__(self, retries=1, retry_delay=1.0):
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.stats = ChannelStats()
+
+    def send(self, title, message, priority, symbol=None, digest=True, on_result=None) -> bool:
+        """
+        发送一条消息；digest=False 时不经过合并队列（只有企业微信通道区分）。
+        消息进入合并队列时返回True，并在实际送达或最终失败时调用 on_result(ok)
+        """
+        raise NotImplementedError
+
+    def defers(self, digest=True) -> bool:
+        """send 返回时是否尚未实际送达（结果由 on_result 回调）"""
+        return False
+
+    def send_image(self, image, symbol=None) -> bool:
+        """发送图片（PNG字节），不支持图片的通道不覆盖此方法"""
+        raise NotImplementedError
+
+    @property
+    def supports_image(self):
+        return type(self).send_image is not Channel.send_image
+
+    def deliver_image(self, image, symbol=None) -> bool:
+        """发送图片，不重试（图片只是文字告警的补充）；不抛出异常"""
+        try:
+            return bool(self.send_image(image, symbol))
+        except Exception as e:
+            logger.error(f"通道 {self.name} 发送图片失败: {e}")
+            return False
+
+    def deliver(self, title, message, priority=PRIORITY_NORMAL, symbol=None, digest=True,
+                on_result=None) -> bool:
+        """
+        发送并重试，记录统计；不抛出异常
+        on_result(ok) 在实际送达或最终失败时调用一次（进入合并队列的消息由队列回调）
+        """
+        started = time.time()
+        error = None
+        deferred = on_result if self.defers(digest) else None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                if self.send(title, message, priority, symbol, digest, deferred):
+                    self.stats.record(True, time.time() - started, attempt)
+                    if on_result is not None and deferred is None:
+                        on_result(True)
+                    return True
+                error = "发送失败"
+            except Exception as e:
+                error = str(e)
+        self.stats.record(False, time.time() - started, self.retries, error)
+        logger.error(f"通道 {self.name} 发送失败（已重试 {self.retries} 次）: {error}")
+        if on_result is not None:
+            on_result(False)
+        return False
+
+
+class WeChatChannel(Channel):
+    """
+    企业微信群机器人；digest=True 时进入合并发送队列（见 notify_digest.py），
+    入队即视为成功，单条消息可用 digest=False 绕过队列直接发送
+    """
+    name = 'wechat'
+
+    def __init__(self, digest=True, **kwargs):
+        super().__init__(**kwargs)
+        self.digest = digest
+
+    def defers(self, digest=True):
+        return self.digest and digest
+
+    def send(self, title, message, priority, symbol=None, digest=True, on_result=None):
+        import wechat_bot
+        content = f"{title}\n{message}" if title else message
+        if self.defers(digest):
+            return wechat_bot.send_alert(content, priority, on_result)
+        result = wechat_bot.send_text(content)
+        return result.get('errcode') == 0
+
+    def send_image(self, image, symbol=None):
+        import wechat_bot
+        bot = wechat_bot.get_bot()
+        # 配额紧张时放弃图片，把剩余配额留给文字告警
+        if bot.quota.remaining() <= get_setting('notify', 'high_priority_reserve', 5, int):
+            logger.info("webhook 配额不足，跳过告警图片")
+            return False
+        if self.digest:
+            # 对应的文字告警可能还在合并窗口中，先发出去，保证图片排在文字之后
+            wechat_bot.flush_alerts()
+        return bot.send_image(image).get('errcode') == 0
+
+
+class QQChannel(Channel):
+    """通过 go-cqhttp 发送QQ群消息"""
+    name = 'qq'
+
+    def __init__(self, group_id=None, timeout=5.0, **kwargs):
+        super().__init__(**kwargs)
+        # 目标QQ群号，可在 bot_config.cfg 的 [qq] 节配置
+        self.group_id = group_id or get_setting('qq', 'group_id', '你的QQ群号')
+        self.timeout = timeout
+
+    def send(self, title, message, priority, symbol=None, digest=True, on_result=None):
+        # API 地址，端口需与 go-cqhttp 配置一致（可通过 bot_config.cfg 或环境变量覆盖）
+        api_url = f"{get_endpoint('gocqhttp_url')}/send_group_msg"
+        payload = {
+            "group_id": self.group_id,
+            "message": f"{title}\n{message}" if title else message,
+        }
+        response = requests.post(api_url, data=json.dumps(payload),
+                                 headers={'Content-Type': 'application/json'},
+                                 timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP 请求失败，状态码: {response.status_code}")
+        result = response.json()
+        if result.get("status") != "ok":
+            raise RuntimeError(f"API 返回错误: {result.get('wording')}")
+        return True
+
+
+class LogChannel(Channel):
+    """本地通道: 写入日志，可选同时追加到 JSON Lines 文件"""
+    name = 'log'
+
+    def __init__(self, path=None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path if path is not None else get_setting('notify', 'log_path')
+        self._lock = threading.Lock()
+
+    def send(self, title, message, priority, symbol=None, digest=True, on_result=None):
+        logger.info(f"[通知] {title + ' ' if title else ''}{message}")
+        if self.path:
+            record = {'time': datetime.now().isoformat(timespec='seconds'),
+                      'priority': priority, 'title': title, 'message': message}
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return True
+
+
+class SubscriptionChannel(Channel):
+    """按 (交易对, 告警类型) 投递给订阅了该告警的所有群，至少一个群成功即视为成功"""
+    name = 'subscriptions'
+
+    def __init__(self, rule, default_symbol='ETHUSDT', **kwargs):
+        super().__init__(**kwargs)
+        self.rule = rule
+        self.default_symbol = default_symbol
+
+    def send(self, title, message, priority, symbol=None, digest=True, on_result=None):
+        from subscriptions import get_dispatcher
+        dispatcher = get_dispatcher()
+        if not dispatcher.registry.resolve(symbol or self.default_symbol, self.rule):
+            return True  # 没有订阅者
+        content = f"{title}\n{message}" if title else message
+        return dispatcher.publish(symbol or self.default_symbol, self.rule, content) > 0
+
+
+CHANNEL_TYPES = {
+    'wechat': WeChatChannel,
+    'qq': QQChannel,
+    'log': LogChannel,
+    'subscriptions': SubscriptionChannel,
+}
+
+# 各机器人发出的告警类型（订阅通道按此路由）
+BOT_RULES = {
+    'eth_robot_wt': RULE_WAVETREND,
+    'bn_liquadation': RULE_LIQUIDATION,
+    'rsi_notify': RULE_RSI,
+}
+
+
+class _DeliveryResult:
+    """按确认语义合并各通道的最终投递结果，只回调一次（线程安全）"""
+
+    def __init__(self, channels, ack, callback):
+        self.remaining = channels
+        self.ack = ack
+        self.callback = callback
+        self.done = False
+        self._lock = threading.Lock()
+
+    def report(self, ok):
+        with self._lock:
+            if self.done:
+                return
+            self.remaining -= 1
+            if self.ack == 'any':
+                decided = True if ok else (False if self.remaining == 0 else None)
+            else:
+                decided = False if not ok else (True if self.remaining == 0 else None)
+            if decided is None:
+                return
+            self.done = True
+        try:
+            self.callback(decided)
+        except Exception as e:
+            logger.error(f"投递结果回调出错: {e}")
+
+
+class Notifier:
+    """
+    把一条通知并发投递到多个通道
+
+    Parameters:
+    -----------
+    channels : list of Channel
+        订阅的通道
+    ack : str
+        'any' 任一通道成功即成功；'all' 全部通道成功才成功
+    timeout : float
+        notify 等待确认的最长时间(秒)，超时后仍在后台继续投递
+    """
+
+    def __init__(self, channels, ack='any', timeout=15.0, name='notifier'):
+        if ack not in ('any', 'all'):
+            raise ValueError(f"不支持的确认语义: {ack}")
+        self.channels = list(channels)
+        self.ack = ack
+        self.timeout = timeout
+        # 每个通道一个发送线程，慢通道只阻塞自己的队列
+        self._executors = {
+            channel.name: ThreadPoolExecutor(max_workers=1,
+                                             thread_name_prefix=f"{name}-{channel.name}")
+            for channel in self.channels
+        }
+
+    def notify(self, message, title=None, priority=PRIORITY_NORMAL, wait_ack=True,
+               symbol=None, digest=True, on_result=None) -> bool:
+        """
+        投递一条通知
+
+        Parameters:
+        -----------
+        message : str
+            通知内容
+        title : str, optional
+            标题（微信/QQ消息中放在第一行）
+        priority : int
+            PRIORITY_HIGH / PRIORITY_NORMAL / PRIORITY_LOW
+        wait_ack : bool
+            False 时只提交不等待（事件循环中调用时使用）
+        symbol : str, optional
+            告警所属交易对，订阅通道按它路由
+        digest : bool
+            False 时企业微信不进入合并队列，直接发送并以实际结果确认
+        on_result : callable, optional
+            on_result(ok)，按确认语义得到最终投递结果后调用一次（合并队列中的消息在实际
+            送达或丢弃后才回调），在发送线程中调用
+
+        Returns:
+        --------
+        bool
+            按确认语义判断的投递结果；wait_ack=False 时返回是否已提交
+        """
+        if not self.channels:
+            if on_result is not None:
+                on_result(False)
+            return False
+        report = _DeliveryResult(len(self.channels), self.ack, on_result).report \
+            if on_result is not None else None
+        futures = [self._executors[channel.name].submit(channel.deliver, title, message,
+                                                        priority, symbol, digest, report)
+                   for channel in self.channels]
+        if not wait_ack:
+            return True
+
+        deadline = time.time() + self.timeout
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.time()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break  # 超时，剩余通道在后台继续投递
+            for future in done:
+                ok = future.result()
+                if ok and self.ack == 'any':
+                    return True
+                if not ok and self.ack == 'all':
+                    return False
+        return self.ack == 'all' and not pending
+
+    def notify_image(self, image, symbol=None) -> bool:
+        """
+        把图片投递到支持图片的通道（只提交不等待），在各通道中排在已提交的文字之后
+
+        Parameters:
+        -----------
+        image : bytes
+            PNG 图片
+        symbol : str, optional
+            告警所属交易对
+
+        Returns:
+        --------
+        bool
+            是否有通道接收了图片
+        """
+        channels = [channel for channel in self.channels if channel.supports_image]
+        for channel in channels:
+            self._executors[channel.name].submit(channel.deliver_image, image, symbol)
+        return bool(channels)
+
+    def get_stats(self):
+        """各通道的投递统计"""
+        return {channel.name: channel.stats.as_dict() for channel in self.channels}
+
+    def shutdown(self, wait_pending=True):
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait_pending)
+
+
+def build_notifier(bot_name, default_channels='wechat') -> Notifier:
+    """
+    按配置创建机器人的通知器
+
+    Parameters:
+    -----------
+    bot_name : str
+        机器人名称，读取 [notify] <bot_name>_channels / <bot_name>_ack
+    default_channels : str
+        未配置时使用的通道，逗号分隔
+
+    Returns:
+    --------
+    Notifier
+    """
+    names = get_setting('notify', f'{bot_name}_channels', default_channels)
+    channels = []
+    for name in (n.strip() for n in names.split(',')):
+        if not name:
+            continue
+        if name not in CHANNEL_TYPES:
+            logger.error(f"未知的通知通道: {name}，可选: {list(CHANNEL_TYPES)}")
+            continue
+        if name == 'subscriptions':
+            channels.append(SubscriptionChannel(BOT_RULES.get(bot_name, bot_name)))
+        else:
+            channels.append(CHANNEL_TYPES[name]())
+    return Notifier(channels,
+                    ack=get_setting('notify', f'{bot_name}_ack', 'any'),
+                    timeout=get_setting('notify', 'ack_timeout', 15.0, float),
+                    name=bot_name)
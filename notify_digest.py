@@ -0,0 +1,301 @@
+# notify_digest.py
+"""
+告警合并发送与webhook配额
+
+企业微信群机器人每个webhook每分钟最多约20条消息。多个监控（爆仓、WaveTrend 等）
+同时触发时，DigestQueue 把短时间窗口内到达的告警合并成一条汇总消息发送，
+并按 WebhookQuota 记录的剩余配额决定何时发送:
+    - 高优先级告警不等待合并窗口，且优先占用配额；
+    - 配额不足时只为高优先级保留最后几条，低优先级告警继续排队合并；
+    - window / max_batch 控制延迟与合并条数之间的取舍；
+    - 发送失败的批次按指数退避（retry_delay 起步、最长 max_retry_delay）重新排队，
+      每条告警可带回调，在最终送达或丢弃时得到结果。
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+WECHAT_QUOTA_PER_MINUTE = 20
+
+
+class RateLimitedError(Exception):
+    """发送方被限流，retry_after 秒后再试"""
+
+    def __init__(self, retry_after=60.0, message="webhook 已被限流"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class WebhookQuota:
+    """
+    单个webhook的滑动窗口配额（线程安全）
+
+    Parameters:
+    -----------
+    limit : int
+        窗口内允许的消息数
+    period : float
+        窗口长度(秒)
+    """
+
+    def __init__(self, limit=WECHAT_QUOTA_PER_MINUTE, period=60.0):
+        self.limit = limit
+        self.period = period
+        self.sent = deque()
+        self.blocked_until = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self.sent and now - self.sent[0] >= self.period:
+            self.sent.popleft()
+
+    def remaining(self, now=None):
+        """当前剩余可发送条数"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now < self.blocked_until:
+                return 0
+            self._expire(now)
+            return self.limit - len(self.sent)
+
+    def wait_time(self, now=None):
+        """距离下一条配额释放的秒数，有剩余配额时为0"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self._expire(now)
+            if len(self.sent) < self.limit:
+                return 0.0
+            return self.sent[0] + self.period - now
+
+    def next_release(self, now=None):
+        """距离最早一条发送记录过期的秒数，没有记录时为0"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            return self.sent[0] + self.period - now if self.sent else 0.0
+
+    def record(self, now=None):
+        """记录一次发送"""
+        with self._lock:
+            self.sent.append(time.time() if now is None else now)
+
+    def block(self, seconds):
+        """服务端返回限流时，在 seconds 秒内不再发送"""
+        with self._lock:
+            self.rejected += 1
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+
+@dataclass(order=True)
+class Alert:
+    """排队中的告警，按 (优先级, 入队顺序) 排序"""
+    priority: int
+    seq: int
+    text: str = field(compare=False)
+    created_at: float = field(compare=False, default_factory=time.time)
+    attempts: int = field(compare=False, default=0)
+    callback: object = field(compare=False, default=None)  # callback(ok)，送达或丢弃时调用
+
+
+def format_digest(alerts):
+    """把多条告警格式化为一条 Markdown 汇总"""
+    lines = [f"**告警汇总（{len(alerts)}条）**"]
+    for alert in sorted(alerts, key=lambda a: a.created_at):
+        stamp = datetime.fromtimestamp(alert.created_at).strftime('%H:%M:%S')
+        text = alert.text.replace('\n', ' ')
+        if alert.priority == PRIORITY_HIGH:
+            text = f'<font color="warning">{text}</font>'
+        lines.append(f"> {stamp} {text}")
+    return '\n'.join(lines)
+
+
+class DigestQueue:
+    """
+    告警合并发送队列，由后台线程按窗口与配额批量发送
+
+    Parameters:
+    -----------
+    send_batch : callable
+        send_batch(alerts) -> bool，发送一批告警（一条消息），
+        被限流时抛出 RateLimitedError
+    quota : WebhookQuota
+        发送目标的配额（由实际发送方记录每次发送，队列只读取剩余配额）
+    window : float
+        普通告警的合并窗口(秒)，从队列中最早的告警入队开始计时
+    high_window : float
+        高优先级告警的合并窗口(秒)，默认0即立即发送
+    max_batch : int
+        每条汇总消息最多包含的告警数，达到后立即发送
+    high_reserve : int
+        剩余配额不超过该值时只发送含高优先级告警的批次；不小于配额上限时按上限-1处理
+    max_attempts : int
+        每条告警最多发送次数，超过后丢弃
+    retry_delay : float
+        发送失败后的首次重试等待(秒)，连续失败时翻倍
+    max_retry_delay : float
+        重试等待的上限(秒)
+    """
+
+    def __init__(self, send_batch, quota=None, window=5.0, high_window=0.0, max_batch=10,
+                 high_reserve=5, max_attempts=3, retry_delay=2.0, max_retry_delay=60.0,
+                 name='digest'):
+        self.send_batch = send_batch
+        self.quota = quota or WebhookQuota()
+        self.window = window
+        self.high_window = high_window
+        self.max_batch = max_batch
+        if high_reserve >= self.quota.limit:
+            # 保留数达到配额上限时普通告警永远等不到配额，发送线程每50ms空转一次
+            logger.warning(f"{name}: high_reserve={high_reserve} 不小于配额上限 {self.quota.limit}，"
+                           f"调整为 {self.quota.limit - 1}")
+            high_reserve = self.quota.limit - 1
+        self.high_reserve = max(0, high_reserve)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.name = name
+        self._consecutive_failures = 0
+        self._retry_at = 0.0  # 退避结束时间
+        self._pending = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._flushing = False
+        self._sending = False
+        self.stats = {'submitted': 0, 'messages': 0, 'delivered': 0, 'dropped': 0,
+                      'failures': 0, 'max_delay': 0.0}
+
+    def submit(self, text, priority=PRIORITY_NORMAL, callback=None):
+        """
+        告警入队（不阻塞），首次调用时启动发送线程
+
+        Parameters:
+        -----------
+        callback : callable, optional
+            callback(ok)，告警送达（True）或重试耗尽被丢弃（False）时在发送线程中调用
+        """
+        with self._cond:
+            heapq.heappush(self._pending, Alert(priority, next(self._seq), text, callback=callback))
+            self.stats['submitted'] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return True
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _next_delay(self, now):
+        """距离本轮可以发送还需等待的秒数，0表示立即发送"""
+        if len(self._pending) >= self.max_batch or self._flushing:
+            due = 0.0
+        else:
+            has_high = any(a.priority == PRIORITY_HIGH for a in self._pending)
+            oldest = min(a.created_at for a in self._pending)
+            due = max(0.0, oldest + (self.high_window if has_high else self.window) - now)
+        quota_wait = max(self.quota.wait_time(now), self._retry_at - now)
+        if quota_wait == 0 and self._pending[0].priority != PRIORITY_HIGH \
+                and self.quota.remaining(now) <= self.high_reserve:
+            # 配额紧张: 低优先级告警等到有配额释放再发，把剩余配额留给高优先级
+            quota_wait = max(0.05, self.quota.next_release(now))
+        return max(due, quota_wait)
+
+    def _take_batch(self):
+        return [heapq.heappop(self._pending)
+                for _ in range(min(self.max_batch, len(self._pending)))]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                delay = self._next_delay(time.time())
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                batch = self._take_batch()
+                self._sending = True
+            self._deliver(batch)
+            with self._cond:
+                self._sending = False
+                self._cond.notify_all()
+
+    def _deliver(self, batch):
+        for alert in batch:
+            alert.attempts += 1
+        try:
+            ok = self.send_batch(batch)
+        except RateLimitedError as e:
+            logger.warning(f"{self.name}: 被限流，{e.retry_after:.0f} 秒后重试 {len(batch)} 条告警")
+            self.quota.block(e.retry_after)
+            ok = False
+        except Exception as e:
+            logger.error(f"{self.name}: 发送汇总消息出错: {e}")
+            ok = False
+
+        now = time.time()
+        with self._cond:
+            if ok:
+                self._consecutive_failures = 0
+                self._retry_at = 0.0
+                self.stats['messages'] += 1
+                self.stats['delivered'] += len(batch)
+                self.stats['max_delay'] = max(self.stats['max_delay'],
+                                              max(now - a.created_at for a in batch))
+                finished = [(a, True) for a in batch]
+            else:
+                # 连续失败时指数退避，避免立即重发同一批告警
+                self._consecutive_failures += 1
+                backoff = min(self.max_retry_delay,
+                              self.retry_delay * 2 ** (self._consecutive_failures - 1))
+                self._retry_at = max(self._retry_at, now + backoff)
+                self.stats['failures'] += 1
+                finished = []
+                for alert in batch:
+                    if alert.attempts < self.max_attempts:
+                        heapq.heappush(self._pending, alert)
+                    else:
+                        self.stats['dropped'] += 1
+                        logger.error(f"{self.name}: 告警发送失败已丢弃: {alert.text}")
+                        finished.append((alert, False))
+        for alert, delivered in finished:
+            if alert.callback is not None:
+                try:
+                    alert.callback(delivered)
+                except Exception as e:
+                    logger.error(f"{self.name}: 告警回调出错: {e}")
+
+    def flush(self, timeout=10.0):
+        """立即发送所有排队告警（忽略合并窗口），等待至多 timeout 秒"""
+        deadline = time.time() + timeout
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            while (self._pending or self._sending) and self._thread is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, 0.1))
+            self._flushing = False
+            return not self._pending
+
+    def get_stats(self):
+        with self._cond:
+            return dict(self.stats, pending=len(self._pending),
+                        quota_remaining=self.quota.remaining())
@@ -0,0 +1,413 @@
+# quantile_sketch.py
+"""
+流式分位数与自适应阈值
+
+TDigest: 合并式 t-digest（Dunning），质心数量由 compression 限定，内存固定；
+两个 digest 可以直接合并（跨重启、跨进程/分片汇总），尾部分位数（如 P99）误差很小。
+
+RollingQuantile: 单个交易对的滚动窗口爆仓总额分布。
+    每个 window 秒（默认5分钟）为一个不重叠的桶，桶结束时把桶内爆仓总额（没有爆仓的桶记为0）
+    写入当天的 digest；只保留最近 days 天的 digest，查询时合并得到最近 N 天的分布。
+    停机或断线期间没有观测的桶不计入分布（不记为0），从恢复时刻所在的桶重新开始。
+    每个交易对的内存约为 days * compression/2 个质心（默认约13KB），与事件数量无关。
+
+AdaptiveThresholds: 按交易对管理 RollingQuantile，阈值 = 最近 N 天窗口总额的指定分位数；
+样本不足（预热期）时使用固定阈值。
+    注意口径差异: 分布来自固定、不重叠的5分钟桶，而告警规则比较的是每笔爆仓时的滑动5分钟总额。
+    每个固定桶的总额都不超过桶内最后一笔爆仓时的滑动总额（该滑动窗口覆盖整个桶），
+    跨越桶边界的一串爆仓还会被拆成两个较小的桶，因此滑动总额超过 P99 阈值的频率高于 1%，
+    percentile 应按此取值。配置在 bot_config.cfg 的 [liquidation] 节:
+    adaptive_threshold = true
+    threshold_percentile = 99
+    threshold_days = 7
+    threshold_min_samples = 288      ; 至少1天的5分钟桶
+    threshold_floor = 0              ; 阈值下限(美元)
+"""
+import base64
+import math
+import threading
+import time
+from collections import deque
+
+from bn_config import get_setting
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+DAY_MS = 86_400_000
+
+
+class TDigest:
+    """
+    合并式 t-digest
+
+    Parameters:
+    -----------
+    compression : float
+        压缩参数 δ，质心数约为 δ/2，越大越精确（δ=200 时 P99 相对误差约1%）
+    """
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self._buffer = []
+        self._buffer_weights = []
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self):
+        return float(self.weights.sum()) + sum(self._buffer_weights)
+
+    def add(self, value, weight=1.0):
+        """加入一个样本（weight>1 表示重复 weight 次）"""
+        if weight <= 0:
+            return
+        self._buffer.append(float(value))
+        self._buffer_weights.append(float(weight))
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def merge(self, other: 'TDigest'):
+        """合并另一个 digest（other 不变）"""
+        other._compress()
+        self._compress()
+        if not len(other.means):
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _compress(self, means=None, weights=None):
+        if means is None:
+            if not self._buffer:
+                return
+            means = np.concatenate([self.means, self._buffer])
+            weights = np.concatenate([self.weights, self._buffer_weights])
+            self._buffer, self._buffer_weights = [], []
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        merged_means, merged_weights = [], []
+        cur_mean, cur_weight = means[0], weights[0]
+        done = 0.0
+        # 尺度函数 k1(q) = δ/2π·asin(2q-1): 每个质心覆盖的 k 跨度不超过1，尾部质心更小
+        q_limit = self._q_limit(0.0)
+        for mean, weight in zip(means[1:], weights[1:]):
+            if (done + cur_weight + weight) / total <= q_limit:
+                cur_mean += (mean - cur_mean) * weight / (cur_weight + weight)
+                cur_weight += weight
+            else:
+                merged_means.append(cur_mean)
+                merged_weights.append(cur_weight)
+                done += cur_weight
+                q_limit = self._q_limit(done / total)
+                cur_mean, cur_weight = mean, weight
+        merged_means.append(cur_mean)
+        merged_weights.append(cur_weight)
+        self.means = np.array(merged_means)
+        self.weights = np.array(merged_weights)
+
+    def _q_limit(self, q):
+        """从分位点 q 开始的质心最多覆盖到的分位点"""
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def quantile(self, q):
+        """
+        分位数估计
+
+        Parameters:
+        -----------
+        q : float
+            0~1
+
+        Returns:
+        --------
+        float or None
+            没有样本时返回None
+        """
+        self._compress()
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        # 每个质心的权重中点位置，两端用 min/max 作为锚点线性插值
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0.0], centers, [total]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * total, positions, values))
+
+    def to_dict(self):
+        self._compress()
+        return {
+            'compression': self.compression,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'centroids': base64.b64encode(
+                np.stack([self.means, self.weights]).astype('<f8').tobytes()).decode('ascii'),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        digest = cls(data.get('compression', 200))
+        raw = np.frombuffer(base64.b64decode(data.get('centroids', '')), dtype='<f8')
+        if len(raw):
+            digest.means, digest.weights = raw.reshape(2, -1).copy()
+            digest.min, digest.max = data['min'], data['max']
+        return digest
+
+
+class RollingQuantile:
+    """
+    单个交易对的滚动窗口总额分布（最近 days 天）
+
+    Parameters:
+    -----------
+    window : float
+        桶长度(秒)
+    days : int
+        保留的天数
+    compression : float
+        每个 digest 的压缩参数
+    """
+
+    def __init__(self, window=300, days=7, compression=200):
+        self.window_ms = int(window * 1000)
+        self.days = days
+        self.compression = compression
+        self.digests = deque()  # (UTC日序号, TDigest)，按日期升序
+        self.bucket = None  # 当前桶序号
+        self.bucket_sum = 0.0
+
+    def _digest_for(self, day):
+        if self.digests and self.digests[-1][0] == day:
+            return self.digests[-1][1]
+        if self.digests and self.digests[-1][0] > day:
+            for d, digest in self.digests:  # 乱序的旧桶
+                if d == day:
+                    return digest
+            return None
+        digest = TDigest(self.compression)
+        self.digests.append((day, digest))
+        while self.digests and self.digests[0][0] <= day - self.days:
+            self.digests.popleft()
+        return digest
+
+    def _close_bucket(self, bucket, value, weight=1.0):
+        digest = self._digest_for(bucket * self.window_ms // DAY_MS)
+        if digest is not None:
+            digest.add(value, weight)
+
+    def advance(self, ts_ms):
+        """把 ts_ms 之前已结束的桶写入 digest（没有爆仓的桶记为0）"""
+        bucket = ts_ms // self.window_ms
+        if self.bucket is None or bucket <= self.bucket:
+            return
+        self._close_bucket(self.bucket, self.bucket_sum)
+        empty = bucket - self.bucket - 1
+        if empty > 0:
+            # 中间空桶合并为一个带权重的0样本，最多计入 days 天
+            empty = min(empty, self.days * DAY_MS // self.window_ms)
+            self._close_bucket(bucket - 1, 0.0, empty)
+        self.bucket = bucket
+        self.bucket_sum = 0.0
+
+    def skip(self, start_ms, end_ms):
+        """
+        [start_ms, end_ms) 期间没有观测（停机、断线），其中的桶不计入分布
+
+        start_ms 之前已结束的桶照常写入；start_ms 所在的桶只观测到一部分，与中间的桶一起丢弃，
+        从 end_ms 所在的桶重新开始累计
+        """
+        if self.bucket is None:
+            return
+        self.advance(start_ms)
+        bucket = end_ms // self.window_ms
+        if bucket > self.bucket:
+            self.bucket = bucket
+            self.bucket_sum = 0.0
+        day = end_ms // DAY_MS
+        while self.digests and self.digests[0][0] <= day - self.days:
+            self.digests.popleft()
+
+    def add(self, ts_ms, value):
+        """记录一笔爆仓"""
+        if self.bucket is None:
+            self.bucket = ts_ms // self.window_ms
+        self.advance(ts_ms)
+        if ts_ms // self.window_ms == self.bucket:
+            self.bucket_sum += value
+
+    def merged(self) -> TDigest:
+        digest = TDigest(self.compression)
+        for _, d in self.digests:
+            digest.merge(d)
+        return digest
+
+    def merge(self, other: 'RollingQuantile'):
+        """按日期合并另一个分片/快照的 digest"""
+        days = {d: digest for d, digest in self.digests}
+        for d, digest in other.digests:
+            if d in days:
+                days[d].merge(digest)
+            else:
+                days[d] = TDigest(self.compression).merge(digest)
+        latest = max(days) if days else 0
+        self.digests = deque((d, days[d]) for d in sorted(days) if d > latest - self.days)
+        return self
+
+    def to_dict(self):
+        return {
+            'bucket': self.bucket,
+            'bucket_sum': self.bucket_sum,
+            'digests': [[d, digest.to_dict()] for d, digest in self.digests],
+        }
+
+    def load(self, data):
+        """从快照合并（当前桶的累计值只在快照仍处于同一个桶时沿用）"""
+        other = RollingQuantile(self.window_ms / 1000, self.days, self.compression)
+        other.digests = deque((d, TDigest.from_dict(item)) for d, item in data.get('digests', []))
+        self.merge(other)
+        if self.bucket is None or self.bucket == data.get('bucket'):
+            self.bucket = data.get('bucket')
+            self.bucket_sum += data.get('bucket_sum', 0.0)
+
+
+class AdaptiveThresholds:
+    """
+    按交易对的自适应爆仓阈值（线程安全）
+
+    Parameters:
+    -----------
+    fallback : float
+        预热期（样本不足）使用的固定阈值
+    window : float
+        窗口长度(秒)，与告警规则中的时间窗口一致
+    percentile : float, optional
+        分位数(0~100)，默认读取 [liquidation] threshold_percentile
+    days : int, optional
+        统计最近几天，默认读取 [liquidation] threshold_days
+    """
+
+    def __init__(self, fallback, window=300, percentile=None, days=None, compression=200):
+        self.fallback = fallback
+        self.window = window
+        self.enabled = get_setting('liquidation', 'adaptive_threshold', 'true').lower() == 'true'
+        self.percentile = percentile if percentile is not None else \
+            get_setting('liquidation', 'threshold_percentile', 99.0, float)
+        self.days = days or get_setting('liquidation', 'threshold_days', 7, int)
+        self.min_samples = get_setting('liquidation', 'threshold_min_samples',
+                                       DAY_MS // int(window * 1000), int)
+        self.floor = get_setting('liquidation', 'threshold_floor', 0.0, float)
+        self.compression = compression
+        self.symbols = {}
+        self._cache = {}  # 交易对 -> (桶序号, 阈值)，同一个桶内不重复合并 digest
+        self._lock = threading.Lock()
+
+    def _get(self, symbol):
+        rolling = self.symbols.get(symbol)
+        if rolling is None:
+            rolling = self.symbols[symbol] = RollingQuantile(self.window, self.days,
+                                                             self.compression)
+        return rolling
+
+    def observe(self, symbol, ts_ms, value):
+        """记录一笔爆仓"""
+        with self._lock:
+            self._get(symbol).add(ts_ms, value)
+
+    def threshold(self, symbol, now_ms=None):
+        """
+        当前阈值
+
+        Returns:
+        --------
+        float
+            最近 N 天固定5分钟桶总额的 percentile 分位数（不低于 threshold_floor），
+            未启用或样本不足时为固定阈值；与滑动窗口总额比较时触发频率偏高，见模块说明
+        """
+        if not self.enabled:
+            return self.fallback
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        with self._lock:
+            rolling = self._get(symbol)
+            rolling.advance(now_ms)
+            cached = self._cache.get(symbol)
+            if cached is not None and cached[0] == rolling.bucket:
+                return cached[1]
+            digest = rolling.merged()
+            if digest.count < self.min_samples:
+                value = self.fallback
+            else:
+                value = max(self.floor, digest.quantile(self.percentile / 100))
+            self._cache[symbol] = (rolling.bucket, value)
+            return value
+
+    def get_stats(self):
+        with self._lock:
+            return {symbol: {'samples': int(rolling.merged().count),
+                             'threshold': self._cache.get(symbol, (None, None))[1],
+                             'days': len(rolling.digests)}
+                    for symbol, rolling in self.symbols.items()}
+
+    def get_state(self):
+        with self._lock:
+            return {symbol: rolling.to_dict() for symbol, rolling in self.symbols.items()}
+
+    def skip(self, start_ms, end_ms=None):
+        """
+        所有交易对在 [start_ms, end_ms) 期间没有观测（断线），这段时间的桶不计入分布
+
+        Parameters:
+        -----------
+        start_ms : int
+            断线开始时间(毫秒)，通常为最后一条消息的时间
+        end_ms : int, optional
+            恢复时间(毫秒)，默认为当前时间
+        """
+        end_ms = int(time.time() * 1000) if end_ms is None else end_ms
+        with self._lock:
+            for rolling in self.symbols.values():
+                rolling.skip(start_ms, end_ms)
+            self._cache.clear()
+
+    def restore_state(self, state, saved_at=None):
+        """
+        从快照恢复；与内存中已有的数据合并，多个分片的快照可依次恢复到同一个对象
+
+        saved_at(秒) 之后的停机时间不计入分布
+        """
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            for symbol, data in state.items():
+                rolling = self._get(symbol)
+                rolling.load(data)
+                if saved_at is not None:
+                    rolling.skip(int(saved_at * 1000), now_ms)
+            self._cache.clear()
+
+
+# 使用示例: 用合成的爆仓数据预热7天并查看阈值
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    thresholds = AdaptiveThresholds(fallback=250000, percentile=99, days=7)
+    start = int(time.time() * 1000) - 7 * DAY_MS
+    ts, events = start, 0
+    while ts < start + 7 * DAY_MS:
+        ts += int(rng.exponential(20_000))  # 平均20秒一笔
+        thresholds.observe('ETHUSDT', ts, float(rng.lognormal(8, 1.5)))
+        events += 1
+    started = time.perf_counter()
+    value = thresholds.threshold('ETHUSDT', ts)
+    print(f"{events} 笔爆仓，P99 阈值 ${value:,.0f}，查询耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+    print(thresholds.get_stats())
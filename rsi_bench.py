@@ -0,0 +1,145 @@
+# rsi_bench.py
+"""
+RSI检查延迟基准
+
+在本进程内启动模拟行情接口（bn_simulator 的HTTP处理类，可设置固定网络延迟），
+对 交易对 × 周期 的全部组合各请求一次K线并计算RSI，分别测量:
+    - sequential: 逐个同步请求（改为 ccxt.async_support 之前的做法）
+    - concurrent: 同一事件循环内 asyncio.gather 并发请求（rsi_notify.check_all 的做法）
+
+ccxt 的 fetch_ohlcv 在本基准中由直接请求 /api/v3/klines 代替（异步版与 ccxt.async_support
+一样基于 aiohttp），因此不需要安装 ccxt；模拟器没有 exchangeInfo 接口，市场元数据缓存
+对启动耗时的影响不在本基准范围内。
+
+使用示例:
+    python3 rsi_bench.py
+    python3 rsi_bench.py --symbols ETHUSDT,BTCUSDT --timeframes 15m,1h,4h --latency-ms 150
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import aiohttp
+import pandas as pd
+import requests
+
+from bn_simulator import SimulatorStats, SyntheticMarket, make_http_handler
+from indicators import IndicatorPipeline
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def start_market_server(latency_ms):
+    """启动本地模拟行情接口，返回 (server, 基础地址)"""
+    handler = make_http_handler(SyntheticMarket(), SimulatorStats(), 0, 0, 0,
+                                rest_latency_ms=latency_ms)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def to_rsi(pipeline, symbol, timeframe, rows):
+    """K线转为 DataFrame 并计算最新RSI（与 RSINotifierFixedWindow 相同的处理）"""
+    df = pd.DataFrame([row[:6] for row in rows], columns=COLUMNS).astype(float)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return pipeline.evaluate(symbol, timeframe, df, ['rsi_14'])['rsi_14'][-1]
+
+
+def check_sequential(base_url, pairs, limit, session, pipeline):
+    """逐个同步请求全部组合，返回RSI列表"""
+    values = []
+    for symbol, timeframe in pairs:
+        rows = session.get(f"{base_url}/api/v3/klines", timeout=10,
+                           params={'symbol': symbol, 'interval': timeframe, 'limit': limit}).json()
+        values.append(to_rsi(pipeline, symbol, timeframe, rows))
+    return values
+
+
+async def check_concurrent(base_url, pairs, limit, session, pipeline):
+    """并发请求全部组合，返回RSI列表"""
+    async def fetch(symbol, timeframe):
+        async with session.get(f"{base_url}/api/v3/klines",
+                               params={'symbol': symbol, 'interval': timeframe,
+                                       'limit': str(limit)}) as response:
+            return to_rsi(pipeline, symbol, timeframe, await response.json())
+
+    return await asyncio.gather(*(fetch(symbol, timeframe) for symbol, timeframe in pairs))
+
+
+def measure(base_url, pairs, limit=100, rounds=5):
+    """
+    测量一次完整检查（全部组合）的耗时
+
+    Returns:
+    --------
+    dict
+        sequential_ms / concurrent_ms 的中位数与最小值（毫秒）
+    """
+    pipeline = IndicatorPipeline()
+    sequential = []
+    with requests.Session() as session:
+        check_sequential(base_url, pairs, limit, session, pipeline)  # 预热连接与指标缓存
+        for _ in range(rounds):
+            started = time.perf_counter()
+            check_sequential(base_url, pairs, limit, session, pipeline)
+            sequential.append((time.perf_counter() - started) * 1000)
+
+    async def run_concurrent():
+        timings = []
+        async with aiohttp.ClientSession() as session:
+            await check_concurrent(base_url, pairs, limit, session, pipeline)
+            for _ in range(rounds):
+                started = time.perf_counter()
+                await check_concurrent(base_url, pairs, limit, session, pipeline)
+                timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    concurrent = asyncio.run(run_concurrent())
+    return {
+        'pairs': len(pairs),
+        'sequential_ms': statistics.median(sequential),
+        'sequential_min_ms': min(sequential),
+        'concurrent_ms': statistics.median(concurrent),
+        'concurrent_min_ms': min(concurrent),
+    }
+
+
+def print_results(results, latency_ms):
+    print(f"模拟网络延迟 {latency_ms:.0f} ms")
+    print(f"{'组合数':>6} {'逐个请求(ms)':>12} {'最小':>8} {'并发请求(ms)':>12} {'最小':>8} {'加速':>6}")
+    for r in results:
+        print(f"{r['pairs']:>6} {r['sequential_ms']:>12.1f} {r['sequential_min_ms']:>8.1f} "
+              f"{r['concurrent_ms']:>12.1f} {r['concurrent_min_ms']:>8.1f} "
+              f"{r['sequential_ms'] / r['concurrent_ms']:>5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSI检查延迟基准")
+    parser.add_argument('--symbols', default='ETHUSDT,BTCUSDT,SOLUSDT', help="交易对，逗号分隔")
+    parser.add_argument('--timeframes', default='15m,1h', help="K线周期，逗号分隔")
+    parser.add_argument('--latency-ms', type=float, default=100, help="模拟交易所网络延迟(毫秒)")
+    parser.add_argument('--limit', type=int, default=100, help="每次请求的K线数")
+    parser.add_argument('--rounds', type=int, default=5, help="每种方式的检查轮数")
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+    timeframes = [t.strip() for t in args.timeframes.split(',') if t.strip()]
+    pairs = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+
+    server, base_url = start_market_server(args.latency_ms)
+    try:
+        # 单个组合（原先只监控 ETH/USDT 15m）与全部组合
+        results = [measure(base_url, pairs[:1], args.limit, args.rounds)]
+        if len(pairs) > 1:
+            results.append(measure(base_url, pairs, args.limit, args.rounds))
+        print_results(results, args.latency_ms)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
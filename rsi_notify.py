@@ -1,39 +1,103 @@
-import ccxt
-import pandas as pd
-import talib
+import asyncio
+import os
 from datetime import datetime, timedelta
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.cron import CronTrigger
-from plyer import notification
 import logging
 import time  # 新增导入，用于添加短暂延迟
-import requests  # 确保在文件开头已经导入
-import json
+
+from bn_config import get_endpoint, get_setting, DEFAULT_ENDPOINTS
+from state_store import StateCheckpointer, save_snapshot, load_snapshot
+from lazy_import import lazy_import
+from notifier import build_notifier
+from alert_throttle import build_throttler
+from indicators import calculate_rsi
+import alert_rules
+
+# 较重的依赖在首次使用时才导入，缩短启动时间
+ccxt_async = lazy_import('ccxt.async_support')
+pd = lazy_import('pandas')
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 市场元数据（exchangeInfo）磁盘缓存，过期前启动时不再下载
+MARKETS_CACHE = os.path.join('state', 'binance_markets.snapshot')
+MARKETS_TTL = 24 * 3600  # 缓存有效期(秒)
+
+async def create_exchange(cache_path=MARKETS_CACHE, ttl=None):
+    """
+    创建异步 ccxt 交易所对象，市场元数据优先从磁盘缓存加载（set_markets），
+    缓存不存在或过期时才调用 load_markets 下载并写回缓存；下载失败时退回使用过期缓存
+    """
+    started = time.time()
+    exchange = ccxt_async.binance({'enableRateLimit': True})
+    # 指向本地模拟器等非默认地址时，覆盖现货公共接口地址
+    rest_url = get_endpoint('binance_rest_url')
+    if rest_url != DEFAULT_ENDPOINTS['binance_rest_url']:
+        exchange.urls['api']['public'] = f"{rest_url}/api/v3"
+
+    if ttl is None:
+        ttl = get_setting('rsi', 'markets_ttl', MARKETS_TTL, int)
+    cached = load_snapshot(cache_path)
+    if cached is not None and time.time() - cached[1] < ttl:
+        exchange.set_markets(cached[0]['markets'], cached[0].get('currencies'))
+        source = "磁盘缓存"
+    else:
+        try:
+            await exchange.load_markets()
+            save_snapshot(cache_path, {'markets': exchange.markets,
+                                       'currencies': exchange.currencies})
+            source = "交易所"
+        except Exception as e:
+            if cached is None:
+                await exchange.close()
+                raise
+            logger.warning(f"下载市场元数据失败，使用过期缓存: {e}")
+            exchange.set_markets(cached[0]['markets'], cached[0].get('currencies'))
+            source = "过期缓存"
+    logger.info(f"市场元数据已加载（{source}，{len(exchange.markets)} 个交易对），"
+                f"耗时 {(time.time() - started) * 1000:.0f} ms")
+    return exchange
+
+_notifier = None
+_throttler = None
+
+RSI_WINDOW = 15 * 60  # 每个15分钟窗口内最多提醒一次
+
+def get_notifier():
+    """RSI监控器共用的通知器（延迟创建）"""
+    global _notifier
+    if _notifier is None:
+        _notifier = build_notifier('rsi_notify', 'qq')
+    return _notifier
+
+def get_throttler():
+    """RSI监控器共用的限频器，按 (交易对, rsi, 周期) 计数；默认不设静默时段"""
+    global _throttler
+    if _throttler is None:
+        _throttler = build_throttler('rsi_notify', f'fixed:1/{RSI_WINDOW}', '')
+    return _throttler
+
 class RSINotifierFixedWindow:
-    def __init__(self, symbol='ETH/USDT', timeframe='15m', rsi_period=14):
+    def __init__(self, symbol='ETH/USDT', timeframe='15m', rsi_period=14, exchange=None,
+                 notifier=None, throttler=None):
         self.symbol = symbol
         self.timeframe = timeframe
         self.rsi_period = rsi_period
-        self.exchange = ccxt.binance({'enableRateLimit': True})
-        # 标记当前15分钟窗口内是否已发送过通知
-        self.notified_in_current_window = False  
+        # 异步交易所对象（由 create_exchange 创建，多个监控器共享）
+        self.exchange = exchange
+        # 通知通道（默认QQ群），多个监控器共享同一个通知器
+        self.notifier = notifier or get_notifier()
+        # 检查耗时统计
+        self.check_count = 0
+        self.last_check_ms = None
+        self.total_check_ms = 0.0
+        # 固定窗口限频（默认每个15分钟窗口最多一次），多个监控器共享同一个限频器
+        self.throttler = throttler or get_throttler()
+        self.throttle_key = (symbol.replace('/', ''), 'rsi', timeframe)
         # 记录当前窗口的起始时间戳（精确到分钟，并规整到15分钟的整数倍）
         self.current_window_start = self.get_current_window_start()
         
-        # === 新增：程序启动时发送一次通知 ===
-        # 添加一个短暂延迟，确保初始化完全完成
-        time.sleep(1)
-        self.send_notification(
-            "RSI监控器已启动", 
-            f"开始监控 {self.symbol} ({self.timeframe}) 的RSI指标。\n监控条件: RSI ≥ 70 或 RSI ≤ 30\n每个15分钟窗口内最多提醒一次。"
-        )
-        # === 新增代码结束 ===
-        
     def get_current_window_start(self):
         """计算当前所属的15分钟窗口的起始时间点"""
         now = datetime.now()
@@ -48,16 +112,28 @@ class RSINotifierFixedWindow:
         now_window_start = self.get_current_window_start()
         if now_window_start > self.current_window_start:
             # 进入了新的时间窗口
-            logger.info(f"进入新的时间窗口: {self.current_window_start} -> {now_window_start}，重置通知标记")
+            logger.info(f"进入新的时间窗口: {self.current_window_start} -> {now_window_start}")
             self.current_window_start = now_window_start
-            self.notified_in_current_window = False
             return True
         return False
 
-    def fetch_ohlcv_data(self, limit=100):
-        """从币安获取K线数据"""
+    @property
+    def notified_in_current_window(self):
+        """当前窗口内是否已达到提醒次数上限"""
+        return self.throttler.wait_time(self.throttle_key) > 0
+
+    async def fetch_ohlcv_data(self, limit=100):
+        """从币安获取K线数据（配置了行情守护进程时从共享内存读取，不产生交易所请求）"""
+        if get_setting('market_data', 'socket_path'):
+            import md_client
+            # 共享内存读取是同步的（顺序锁冲突时会重试），放到线程中执行，不阻塞事件循环
+            shared = await asyncio.to_thread(md_client.get_kline_data,
+                                             self.symbol.replace('/', ''), self.timeframe, limit)
+            if shared is not None:
+                return shared.rename_axis('timestamp').reset_index()
+            logger.warning("行情守护进程不可用，改为直接请求币安")
         try:
-            ohlcv = self.exchange.fetch_ohlcv(self.symbol, self.timeframe, limit=limit)
+            ohlcv = await self.exchange.fetch_ohlcv(self.symbol, self.timeframe, limit=limit)
             df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
             df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
             return df
@@ -71,122 +147,166 @@ class RSINotifierFixedWindow:
             logger.warning("数据不足，无法计算RSI")
             return None, df
         
-        df['RSI'] = talib.RSI(df['close'], timeperiod=self.rsi_period)
+        # 指标流水线按 (交易对, 周期, K线) 缓存中间结果，与其他指标共用收盘价差分
+        df['RSI'] = calculate_rsi(df, self.symbol, self.timeframe, self.rsi_period)
         current_rsi = df['RSI'].iloc[-1]
         return current_rsi, df
 
     def send_notification(self, title, message):
-        def send_notification(self, title, message):
         """
-        通过 go-cqhttp 发送群消息
+        通过通知器发送消息（默认 go-cqhttp 群消息，可在 [notify] rsi_notify_channels 配置多个通道）
         """
-        # API 地址，端口需与 go-cqhttp 配置一致
-        api_url = "http://127.0.0.1:5700/send_group_msg"
+        return self.notifier.notify(message, title=title, symbol=self.symbol)
 
-        # 替换为你的目标 QQ 群号
-        group_id = "你的QQ群号"  # 例如 "123456789"
 
-        # 合并 title 和 message 作为发送的内容
-        full_message = f"{title}\n{message}"
+    @property
+    def rule_key(self):
+        """在规则引擎中区分同一交易对的不同周期"""
+        return f"{self.symbol} {self.timeframe}"
 
-        payload = {
-            "group_id": group_id,
-            "message": full_message
-        }
+    async def update(self):
+        """
+        获取K线并计算最新RSI（记录检查耗时）
 
+        Returns:
+        --------
+        float or None
+            最新RSI，数据不足或获取失败时返回None
+        """
+        started = time.time()
         try:
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(api_url, data=json.dumps(payload), headers=headers, timeout=5)
-
-            # 检查响应状态
-            if response.status_code == 200:
-                result = response.json()
-                if result.get("status") == "ok":
-                    logger.info(f"QQ群消息发送成功: {full_message}")
-                    return True
-                else:
-                    logger.error(f"QQ群消息发送失败，API 返回错误: {result.get('wording')}")
-                    return False
-            else:
-                logger.error(f"HTTP 请求失败，状态码: {response.status_code}")
-                return False
-        except requests.exceptions.ConnectionError:
-            logger.error("无法连接到 go-cqhttp 服务，请检查其是否正常运行。")
-            return False
-        except requests.exceptions.Timeout:
-            logger.error("发送QQ消息请求超时。")
-            return False
-        except Exception as e:
-            logger.error(f"发送QQ消息时发生未知错误: {e}")
-            return False
-
+            return await self._update()
+        finally:
+            self.last_check_ms = (time.time() - started) * 1000
+            self.check_count += 1
+            self.total_check_ms += self.last_check_ms
+            logger.info(f"{self.symbol} {self.timeframe} 本次检查耗时 {self.last_check_ms:.0f} ms"
+                        f"（平均 {self.total_check_ms / self.check_count:.0f} ms）")
 
-    def check_and_notify(self):
-        """检查RSI条件并在满足条件时发送通知（遵守固定窗口限制）"""
+    async def _update(self):
         # 每次检查前，先确认是否进入新窗口
         self.check_window_shift()
         
-        logger.info("开始检查RSI...")
+        logger.info(f"开始检查RSI: {self.symbol} {self.timeframe}")
         # 获取数据
-        df = self.fetch_ohlcv_data()
+        df = await self.fetch_ohlcv_data()
         if df is None or df.empty:
             logger.warning("未获取到数据，跳过本次检查")
-            return
+            return None
 
         # 计算RSI
         current_rsi, df_with_rsi = self.calculate_rsi(df)
         if current_rsi is None:
-            return
+            return None
 
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         logger.info(f"[{current_time}] {self.symbol} RSI: {current_rsi:.2f}")
+        return current_rsi
+
+    async def check_and_notify(self):
+        """检查RSI条件并在满足条件时发送通知（遵守固定窗口限制）"""
+        await check_all([self])
+
+    async def handle_matches(self, current_rsi, matches):
+        """
+        处理规则计算结果（触发条件见 alert_rules.cfg 的 rsi 组）
 
-        # 检查RSI条件
-        conditions_met = []
-        if current_rsi >= 70:
-            conditions_met.append(f"RSI过高: {current_rsi:.2f}")
-        elif current_rsi <= 30:
-            conditions_met.append(f"RSI过低: {current_rsi:.2f}")
+        Parameters:
+        -----------
+        current_rsi : float
+            最新RSI
+        matches : list of alert_rules.Match
+            本监控器触发的规则
+        """
+        conditions_met = [m.message for m in matches]
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         # 如果条件满足且当前窗口内未发送过通知
-        if conditions_met and not self.notified_in_current_window:
+        if conditions_met and not self.notified_in_current_window \
+                and not self.throttler.quiet():
             title = f"RSI提醒 - {self.symbol}"
             message = f"当前RSI: {current_rsi:.2f}\n"
             message += "\n".join(conditions_met)
             message += f"\n时间: {current_time}"
             message += f"\n时间窗口: {self.current_window_start.strftime('%H:%M')} - {(self.current_window_start + timedelta(minutes=15)).strftime('%H:%M')}"
             
-            if self.send_notification(title, message):
-                self.notified_in_current_window = True
+            # 发送消息是同步请求，放到线程池执行，不阻塞其他交易对的检查
+            loop = asyncio.get_running_loop()
+            if await loop.run_in_executor(None, self.send_notification, title, message):
+                self.throttler.record(self.throttle_key)
                 logger.info(f"已发送RSI提醒: {conditions_met}，本窗口内将不再提醒")
         elif conditions_met and self.notified_in_current_window:
             logger.info(f"RSI条件满足但本窗口内已发送过通知，跳过提醒")
+        elif conditions_met:
+            logger.info(f"RSI条件满足但处于静默时段（{self.throttler.quiet_hours}），跳过提醒")
         else:
-            logger.info("RSI条件未满足")
+            logger.info(f"{self.symbol} {self.timeframe} RSI条件未满足")
 
-def main():
-    # 创建RSI监控器
-    notifier = RSINotifierFixedWindow(
-        symbol='ETH/USDT',
-        timeframe='15m',
-        rsi_period=14
-    )
+def parse_list(value):
+    """逗号分隔的配置项转为列表"""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def send_startup_notice(notifiers):
+    """
+    程序启动时按交易对各发送一次通知（只提交不等待，不阻塞事件循环）
+    """
+    timeframes = {}
+    for n in notifiers:
+        timeframes.setdefault(n.symbol, []).append(n.timeframe)
+    for symbol, frames in timeframes.items():
+        get_notifier().notify(
+            f"开始监控 {symbol} ({', '.join(frames)}) 的RSI指标。\n监控条件: RSI ≥ 70 或 RSI ≤ 30\n每个15分钟窗口内最多提醒一次。",
+            title="RSI监控器已启动", symbol=symbol, wait_ack=False)
 
-    # 创建调度器
-    scheduler = BlockingScheduler()
+async def check_all(notifiers):
+    """并发获取所有交易对/周期的RSI，再一次性计算全部告警规则"""
+    started = time.time()
+    values = await asyncio.gather(*(n.update() for n in notifiers))
+    ready = [(n, v) for n, v in zip(notifiers, values) if v is not None]
+    if ready:
+        matches = alert_rules.evaluate('rsi', [n.rule_key for n, _ in ready],
+                                       {'rsi': [v for _, v in ready]})
+        await asyncio.gather(*(n.handle_matches(v, [m for m in matches if m.symbol == n.rule_key])
+                               for n, v in ready))
+    logger.info(f"完成 {len(notifiers)} 个RSI检查，总耗时 {(time.time() - started) * 1000:.0f} ms")
+
+async def run():
+    started = time.time()
+    exchange = await create_exchange()
+
+    # 创建RSI监控器（可在 bot_config.cfg 的 [rsi] 节配置多个交易对/周期，逗号分隔）
+    symbols = parse_list(get_setting('rsi', 'symbols', 'ETH/USDT'))
+    timeframes = parse_list(get_setting('rsi', 'timeframes', '15m'))
+    notifiers = [
+        RSINotifierFixedWindow(symbol=symbol, timeframe=timeframe, rsi_period=14,
+                               exchange=exchange)
+        for symbol in symbols for timeframe in timeframes
+    ]
+
+    # 恢复上次运行的窗口通知状态（所有交易对/周期共用一个限频器），并定期保存快照
+    checkpointer = StateCheckpointer('rsi_notify', interval=30)
+    throttler = get_throttler()
+    checkpointer.register_state('throttle', throttler.get_state, throttler.restore_state)
+    checkpointer.restore()
+    checkpointer.start()
+
+    # 创建调度器（与交易所请求共用同一个事件循环）
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    scheduler = AsyncIOScheduler()
 
     # 添加定时任务：每分钟检查一次（您可以根据需要调整检查频率，例如每2分钟或5分钟）
     # 触发时间设定为每分钟的第30秒执行，可以适当分散请求
     scheduler.add_job(
-        notifier.check_and_notify,
+        check_all,
         'cron',
+        args=[notifiers],
         second=30,
         id='rsi_check'
     )
 
     # 添加一个每15分钟整点打印窗口信息的任务（可选，用于观察窗口切换）
     scheduler.add_job(
-        lambda: logger.info(f"当前窗口起始: {notifier.current_window_start.strftime('%H:%M')}, 窗口内已通知: {notifier.notified_in_current_window}"),
+        lambda: [logger.info(f"{n.symbol} {n.timeframe} 当前窗口起始: {n.current_window_start.strftime('%H:%M')}, 窗口内已通知: {n.notified_in_current_window}") for n in notifiers],
         'cron',
         minute='0,15,30,45',
         second=0,
@@ -195,16 +315,26 @@ def main():
 
     try:
         logger.info("启动RSI监控器（固定窗口模式）...")
+        logger.info(f"监控: {', '.join(f'{n.symbol} {n.timeframe}' for n in notifiers)}")
         logger.info("监控条件: RSI ≥ 70 或 RSI ≤ 30")
         logger.info("通知规则: 每个15分钟时间窗口内最多提醒一次")
+        logger.info(f"启动耗时 {(time.time() - started) * 1000:.0f} ms")
         logger.info("程序运行中，按 Ctrl+C 退出")
         scheduler.start()
+        send_startup_notice(notifiers)
+        await asyncio.Event().wait()
+    finally:
+        checkpointer.stop()
+        scheduler.shutdown(wait=False)
+        await exchange.close()
+
+def main():
+    try:
+        asyncio.run(run())
     except KeyboardInterrupt:
         logger.info("监控程序被用户中断")
     except Exception as e:
         logger.error(f"监控程序出错: {e}")
-    finally:
-        scheduler.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
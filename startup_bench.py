@@ -0,0 +1,99 @@
+# startup_bench.py
+"""
+启动耗时基准
+
+每个入口模块在全新的解释器中导入若干次，统计导入耗时与进程总耗时；
+--report 在本进程内用 lazy_import.ImportTimer 输出指定模块的导入耗时明细。
+
+使用示例:
+    python3 startup_bench.py                       # 默认入口模块，各运行5次
+    python3 startup_bench.py eth_robot_wt --runs 10
+    python3 startup_bench.py --report eth_robot_wt
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ['wechat_bot', 'bn_eth', 'eth_robot_wt', 'rsi_notify',
+                   'bn_liquadation_log', 'md_daemon']
+
+# 子进程内执行: 导入目标模块并输出导入耗时(ms)
+_CHILD_CODE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+print('IMPORT_MS', (time.perf_counter() - started) * 1000)
+"""
+
+
+def measure(module, runs=5):
+    """
+    在全新解释器中导入模块 runs 次
+
+    Returns:
+    --------
+    dict
+        import_ms / process_ms 的中位数与最小值；导入失败时包含 error
+    """
+    import_ms, process_ms = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', _CHILD_CODE.format(module=module)],
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            error = (result.stderr.strip().splitlines() or ['未知错误'])[-1]
+            return {'module': module, 'error': error}
+        for line in result.stdout.splitlines():
+            if line.startswith('IMPORT_MS'):
+                import_ms.append(float(line.split()[1]))
+        process_ms.append(elapsed)
+    return {
+        'module': module,
+        'import_ms': statistics.median(import_ms),
+        'import_min_ms': min(import_ms),
+        'process_ms': statistics.median(process_ms),
+    }
+
+
+def print_results(results):
+    print(f"{'模块':<20} {'导入中位数(ms)':>14} {'导入最小(ms)':>12} {'进程总耗时(ms)':>14}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['module']:<20} 导入失败: {r['error']}")
+            continue
+        print(f"{r['module']:<20} {r['import_ms']:>14.1f} {r['import_min_ms']:>12.1f} "
+              f"{r['process_ms']:>14.1f}")
+
+
+def import_report(module, top=25):
+    """在本进程内导入模块并输出导入耗时明细"""
+    from lazy_import import ImportTimer
+    with ImportTimer() as timer:
+        try:
+            __import__(module)
+        except Exception as e:
+            print(f"导入 {module} 失败: {e}")
+    print(timer.report(top))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help="要测量的入口模块")
+    parser.add_argument('--runs', type=int, default=5, help="每个模块的运行次数")
+    parser.add_argument('--report', metavar='MODULE', help="输出该模块的导入耗时明细")
+    parser.add_argument('--top', type=int, default=25, help="明细中列出的模块数")
+    args = parser.parse_args()
+
+    if args.report:
+        import_report(args.report, args.top)
+        return
+    print_results([measure(module, args.runs) for module in args.modules])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# state_store.py
+"""
+运行状态快照（热重启）
+
+各模块通过 register_state 注册自己的状态读写函数，StateCheckpointer 定期把所有状态
+写入本地压缩快照；重启时先恢复快照，再由各模块自行补齐停机期间缺失的数据，
+避免重复报警和全量重新拉取历史数据。
+
+快照写入先写临时文件再 os.replace 原子替换，进程在任何时刻被杀都不会留下半个文件。
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR = "state"
+SNAPSHOT_VERSION = 1
+
+
+def _default(obj):
+    """JSON序列化扩展: datetime 转为带标记的字符串"""
+    if isinstance(obj, datetime):
+        return {'__datetime__': obj.isoformat()}
+    if hasattr(obj, 'tolist'):  # numpy 数组 / 标量
+        return obj.tolist()
+    raise TypeError(f"无法序列化的类型: {type(obj)}")
+
+
+def _object_hook(obj):
+    if '__datetime__' in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+def save_snapshot(path, state):
+    """
+    原子地写入压缩快照
+
+    Parameters:
+    -----------
+    path : str
+        快照文件路径
+    state : dict
+        可JSON序列化的状态（支持 datetime）
+
+    Returns:
+    --------
+    int
+        写入的字节数
+    """
+    payload = {'version': SNAPSHOT_VERSION, 'saved_at': time.time(), 'state': state}
+    raw = json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+    data = zlib.compress(raw, 6)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.snapshot-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(data)
+
+
+def load_snapshot(path):
+    """
+    读取快照
+
+    Returns:
+    --------
+    tuple or None
+        (state, saved_at)，文件不存在或损坏时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            raw = zlib.decompress(f.read())
+        payload = json.loads(raw.decode('utf-8'), object_hook=_object_hook)
+        if payload.get('version') != SNAPSHOT_VERSION:
+            logger.warning(f"快照版本不匹配，忽略: {path}")
+            return None
+        return payload['state'], payload['saved_at']
+    except Exception as e:
+        logger.error(f"读取快照失败，忽略: {path}: {e}")
+        return None
+
+
+class StateCheckpointer:
+    """
+    状态快照管理器
+
+    Parameters:
+    -----------
+    name : str
+        快照名称，文件保存为 state/<name>.snapshot
+    interval : float
+        定期保存的间隔(秒)
+    """
+
+    def __init__(self, name, interval=30, state_dir=STATE_DIR):
+        self.path = os.path.join(state_dir, f"{name}.snapshot")
+        self.interval = interval
+        self._providers = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_saved_at = None
+        self.last_size = 0
+
+    def register_state(self, key, get_state, restore_state):
+        """
+        注册一组状态
+
+        Parameters:
+        -----------
+        key : str
+            快照中的键名
+        get_state : callable
+            无参函数，返回可序列化的状态
+        restore_state : callable
+            接收 (state, saved_at) 的恢复函数
+        """
+        self._providers[key] = (get_state, restore_state)
+
+    def save(self):
+        """立即保存一次快照"""
+        state = {}
+        for key, (get_state, _) in self._providers.items():
+            try:
+                state[key] = get_state()
+            except Exception as e:
+                logger.error(f"收集状态 {key} 失败: {e}")
+        try:
+            self.last_size = save_snapshot(self.path, state)
+            self.last_saved_at = time.time()
+        except Exception as e:
+            logger.error(f"保存快照失败: {e}")
+
+    def restore(self):
+        """
+        从快照恢复所有已注册的状态
+
+        Returns:
+        --------
+        bool
+            是否找到并恢复了快照
+        """
+        start = time.perf_counter()
+        loaded = load_snapshot(self.path)
+        if loaded is None:
+            return False
+        state, saved_at = loaded
+        for key, (_, restore_state) in self._providers.items():
+            if key not in state:
+                continue
+            try:
+                restore_state(state[key], saved_at)
+            except Exception as e:
+                logger.error(f"恢复状态 {key} 失败: {e}")
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(f"已从快照恢复状态（停机 {time.time() - saved_at:.0f} 秒，耗时 {elapsed:.1f} 毫秒）")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def start(self):
+        """启动后台定期保存线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台线程并保存最终快照"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.save()
@@ -0,0 +1,451 @@
+# status_api.py
+"""
+本地只读 HTTP 状态接口
+
+各模块把自己的状态注册为一个分区（与 StateCheckpointer.register_state 类似）:
+    board.register('liquidation', get_status)            写入时 board.mark('liquidation') 标记为过期
+    board.register('notify', get_stats, interval=10)     没有写入钩子的统计按间隔刷新
+    board.publish('indicators', data)                    写入方已有现成数据时直接发布
+
+后台刷新线程每 refresh_interval 秒重新生成被标记或到期的分区，序列化为 JSON 字节并整体替换；
+HTTP 服务在独立线程的事件循环中运行，请求只读取已序列化好的字节，不调用任何模块的函数、
+不加锁，轮询再频繁也不会影响行情与爆仓处理。
+
+接口（只支持 GET，支持 If-None-Match）:
+    /status             所有分区 {"generated_at": ..., "sections": {分区: {"updated_at": ..., "data": ...}}}
+    /status/<分区>      单个分区
+    /health             存活检查与各分区的数据年龄
+
+配置在 bot_config.cfg 的 [status_api] 节:
+    enabled = true
+    host = 127.0.0.1
+    eth_robot_wt_port = 8099       ; 各机器人单独的端口，同一台机器上同时运行时互不冲突
+    bn_liquadation_port = 8098
+    bn_liquadation_log_port = 8097
+    ; port = 8099                  ; 设置后未配置 <机器人>_port 的机器人都使用该端口
+    refresh_interval = 0.5
+
+使用示例:
+    curl -s http://127.0.0.1:8099/status | python3 -m json.tool
+    python3 status_api.py --clients 50 --seconds 5     ; 轮询压测
+"""
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+
+from bn_config import get_setting
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 8192
+REASONS = {200: 'OK', 304: 'Not Modified', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+def _default(obj):
+    """JSON序列化扩展: datetime 转为 ISO 字符串，numpy 转为列表/标量"""
+    if isinstance(obj, datetime):
+        return obj.isoformat(timespec='seconds')
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return str(obj)
+
+
+def _clean(value):
+    """把 NaN/inf 替换为 None（标准 JSON 不支持），字典的非字符串键转为字符串"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k if isinstance(k, str) else str(k): _clean(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(v) for v in value]
+    if hasattr(value, 'tolist'):
+        return _clean(value.tolist())
+    return value
+
+
+def encode(data):
+    return json.dumps(_clean(data), ensure_ascii=False, default=_default,
+                      separators=(',', ':')).encode('utf-8')
+
+
+class Section:
+    """一个状态分区: 数据来源与最近一次序列化的结果"""
+
+    def __init__(self, name, provider=None, interval=None):
+        self.name = name
+        self.provider = provider
+        self.interval = interval
+        self.dirty = provider is not None
+        self.body = None        # {"updated_at": ..., "data": ...} 的 JSON 字节
+        self.updated_at = None
+        self.builds = 0
+        self.errors = 0
+        self.last_error = None
+
+
+class StatusBoard:
+    """
+    预先序列化的状态快照（读取无锁）
+
+    Parameters:
+    -----------
+    refresh_interval : float
+        后台刷新线程的检查间隔(秒)，也是被标记分区的最大更新延迟
+    """
+
+    def __init__(self, refresh_interval=None):
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            get_setting('status_api', 'refresh_interval', 0.5, float)
+        self.started_at = time.time()
+        self.sections = {}
+        self.version = 0
+        # 读者只读取这个元组，写者整体替换: (版本, /status 的响应体, {分区: 响应体})
+        self.snapshot = (0, encode({'generated_at': self.started_at, 'sections': {}}), {})
+        # 只在写者之间互斥；可重入: provider 首次调用时可能导入其他模块，模块导入时又会 register
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name, provider, interval=None):
+        """
+        注册分区
+
+        Parameters:
+        -----------
+        name : str
+            分区名，即 /status/<name>
+        provider : callable
+            provider() -> 可JSON序列化的数据，在刷新线程中调用
+        interval : float, optional
+            定期刷新间隔(秒)；None 表示只在 mark 后刷新
+        """
+        with self._lock:
+            self.sections[name] = Section(name, provider, interval)
+
+    def mark(self, name):
+        """标记分区已变化（写路径调用，O(1)）"""
+        section = self.sections.get(name)
+        if section is not None:
+            section.dirty = True
+
+    def publish(self, name, data):
+        """直接发布分区数据（在调用线程中序列化）"""
+        with self._lock:
+            section = self.sections.get(name)
+            if section is None:
+                section = self.sections[name] = Section(name)
+            self._store(section, data, time.time())
+            self._rebuild()
+
+    def _store(self, section, data, now):
+        section.body = b'{"updated_at":%s,"data":%s}' % (json.dumps(now).encode(), encode(data))
+        section.updated_at = now
+        section.builds += 1
+
+    def _build(self, section, now):
+        section.dirty = False
+        try:
+            data = section.provider()
+        except Exception as e:
+            section.errors += 1
+            section.last_error = str(e)
+            logger.warning(f"状态分区 {section.name} 生成失败: {e}")
+            return False
+        self._store(section, data, now)
+        return True
+
+    def _rebuild(self):
+        """拼接 /status 响应体（各分区已是 JSON 字节，不重复序列化）"""
+        bodies = {name: s.body for name, s in self.sections.items() if s.body is not None}
+        parts = b','.join(json.dumps(name).encode() + b':' + body for name, body in bodies.items())
+        self.version += 1
+        status = b'{"generated_at":%s,"sections":{%s}}' % (json.dumps(time.time()).encode(), parts)
+        self.snapshot = (self.version, status, bodies)
+
+    def refresh(self, force=False):
+        """重新生成被标记或到期的分区，返回重新生成的分区数"""
+        now = time.time()
+        with self._lock:
+            built = 0
+            for section in list(self.sections.values()):
+                if section.provider is None:
+                    continue
+                due = section.interval is not None and (
+                    section.updated_at is None or now - section.updated_at >= section.interval)
+                if force or section.dirty or due:
+                    built += self._build(section, now)
+            if built:
+                self._rebuild()
+            return built
+
+    def health(self):
+        """/health 的响应体（数据量很小，按请求生成）"""
+        now = time.time()
+        return encode({
+            'ok': True,
+            'uptime': now - self.started_at,
+            'version': self.snapshot[0],
+            'sections': {name: {'age': now - s.updated_at if s.updated_at else None,
+                                'builds': s.builds, 'errors': s.errors, 'last_error': s.last_error}
+                         for name, s in list(self.sections.items())},
+        })
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"刷新状态快照出错: {e}")
+
+    def start(self):
+        """启动后台刷新线程"""
+        if self._thread is None:
+            self.refresh(force=True)
+            self._thread = threading.Thread(target=self._run, name='status-board', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class StatusServer:
+    """
+    只读 HTTP/1.1 服务（asyncio，支持 keep-alive），在独立线程的事件循环中运行
+
+    Parameters:
+    -----------
+    board : StatusBoard
+    host, port : 监听地址，未指定时读取 [status_api] 节
+    """
+
+    def __init__(self, board, host=None, port=None):
+        self.board = board
+        self.host = host or get_setting('status_api', 'host', '127.0.0.1')
+        self.port = port if port is not None else get_setting('status_api', 'port', DEFAULT_PORT, int)
+        self.requests = 0
+        self.not_modified = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def _route(self, method, path, headers):
+        """返回 (状态码, 响应体, ETag)"""
+        if method != 'GET':
+            return 405, encode({'error': 'method not allowed'}), None
+        path = path.split('?', 1)[0].rstrip('/')
+        version, status, bodies = self.board.snapshot
+        if path == '/health':
+            return 200, self.board.health(), None
+        if path == '/status':
+            body = status
+        elif path.startswith('/status/') and path[8:] in bodies:
+            body = bodies[path[8:]]
+        else:
+            return 404, encode({'error': 'not found', 'sections': sorted(bodies)}), None
+        etag = f'"{version}"'
+        if headers.get('if-none-match') == etag:
+            self.not_modified += 1
+            return 304, b'', etag
+        return 200, body, etag
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                parts = lines[0].split(' ')
+                if len(parts) != 3:
+                    break
+                method, path, protocol = parts
+                headers = {}
+                for line in lines[1:]:
+                    key, _, value = line.partition(':')
+                    if key:
+                        headers[key.strip().lower()] = value.strip()
+                self.requests += 1
+                code, body, etag = self._route(method, path, headers)
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' and (protocol == 'HTTP/1.1' or connection == 'keep-alive')
+                etag_line = f"ETag: {etag}\r\n" if etag else ''
+                header = (f"HTTP/1.1 {code} {REASONS[code]}\r\n"
+                          f"Content-Type: application/json; charset=utf-8\r\n"
+                          f"Content-Length: {len(body)}\r\n"
+                          f"Cache-Control: no-cache\r\n{etag_line}"
+                          f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+                writer.write(header.encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port,
+                                                  limit=MAX_HEADER_BYTES)
+        self._ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except asyncio.CancelledError:
+            pass
+        except OSError as e:
+            logger.error(f"状态接口无法监听 {self.host}:{self.port}: {e}")
+        finally:
+            self._ready.set()
+            self._loop.close()
+
+    def start(self, timeout=5.0):
+        """在后台线程中启动，返回是否已开始监听"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='status-api', daemon=True)
+            self._thread.start()
+        self._ready.wait(timeout)
+        return self._server is not None and self._server.is_serving()
+
+    def stop(self):
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+
+DEFAULT_PORT = 8099
+# 各机器人的默认端口，同一台机器上同时运行多个机器人时不冲突
+BOT_PORTS = {
+    'eth_robot_wt': 8099,
+    'bn_liquadation': 8098,
+    'bn_liquadation_log': 8097,
+}
+
+_board = None
+_server = None
+_lock = threading.Lock()
+
+
+def get_board() -> StatusBoard:
+    """全局状态快照（延迟初始化），各模块在导入时注册分区"""
+    global _board
+    with _lock:
+        if _board is None:
+            _board = StatusBoard()
+        return _board
+
+
+def status_port(name=None):
+    """机器人的状态接口端口: [status_api] <name>_port > port > BOT_PORTS 中的默认端口"""
+    port = get_setting('status_api', f'{name}_port', None, int) if name else None
+    if port is None:
+        port = get_setting('status_api', 'port', None, int)
+    return port if port is not None else BOT_PORTS.get(name, DEFAULT_PORT)
+
+
+def start_status_api(name=None):
+    """
+    启动刷新线程与 HTTP 服务（[status_api] enabled = false 时不启动）
+
+    Parameters:
+    -----------
+    name : str, optional
+        机器人名称，用于读取 [status_api] <name>_port
+
+    Returns:
+    --------
+    StatusServer or None
+        端口被占用等原因无法监听时返回None（并打印提示）
+    """
+    global _server
+    if get_setting('status_api', 'enabled', 'true').lower() != 'true':
+        return None
+    board = get_board()
+    board.start()
+    with _lock:
+        if _server is None:
+            server = StatusServer(board, port=status_port(name))
+            if server.start():
+                _server = server
+                print(f"状态接口: http://{server.host}:{server.port}/status")
+            else:
+                option = f"{name}_port" if name else "port"
+                print(f"⚠️ 状态接口未启动: 无法监听 {server.host}:{server.port}"
+                      f"（可能已被其他机器人占用），请在 [status_api] 中配置 {option}")
+    return _server
+
+
+async def _poll(host, port, path, seconds, latencies):
+    """单个 keep-alive 客户端持续轮询"""
+    reader, writer = await asyncio.open_connection(host, port)
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+    deadline = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        writer.write(request)
+        head = await reader.readuntil(b'\r\n\r\n')
+        length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - started)
+        count += 1
+    writer.close()
+    return count
+
+
+# 使用示例: 启动接口并用多个 keep-alive 客户端压测（压测客户端在主线程，服务在后台线程）
+if __name__ == "__main__":
+    import argparse
+    import random
+    import statistics
+
+    parser = argparse.ArgumentParser(description="状态接口轮询压测")
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--port', type=int, default=0, help="0 表示使用 [status_api] port")
+    args = parser.parse_args()
+
+    board = get_board()
+    writes = {'count': 0}
+
+    def liquidation_status():
+        return {'ETHUSDT': {'liq_sum_300': random.uniform(0, 1e6), 'records': writes['count']}}
+
+    board.register('liquidation', liquidation_status)
+    board.register('robot', lambda: {'connection_ok': True, 'time': datetime.now()}, interval=1)
+    board.start()
+    server = StatusServer(board, port=args.port or None)
+    if not server.start():
+        raise SystemExit(f"无法监听 {server.host}:{server.port}")
+
+    def writer():
+        # 模拟爆仓流的写入: 每毫秒标记一次分区
+        while True:
+            writes['count'] += 1
+            board.mark('liquidation')
+            time.sleep(0.001)
+
+    threading.Thread(target=writer, daemon=True).start()
+
+    async def main():
+        latencies = []
+        counts = await asyncio.gather(*(_poll(server.host, server.port, '/status', args.seconds, latencies)
+                                        for _ in range(args.clients)))
+        total = sum(counts)
+        latencies.sort()
+        print(f"{args.clients} 个客户端 {args.seconds:.0f} 秒: {total} 次请求，{total / args.seconds:,.0f} 次/秒，"
+              f"延迟 P50 {statistics.median(latencies) * 1000:.2f} ms，"
+              f"P99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+        print(f"写入 {writes['count']} 次，快照版本 {board.snapshot[0]}（每 {board.refresh_interval} 秒最多重建一次）")
+
+    asyncio.run(main())
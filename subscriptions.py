@@ -0,0 +1,255 @@
+# subscriptions.py
+"""
+告警订阅路由
+
+一个机器人服务多个企业微信/QQ群，每个群只关心部分交易对和告警类型。
+SubscriptionRegistry 以 (交易对, 告警类型) 为键索引订阅者，一条告警的接收者集合
+通过字典查找得到（O(1)，结果按键缓存，订阅变化时失效）；交易对或类型可用 '*' 通配。
+SubscriptionDispatcher 用共享的连接池（requests.Session + HTTPAdapter，keep-alive）
+并发投递，不为每条消息重新建立TCP/TLS连接。
+
+订阅配置 subscriptions.cfg（可通过 [notify] subscriptions_file 指定路径）:
+    [交易群A]
+    type = wechat
+    target = https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=xxx
+    symbols = ETHUSDT,BTCUSDT
+    rules = liquidation,wavetrend
+
+    [QQ群B]
+    type = qq
+    target = 123456789
+    symbols = *
+    rules = rsi
+"""
+import configparser
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple
+
+from bn_config import get_endpoint, get_setting
+from lazy_import import lazy_import
+
+requests = lazy_import('requests')
+
+logger = logging.getLogger(__name__)
+
+RULE_LIQUIDATION = 'liquidation'
+RULE_WAVETREND = 'wavetrend'
+RULE_RSI = 'rsi'
+WILDCARD = '*'
+
+SUBSCRIPTIONS_FILE = 'subscriptions.cfg'
+
+
+@dataclass(frozen=True)
+class Recipient:
+    """
+    告警接收者
+
+    Parameters:
+    -----------
+    kind : str
+        'wechat'（target 为 webhook 地址）或 'qq'（target 为群号）
+    target : str
+        webhook 地址或QQ群号
+    name : str
+        显示名称
+    """
+    kind: str
+    target: str
+    name: str = ''
+
+
+class SubscriptionRegistry:
+    """(交易对, 告警类型) -> 接收者集合 的索引（线程安全）"""
+
+    def __init__(self):
+        self._index: Dict[Tuple[str, str], set] = {}
+        self._cache: Dict[Tuple[str, str], tuple] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(symbol, rule):
+        return (symbol.upper().replace('/', '') if symbol != WILDCARD else WILDCARD, rule)
+
+    def subscribe(self, recipient: Recipient, symbols: Iterable[str] = (WILDCARD,),
+                  rules: Iterable[str] = (WILDCARD,)):
+        """为接收者订阅若干交易对与告警类型的组合"""
+        with self._lock:
+            for symbol in symbols:
+                for rule in rules:
+                    self._index.setdefault(self._key(symbol, rule), set()).add(recipient)
+            self._cache.clear()
+
+    def unsubscribe(self, recipient: Recipient):
+        """取消接收者的全部订阅"""
+        with self._lock:
+            for key in list(self._index):
+                self._index[key].discard(recipient)
+                if not self._index[key]:
+                    del self._index[key]
+            self._cache.clear()
+
+    def resolve(self, symbol, rule) -> tuple:
+        """
+        一条告警的接收者
+
+        Returns:
+        --------
+        tuple of Recipient
+            精确订阅与通配订阅的并集（去重）
+        """
+        key = self._key(symbol, rule)
+        recipients = self._cache.get(key)
+        if recipients is not None:
+            return recipients
+        with self._lock:
+            merged = set()
+            for k in (key, (key[0], WILDCARD), (WILDCARD, rule), (WILDCARD, WILDCARD)):
+                merged |= self._index.get(k, set())
+            recipients = self._cache[key] = tuple(merged)
+        return recipients
+
+    def __len__(self):
+        with self._lock:
+            return len({r for recipients in self._index.values() for r in recipients})
+
+    def load(self, path=None):
+        """
+        从配置文件加载订阅
+
+        Returns:
+        --------
+        int
+            加载的接收者数
+        """
+        path = path or get_setting('notify', 'subscriptions_file', SUBSCRIPTIONS_FILE)
+        if not os.path.exists(path):
+            return 0
+        config = configparser.ConfigParser()
+        config.read(path, encoding='utf-8')
+        for section in config.sections():
+            item = config[section]
+            recipient = Recipient(item.get('type', 'wechat'), item['target'], section)
+            self.subscribe(recipient,
+                           [s.strip() for s in item.get('symbols', WILDCARD).split(',') if s.strip()],
+                           [r.strip() for r in item.get('rules', WILDCARD).split(',') if r.strip()])
+        return len(config.sections())
+
+
+def create_session(pool_size=32):
+    """带连接池的 requests.Session，同一主机的连接在多次投递间复用"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class SubscriptionDispatcher:
+    """
+    按订阅并发投递告警
+
+    Parameters:
+    -----------
+    registry : SubscriptionRegistry
+        订阅索引
+    max_workers : int
+        并发投递线程数（同时也是连接池大小）
+    timeout : float
+        单次HTTP请求超时(秒)
+    """
+
+    def __init__(self, registry, max_workers=16, timeout=10.0):
+        self.registry = registry
+        self.timeout = timeout
+        self.session = create_session(max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='subscriptions')
+        self.stats = {'published': 0, 'deliveries': 0, 'failures': 0}
+        self._lock = threading.Lock()
+
+    def _send(self, recipient, content):
+        try:
+            if recipient.kind == 'wechat':
+                from wechat_bot import get_quota, WECHAT_RATE_LIMIT_ERRCODE
+                quota = get_quota(recipient.target)
+                if quota.remaining() <= 0:
+                    raise RuntimeError("webhook 配额已用完")
+                quota.record()
+                data = {"msgtype": "text", "text": {"content": content}}
+                result = self.session.post(recipient.target, data=json.dumps(data),
+                                           headers={'Content-Type': 'application/json'},
+                                           timeout=self.timeout).json()
+                if result.get('errcode') == WECHAT_RATE_LIMIT_ERRCODE:
+                    quota.block(60)
+                ok = result.get('errcode') == 0
+            elif recipient.kind == 'qq':
+                payload = {"group_id": recipient.target, "message": content}
+                result = self.session.post(f"{get_endpoint('gocqhttp_url')}/send_group_msg",
+                                           data=json.dumps(payload),
+                                           headers={'Content-Type': 'application/json'},
+                                           timeout=self.timeout).json()
+                ok = result.get('status') == 'ok'
+            else:
+                raise ValueError(f"未知的接收者类型: {recipient.kind}")
+        except Exception as e:
+            logger.error(f"投递到 {recipient.name or recipient.target} 失败: {e}")
+            ok = False
+        with self._lock:
+            self.stats['deliveries'] += 1
+            if not ok:
+                self.stats['failures'] += 1
+        return ok
+
+    def publish(self, symbol, rule, content, wait=True):
+        """
+        把告警投递给订阅了 (symbol, rule) 的全部接收者
+
+        Parameters:
+        -----------
+        symbol : str
+            交易对，如 ETHUSDT 或 ETH/USDT
+        rule : str
+            告警类型，如 RULE_LIQUIDATION
+        content : str
+            消息内容
+        wait : bool
+            是否等待全部投递完成
+
+        Returns:
+        --------
+        int
+            接收者数量（wait=True 时为投递成功的数量）
+        """
+        recipients = self.registry.resolve(symbol, rule)
+        with self._lock:
+            self.stats['published'] += 1
+        futures = [self._executor.submit(self._send, r, content) for r in recipients]
+        if not wait:
+            return len(futures)
+        return sum(1 for f in futures if f.result())
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+_registry = None
+_dispatcher = None
+
+
+def get_dispatcher() -> SubscriptionDispatcher:
+    """全局投递器（延迟创建，首次使用时加载订阅配置）"""
+    global _registry, _dispatcher
+    if _dispatcher is None:
+        _registry = SubscriptionRegistry()
+        count = _registry.load()
+        logger.info(f"已加载 {count} 个告警订阅")
+        _dispatcher = SubscriptionDispatcher(
+            _registry, max_workers=get_setting('notify', 'subscription_workers', 16, int))
+    return _dispatcher
@@ -0,0 +1,117 @@
+# test_alert_rules.py
+"""
+告警规则引擎的回归测试（pytest test_alert_rules.py 或 python test_alert_rules.py）
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from alert_rules import RuleEngine, RuleError, compile_expression
+
+
+def make_engine(text=None):
+    """使用临时规则文件的引擎；text 为 None 时文件不存在，只有默认规则"""
+    path = os.path.join(tempfile.mkdtemp(), 'alert_rules.cfg')
+    if text is not None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return RuleEngine(path), path
+
+
+def names(matches):
+    return [(m.symbol, m.rule.name) for m in matches]
+
+
+def test_default_rules_reproduce_old_thresholds():
+    """默认规则与原硬编码条件一致: WT1 >49 / <-49，RSI ≥70 / ≤30，爆仓 |WT1|>49 且总额>阈值"""
+    engine, _ = make_engine()
+    wt1 = np.array([-60.0, -49.0, -48.9, 0.0, 49.0, 49.1, 60.0])
+    matches = engine.evaluate('wavetrend', [str(v) for v in wt1],
+                              {'wt1': wt1, 'close': 3000.0})
+    expected = [(str(v), 'wavetrend_high' if v > 49 else 'wavetrend_low')
+                for v in wt1 if v > 49 or v < -49]
+    assert sorted(names(matches)) == sorted(expected)
+
+    rsi = np.array([0.0, 29.9, 30.0, 30.1, 50.0, 69.9, 70.0, 85.0])
+    matches = engine.evaluate('rsi', [str(v) for v in rsi], {'rsi': rsi})
+    expected = [(str(v), 'rsi_high' if v >= 70 else 'rsi_low') for v in rsi if v >= 70 or v <= 30]
+    assert sorted(names(matches)) == sorted(expected)
+
+    cases = [(50.0, 300000.0), (-50.0, 300000.0), (49.0, 300000.0),
+             (50.0, 250000.0), (50.0, 200000.0)]
+    symbols = [f"S{i}" for i in range(len(cases))]
+    matches = engine.evaluate('liquidation', symbols, {
+        'wt1': [w for w, _ in cases],
+        'liq_sum_300': [s for _, s in cases],
+        'threshold': 250000.0,
+    })
+    expected = [(sym, 'liquidation') for sym, (w, s) in zip(symbols, cases)
+                if (w > 49 or w < -49) and s > 250000]
+    assert names(matches) == expected
+
+
+def test_cross_detected_per_symbol():
+    """逐个交易对计算（每条爆仓推送一个交易对）时，各交易对的上一次值互不覆盖"""
+    engine, _ = make_engine("[cross]\ngroup = test\nexpr = cross_above(x, 10)\n")
+    assert engine.evaluate('test', ['ETHUSDT'], {'x': 5.0}) == []
+    assert engine.evaluate('test', ['BTCUSDT'], {'x': 5.0}) == []
+    assert names(engine.evaluate('test', ['ETHUSDT'], {'x': 15.0})) == [('ETHUSDT', 'cross')]
+    assert names(engine.evaluate('test', ['BTCUSDT'], {'x': 15.0})) == [('BTCUSDT', 'cross')]
+    # 已在阈值之上，不再触发
+    assert engine.evaluate('test', ['ETHUSDT', 'BTCUSDT'], {'x': [20.0, 20.0]}) == []
+
+
+def test_cross_below_and_prev():
+    engine, _ = make_engine(
+        "[down]\ngroup = test\nexpr = cross_below(x, 0)\n\n"
+        "[jump]\ngroup = jump\nexpr = x - prev(x) > 5\n")
+    # 第一次计算没有上一次的值，不触发
+    assert engine.evaluate('test', ['A', 'B'], {'x': [1.0, -1.0]}) == []
+    assert names(engine.evaluate('test', ['B', 'A'], {'x': [-2.0, -1.0]})) == [('A', 'down')]
+
+    assert engine.evaluate('jump', ['A'], {'x': 1.0}) == []
+    assert names(engine.evaluate('jump', ['A'], {'x': 7.0})) == [('A', 'jump')]
+    assert engine.evaluate('jump', ['A'], {'x': 8.0}) == []
+
+
+def test_expression_whitelist():
+    predicate, used = compile_expression("abs(wt1) > 49 and between(rsi, 30, 70)")
+    assert used == {'wt1', 'rsi'}
+    env = {'wt1': np.array([50.0, 10.0]), 'rsi': np.array([50.0, 50.0])}
+    assert list(predicate(env, env)) == [True, False]
+    for expr in ("__import__('os').system('true')", "wt1.real > 0", "open('x')",
+                 "[wt1][0] > 0", "wt1 ** 2 > 0", "wt1 in (1, 2)", "'a' < 'b'", "wt1 >"):
+        try:
+            compile_expression(expr)
+        except RuleError:
+            continue
+        raise AssertionError(f"应拒绝: {expr}")
+
+
+def test_hot_reload_keeps_rules_on_error():
+    engine, path = make_engine("[big]\ngroup = test\nexpr = x > 10\n")
+    assert names(engine.evaluate('test', ['A'], {'x': 11.0})) == [('A', 'big')]
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[big]\ngroup = test\nexpr = x > 100\n")
+    os.utime(path, (1, 1))
+    assert engine.maybe_reload(now=1e10)
+    assert engine.evaluate('test', ['A'], {'x': 11.0}) == []
+
+    # 解析失败时继续使用上一版规则
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[big]\ngroup = test\nexpr = import os\n")
+    os.utime(path, (2, 2))
+    assert not engine.maybe_reload(now=2e10)
+    assert names(engine.evaluate('test', ['A'], {'x': 101.0})) == [('A', 'big')]
+    assert engine.get_stats()['errors'] == 1
+
+
+if __name__ == "__main__":
+    test_default_rules_reproduce_old_thresholds()
+    test_cross_detected_per_symbol()
+    test_cross_below_and_prev()
+    test_expression_whitelist()
+    test_hot_reload_keeps_rules_on_error()
+    print("通过")
@@ -0,0 +1,72 @@
+# test_alert_throttle.py
+"""
+告警限频的回归测试（pytest test_alert_throttle.py 或 python test_alert_throttle.py）
+"""
+from datetime import datetime
+
+from alert_throttle import QuietHours, Throttler
+
+KEY = ('ETHUSDT', 'liquidation')
+
+
+def local(hour, minute=0):
+    """2024-01-01 的本地时间戳"""
+    return datetime(2024, 1, 1, hour, minute).timestamp()
+
+
+def test_cooldown_expiry():
+    throttler = Throttler('cooldown:1800', quiet_hours='')
+    now = local(12)
+    assert throttler.allow(KEY, now)
+    assert not throttler.allow(KEY, now + 1799)
+    assert throttler.wait_time(KEY, now + 1799) == 1
+    assert throttler.allow(KEY, now + 1800)
+    # 各键独立冷却
+    assert throttler.allow(('BTCUSDT', 'liquidation'), now + 1801)
+    assert throttler.get_stats()['throttled'] == 1
+
+
+def test_fixed_window_expiry():
+    """每个对齐到本地时钟的15分钟窗口最多一次"""
+    throttler = Throttler('fixed:1/900', quiet_hours='')
+    start = local(12, 15)
+    assert throttler.allow(KEY, start + 1)
+    assert not throttler.allow(KEY, start + 600)
+    assert throttler.wait_time(KEY, start + 600) == 300
+    assert not throttler.allow(KEY, start + 899)
+    assert throttler.allow(KEY, start + 900)
+
+
+def test_quiet_hours():
+    quiet = QuietHours('23:00-07:00')
+    assert quiet.active(local(23, 30))
+    assert quiet.active(local(6, 59))
+    assert not quiet.active(local(7))
+    assert not quiet.active(local(22, 59))
+    assert not QuietHours('').active(local(3))
+
+    throttler = Throttler('cooldown:60', quiet_hours='01:00-07:00')
+    assert not throttler.allow(KEY, local(3))
+    # 静默时段内被屏蔽的告警不占用冷却
+    assert throttler.allow(KEY, local(7))
+    assert throttler.get_stats()['quiet'] == 1
+
+
+def test_state_round_trip():
+    throttler = Throttler('cooldown:1800', quiet_hours='')
+    throttler.allow(KEY)
+    restored = Throttler('cooldown:1800', quiet_hours='')
+    restored.restore_state(throttler.get_state())
+    assert not restored.allow(KEY)
+    # 策略类型变化时丢弃旧状态
+    changed = Throttler('fixed:1/900', quiet_hours='')
+    changed.restore_state(throttler.get_state())
+    assert len(changed.store) == 0
+
+
+if __name__ == "__main__":
+    test_cooldown_expiry()
+    test_fixed_window_expiry()
+    test_quiet_hours()
+    test_state_round_trip()
+    print("通过")
@@ -0,0 +1,156 @@
+# test_bn_stream.py
+"""
+WebSocket 连接管理的回归测试（pytest test_bn_stream.py 或 python test_bn_stream.py）
+
+在本地起一个 WebSocket 服务，前几次握手按指定状态码拒绝，之后接受连接并推送一条消息
+"""
+import asyncio
+import json
+from http import HTTPStatus
+
+from websockets.asyncio.server import serve
+
+from bn_stream import ConnectionManager, OutageTracker, RedundantFeed, RolloverStream
+
+MESSAGE = {'o': {'s': 'ETHUSDT', 'T': 1, 'q': '1'}}
+
+
+def make_manager(url, on_message, stop_event):
+    return ConnectionManager(url, on_message, base_delay=0.01, max_delay=0.05,
+                             stop_event=stop_event)
+
+
+def make_rollover(url, on_message, stop_event):
+    return RolloverStream(url, on_message, base_delay=0.01, max_delay=0.05,
+                          stop_event=stop_event)
+
+
+async def run_against(status, rejections, factory=make_manager, timeout=5):
+    """
+    用 factory 创建的连接对象连接一个先拒绝 rejections 次握手的本地服务
+
+    Returns:
+    --------
+    tuple
+        (收到的消息列表, 连接对象, 异常或None)
+    """
+    attempts = []
+
+    def process_request(connection, request):
+        attempts.append(request.path)
+        if len(attempts) <= rejections:
+            return connection.respond(status, "unavailable\n")
+        return None
+
+    async def handler(websocket):
+        await websocket.send(json.dumps(MESSAGE))
+        await websocket.wait_closed()
+
+    received = []
+    stop_event = asyncio.Event()
+
+    def on_message(data):
+        received.append(data)
+        stop_event.set()
+
+    async with serve(handler, '127.0.0.1', 0, process_request=process_request) as server:
+        port = server.sockets[0].getsockname()[1]
+        manager = factory(f"ws://127.0.0.1:{port}", on_message, stop_event)
+        error = None
+        try:
+            await asyncio.wait_for(manager.run(), timeout)
+        except asyncio.TimeoutError:
+            raise AssertionError(f"{type(manager).__name__} 未能在超时前收到消息")
+        except Exception as e:
+            error = e
+    return received, manager, error
+
+
+def test_retries_service_unavailable():
+    """交易所维护时的 503 与限频的 429 应按退避重试，而不是停止监控"""
+    for status in (HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.TOO_MANY_REQUESTS):
+        received, manager, error = asyncio.run(run_against(status, rejections=3))
+        assert error is None
+        assert received == [MESSAGE]
+        assert manager.connect_count == 1
+
+
+def test_rollover_retries_service_unavailable():
+    received, stream, error = asyncio.run(
+        run_against(HTTPStatus.SERVICE_UNAVAILABLE, rejections=3, factory=make_rollover))
+    assert error is None
+    assert received == [MESSAGE]
+
+
+def test_client_error_is_fatal():
+    """其他 4xx（地址错误等）重连无法解决，直接抛出"""
+    received, manager, error = asyncio.run(run_against(HTTPStatus.NOT_FOUND, rejections=1))
+    assert error is not None
+    assert received == []
+    assert manager.connect_count == 0
+    received, stream, error = asyncio.run(
+        run_against(HTTPStatus.FORBIDDEN, rejections=1, factory=make_rollover))
+    assert error is not None
+    assert received == []
+
+
+def test_outage_only_when_all_links_down():
+    gaps = []
+    tracker = OutageTracker(on_gap=lambda start, end: gaps.append((start, end)))
+    tracker.update(1, True, 0.0)
+    tracker.update(2, True, 0.0)
+    # 单条连接断开重连，另一条一直在线，不算断线
+    tracker.update(1, False, 10.0)
+    tracker.update(1, True, 20.0)
+    assert gaps == []
+    # 两条都断开: 断线从最后一条消息（两条连接中较晚者）开始，任一连接恢复时结束
+    tracker.update(1, False, 30.0)
+    tracker.update(2, False, 25.0)
+    tracker.update(2, True, 40.0)
+    tracker.update(1, True, 41.0)
+    assert gaps == [(30.0, 40.0)]
+
+
+def test_redundant_feed_detects_idle_links():
+    """每条连接只推送一条消息后静默（半开），空闲超时后重连，全部断开的时段只报告一次"""
+    connections = []
+
+    async def handler(websocket):
+        connections.append(websocket)
+        # 前两条连接推送同一个事件（去重后投递一次），重连后推送新事件
+        trade_time = 1 if len(connections) <= 2 else 2
+        await websocket.send(json.dumps({'o': {'s': 'ETHUSDT', 'T': trade_time, 'q': '1'}}))
+        await websocket.wait_closed()
+
+    async def main():
+        received, gaps = [], []
+        stop_event = asyncio.Event()
+
+        def on_message(data):
+            received.append(data['o']['T'])
+            if len(received) == 2:
+                stop_event.set()
+
+        async with serve(handler, '127.0.0.1', 0) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            # 重连间隔大于两条连接空闲超时的先后差，两条连接都断开后才有连接恢复
+            feed = RedundantFeed([url, url], on_message, retry_delay=0.2, max_retry_delay=0.4,
+                                 idle_timeout=0.3, on_gap=lambda a, b: gaps.append(b - a),
+                                 stop_event=stop_event)
+            await asyncio.wait_for(feed.run(), 5)
+        return received, gaps, feed
+
+    received, gaps, feed = asyncio.run(main())
+    assert received == [1, 2]
+    assert len(gaps) == 1 and gaps[0] >= 0.3
+    assert feed.get_stats()['duplicates'] >= 1
+    assert all(s['reconnects'] >= 1 for s in feed.get_stats()['connections'])
+
+
+if __name__ == "__main__":
+    test_retries_service_unavailable()
+    test_rollover_retries_service_unavailable()
+    test_client_error_is_fatal()
+    test_outage_only_when_all_links_down()
+    test_redundant_feed_detects_idle_links()
+    print("通过")
@@ -0,0 +1,82 @@
+# test_burst_detector.py
+"""
+爆仓突发检测的回归测试（pytest test_burst_detector.py 或 python test_burst_detector.py）
+
+平静期每10秒一笔 $5,000，突发期每秒3笔 $8,000
+"""
+from burst_detector import BurstDetector
+
+T0 = 1_700_000_000.0
+
+
+def make_detector(**kwargs):
+    kwargs.setdefault('shift', 4)
+    kwargs.setdefault('threshold', 12)
+    kwargs.setdefault('warmup', 600)
+    kwargs.setdefault('min_notional', 0)
+    detector = BurstDetector(**kwargs)
+    detector.enabled = True
+    return detector
+
+
+def calm(detector, start, seconds):
+    return [detector.update('ETHUSDT', int((start + i * 10) * 1000), 5000)
+            for i in range(int(seconds // 10))]
+
+
+def burst(detector, start, events=60):
+    return [detector.update('ETHUSDT', int((start + i / 3) * 1000), 8000) for i in range(events)]
+
+
+def alarms(results):
+    return [b for b in results if b is not None]
+
+
+def test_onset_and_single_alarm():
+    detector = make_detector()
+    assert alarms(calm(detector, T0, 3400)) == []
+    found = alarms(burst(detector, T0 + 3400))
+    # 每次突发只报警一次，起点估计为第一笔加速的爆仓，几秒内报警
+    assert len(found) == 1
+    assert abs(found[0].onset - (T0 + 3400)) < 1
+    assert found[0].delay < 10
+    assert found[0].baseline[0] < 10 < found[0].rates[10][0]
+
+    # 回落到平静后重新布防，下一次突发再次报警
+    assert alarms(calm(detector, T0 + 3500, 1800)) == []
+    found = alarms(burst(detector, T0 + 5300))
+    assert len(found) == 1 and abs(found[0].onset - (T0 + 5300)) < 1
+    assert detector.get_stats()['bursts'] == 2
+
+
+def test_warmup_suppresses_alarms():
+    """启动后 warmup 秒内基线还不可靠，不报警"""
+    for warmup, expected in ((600, 0), (0, 1)):
+        detector = make_detector(warmup=warmup)
+        calm(detector, T0, 300)
+        assert len(alarms(burst(detector, T0 + 300))) == expected
+
+
+def test_min_notional_delays_alarm():
+    detector = make_detector(min_notional=100000)
+    calm(detector, T0, 3400)
+    found = alarms(burst(detector, T0 + 3400))
+    assert len(found) == 1
+    assert found[0].notional >= 100000 and found[0].events == 13
+
+
+def test_state_round_trip_keeps_baseline():
+    detector = make_detector()
+    calm(detector, T0, 3400)
+    restored = make_detector()
+    restored.restore_state(detector.get_state())
+    # 恢复后已过预热期，基线沿用，突发立即可检测
+    assert len(alarms(burst(restored, T0 + 3400))) == 1
+
+
+if __name__ == "__main__":
+    test_onset_and_single_alarm()
+    test_warmup_suppresses_alarms()
+    test_min_notional_delays_alarm()
+    test_state_round_trip_keeps_baseline()
+    print("通过")
@@ -0,0 +1,88 @@
+# test_futures_poller.py
+"""
+资金费率/持仓量快照的回归测试（pytest test_futures_poller.py 或 python test_futures_poller.py）
+
+只测试 build_snapshot 与 variables，不发送请求
+"""
+import numpy as np
+
+from futures_poller import FuturesPoller
+
+NOW = 1_700_000_000.0
+
+
+def make_poller():
+    poller = FuturesPoller(interval=60, oi_symbols=['ETHUSDT', 'BTCUSDT'], oi_concurrency=1)
+    poller.oi_change_window = 300
+    return poller
+
+
+def premium(eth_mark=3000.0):
+    return [
+        {'symbol': 'ETHUSDT', 'markPrice': str(eth_mark), 'indexPrice': '2997.0',
+         'lastFundingRate': '0.0001', 'nextFundingTime': 1_700_003_600_000},
+        {'symbol': 'BTCUSDT', 'markPrice': '40000', 'indexPrice': '40000',
+         'lastFundingRate': '-0.0002', 'nextFundingTime': 1_700_003_600_000},
+        # 新上线的合约: 指数价格与资金费率为空字符串
+        {'symbol': 'NEWUSDT', 'markPrice': '1.5', 'indexPrice': '', 'lastFundingRate': ''},
+        {'markPrice': '1'},  # 没有 symbol 的条目被忽略
+    ]
+
+
+def test_build_snapshot_columns():
+    poller = make_poller()
+    snapshot = poller.build_snapshot(premium(), {'ETHUSDT': (1000.0, 1)}, now=NOW)
+    assert snapshot.symbols == ('ETHUSDT', 'BTCUSDT', 'NEWUSDT')
+    eth = snapshot.row('ETHUSDT')
+    assert eth['funding_rate'] == 0.0001 and eth['open_interest'] == 1000.0
+    assert abs(eth['basis'] - (3000.0 / 2997.0 - 1)) < 1e-12
+    assert eth['oi_value'] == 3000.0 * 1000.0
+    assert np.isnan(eth['oi_change'])  # 只有一个样本
+    new = snapshot.row('NEWUSDT')
+    assert new['mark_price'] == 1.5
+    assert np.isnan(new['funding_rate']) and np.isnan(new['basis']) and np.isnan(new['open_interest'])
+    assert snapshot.row('XRPUSDT') is None
+    assert not snapshot.column('mark_price').flags.writeable
+
+
+def test_open_interest_carry_over_and_change():
+    poller = make_poller()
+    poller.snapshot = poller.build_snapshot(
+        premium(), {'ETHUSDT': (1000.0, 1), 'BTCUSDT': (50.0, 1)}, now=NOW)
+    # 本轮 BTCUSDT 的持仓量请求失败: 沿用上一份快照的值
+    poller.snapshot = poller.build_snapshot(premium(3100.0), {'ETHUSDT': (1100.0, 2)}, now=NOW + 60)
+    eth, btc = poller.snapshot.row('ETHUSDT'), poller.snapshot.row('BTCUSDT')
+    assert abs(eth['oi_change'] - 0.1) < 1e-12
+    assert eth['oi_value'] == 3100.0 * 1100.0
+    assert btc['open_interest'] == 50.0 and btc['oi_time'] == 1
+    # 持仓价值按本轮的标记价格重新计算
+    assert btc['oi_value'] == 40000.0 * 50.0
+
+    # 超出 oi_change_window 的样本被丢弃，变化按窗口内最早的样本计算
+    poller.snapshot = poller.build_snapshot(premium(), {'ETHUSDT': (1210.0, 3)}, now=NOW + 400)
+    assert abs(poller.snapshot.row('ETHUSDT')['oi_change'] - 0.1) < 1e-12
+
+
+def test_variables_nan_handling():
+    poller = make_poller()
+    # 首次轮询完成前: 每个变量都是与 symbols 等长的 NaN 数组
+    variables = poller.variables(['ETHUSDT', 'BTCUSDT'])
+    assert set(variables) == {'funding_rate', 'mark_price', 'basis', 'open_interest',
+                              'oi_value', 'oi_change'}
+    assert all(len(values) == 2 and np.isnan(values).all() for values in variables.values())
+
+    poller.snapshot = poller.build_snapshot(premium(), {'ETHUSDT': (1000.0, 1)}, now=NOW)
+    variables = poller.variables(['BTCUSDT', 'XRPUSDT', 'ETHUSDT'])
+    assert list(variables['funding_rate'][[0, 2]]) == [-0.0002, 0.0001]
+    # 快照中没有的交易对为 NaN，没有请求持仓量的交易对持仓变量为 NaN
+    assert all(np.isnan(values[1]) for values in variables.values())
+    assert np.isnan(variables['open_interest'][0]) and variables['open_interest'][2] == 1000.0
+    # 不指定交易对时按快照顺序返回整列
+    assert len(poller.variables(None)['mark_price']) == 3
+
+
+if __name__ == "__main__":
+    test_build_snapshot_columns()
+    test_open_interest_carry_over_and_change()
+    test_variables_nan_handling()
+    print("通过")
@@ -0,0 +1,58 @@
+# test_indicators.py
+"""
+指标流水线缓存的回归测试（pytest test_indicators.py 或 python test_indicators.py）
+"""
+import numpy as np
+import pandas as pd
+
+from indicators import IndicatorPipeline
+
+
+def make_df(bars=200, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.003, bars)))
+    return pd.DataFrame({'open': close, 'high': close * 1.002, 'low': close * 0.998,
+                         'close': close, 'volume': rng.uniform(10, 100, bars)},
+                        index=pd.date_range('2024-01-01', periods=bars, freq='30min'))
+
+
+def test_cached_indicator_recomputed_after_other_request():
+    """同一根K线内: 请求 rsi -> 收盘价变化 -> 请求 wt1 -> 再请求 rsi，应得到新的RSI"""
+    pipeline = IndicatorPipeline()
+    df = make_df()
+    pipeline.evaluate('ETHUSDT', '30m', df, ['rsi_14'])
+    df = df.copy()
+    df.iloc[-1, df.columns.get_loc('close')] *= 1.02
+    pipeline.evaluate('ETHUSDT', '30m', df, ['wt1'])
+    cached = pipeline.evaluate('ETHUSDT', '30m', df, ['rsi_14'])['rsi_14']
+    fresh = IndicatorPipeline().evaluate('ETHUSDT', '30m', df, ['rsi_14'])['rsi_14']
+    np.testing.assert_array_equal(cached, fresh)
+
+
+def test_in_place_update_detected():
+    """调用方原地修改同一个 DataFrame 的最新收盘价，指标应随之更新"""
+    pipeline = IndicatorPipeline()
+    df = make_df()
+    before = pipeline.evaluate('ETHUSDT', '30m', df, ['wt1'])['wt1'][-1]
+    df.iloc[-1, df.columns.get_loc('close')] *= 1.02
+    after = pipeline.evaluate('ETHUSDT', '30m', df, ['wt1'])['wt1'][-1]
+    assert after != before
+    assert after == IndicatorPipeline().evaluate('ETHUSDT', '30m', df, ['wt1'])['wt1'][-1]
+
+
+def test_unchanged_inputs_are_reused():
+    """只有成交量变化时不重算任何价格类指标"""
+    pipeline = IndicatorPipeline()
+    df = make_df()
+    pipeline.evaluate('ETHUSDT', '30m', df, ['wt2', 'rsi_14'])
+    computed = pipeline.get_stats()['computed']
+    df.iloc[-1, df.columns.get_loc('volume')] += 1
+    pipeline.evaluate('ETHUSDT', '30m', df, ['wt2', 'rsi_14'])
+    assert pipeline.get_stats()['computed'] == computed
+
+
+if __name__ == "__main__":
+    test_cached_indicator_recomputed_after_other_request()
+    test_in_place_update_detected()
+    test_unchanged_inputs_are_reused()
+    print("通过")
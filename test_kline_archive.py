@@ -0,0 +1,97 @@
+# test_kline_archive.py
+"""
+K线归档的回归测试（pytest test_kline_archive.py 或 python test_kline_archive.py）
+"""
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from kline_archive import KlineArchive
+
+STEP = 60_000
+T0 = 1_700_000_040_000  # 1m 边界
+
+
+def rows(indices, close=1.0):
+    return [(T0 + i * STEP, 1.0, 2.0, 0.5, close, 10.0) for i in indices]
+
+
+def make_archive():
+    return KlineArchive('ETHUSDT', '1m', root=tempfile.mkdtemp())
+
+
+def open_times(archive):
+    return [(t - T0) // STEP for t in archive.records()['open_time']]
+
+
+def test_append_and_out_of_order_merge():
+    archive = make_archive()
+    assert archive.merge(rows(range(10, 20))) == 10
+    inode = os.stat(archive.path).st_ino
+    # 晚于现有数据: 直接追加（同一批次内的重复只写一次）
+    assert archive.merge(rows([20, 21, 21, 22])) == 3
+    assert os.stat(archive.path).st_ino == inode
+    # 早于/穿插现有数据: 合并去重后重写，已有的K线不被覆盖
+    assert archive.merge(rows([5, 6, 15, 16, 23], close=9.0)) == 3
+    assert open_times(archive) == [5, 6] + list(range(10, 24))
+    assert archive.slice(T0 + 15 * STEP, T0 + 16 * STEP)['close'][0] == 1.0
+    # 全部已存在时不改动文件
+    inode = os.stat(archive.path).st_ino
+    assert archive.merge(rows([5, 12, 23])) == 0
+    assert os.stat(archive.path).st_ino == inode
+    assert not [n for n in os.listdir(os.path.dirname(archive.path)) if n.endswith('.tmp')]
+
+
+def test_slice_and_tail():
+    archive = make_archive()
+    archive.merge(rows(range(100)))
+    assert len(archive) == 100
+    part = archive.slice(T0 + 10 * STEP, T0 + 20 * STEP)
+    assert [(t - T0) // STEP for t in part['open_time']] == list(range(10, 20))
+    # 起点不在K线边界时从下一根开始
+    assert (archive.slice(T0 + 10 * STEP + 1, T0 + 12 * STEP)['open_time'] == T0 + 11 * STEP).all()
+    assert len(archive.slice(T0 + 200 * STEP)) == 0
+    tail = archive.tail(5, end=T0 + 50 * STEP)
+    assert [(t - T0) // STEP for t in tail['open_time']] == list(range(45, 50))
+    assert isinstance(archive.records(), np.memmap)
+
+
+def test_missing_ranges():
+    archive = make_archive()
+    assert archive.missing_ranges(T0, T0 + 10 * STEP) == [(T0, T0 + 10 * STEP)]
+    archive.merge(rows([2, 3, 4, 7, 8]))
+    assert archive.missing_ranges(T0, T0 + 10 * STEP) == [
+        (T0, T0 + 2 * STEP), (T0 + 5 * STEP, T0 + 7 * STEP), (T0 + 9 * STEP, T0 + 10 * STEP)]
+    # 交易所确认没有数据的区间不再算作缺口
+    archive.mark_empty([(T0 + 5 * STEP, T0 + 7 * STEP), (T0, T0 + STEP)])
+    assert archive.missing_ranges(T0, T0 + 10 * STEP) == [
+        (T0 + STEP, T0 + 2 * STEP), (T0 + 9 * STEP, T0 + 10 * STEP)]
+
+
+def test_concurrent_merge_and_mark_empty():
+    """多个线程共用同一个归档对象同时写入与记录空区间，不应死锁或丢数据"""
+    archive = make_archive()
+
+    def write(offset):
+        for i in range(20):
+            archive.merge(rows([offset + 40 * i, offset + 40 * i + 1]))
+            archive.mark_empty([(T0 - (offset + i + 2) * STEP, T0 - (offset + i + 1) * STEP)])
+
+    threads = [threading.Thread(target=write, args=(k * 2,), daemon=True) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=20)
+        assert not thread.is_alive(), "写入线程死锁"
+    assert len(archive) == 4 * 20 * 2
+    assert archive.missing_ranges(T0 - 27 * STEP, T0 - STEP) == []
+
+
+if __name__ == "__main__":
+    test_append_and_out_of_order_merge()
+    test_slice_and_tail()
+    test_missing_ranges()
+    test_concurrent_merge_and_mark_empty()
+    print("通过")
@@ -0,0 +1,93 @@
+# test_liquidation_heatmap.py
+"""
+爆仓热力图的回归测试（pytest test_liquidation_heatmap.py 或 python test_liquidation_heatmap.py）
+
+中心价 3000、桶宽 10bp 时每个桶 $3，200 个桶覆盖 2700-3300，价格离开 2850-3150 时重新分桶
+"""
+import numpy as np
+
+from liquidation_heatmap import LiquidationHeatmap, PriceHistogram
+
+T0 = 1_700_000_000.0
+
+
+def make_histogram():
+    histogram = PriceHistogram(bucket_bps=10, buckets=200, window=3600, slices=12)
+    histogram.rebucket(3000.0)  # 第一次调用只建立分桶，不计入 rebuckets
+    return histogram
+
+
+def mass_between(histogram, low, high):
+    """[low, high) 内的金额（两端须落在桶边界上）"""
+    edges = histogram.edges()
+    start, end = np.searchsorted(edges, [low, high])
+    return float(histogram.totals[:, start:end].sum())
+
+
+def test_rebucket_conserves_mass():
+    histogram = make_histogram()
+    rng = np.random.default_rng(0)
+    prices = rng.uniform(2950, 3050, 500)
+    values = rng.uniform(1000, 5000, 500)
+    for i, (price, value) in enumerate(zip(prices, values)):
+        histogram.add(T0 + i, price, value, 'SELL' if i % 2 else 'BUY')
+    total = float(values.sum())
+    near = mass_between(histogram, 2988.0, 3012.0)
+
+    # 价格跳到 3200: 以新价格为中心重新分桶（2880-3520），旧金额全部仍在范围内
+    histogram.add(T0 + 600, 3200.0, 7000.0, 'BUY')
+    assert histogram.stats['rebuckets'] == 1
+    assert abs(histogram.low - 2880.0) < 1e-9 and abs(histogram.width - 3.2) < 1e-9
+    assert abs(float(histogram.totals.sum()) - (total + 7000.0)) < 1e-6 * total
+    assert histogram.stats['dropped'] < 1e-6 * total
+    assert abs(float(histogram.data.sum(axis=0).sum()) - float(histogram.totals.sum())) < 1e-6 * total
+    # 线性插值只在桶内移动金额，宽区间内的金额基本不变
+    assert abs(mass_between(histogram, 2988.8, 3011.2) - near) < 0.1 * near
+    assert histogram.stats['events'] == 501
+
+
+def test_rebucket_drops_out_of_range_mass():
+    histogram = make_histogram()
+    histogram.add(T0, 2860.0, 1000.0, 'SELL')
+    histogram.add(T0 + 1, 3000.0, 2000.0, 'SELL')
+    histogram.add(T0 + 2, 3200.0, 4000.0, 'BUY')
+    # 2860 低于新范围的下沿 2880，计入 dropped
+    assert abs(histogram.stats['dropped'] - 1000.0) < 1e-6
+    assert abs(float(histogram.totals.sum()) - 6000.0) < 1e-6
+
+
+def test_top_clusters():
+    histogram = make_histogram()
+    for i in range(30):
+        histogram.add(T0 + i, 2950.0 + (i % 3), 10000.0, 'SELL')  # 多头密集区 $300K
+        histogram.add(T0 + i, 3080.0 + (i % 3), 5000.0, 'BUY')    # 空头密集区 $150K
+    histogram.add(T0 + 40, 3010.0, 1000.0, 'SELL')
+    clusters = histogram.top_clusters(k=3, cluster_buckets=3)
+    assert [round(total) for _, _, total in clusters] == [300000, 150000, 1000]
+    # 区间宽3个桶，覆盖对应价格，互不重叠
+    for (low, high, _), price in zip(clusters, (2950.0, 3080.0, 3010.0)):
+        assert abs(high - low - 9.0) < 1e-9
+        assert low <= price < high
+    assert histogram.top_clusters(k=1, cluster_buckets=3) == clusters[:1]
+    buy = histogram.top_clusters(k=3, side='BUY', cluster_buckets=3)
+    assert len(buy) == 1 and round(buy[0][2]) == 150000
+    assert PriceHistogram().top_clusters() == []
+
+
+def test_expired_slices_leave_window():
+    heatmap = LiquidationHeatmap(bucket_bps=10, buckets=200, window=3600, slices=12)
+    heatmap.observe('ETHUSDT', T0 * 1000, 3000.0, 10000.0, 'SELL')
+    heatmap.observe('ETHUSDT', (T0 + 1800) * 1000, 3050.0, 20000.0, 'SELL')
+    assert len(heatmap.top_clusters('ETHUSDT', side='SELL', now=T0 + 1800)) == 2
+    # 1小时后第一笔所在的时间片过期
+    clusters = heatmap.top_clusters('ETHUSDT', side='SELL', now=T0 + 3700)
+    assert [round(total) for _, _, total in clusters] == [20000]
+    assert heatmap.summary('ETHUSDT', now=T0 + 9000) == ''
+
+
+if __name__ == "__main__":
+    test_rebucket_conserves_mass()
+    test_rebucket_drops_out_of_range_mass()
+    test_top_clusters()
+    test_expired_slices_leave_window()
+    print("通过")
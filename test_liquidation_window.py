@@ -0,0 +1,75 @@
+# test_liquidation_window.py
+"""
+爆仓窗口共享状态的回归测试（pytest test_liquidation_window.py 或 python test_liquidation_window.py）
+"""
+import os
+import tempfile
+import time
+
+import alert_rules
+from alert_rules import RuleEngine
+from alert_throttle import Throttler
+from liquidation_window import RULE, LiquidationWindow
+
+RULES = "[surge]\ngroup = liquidation\nexpr = cross_above(liq_sum_300, threshold)\n"
+
+
+def make_window():
+    """使用临时规则文件与不含静默时段的限频器的窗口（WT1=0，默认的 liquidation 规则不触发）"""
+    path = os.path.join(tempfile.mkdtemp(), 'alert_rules.cfg')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(RULES)
+    alert_rules._engine = RuleEngine(path)
+    window = LiquidationWindow('test_liquidation_window', 1800, 250000)
+    window.thresholds.enabled = False
+    window.set_WT1(0)
+    window.throttler = Throttler('cooldown:1800', quiet_hours='')
+    return window
+
+
+def liquidation(value, at):
+    return {'symbol': 'ETHUSDT', 'quantity': 1.0, 'price': 3000.0, 'side': 'SELL',
+            'total_value': value, 'timestamp': int(at * 1000)}
+
+
+def test_rules_evaluated_during_cooldown():
+    """冷却期间的穿越也要更新规则的上一次值，冷却结束后不因旧值误触发"""
+    window = make_window()
+    now = time.time()
+    try:
+        window.observe(liquidation(100000, now - 10))
+        assert window.should_send_alert('ETHUSDT') == []
+
+        # 冷却中: 窗口总额穿越阈值，规则照常计算但不发送
+        window.throttler.record(('ETHUSDT', RULE), now)
+        window.observe(liquidation(200000, now - 5))
+        assert window.should_send_alert('ETHUSDT') == []
+
+        # 冷却结束: 总额一直在阈值之上，没有新的穿越
+        window.throttler.record(('ETHUSDT', RULE), now - 3600)
+        window.observe(liquidation(10000, now - 1))
+        assert window.should_send_alert('ETHUSDT') == []
+    finally:
+        alert_rules._engine = None
+
+
+def test_cross_after_cooldown_is_sent():
+    window = make_window()
+    now = time.time()
+    try:
+        window.observe(liquidation(300000, now - 400))
+        window.observe(liquidation(100000, now - 10))
+        assert window.should_send_alert('ETHUSDT') == []
+        window.observe(liquidation(200000, now - 5))
+        matches = window.should_send_alert('ETHUSDT')
+        assert [m.rule.name for m in matches] == ['surge']
+        # 超出窗口的记录已被清理
+        assert len(window.records) == 2
+    finally:
+        alert_rules._engine = None
+
+
+if __name__ == "__main__":
+    test_rules_evaluated_during_cooldown()
+    test_cross_after_cooldown_is_sent()
+    print("通过")
@@ -0,0 +1,50 @@
+# test_notify_digest.py
+"""
+告警合并发送队列的回归测试（pytest test_notify_digest.py 或 python test_notify_digest.py）
+"""
+import threading
+
+from notify_digest import PRIORITY_HIGH, PRIORITY_LOW, DigestQueue, WebhookQuota
+
+
+def make_queue(limit, high_reserve):
+    """发送即成功并记录配额的队列，返回 (队列, 已发送的批次列表, 每发送一批时 set 的事件)"""
+    quota = WebhookQuota(limit=limit)
+    batches = []
+    sent = threading.Event()
+
+    def send_batch(alerts):
+        quota.record()
+        batches.append([a.text for a in alerts])
+        sent.set()
+        return True
+
+    return DigestQueue(send_batch, quota=quota, window=0.0, high_reserve=high_reserve), batches, sent
+
+
+def test_reserve_not_below_quota_limit():
+    """保留数不小于配额上限时，普通告警仍能发送"""
+    queue, batches, sent = make_queue(limit=3, high_reserve=5)
+    assert queue.high_reserve == 2
+    queue.submit('low', priority=PRIORITY_LOW)
+    assert sent.wait(2), "普通告警一直在等待配额"
+    assert batches == [['low']]
+
+
+def test_reserve_kept_for_high_priority():
+    queue, batches, sent = make_queue(limit=3, high_reserve=2)
+    queue.submit('low 1', priority=PRIORITY_LOW)
+    assert sent.wait(2)
+    sent.clear()
+    # 剩余2条配额全部保留给高优先级: 普通告警排队，高优先级告警立即发送（同批带上排队的普通告警）
+    queue.submit('low 2', priority=PRIORITY_LOW)
+    assert not sent.wait(0.3)
+    queue.submit('high', priority=PRIORITY_HIGH)
+    assert sent.wait(2)
+    assert batches == [['low 1'], ['high', 'low 2']]
+
+
+if __name__ == "__main__":
+    test_reserve_not_below_quota_limit()
+    test_reserve_kept_for_high_priority()
+    print("通过")
@@ -0,0 +1,122 @@
+# test_quantile_sketch.py
+"""
+流式分位数的回归测试（pytest test_quantile_sketch.py 或 python test_quantile_sketch.py）
+"""
+import numpy as np
+
+from quantile_sketch import AdaptiveThresholds, RollingQuantile, TDigest
+
+WINDOW_MS = 300_000
+B0 = 1_700_000_100_000 // WINDOW_MS * WINDOW_MS  # 5分钟边界
+
+
+def bucket(i, offset=0):
+    return B0 + i * WINDOW_MS + offset
+
+
+def test_tdigest_quantile_accuracy():
+    """重尾分布上的中位数与尾部分位数，按排名误差衡量"""
+    values = np.random.default_rng(0).lognormal(8, 1.5, 50_000)
+    digest = TDigest(200)
+    for v in values:
+        digest.add(v)
+    ordered = np.sort(values)
+    for q, tolerance in ((0.5, 0.01), (0.9, 0.005), (0.99, 0.002), (0.999, 0.0005)):
+        rank = np.searchsorted(ordered, digest.quantile(q)) / len(ordered)
+        assert abs(rank - q) <= tolerance, (q, rank)
+    assert digest.count == len(values)
+    assert len(digest.means) <= 200
+    assert digest.quantile(0.0) == ordered[0] and digest.quantile(1.0) == ordered[-1]
+    assert TDigest().quantile(0.5) is None
+
+
+def test_tdigest_merge_and_round_trip():
+    rng = np.random.default_rng(1)
+    a, b = rng.exponential(1.0, 20_000), rng.exponential(3.0, 20_000)
+    left, right, whole = TDigest(), TDigest(), TDigest()
+    for v in a:
+        left.add(v)
+        whole.add(v)
+    for v in b:
+        right.add(v)
+        whole.add(v)
+    right_count = right.count
+    left.merge(right)
+    # other 不变
+    assert right.count == right_count
+    assert left.count == whole.count == 40_000
+    ordered = np.sort(np.concatenate([a, b]))
+    for q in (0.1, 0.5, 0.95, 0.99):
+        rank = np.searchsorted(ordered, left.quantile(q)) / len(ordered)
+        assert abs(rank - q) <= 0.01, (q, rank)
+    assert left.min == ordered[0] and left.max == ordered[-1]
+
+    restored = TDigest.from_dict(left.to_dict())
+    assert restored.count == left.count
+    assert restored.quantile(0.99) == left.quantile(0.99)
+    assert TDigest.from_dict(TDigest().to_dict()).quantile(0.5) is None
+
+
+def test_rolling_quantile_skip():
+    """断线期间的桶不计入分布，断线前已结束的桶照常写入"""
+    rolling = RollingQuantile(window=300, days=7)
+    rolling.add(bucket(0, 1000), 10.0)
+    rolling.add(bucket(1, 1000), 20.0)
+    rolling.skip(bucket(2, 1000), bucket(10, 1000))
+    assert rolling.merged().count == 2  # 桶0、桶1
+    assert rolling.bucket == 10 + B0 // WINDOW_MS
+    rolling.add(bucket(10, 2000), 5.0)
+    rolling.advance(bucket(12))
+    digest = rolling.merged()
+    # 桶10 = 5，桶11 = 0；不跳过时桶2~9的8个空桶也会记为0
+    assert digest.count == 4
+    assert digest.min == 0.0 and digest.max == 20.0
+
+    # 第一笔之前的 skip 不创建状态
+    empty = RollingQuantile(window=300)
+    empty.skip(bucket(0), bucket(5))
+    assert empty.bucket is None
+
+
+def test_rolling_quantile_load():
+    rolling = RollingQuantile(window=300, days=7)
+    for i in range(5):
+        rolling.add(bucket(i, 1000), float(i + 1))
+    rolling.add(bucket(5, 2000), 7.0)
+    snapshot = rolling.to_dict()
+
+    # 仍处于快照所在的桶: digest 与当前桶的累计值都沿用
+    restored = RollingQuantile(window=300, days=7)
+    restored.load(snapshot)
+    assert restored.merged().count == 5
+    assert restored.bucket == rolling.bucket and restored.bucket_sum == 7.0
+
+    # 已进入新的桶: 只合并 digest，旧桶未结束的累计值丢弃
+    later = RollingQuantile(window=300, days=7)
+    later.add(bucket(8, 1000), 3.0)
+    later.load(snapshot)
+    assert later.merged().count == 5
+    assert later.bucket == 8 + B0 // WINDOW_MS and later.bucket_sum == 3.0
+
+
+def test_adaptive_threshold_warmup():
+    thresholds = AdaptiveThresholds(250000, window=300, percentile=50, days=7)
+    thresholds.enabled = True
+    thresholds.min_samples = 10
+    for i in range(5):
+        thresholds.observe('ETHUSDT', bucket(i, 1000), 100.0)
+    assert thresholds.threshold('ETHUSDT', bucket(5)) == 250000
+    for i in range(5, 20):
+        thresholds.observe('ETHUSDT', bucket(i, 1000), 100.0)
+    assert thresholds.threshold('ETHUSDT', bucket(20)) == 100.0
+    # 其他交易对独立统计
+    assert thresholds.threshold('BTCUSDT', bucket(20)) == 250000
+
+
+if __name__ == "__main__":
+    test_tdigest_quantile_accuracy()
+    test_tdigest_merge_and_round_trip()
+    test_rolling_quantile_skip()
+    test_rolling_quantile_load()
+    test_adaptive_threshold_warmup()
+    print("通过")
@@ -1,11 +1,32 @@
 
 # wechat_bot.py
-import requests
+import base64
+import hashlib
 import json
 import configparser
 import os
 from typing import Optional, List, Dict, Any
 
+from bn_config import get_endpoint, get_setting
+from lazy_import import lazy_import
+from notify_digest import (DigestQueue, RateLimitedError, WebhookQuota, format_digest,
+                           PRIORITY_NORMAL)
+
+requests = lazy_import('requests')  # 首次发送消息时才导入
+
+WECHAT_RATE_LIMIT_ERRCODE = 45009  # 接口调用超过限制
+
+# 每个webhook地址的发送配额（企业微信每分钟20条），直接发送与合并发送共用
+_quotas = {}
+
+def get_quota(webhook_url) -> WebhookQuota:
+    """获取 webhook 地址对应的配额记录"""
+    quota = _quotas.get(webhook_url)
+    if quota is None:
+        quota = _quotas[webhook_url] = WebhookQuota(
+            get_setting('notify', 'quota_per_minute', 20, int), 60.0)
+    return quota
+
 class WeChatBot:
     """
     微信企业微信群机器人封装类
@@ -29,6 +50,13 @@ class WeChatBot:
         """
         从配置文件加载Webhook配置
         """
+        # 完整的 webhook 地址可通过 bot_config.cfg 或环境变量直接覆盖（如指向本地模拟器）
+        override_url = get_endpoint('wechat_webhook_url')
+        if override_url:
+            self._webhook_url = override_url
+            print(f"使用覆盖的Webhook地址: {override_url}")
+            return
+
         config = configparser.ConfigParser()
         config_file = 'wechat_config.cfg'
         
@@ -55,6 +83,20 @@ class WeChatBot:
         except (configparser.NoSectionError, configparser.NoOptionError) as e:
             print(f"配置文件格式错误: {e}")
             self._webhook_url = None
+
+    @property
+    def quota(self) -> WebhookQuota:
+        return get_quota(self._webhook_url)
+
+    def _post(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """POST 到 webhook 并记录配额，服务端返回限流时暂停该 webhook 的发送"""
+        self.quota.record()
+        response = requests.post(self._webhook_url, headers={'Content-Type': 'application/json'},
+                                 data=json.dumps(data), timeout=10)
+        result = response.json()
+        if result.get('errcode') == WECHAT_RATE_LIMIT_ERRCODE:
+            self.quota.block(60)
+        return result
     
     def send_text(self, 
                  content: str, 
@@ -80,7 +122,6 @@ class WeChatBot:
         if self._webhook_url is None:
             return {"errcode": -1, "errmsg": "Webhook URL未配置"}
         
-        headers = {'Content-Type': 'application/json'}
         data = {
             "msgtype": "text",
             "text": {
@@ -91,9 +132,7 @@ class WeChatBot:
         }
         
         try:
-            response = requests.post(self._webhook_url, headers=headers, 
-                                   data=json.dumps(data), timeout=10)
-            result = response.json()
+            result = self._post(data)
             
             if result.get('errcode') == 0:
                 print("微信消息发送成功！")
@@ -122,7 +161,6 @@ class WeChatBot:
         if self._webhook_url is None:
             return {"errcode": -1, "errmsg": "Webhook URL未配置"}
         
-        headers = {'Content-Type': 'application/json'}
         data = {
             "msgtype": "markdown",
             "markdown": {
@@ -131,9 +169,7 @@ class WeChatBot:
         }
         
         try:
-            response = requests.post(self._webhook_url, headers=headers,
-                                   data=json.dumps(data), timeout=10)
-            return response.json()
+            return self._post(data)
         except Exception as e:
             print(f"Markdown消息发送失败: {e}")
             return {"errcode": -1, "errmsg": str(e)}
@@ -156,7 +192,6 @@ class WeChatBot:
         if self._webhook_url is None:
             return {"errcode": -1, "errmsg": "Webhook URL未配置"}
         
-        headers = {'Content-Type': 'application/json'}
         data = {
             "msgtype": "news",
             "news": {
@@ -165,13 +200,42 @@ class WeChatBot:
         }
         
         try:
-            response = requests.post(self._webhook_url, headers=headers,
-                                   data=json.dumps(data), timeout=10)
-            return response.json()
+            return self._post(data)
         except Exception as e:
             print(f"图文消息发送失败: {e}")
             return {"errcode": -1, "errmsg": str(e)}
     
+    def send_image(self, image: bytes) -> Dict[str, Any]:
+        """
+        发送图片消息（JPG/PNG，原始图片不超过2M）
+        
+        Parameters:
+        -----------
+        image : bytes
+            图片内容
+            
+        Returns:
+        --------
+        Dict[str, Any]
+            微信API返回结果
+        """
+        if self._webhook_url is None:
+            return {"errcode": -1, "errmsg": "Webhook URL未配置"}
+        
+        data = {
+            "msgtype": "image",
+            "image": {
+                "base64": base64.b64encode(image).decode('ascii'),
+                "md5": hashlib.md5(image).hexdigest()
+            }
+        }
+        
+        try:
+            return self._post(data)
+        except Exception as e:
+            print(f"图片消息发送失败: {e}")
+            return {"errcode": -1, "errmsg": str(e)}
+    
     def is_available(self) -> bool:
         """
         检查机器人是否可用（Webhook URL已配置）
@@ -183,8 +247,21 @@ class WeChatBot:
         """
         return self._webhook_url is not None
 
-# 创建全局实例
-wechat_bot = WeChatBot()
+# 全局实例在首次使用时创建（读取配置文件），导入本模块不产生任何I/O
+_bot = None
+
+def get_bot() -> WeChatBot:
+    """获取全局机器人实例（延迟初始化）"""
+    global _bot
+    if _bot is None:
+        _bot = WeChatBot()
+    return _bot
+
+def __getattr__(name):
+    # 兼容旧代码中的 from wechat_bot import wechat_bot
+    if name == 'wechat_bot':
+        return get_bot()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 便捷函数接口 - 其他模块直接导入这些函数使用[5](@ref)
 def send_text(content: str, 
@@ -207,7 +284,7 @@ def send_text(content: str,
     Dict[str, Any]
         发送结果
     """
-    return wechat_bot.send_text(content, mentioned_list, mentioned_mobile_list)
+    return get_bot().send_text(content, mentioned_list, mentioned_mobile_list)
 
 def send_markdown(content: str) -> Dict[str, Any]:
     """
@@ -223,7 +300,7 @@ def send_markdown(content: str) -> Dict[str, Any]:
     Dict[str, Any]
         发送结果
     """
-    return wechat_bot.send_markdown(content)
+    return get_bot().send_markdown(content)
 
 def send_news(articles: List[Dict[str, str]]) -> Dict[str, Any]:
     """
@@ -239,7 +316,88 @@ def send_news(articles: List[Dict[str, str]]) -> Dict[str, Any]:
     Dict[str, Any]
         发送结果
     """
-    return wechat_bot.send_news(articles)
+    return get_bot().send_news(articles)
+
+def send_image(image: bytes) -> Dict[str, Any]:
+    """
+    发送图片消息的便捷函数
+    
+    Parameters:
+    -----------
+    image : bytes
+        JPG/PNG 图片内容
+        
+    Returns:
+    --------
+    Dict[str, Any]
+        发送结果
+    """
+    return get_bot().send_image(image)
+
+def _send_digest(alerts) -> bool:
+    """发送一批告警: 单条直接发文本，多条合并为一条 Markdown 汇总"""
+    bot = get_bot()
+    if len(alerts) == 1:
+        result = bot.send_text(alerts[0].text)
+    else:
+        result = bot.send_markdown(format_digest(alerts))
+    if result.get('errcode') == WECHAT_RATE_LIMIT_ERRCODE:
+        raise RateLimitedError(60)
+    return result.get('errcode') == 0
+
+_digest = None
+
+def get_digest() -> DigestQueue:
+    """告警合并发送队列（延迟初始化），参数见 bot_config.cfg 的 [notify] 节"""
+    global _digest
+    if _digest is None:
+        _digest = DigestQueue(
+            _send_digest,
+            quota=get_bot().quota,
+            window=get_setting('notify', 'digest_window', 5.0, float),
+            high_window=get_setting('notify', 'high_priority_window', 0.0, float),
+            max_batch=get_setting('notify', 'max_batch', 10, int),
+            high_reserve=get_setting('notify', 'high_priority_reserve', 5, int),
+            retry_delay=get_setting('notify', 'digest_retry_delay', 2.0, float),
+            max_retry_delay=get_setting('notify', 'digest_max_retry_delay', 60.0, float),
+            name='wechat_digest',
+        )
+    return _digest
+
+def send_alert(content: str, priority: int = PRIORITY_NORMAL, on_result=None) -> bool:
+    """
+    发送告警的便捷函数: 告警进入合并队列，短时间内的多条告警合并为一条消息发送，
+    并遵守 webhook 每分钟配额
+    
+    Parameters:
+    -----------
+    content : str
+        告警内容
+    priority : int
+        PRIORITY_HIGH / PRIORITY_NORMAL / PRIORITY_LOW，高优先级不等待合并窗口
+    on_result : callable, optional
+        on_result(ok)，告警实际送达或最终发送失败时在发送线程中调用
+        
+    Returns:
+    --------
+    bool
+        是否已加入发送队列
+    """
+    if not get_bot().is_available():
+        return False
+    return get_digest().submit(content, priority, on_result)
+
+def get_digest_stats() -> Optional[Dict[str, Any]]:
+    """合并队列的发送统计，尚未创建队列时返回None"""
+    if _digest is None:
+        return None
+    return _digest.get_stats()
+
+def flush_alerts(timeout: float = 10.0) -> bool:
+    """立即发送合并队列中的所有告警（程序退出前调用）"""
+    if _digest is None:
+        return True
+    return _digest.flush(timeout)
 
 def check_bot_availability() -> bool:
     """
@@ -250,7 +408,7 @@ def check_bot_availability() -> bool:
     bool
         是否可用
     """
-    return wechat_bot.is_available()
+    return get_bot().is_available()
 
 # 使用示例和测试
 if __name__ == '__main__':